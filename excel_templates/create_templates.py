@@ -2,13 +2,10 @@
 Create Excel Templates for Model Registry
 Generates Excel templates with proper formatting and validation rules
 """
-import pandas as pd
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
-from openpyxl.worksheet.datavalidation import DataValidation
-from openpyxl.utils.dataframe import dataframe_to_rows
 import os
 
+# pandas and openpyxl are imported by the functions that write files, so reading TEMPLATE_CONFIGS stays fast
+
 # Template configurations based on database schema
 TEMPLATE_CONFIGS = {
     'model_type': {
@@ -147,6 +144,9 @@ TEMPLATE_CONFIGS = {
 
 def create_excel_template(table_name, config, output_dir='templates'):
     """Create Excel template with formatting and validation"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+    from openpyxl.worksheet.datavalidation import DataValidation
     
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
@@ -247,6 +247,7 @@ def create_excel_template(table_name, config, output_dir='templates'):
 
 def create_sample_data_file(table_name, config, output_dir='sample_data'):
     """Create sample data file"""
+    import pandas as pd
     
     os.makedirs(output_dir, exist_ok=True)
     
@@ -0,0 +1,312 @@
+"""
+Upload backups for Model Registry upload scripts
+Saves only the rows an upload can overwrite, records the identities it inserts, and prunes old backup tables
+"""
+import glob
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from bulk_insert import frame_to_rows
+
+BACKUP_MODES = ['keys', 'full']
+
+KEYS_TABLE = '#BACKUP_KEYS'
+
+# Suffix of the table next to a backup table holding the identities the upload inserted
+IDS_SUFFIX = '_IDS'
+
+
+def backup_table_name(table_name: str, timestamp: Optional[datetime] = None) -> str:
+    """Name of a backup table (e.g., 'MODEL_REGISTRY_BACKUP_20240101_120000')"""
+    return f"{table_name}_BACKUP_{(timestamp or datetime.now()).strftime('%Y%m%d_%H%M%S')}"
+
+
+class UploadBackup:
+    """Backup of one upload into one table"""
+
+    def __init__(self, connection, table_config: Dict, mode: str = 'keys', manifest_dir: str = 'backups',
+                 logger: Optional[logging.Logger] = None):
+        """
+        Initialize the backup for one upload
+
+        Args:
+            connection: Open pyodbc connection shared with the upload
+            table_config: Entry of TABLE_MAPPINGS for the target table
+            mode: 'keys' to copy only existing rows whose unique key is uploaded again,
+                'full' to copy the whole table before the upload
+            manifest_dir: Directory for the JSON manifests used to undo uploads
+        """
+        if mode not in BACKUP_MODES:
+            raise ValueError(f"Unknown backup mode: {mode} (available: {', '.join(BACKUP_MODES)})")
+
+        self.connection = connection
+        self.db_table = table_config['table_name']
+        self.key_columns = list(table_config['unique_columns'])
+        self.identity_column = table_config['identity_column']
+        self.mode = mode
+        self.manifest_dir = manifest_dir
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.started_at = datetime.now()
+        self.backup_table = backup_table_name(self.db_table, self.started_at)
+        self.ids_table = self.backup_table + IDS_SUFFIX
+        self.rows_backed_up = 0
+
+    @property
+    def output_ids(self) -> Tuple[str, str]:
+        """
+        (identity column, table) for the writers' OUTPUT INSERTED ... INTO
+
+        Only the rows this upload inserted are recorded, so a restore leaves rows
+        that other sessions inserted meanwhile alone.
+        """
+        return self.identity_column, self.ids_table
+
+    def begin(self):
+        """Create the (empty, or full-copy) backup table and the table of inserted identities"""
+        cursor = self.connection.cursor()
+        try:
+            # UNION ALL keeps the column type but drops the IDENTITY property
+            cursor.execute(
+                f"SELECT TOP 0 {self.identity_column} INTO {self.ids_table} FROM {self.db_table} "
+                f"UNION ALL SELECT TOP 0 {self.identity_column} FROM {self.db_table}"
+            )
+            if self.mode == 'full':
+                cursor.execute(f"SELECT * INTO {self.backup_table} FROM {self.db_table}")
+                self.rows_backed_up = cursor.rowcount
+            else:
+                # UNION ALL keeps the column types but drops the IDENTITY property
+                cursor.execute(
+                    f"SELECT TOP 0 * INTO {self.backup_table} FROM {self.db_table} "
+                    f"UNION ALL SELECT TOP 0 * FROM {self.db_table}"
+                )
+                cursor.execute(f"DROP TABLE IF EXISTS {KEYS_TABLE}")
+                key_list = ', '.join(self.key_columns)
+                cursor.execute(
+                    f"SELECT TOP 0 {key_list} INTO {KEYS_TABLE} FROM {self.db_table} "
+                    f"UNION ALL SELECT TOP 0 {key_list} FROM {self.db_table}"
+                )
+        finally:
+            cursor.close()
+        # Committed at once so a rolled-back batch cannot drop the tables again
+        self.connection.commit()
+
+        self.logger.info(f"Created backup table: {self.backup_table} ({self.mode} mode)")
+
+    def save_batch(self, batch_df: pd.DataFrame):
+        """
+        Copy the existing rows whose unique key appears in a batch, in the batch's transaction
+
+        Call before the batch is written, so the copy holds the values it replaces.
+        """
+        if self.mode != 'keys' or not all(col in batch_df.columns for col in self.key_columns):
+            return
+
+        cursor = self.connection.cursor()
+        try:
+            cursor.fast_executemany = True
+            cursor.executemany(
+                f"INSERT INTO {KEYS_TABLE} ({', '.join(self.key_columns)}) "
+                f"VALUES ({', '.join('?' for _ in self.key_columns)})",
+                frame_to_rows(batch_df, self.key_columns)
+            )
+            self._copy_matching(cursor, KEYS_TABLE)
+            cursor.execute(f"TRUNCATE TABLE {KEYS_TABLE}")
+        finally:
+            cursor.close()
+
+    def save_staged(self, staging_table: str):
+        """Copy the existing rows whose unique key appears in a staging table, in the open transaction"""
+        if self.mode != 'keys':
+            return
+
+        cursor = self.connection.cursor()
+        try:
+            self._copy_matching(cursor, staging_table)
+        finally:
+            cursor.close()
+
+    def _copy_matching(self, cursor, key_source: str):
+        match = ' AND '.join(f"t.{col} = k.{col}" for col in self.key_columns)
+        cursor.execute(
+            f"INSERT INTO {self.backup_table} SELECT t.* FROM {self.db_table} t "
+            f"WHERE EXISTS (SELECT 1 FROM {key_source} k WHERE {match})"
+        )
+        saved = cursor.rowcount
+        if saved and saved > 0:
+            self.rows_backed_up += saved
+
+    def finish(self, uploaded_count: int) -> Optional[str]:
+        """
+        Write the manifest describing how to undo the upload
+
+        Returns:
+            Path of the manifest file, or None if the upload changed nothing
+        """
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"SELECT COUNT(*) FROM {self.ids_table}")
+            rows_inserted = cursor.fetchone()[0]
+            cursor.execute(f"DROP TABLE IF EXISTS {KEYS_TABLE}")
+            if self.mode == 'keys' and self.rows_backed_up == 0:
+                # Nothing was overwritten; keep only the inserted identities
+                cursor.execute(f"DROP TABLE IF EXISTS {self.backup_table}")
+            if not rows_inserted:
+                cursor.execute(f"DROP TABLE IF EXISTS {self.ids_table}")
+        finally:
+            cursor.close()
+        self.connection.commit()
+
+        if not uploaded_count:
+            return None
+
+        manifest = {
+            'table': self.db_table,
+            'created': self.started_at.isoformat(timespec='seconds'),
+            'mode': self.mode,
+            'backup_table': self.backup_table if self.mode == 'full' or self.rows_backed_up else None,
+            'rows_backed_up': self.rows_backed_up,
+            'key_columns': self.key_columns,
+            'identity_column': self.identity_column,
+            'inserted_ids_table': self.ids_table if rows_inserted else None,
+            'rows_inserted': rows_inserted,
+            'uploaded_rows': uploaded_count
+        }
+
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        manifest_path = os.path.join(self.manifest_dir, f"{self.backup_table}.json")
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+        self.logger.info(f"Backup manifest: {manifest_path} ({self.rows_backed_up} rows backed up)")
+        return manifest_path
+
+
+def restore_upload(connection, manifest_path: str, logger: Optional[logging.Logger] = None) -> Dict:
+    """
+    Undo an upload from its manifest in one transaction
+
+    Rows the upload inserted are deleted by their recorded identities. Rows it
+    updated are set back to their backed-up values in place (UPDATE ... FROM),
+    so rows referenced by foreign keys can be restored too; backed-up rows no
+    longer in the table (deleted by a sync) are inserted again with their
+    original identity values. In 'full' mode every row of the copy is restored
+    this way, and rows inserted by other sessions are kept.
+
+    Returns:
+        Counts of deleted, updated and restored rows
+    """
+    logger = logger or logging.getLogger(__name__)
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    table = manifest['table']
+    backup_table = manifest['backup_table']
+    identity_column = manifest['identity_column']
+    ids_table = manifest.get('inserted_ids_table')
+    if 'inserted_ids_table' not in manifest and manifest.get('inserted_identity_range'):
+        raise ValueError(f"{manifest_path} records only the identity range of the upload, which can hold rows of "
+                         f"other sessions; undo its inserts by hand")
+    counts = {'deleted': 0, 'updated': 0, 'restored': 0}
+
+    cursor = connection.cursor()
+    try:
+        if ids_table:
+            cursor.execute(f"DELETE t FROM {table} t WHERE EXISTS "
+                           f"(SELECT 1 FROM {ids_table} i WHERE i.{identity_column} = t.{identity_column})")
+            counts['deleted'] = cursor.rowcount
+
+        if backup_table:
+            # Computed and rowversion columns are neither updated nor inserted
+            cursor.execute("SELECT name FROM sys.columns WHERE object_id = OBJECT_ID(?) AND is_computed = 0 "
+                           "AND system_type_id <> 189 ORDER BY column_id", (table,))
+            columns = [row[0] for row in cursor.fetchall()]
+            value_columns = [col for col in columns if col != identity_column]
+            match = f"t.{identity_column} = b.{identity_column}"
+
+            if value_columns:
+                # EXCEPT compares NULLs as equal, so rows already holding the backed-up values are not rewritten
+                assignments = ', '.join(f"{col} = b.{col}" for col in value_columns)
+                backup_values = ', '.join(f"b.{col}" for col in value_columns)
+                table_values = ', '.join(f"t.{col}" for col in value_columns)
+                cursor.execute(f"UPDATE t SET {assignments} FROM {table} t JOIN {backup_table} b ON {match} "
+                               f"WHERE EXISTS (SELECT {backup_values} EXCEPT SELECT {table_values})")
+                counts['updated'] = cursor.rowcount
+
+            column_list = ', '.join(columns)
+            cursor.execute(f"SET IDENTITY_INSERT {table} ON")
+            try:
+                cursor.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {backup_table} b "
+                               f"WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE {match})")
+                counts['restored'] = cursor.rowcount
+            finally:
+                # A session setting that a rollback keeps; the pooled connection goes to other uploads next
+                cursor.execute(f"SET IDENTITY_INSERT {table} OFF")
+
+        connection.commit()
+
+    except Exception:
+        connection.rollback()
+        raise
+
+    finally:
+        cursor.close()
+
+    logger.info(f"Restored {table} from {manifest_path}: {counts['deleted']} inserted rows deleted, "
+                f"{counts['updated']} rows reverted, {counts['restored']} deleted rows put back")
+    return counts
+
+
+def prune_backups(connection, table_name: str, keep: int, retention_days: int,
+                  manifest_dir: str = 'backups', logger: Optional[logging.Logger] = None) -> List[str]:
+    """
+    Drop a table's old _BACKUP_ tables (with their _IDS tables) and their manifests
+
+    A backup table or manifest is dropped when it is older than retention_days
+    and is not one of the newest `keep` of the table.
+
+    Returns:
+        Names of the dropped backup tables
+    """
+    logger = logger or logging.getLogger(__name__)
+    cutoff = datetime.now() - timedelta(days=retention_days)
+
+    # '_' is a LIKE wildcard
+    name_pattern = table_name.replace('_', '\\_') + '\\_BACKUP\\_%'
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "SELECT name, create_date FROM sys.tables WHERE name LIKE ? ESCAPE '\\' ORDER BY create_date DESC",
+            (name_pattern,)
+        )
+        # A backup table and its table of inserted identities count as one backup
+        backups: Dict[str, List] = {}
+        for name, create_date in cursor.fetchall():
+            stem = name[:-len(IDS_SUFFIX)] if name.endswith(IDS_SUFFIX) else name
+            backups.setdefault(stem, [create_date, []])[1].append(name)
+
+        dropped = []
+        for create_date, names in list(backups.values())[keep:]:
+            if create_date < cutoff:
+                for name in names:
+                    cursor.execute(f"DROP TABLE {name}")
+                dropped.extend(names)
+    finally:
+        cursor.close()
+    connection.commit()
+
+    # Manifest names end in their timestamp, so name order is age order
+    manifests = sorted(glob.glob(os.path.join(manifest_dir, f"{table_name}_BACKUP_*.json")), reverse=True)
+    for manifest_path in manifests[keep:]:
+        if datetime.fromtimestamp(os.path.getmtime(manifest_path)) < cutoff:
+            os.remove(manifest_path)
+
+    if dropped:
+        logger.info(f"Pruned {len(dropped)} old backup tables of {table_name}")
+    return dropped
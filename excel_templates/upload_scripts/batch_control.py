@@ -0,0 +1,214 @@
+"""
+Adaptive batch sizing for Model Registry upload scripts
+Rows per batch grown and shrunk from measured latency, throughput and rejects (AIMD), within a memory budget
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+import pandas as pd
+
+# Bump when the state file layout changes, so older entries are ignored
+STATE_VERSION = 1
+
+# Rows of a chunk measured to estimate the in-memory width of its rows
+WIDTH_SAMPLE_ROWS = 200
+
+# A larger batch must keep at least this share of the previous throughput, or growth stops there
+THROUGHPUT_KEEP = 0.9
+
+# Weight of the newest batch in the smoothed throughput
+RATE_SMOOTHING = 0.3
+
+# Serializes updates of the state file by the uploaders of one process
+_state_lock = threading.Lock()
+
+
+def estimate_row_bytes(df: pd.DataFrame) -> int:
+    """Average in-memory width of a row, strings included, measured on the first rows of the frame"""
+    sample = df.iloc[:WIDTH_SAMPLE_ROWS]
+    if sample.empty:
+        return 0
+    return max(1, int(sample.memory_usage(index=False, deep=True).sum() / len(sample)))
+
+
+def load_batch_state(path: str) -> Dict[str, Dict]:
+    """Saved batch sizes by table ({} if there are none)"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get('version') != STATE_VERSION:
+        return {}
+    return data.get('tables', {})
+
+
+def save_batch_state(path: str, key: str, entry: Dict):
+    """Update one table's entry, keeping those other uploads saved in the meantime"""
+    with _state_lock:
+        tables = load_batch_state(path)
+        tables[key] = entry
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': STATE_VERSION, 'tables': tables}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, path)
+
+
+class AdaptiveBatchSizer:
+    """
+    Rows per batch for one upload, adjusted after every committed batch
+
+    Without a saved size the batch size starts small and doubles while batches
+    finish within the target latency (slow start). After that it grows by a
+    fixed step (additive increase) and is cut in proportion to the overshoot
+    when a batch is too slow, or halved when a batch had rejected rows, since
+    isolating them re-sends the batch (multiplicative decrease). A size whose
+    throughput is lower than that of the size before it becomes a ceiling for
+    the rest of the upload. The size never exceeds what fits in the memory
+    budget at the measured row width.
+
+    With adaptive=False the size stays at config['batch_size'] (BATCH_SIZE).
+    """
+
+    def __init__(self, table_key: str, config: Dict, logger: Optional[logging.Logger] = None,
+                 adaptive: Optional[bool] = None):
+        """
+        Args:
+            table_key: Key of the table's saved size (database, table and upload mode)
+            config: UPLOAD_CONFIG (batch_size, batch_size_min/max/start/step, batch_target_seconds,
+                batch_memory_mb, batch_state_file)
+            logger: Logger for size changes
+            adaptive: Adjust the size; defaults to config['adaptive_batching']
+        """
+        self.table_key = table_key
+        self.logger = logger or logging.getLogger(__name__)
+        self.adaptive = config['adaptive_batching'] if adaptive is None else adaptive
+        self.min_size = max(1, config['batch_size_min'])
+        self.max_size = max(self.min_size, config['batch_size_max'])
+        self.step = max(1, config['batch_size_step'])
+        self.target_seconds = config['batch_target_seconds']
+        self.memory_budget = config['batch_memory_mb'] * 1024 * 1024
+        self.state_path = config['batch_state_file']
+        self.row_bytes = 0
+        self.rows_per_sec = 0.0
+        self.ceiling = self.max_size
+        self.previous = None
+        self.settled = None
+        self.warm = False
+
+        if not self.adaptive:
+            self.size = max(1, config['batch_size'])
+        else:
+            saved = load_batch_state(self.state_path).get(table_key) or {}
+            if saved.get('batch_size'):
+                self.size = self.clamp(int(saved['batch_size']))
+                self.row_bytes = int(saved.get('row_bytes', 0))
+                self.warm = True
+            else:
+                self.size = self.clamp(config['batch_size_start'])
+        self.slow_start = self.adaptive and not self.warm
+        self.start_size = self.size
+        self.smallest = self.size
+        self.largest = self.size
+        self.changes = 0
+
+    def clamp(self, size: int) -> int:
+        size = min(max(size, self.min_size), self.max_size, self.ceiling)
+        if self.row_bytes:
+            size = min(size, max(self.min_size, self.memory_budget // self.row_bytes))
+        return size
+
+    def observe_chunk(self, df: pd.DataFrame):
+        """Measure the row width of a chunk and shrink the size if a batch would exceed the memory budget"""
+        if not self.adaptive or df.empty:
+            return
+        self.row_bytes = max(self.row_bytes, estimate_row_bytes(df))
+        self.resize(self.clamp(self.size), 'memory budget')
+
+    def record(self, rows: int, seconds: float, rejected: int = 0):
+        """
+        Adjust the size after a batch was written and committed
+
+        Args:
+            rows: Rows in the batch
+            seconds: Time to write and commit it, including the retries that isolated rejected rows
+            rejected: Rows of the batch the database rejected
+        """
+        if not self.adaptive or rows <= 0 or seconds <= 0:
+            return
+        rate = rows / seconds
+        self.rows_per_sec = rate if not self.rows_per_sec else (
+            RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self.rows_per_sec)
+
+        if rejected:
+            self.slow_start = False
+            self.previous = None
+            self.resize(self.clamp(self.size // 2), f"{rejected} rejected rows")
+        elif seconds > self.target_seconds * 1.5:
+            self.slow_start = False
+            self.previous = None
+            factor = max(0.5, self.target_seconds / seconds)
+            self.resize(self.clamp(int(self.size * factor)), f"batch took {seconds:.2f}s")
+        elif rows < self.size:
+            # A short last batch of a chunk says little about the full size
+            return
+        elif self.previous and self.previous[0] < self.size and rate < self.previous[1] * THROUGHPUT_KEEP:
+            self.slow_start = False
+            self.ceiling = max(self.min_size, self.previous[0])
+            self.settled = self.previous[0]
+            self.resize(self.clamp(self.previous[0]),
+                        f"{rate:,.0f} rows/sec is below the {self.previous[1]:,.0f} rows/sec of the smaller size")
+        else:
+            self.previous = (self.size, rate)
+            self.settled = self.size
+            if seconds < self.target_seconds:
+                self.resize(self.clamp(self.size * 2 if self.slow_start else self.size + self.step))
+
+    def resize(self, size: int, reason: Optional[str] = None):
+        if size == self.size:
+            return
+        if reason:
+            self.logger.info(f"Batch size {self.size} -> {size} ({reason})")
+        else:
+            self.logger.debug(f"Batch size {self.size} -> {size}")
+        self.size = size
+        self.smallest = min(self.smallest, size)
+        self.largest = max(self.largest, size)
+        self.changes += 1
+
+    def summary(self) -> Dict:
+        """Sizes of this upload, for the upload metrics"""
+        return {
+            'adaptive': self.adaptive,
+            'warm_start': self.warm,
+            'start': self.start_size,
+            'final': self.size,
+            'min': self.smallest,
+            'max': self.largest,
+            'changes': self.changes,
+            'row_bytes': self.row_bytes
+        }
+
+    def save(self):
+        """
+        Remember the size for the next upload of the table
+
+        The saved size is the last one whose full batch met the latency target without
+        rejects, so a file with bad rows does not leave a smaller size for the next upload.
+        """
+        if not self.adaptive or not self.settled:
+            return
+        try:
+            save_batch_state(self.state_path, self.table_key, {
+                'batch_size': self.settled,
+                'row_bytes': self.row_bytes,
+                'rows_per_sec': round(self.rows_per_sec, 1),
+                'updated': datetime.now().isoformat(timespec='seconds')
+            })
+        except OSError as e:
+            self.logger.warning(f"Could not save the batch size of {self.table_key}: {str(e)}")
@@ -0,0 +1,138 @@
+"""
+Bulk Insert Engine for Model Registry upload scripts
+Sends each batch to SQL Server as a single parameter-array call instead of one round trip per row
+"""
+import logging
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+
+def sort_by_key(df: pd.DataFrame, key_columns: Sequence[str]) -> pd.DataFrame:
+    """Order rows by the target table's unique key so inserts follow the index order"""
+    key_columns = [col for col in key_columns if col in df.columns]
+    if not key_columns:
+        return df
+    return df.sort_values(key_columns, kind='mergesort', na_position='last')
+
+
+def frame_to_rows(df: pd.DataFrame, columns: Sequence[str]) -> List[tuple]:
+    """Convert a DataFrame to parameter tuples, converting each column array only once"""
+    arrays = []
+    for col in columns:
+        series = df[col].astype(object)
+        arrays.append(series.where(df[col].notna(), None).tolist())
+    return list(zip(*arrays))
+
+
+class BulkCallError(Exception):
+    """
+    The parameter-array call of a batch failed
+
+    Nothing has been rolled back: the caller rolls back its transaction and can
+    write the batch again on the per-row path (use_bulk = False).
+    """
+
+
+class BulkInserter:
+    """Insert batches of rows into one table using pyodbc fast_executemany"""
+
+    def __init__(self, connection, table_name: str, columns: Sequence[str],
+                 logger: Optional[logging.Logger] = None, use_bulk: bool = True,
+                 output_ids: Optional[Tuple[str, str]] = None):
+        """
+        Initialize the inserter for a specific table
+
+        Args:
+            connection: Open pyodbc connection; commits are left to the caller
+            table_name: Database table to insert into (e.g., 'MODEL_TYPE')
+            columns: Column names, in the order used by the row tuples
+            use_bulk: Send each batch as one parameter array; False keeps the per-row path
+            output_ids: (identity column, table) to record the identities of the inserted rows in,
+                in the same transaction (see UploadBackup.output_ids)
+        """
+        self.connection = connection
+        self.table_name = table_name
+        self.columns = list(columns)
+        self.logger = logger or logging.getLogger(__name__)
+        self.use_bulk = use_bulk
+
+        placeholders = ','.join(['?' for _ in self.columns])
+        output = f"OUTPUT INSERTED.{output_ids[0]} INTO {output_ids[1]} ({output_ids[0]}) " if output_ids else ''
+        self.insert_query = f"INSERT INTO {table_name} ({','.join(self.columns)}) {output}VALUES ({placeholders})"
+
+    def insert_bulk(self, rows: List[tuple]):
+        """Send all rows in a single parameter-array call"""
+        cursor = self.connection.cursor()
+        try:
+            cursor.fast_executemany = True
+            cursor.executemany(self.insert_query, rows)
+        finally:
+            cursor.close()
+
+    def insert_row_by_row(self, rows: List[tuple]):
+        """Fallback path: one execute per row"""
+        cursor = self.connection.cursor()
+        try:
+            for values in rows:
+                cursor.execute(self.insert_query, values)
+        finally:
+            cursor.close()
+
+    def insert_batch(self, rows: List[tuple], batch_number: int = 1) -> float:
+        """
+        Insert one batch without committing and log its throughput
+
+        Returns:
+            Throughput of the batch in rows per second
+        """
+        if not rows:
+            return 0.0
+
+        start_time = time.perf_counter()
+        if self.use_bulk:
+            try:
+                self.insert_bulk(rows)
+            except Exception as e:
+                raise BulkCallError(str(e)) from e
+        else:
+            self.insert_row_by_row(rows)
+        elapsed = time.perf_counter() - start_time
+
+        rows_per_sec = len(rows) / elapsed if elapsed > 0 else float(len(rows))
+        self.logger.info(
+            f"Batch {batch_number}: {len(rows)} rows inserted into {self.table_name} "
+            f"in {elapsed:.3f}s ({rows_per_sec:,.0f} rows/sec, {'bulk' if self.use_bulk else 'row'} mode)"
+        )
+        return rows_per_sec
+
+    def insert_with_fallback(self, rows: List[tuple], batch_number: int = 1) -> float:
+        """
+        Insert one batch, retrying it on the per-row path if the bulk call fails
+
+        The open transaction is rolled back before the retry, so this is only for
+        callers whose transaction holds nothing but this batch; callers that write
+        more in the same transaction (such as a backup of the rows) catch
+        BulkCallError from insert_batch and redo all of it. If the per-row retry
+        succeeds the failure came from the driver rather than the data, and bulk
+        mode is switched off for the rest of the run.
+        """
+        if not self.use_bulk:
+            return self.insert_batch(rows, batch_number)
+
+        try:
+            return self.insert_batch(rows, batch_number)
+        except BulkCallError as e:
+            self.connection.rollback()
+            self.logger.warning(f"Bulk insert of batch {batch_number} failed, retrying row by row: {str(e)}")
+
+        self.use_bulk = False
+        try:
+            rows_per_sec = self.insert_batch(rows, batch_number)
+        except Exception:
+            self.use_bulk = True
+            raise
+
+        self.logger.warning(f"Bulk insert not usable for {self.table_name}; continuing row by row")
+        return rows_per_sec
@@ -0,0 +1,122 @@
+"""
+Upload checkpoints for Model Registry upload scripts
+Records which source rows were committed or rejected so an interrupted upload can resume where it stopped
+"""
+import json
+import os
+from datetime import datetime
+from typing import Iterable, List, Set
+
+import numpy as np
+import pandas as pd
+
+from parse_cache import file_sha256
+
+
+def to_ranges(rows: Iterable[int]) -> List[List[int]]:
+    """Compress row numbers into sorted [first, last] ranges"""
+    ranges = []
+    for row in sorted(set(int(row) for row in rows)):
+        if ranges and row == ranges[-1][1] + 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return ranges
+
+
+class UploadCheckpoint:
+    """
+    Append-only log of committed and rejected source rows for one file and table
+
+    The first line identifies the upload; every later line records the rows of
+    one committed batch or rejected row. A line is written right after the
+    database commit, so a crash between the two can replay one batch on resume
+    (upsert mode absorbs it; insert mode rejects the rows as duplicates).
+    """
+
+    def __init__(self, checkpoint_dir: str, file_path: str, table_name: str, upload_mode: str):
+        self.file_path = file_path
+        self.table_name = table_name
+        self.upload_mode = upload_mode
+        self.content_hash = file_sha256(file_path)
+        self.path = os.path.join(checkpoint_dir, f"{table_name}_{upload_mode}_{self.content_hash[:16]}.jsonl")
+        self.committed: Set[int] = set()
+        self.rejected: Set[int] = set()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self) -> bool:
+        """Read the rows already handled by an earlier run (False if there is no usable checkpoint)"""
+        if not self.exists():
+            return False
+
+        with open(self.path, encoding='utf-8') as f:
+            lines = f.readlines()
+        if not lines or json.loads(lines[0]).get('sha256') != self.content_hash:
+            return False
+
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A crash mid-write leaves at most one partial last line
+                continue
+            target = self.committed if entry.get('event') == 'committed' else self.rejected
+            for first, last in entry.get('rows', []):
+                target.update(range(first, last + 1))
+        return True
+
+    def start(self):
+        """Start a new checkpoint, discarding any earlier one for the same file and table"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        header = {
+            'file': os.path.abspath(self.file_path),
+            'sha256': self.content_hash,
+            'table': self.table_name,
+            'mode': self.upload_mode,
+            'started': datetime.now().isoformat(timespec='seconds')
+        }
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header) + '\n')
+        self.committed = set()
+        self.rejected = set()
+
+    def _append(self, event: str, rows: Iterable[int]):
+        rows = list(rows)
+        entry = {'event': event, 'rows': to_ranges(rows)}
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        (self.committed if event == 'committed' else self.rejected).update(int(row) for row in rows)
+
+    def record_committed(self, rows: Iterable[int]):
+        self._append('committed', rows)
+
+    def record_rejected(self, rows: Iterable[int]):
+        self._append('rejected', rows)
+
+    def pending(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Rows of a chunk that were neither committed nor rejected by an earlier run"""
+        handled = self.committed | self.rejected
+        if not handled:
+            return df
+        return df[~df.index.isin(np.fromiter(handled, dtype=np.int64, count=len(handled)))]
+
+    def handled_count(self) -> int:
+        return len(self.committed) + len(self.rejected)
+
+    def remove(self):
+        """Delete the checkpoint once the upload has finished"""
+        if self.exists():
+            os.remove(self.path)
+
+
+def open_checkpoint(checkpoint_dir: str, file_path: str, table_name: str, upload_mode: str,
+                    resume: bool) -> UploadCheckpoint:
+    """Load the checkpoint to resume from, or start a fresh one"""
+    checkpoint = UploadCheckpoint(checkpoint_dir, file_path, table_name, upload_mode)
+    if not (resume and checkpoint.load()):
+        checkpoint.start()
+    return checkpoint
@@ -2,10 +2,26 @@
 Configuration file for Excel upload scripts
 """
 import os
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+
+def _find_env_file(start: str) -> str:
+    """Nearest .env file in start or its parent directories, as load_dotenv() finds it ('' if none)"""
+    directory = os.path.abspath(start)
+    while True:
+        path = os.path.join(directory, '.env')
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return ''
+        directory = parent
+
+
+# Load environment variables (python-dotenv is only imported when there is a .env file to read)
+_env_file = _find_env_file(os.path.dirname(__file__))
+if _env_file:
+    from dotenv import load_dotenv
+    load_dotenv(_env_file)
 
 # Database Configuration
 DB_CONFIG = {
@@ -17,36 +33,96 @@ DB_CONFIG = {
     'password': os.getenv('DB_PASSWORD', '')
 }
 
+# Connection Pool Configuration (see db_access.ConnectionPool)
+POOL_CONFIG = {
+    'min_size': int(os.getenv('POOL_MIN_SIZE', '1')),  # connections kept open while idle
+    'max_size': int(os.getenv('POOL_MAX_SIZE', '10')),  # must exceed --workers (workers plus the coordinating connection)
+    'idle_timeout': float(os.getenv('POOL_IDLE_TIMEOUT', '300')),  # seconds before an idle connection above min_size is closed
+    'health_check_after': float(os.getenv('POOL_HEALTH_CHECK_AFTER', '30')),  # idle seconds before a reused connection is tested
+    'statement_cache_size': int(os.getenv('STATEMENT_CACHE_SIZE', '32')),  # prepared statements kept per connection
+    'timeout': float(os.getenv('POOL_TIMEOUT', '300'))  # seconds to wait for a free connection
+}
+
 # Upload Configuration
 UPLOAD_CONFIG = {
-    'batch_size': int(os.getenv('BATCH_SIZE', '1000')),
+    'batch_size': int(os.getenv('BATCH_SIZE', '10000')),  # rows per batch with ADAPTIVE_BATCHING=false (and for parallel workers)
+    'adaptive_batching': os.getenv('ADAPTIVE_BATCHING', 'true').lower() == 'true',  # size batches from their measured latency
+    'batch_size_min': int(os.getenv('BATCH_SIZE_MIN', '100')),
+    'batch_size_max': int(os.getenv('BATCH_SIZE_MAX', '50000')),
+    'batch_size_start': int(os.getenv('BATCH_SIZE_START', '500')),  # first size for a table without a saved size
+    'batch_size_step': int(os.getenv('BATCH_SIZE_STEP', '500')),  # rows added while batches stay within the target
+    'batch_target_seconds': float(os.getenv('BATCH_TARGET_SECONDS', '2')),  # wanted write + commit time of a batch
+    'batch_memory_mb': int(os.getenv('BATCH_MEMORY_MB', '64')),  # largest in-memory size of one batch
+    'batch_state_file': os.getenv('BATCH_STATE_FILE', '.upload_batch_sizes.json'),  # sizes learned per table, for a warm start
     'max_errors': int(os.getenv('MAX_ERRORS', '100')),
     'log_level': os.getenv('LOG_LEVEL', 'INFO'),
-    'backup_before_upload': os.getenv('BACKUP_BEFORE_UPLOAD', 'true').lower() == 'true'
+    'log_format': os.getenv('LOG_FORMAT', 'text').lower(),  # 'text' or 'json' (JSON lines log files)
+    'log_rate_limit': int(os.getenv('LOG_RATE_LIMIT', '20')),  # similar warnings/errors logged per minute, the rest only counted (0: no limit)
+    'backup_before_upload': os.getenv('BACKUP_BEFORE_UPLOAD', 'true').lower() == 'true',
+    'checkpoint_dir': os.getenv('CHECKPOINT_DIR', '.upload_checkpoints'),  # progress of unfinished uploads (--resume)
+    'backup_mode': os.getenv('BACKUP_MODE', 'keys').lower(),  # 'keys' (rows the upload overwrites) or 'full' (whole table)
+    'backup_dir': os.getenv('BACKUP_DIR', 'backups'),  # undo manifests
+    'backup_keep': int(os.getenv('BACKUP_KEEP', '5')),  # newest _BACKUP_ tables per table that are never pruned
+    'backup_retention_days': int(os.getenv('BACKUP_RETENTION_DAYS', '30')),
+    'insert_mode': os.getenv('INSERT_MODE', 'bulk').lower(),  # 'bulk' (fast_executemany) or 'row'
+    'upload_mode': os.getenv('UPLOAD_MODE', 'insert').lower(),  # 'insert' or 'upsert' (MERGE on unique_columns)
+    'upload_workers': int(os.getenv('UPLOAD_WORKERS', '1')),  # connections inserting one table in parallel (--workers)
+    'staging_stale_hours': int(os.getenv('STAGING_STALE_HOURS', '24')),  # --workers staging tables older than this are from killed runs and dropped
+    'job_concurrency': int(os.getenv('JOB_CONCURRENCY', '4')),  # uploads run at once by job_scheduler.py
+    'stream_chunk_size': int(os.getenv('STREAM_CHUNK_SIZE', '50000')),
+    'pipeline_queue_size': int(os.getenv('PIPELINE_QUEUE_SIZE', '2')),  # chunks buffered between pipeline stages (--pipeline)
+    'pipeline_transaction': os.getenv('PIPELINE_TRANSACTION', 'true').lower() == 'true',  # commit a pipelined upload only as a whole
+    'parser': os.getenv('EXCEL_PARSER', 'auto'),  # 'auto', 'openpyxl', 'calamine', 'fastexcel', 'csv', 'parquet'
+    'parse_cache': os.getenv('PARSE_CACHE', 'true').lower() == 'true',
+    'cache_dir': os.getenv('PARSE_CACHE_DIR', '.upload_cache'),
+    'cache_max_mb': int(os.getenv('PARSE_CACHE_MAX_MB', '1024')),
+    'fk_cache_ttl': int(os.getenv('FK_CACHE_TTL', '300')),  # seconds a loaded FK key set is reused
+    'fk_index_max_keys': int(os.getenv('FK_INDEX_MAX_KEYS', '1000000')),  # larger reference tables use a temp-table join
+    'metrics_dir': os.getenv('METRICS_DIR', 'metrics'),  # per-stage upload timings
+    'metrics_format': os.getenv('METRICS_FORMAT', 'json').lower(),  # 'json' (file per upload), 'csv' (one appended file), 'both' or 'none'
+    'metrics_summary': os.getenv('METRICS_SUMMARY', 'false').lower() == 'true',  # print the stage table after each upload
+    'sync_manifest_dir': os.getenv('SYNC_MANIFEST_DIR', '.upload_sync'),  # row hashes of each table as of its last --sync
+    'sync_delete': os.getenv('SYNC_DELETE', 'false').lower() == 'true',  # --sync deletes the table's rows missing from the file
+    'service_dir': os.getenv('SERVICE_DIR', '.upload_service'),  # job queue and socket of upload_service.py
+    'service_drop_dir': os.getenv('SERVICE_DROP_DIR', ''),  # folder upload_service.py watches for new files ('' for none)
+    'service_workers': int(os.getenv('SERVICE_WORKERS', '2')),  # uploads upload_service.py runs at once
+    'service_poll_interval': float(os.getenv('SERVICE_POLL_INTERVAL', '5')),  # seconds between drop folder scans without inotify
+    'service_port': int(os.getenv('SERVICE_PORT', '8765'))  # localhost TCP port where UNIX sockets are unavailable (Windows)
 }
 
 # Table Mappings
+# json_columns: column -> required top-level JSON kind ('object', 'array', or None for any JSON)
+# natural_key: columns other sheets of a workbook may use instead of the identity value (see workbook_upload.py)
 TABLE_MAPPINGS = {
     'model_type': {
         'table_name': 'MODEL_TYPE',
         'required_columns': ['TYPE_CODE', 'TYPE_NAME'],
         'unique_columns': ['TYPE_CODE'],
-        'identity_column': 'TYPE_ID'
+        'identity_column': 'TYPE_ID',
+        'natural_key': ['TYPE_CODE']
     },
     'model_registry': {
         'table_name': 'MODEL_REGISTRY',
         'required_columns': ['MODEL_NAME', 'MODEL_VERSION', 'SOURCE_DATABASE', 'SOURCE_SCHEMA', 'SOURCE_TABLE_NAME', 'EFF_DATE', 'EXP_DATE'],
         'unique_columns': ['MODEL_NAME', 'MODEL_VERSION'],
         'identity_column': 'MODEL_ID',
+        'natural_key': ['MODEL_NAME', 'MODEL_VERSION'],
         'foreign_keys': {
             'TYPE_ID': 'MODEL_TYPE(TYPE_ID)'
+        },
+        'json_columns': {
+            'SEGMENT_CRITERIA': 'object'
         }
     },
     'feature_registry': {
         'table_name': 'FEATURE_REGISTRY',
         'required_columns': ['FEATURE_NAME', 'FEATURE_CODE', 'DATA_TYPE', 'VALUE_TYPE', 'SOURCE_SYSTEM'],
         'unique_columns': ['FEATURE_CODE', 'FEATURE_NAME'],
-        'identity_column': 'FEATURE_ID'
+        'identity_column': 'FEATURE_ID',
+        'natural_key': ['FEATURE_CODE'],
+        'json_columns': {
+            'VALID_VALUES': 'array'
+        }
     },
     'model_parameters': {
         'table_name': 'MODEL_PARAMETERS',
@@ -64,6 +140,9 @@ TABLE_MAPPINGS = {
         'identity_column': 'SOURCE_TABLE_ID',
         'foreign_keys': {
             'MODEL_ID': 'MODEL_REGISTRY(MODEL_ID)'
+        },
+        'json_columns': {
+            'KEY_COLUMNS': 'array'
         }
     },
     'model_column_details': {
@@ -91,6 +170,9 @@ TABLE_MAPPINGS = {
         'identity_column': 'MAPPING_ID',
         'foreign_keys': {
             'MODEL_ID': 'MODEL_REGISTRY(MODEL_ID)'
+        },
+        'json_columns': {
+            'SEGMENT_PERFORMANCE': 'object'
         }
     },
     'model_validation_results': {
@@ -100,6 +182,12 @@ TABLE_MAPPINGS = {
         'identity_column': 'VALIDATION_ID',
         'foreign_keys': {
             'MODEL_ID': 'MODEL_REGISTRY(MODEL_ID)'
+        },
+        'json_columns': {
+            'DETAILED_METRICS': None,
+            'CONFUSION_MATRIX': None,
+            'ROC_CURVE_DATA': None,
+            'CAP_CURVE_DATA': None
         }
     },
     'feature_transformations': {
@@ -109,6 +197,9 @@ TABLE_MAPPINGS = {
         'identity_column': 'TRANSFORMATION_ID',
         'foreign_keys': {
             'FEATURE_ID': 'FEATURE_REGISTRY(FEATURE_ID)'
+        },
+        'json_columns': {
+            'TRANSFORMATION_PARAMS': 'object'
         }
     },
     'feature_source_tables': {
@@ -118,6 +209,9 @@ TABLE_MAPPINGS = {
         'identity_column': 'SOURCE_ID',
         'foreign_keys': {
             'FEATURE_ID': 'FEATURE_REGISTRY(FEATURE_ID)'
+        },
+        'json_columns': {
+            'JOINS_REQUIRED': 'array'
         }
     },
     'feature_model_mapping': {
@@ -128,6 +222,10 @@ TABLE_MAPPINGS = {
         'foreign_keys': {
             'FEATURE_ID': 'FEATURE_REGISTRY(FEATURE_ID)',
             'MODEL_ID': 'MODEL_REGISTRY(MODEL_ID)'
+        },
+        'json_columns': {
+            'PARTIAL_DEPENDENCE_DATA': None,
+            'ICE_CURVES_DATA': None
         }
     }
 }
@@ -0,0 +1,383 @@
+"""
+Database access for Model Registry tools
+Thread-safe connection pool with health checks and idle eviction, cached prepared statements and streamed fetches
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+import pyodbc
+
+# Rows fetched per round trip when reading results
+FETCH_SIZE = 1000
+
+
+def connection_string(db_config: Dict) -> str:
+    """ODBC connection string for a DB_CONFIG-style dict (server, database, driver, trusted_connection, ...)"""
+    if db_config['trusted_connection'] == 'yes':
+        return (
+            f"DRIVER={{{db_config['driver']}}};"
+            f"SERVER={db_config['server']};"
+            f"DATABASE={db_config['database']};"
+            f"Trusted_Connection=yes;"
+        )
+    return (
+        f"DRIVER={{{db_config['driver']}}};"
+        f"SERVER={db_config['server']};"
+        f"DATABASE={db_config['database']};"
+        f"UID={db_config.get('username')};"
+        f"PWD={db_config.get('password')};"
+    )
+
+
+def connect(db_config: Dict):
+    """Open a new, unpooled connection"""
+    return pyodbc.connect(connection_string(db_config))
+
+
+class StatementCache:
+    """
+    One cursor per SQL text, least recently used dropped first
+
+    pyodbc keeps the last statement a cursor prepared, so running the same SQL
+    again on its own cursor skips the prepare round trip.
+    """
+
+    def __init__(self, connection, max_size: int = 32):
+        self.connection = connection
+        self.max_size = max_size
+        self._cursors: 'OrderedDict[str, object]' = OrderedDict()
+
+    def cursor_for(self, sql: str):
+        cursor = self._cursors.get(sql)
+        if cursor is not None:
+            self._cursors.move_to_end(sql)
+            return cursor
+
+        cursor = self.connection.cursor()
+        if self.max_size > 0:
+            self._cursors[sql] = cursor
+            while len(self._cursors) > self.max_size:
+                _, oldest = self._cursors.popitem(last=False)
+                self._close(oldest)
+        return cursor
+
+    def clear(self):
+        while self._cursors:
+            _, cursor = self._cursors.popitem(last=False)
+            self._close(cursor)
+
+    @staticmethod
+    def _close(cursor):
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+
+class _PoolEntry:
+    """A raw connection with its statement cache and usage times"""
+
+    def __init__(self, connection, statement_cache_size: int):
+        self.connection = connection
+        self.statements = StatementCache(connection, statement_cache_size)
+        self.last_used = time.monotonic()
+
+    def close(self):
+        self.statements.clear()
+        self.connection.close()
+
+
+class PooledConnection:
+    """
+    Connection borrowed from a ConnectionPool
+
+    Behaves like the pyodbc connection, plus cached-statement helpers; close()
+    rolls back any open transaction and returns the connection to the pool.
+    """
+
+    def __init__(self, pool: 'ConnectionPool', entry: _PoolEntry):
+        self._pool = pool
+        self._entry = entry
+
+    def __getattr__(self, name):
+        if self._entry is None:
+            raise pyodbc.ProgrammingError('Attempt to use a connection returned to the pool')
+        return getattr(self._entry.connection, name)
+
+    def run(self, sql: str, params: Optional[Sequence] = None):
+        """
+        Execute on the cached cursor for this SQL text
+
+        Returns:
+            The cursor; it stays owned by the cache, so do not close it
+        """
+        cursor = self._entry.statements.cursor_for(sql)
+        if params:
+            cursor.execute(sql, params)
+        else:
+            cursor.execute(sql)
+        return cursor
+
+    def stream(self, sql: str, params: Optional[Sequence] = None, chunk_size: int = FETCH_SIZE) -> Iterator[List]:
+        """
+        Execute a query and yield its rows in fetchmany chunks
+
+        Stopping early (break, an exception, or closing the generator) cancels the rest of the
+        result, so the connection's next statement does not find it busy with this one.
+        """
+        cursor = self.run(sql, params)
+        finished = False
+        try:
+            while cursor.description is not None:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+            finished = True
+        finally:
+            if not finished:
+                try:
+                    cursor.cancel()
+                except Exception:
+                    pass
+
+    def fetch_all(self, sql: str, params: Optional[Sequence] = None, chunk_size: int = FETCH_SIZE) -> Optional[List]:
+        """
+        Execute a statement and collect its rows chunk by chunk
+
+        Returns:
+            The rows, or None if the statement returned no result set
+        """
+        cursor = self.run(sql, params)
+        if cursor.description is None:
+            return None
+        rows = []
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                return rows
+            rows.extend(chunk)
+
+    def close(self):
+        if self._entry is None:
+            return
+        entry, self._entry = self._entry, None
+
+        # Never hand an open transaction to the next borrower
+        broken = False
+        if not entry.connection.autocommit:
+            try:
+                entry.connection.rollback()
+            except Exception:
+                broken = True
+        self._pool.release(entry, discard=broken)
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of open connections, shared by all uploads and checks of a process
+
+    Connections are opened on demand up to max_size. A connection idle for longer
+    than health_check_after seconds is tested before it is lent out, and idle
+    connections above min_size are closed after idle_timeout seconds.
+    """
+
+    def __init__(self, connection_str: Optional[str] = None, min_size: int = 0, max_size: int = 4,
+                 idle_timeout: float = 300, health_check_after: float = 30, autocommit: bool = False,
+                 statement_cache_size: int = 32, timeout: float = 300,
+                 connect_function: Optional[Callable] = None, logger: Optional[logging.Logger] = None):
+        """
+        Initialize the pool
+
+        Args:
+            connection_str: ODBC connection string (see connection_string)
+            min_size: Connections kept open when idle (opened by warm())
+            max_size: Most connections open at the same time
+            idle_timeout: Seconds after which an idle connection above min_size is closed
+            health_check_after: Idle seconds after which a connection is tested with SELECT 1 before reuse
+            autocommit: Open connections in autocommit mode
+            statement_cache_size: Prepared statements (cursors) cached per connection
+            timeout: Seconds acquire() waits for a free connection before giving up
+            connect_function: Opens a new raw connection, instead of pyodbc.connect(connection_str)
+        """
+        if max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min {min_size}, max {max_size}")
+        if connection_str is None and connect_function is None:
+            raise ValueError("A connection string or connect function is required")
+
+        self.connection_str = connection_str
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.autocommit = autocommit
+        self.statement_cache_size = statement_cache_size
+        self.timeout = timeout
+        self.connect_function = connect_function
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+        self.failed_checks = 0
+        self._idle: List[_PoolEntry] = []
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def _open(self) -> _PoolEntry:
+        if self.connect_function:
+            connection = self.connect_function()
+            if self.autocommit:
+                connection.autocommit = True
+        else:
+            connection = pyodbc.connect(self.connection_str, autocommit=self.autocommit)
+        return _PoolEntry(connection, self.statement_cache_size)
+
+    def _is_healthy(self, entry: _PoolEntry) -> bool:
+        if time.monotonic() - entry.last_used < self.health_check_after:
+            return True
+        try:
+            entry.statements.cursor_for('SELECT 1').execute('SELECT 1').fetchall()
+            return True
+        except Exception as e:
+            self.failed_checks += 1
+            self.logger.info(f"Discarding pooled connection that failed its health check: {str(e)}")
+            return False
+
+    def _evict_idle(self) -> List[_PoolEntry]:
+        """Take idle connections past idle_timeout off the pool (caller holds the lock and closes them)"""
+        now = time.monotonic()
+        expired = []
+        # Oldest first; never shrink below min_size
+        for entry in sorted(self._idle, key=lambda item: item.last_used):
+            if self._size - len(expired) <= self.min_size or now - entry.last_used < self.idle_timeout:
+                break
+            expired.append(entry)
+        for entry in expired:
+            self._idle.remove(entry)
+        self._size -= len(expired)
+        self.evicted += len(expired)
+        return expired
+
+    def _close_entries(self, entries: List[_PoolEntry]):
+        for entry in entries:
+            try:
+                entry.close()
+            except Exception as e:
+                self.logger.debug(f"Error closing pooled connection: {str(e)}")
+
+    def acquire(self) -> PooledConnection:
+        """
+        Borrow a connection, waiting while all max_size connections are in use
+
+        Raises:
+            TimeoutError: If no connection became free within the timeout
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._condition:
+                expired = self._evict_idle()
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No database connection became free within {self.timeout:.0f}s "
+                                           f"(pool size {self.max_size})")
+                    self._condition.wait(remaining)
+
+                entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    self._size += 1
+            self._close_entries(expired)
+
+            if entry is None:
+                break
+
+            # The health check runs outside the lock; a dead connection is replaced
+            if self._is_healthy(entry):
+                with self._condition:
+                    self.reused += 1
+                return PooledConnection(self, entry)
+            self.release(entry, discard=True)
+
+        # Connect outside the lock so other borrowers are not held up
+        try:
+            entry = self._open()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self.created += 1
+        return PooledConnection(self, entry)
+
+    def release(self, entry: _PoolEntry, discard: bool = False):
+        """Return a borrowed connection; a discarded (or late) connection is closed instead"""
+        to_close = []
+        with self._condition:
+            if discard or self._closed:
+                self._size -= 1
+                to_close.append(entry)
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+                to_close.extend(self._evict_idle())
+            self._condition.notify()
+        self._close_entries(to_close)
+
+    def warm(self):
+        """Open connections until min_size are idle or in use"""
+        borrowed = []
+        try:
+            while True:
+                with self._condition:
+                    if self._size >= self.min_size:
+                        break
+                borrowed.append(self.acquire())
+        finally:
+            for connection in borrowed:
+                connection.close()
+
+    def close(self):
+        """Close the idle connections; borrowed ones are closed when returned"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        self._close_entries(idle)
+
+    def describe(self) -> str:
+        return (f"{self.created} connections opened, {self.reused} reuses, {self.evicted} evicted idle, "
+                f"{self.failed_checks} failed health checks")
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(connection_str: str, **options) -> ConnectionPool:
+    """
+    Return the process-wide pool for a connection string, creating it on first use
+
+    Options (see ConnectionPool) only apply when the pool is created.
+    """
+    with _pools_lock:
+        pool = _pools.get(connection_str)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(connection_str, **options)
+            _pools[connection_str] = pool
+        return pool
+
+
+def close_pools():
+    """Close every process-wide pool"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
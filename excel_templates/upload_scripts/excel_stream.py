@@ -0,0 +1,116 @@
+"""
+Streaming Excel reader for Model Registry upload scripts
+Reads a worksheet in fixed-size typed chunks so large workbooks load in bounded memory
+"""
+from typing import Iterator, List, Optional, Sequence, Union
+
+import pandas as pd
+from openpyxl import load_workbook
+
+# First data row in the worksheet (row 1 holds the column headers)
+FIRST_DATA_ROW = 2
+
+
+def clean_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Drop empty rows and strip whitespace from string cells
+
+    Missing values stay missing (they are never turned into the string 'nan'),
+    and cells that are blank after stripping are treated as missing so required
+    field checks can see them.
+    """
+    df = df.dropna(how='all')
+
+    for col in df.select_dtypes(include=['object', 'string']).columns:
+        series = df[col]
+        try:
+            stripped = series.str.strip()
+        except AttributeError:
+            # Column holds no strings at all (e.g., dates stored as objects)
+            continue
+        # Non-string cells come back as NaN from .str; keep their original value
+        stripped = stripped.where(stripped.notna(), series)
+        df[col] = stripped.mask(stripped == '')
+
+    return df.dropna(how='all')
+
+
+def _build_chunk(rows: List[tuple], columns: List[str], first_row: int) -> pd.DataFrame:
+    """Build a typed DataFrame from raw worksheet rows, indexed by Excel row number"""
+    width = len(columns)
+    rows = [row[:width] + (None,) * (width - len(row)) for row in rows]
+
+    chunk = pd.DataFrame.from_records(rows, columns=columns)
+    chunk.index = pd.RangeIndex(first_row, first_row + len(rows))
+    chunk = chunk.infer_objects()
+    return clean_frame(chunk)
+
+
+def iter_excel_chunks(file_path: str, chunk_size: int,
+                      sheet: Union[int, str] = 0) -> Iterator[pd.DataFrame]:
+    """
+    Yield a worksheet as cleaned, typed DataFrame chunks of at most chunk_size rows
+
+    The workbook is opened in openpyxl read-only mode, so only the current chunk
+    is held in memory. Chunk indexes are the Excel row numbers of the rows.
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[sheet] if isinstance(sheet, int) else workbook[sheet]
+        rows = worksheet.iter_rows(values_only=True)
+
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name).strip() if name is not None else f"Unnamed: {idx}"
+                   for idx, name in enumerate(header)]
+
+        buffer = []
+        first_row = FIRST_DATA_ROW
+        for values in rows:
+            buffer.append(tuple(values))
+            if len(buffer) >= chunk_size:
+                chunk = _build_chunk(buffer, columns, first_row)
+                first_row += len(buffer)
+                buffer = []
+                if not chunk.empty:
+                    yield chunk
+
+        if buffer:
+            chunk = _build_chunk(buffer, columns, first_row)
+            if not chunk.empty:
+                yield chunk
+    finally:
+        workbook.close()
+
+
+def describe_rows(chunk: pd.DataFrame) -> str:
+    """Describe the Excel row range covered by a chunk (e.g., 'Rows 2-50001')"""
+    if chunk.empty:
+        return "Rows -"
+    return f"Rows {chunk.index[0]}-{chunk.index[-1]}"
+
+
+class DuplicateKeyTracker:
+    """Detect unique-key duplicates across chunks while keeping only the keys in memory"""
+
+    def __init__(self, key_columns: Sequence[str]):
+        self.key_columns = list(key_columns)
+        self.seen_keys = set()
+
+    def check(self, chunk: pd.DataFrame) -> Optional[int]:
+        """
+        Count rows of a chunk whose key already appeared in an earlier chunk
+
+        Duplicates within the chunk itself are left to the per-chunk validation.
+
+        Returns:
+            Number of rows repeating an earlier key, or None if the chunk lacks a key column
+        """
+        if not self.key_columns or not all(col in chunk.columns for col in self.key_columns):
+            return None
+
+        chunk_keys = list(chunk[self.key_columns].itertuples(index=False, name=None))
+        duplicates = sum(1 for key in chunk_keys if key in self.seen_keys)
+        self.seen_keys.update(chunk_keys)
+        return duplicates
@@ -0,0 +1,151 @@
+"""
+Foreign key reference index for Model Registry upload validation
+Loads each referenced key set once per run and checks whole columns against it in memory
+"""
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+# Rows fetched per round trip when loading a key set
+FETCH_SIZE = 50000
+
+
+def parse_reference(fk_ref: str) -> Tuple[str, str]:
+    """Split a reference like 'MODEL_REGISTRY(MODEL_ID)' into table and column"""
+    ref_table, ref_col = fk_ref.split('(')
+    return ref_table.strip(), ref_col.rstrip(')').strip()
+
+
+class ForeignKeyIndex:
+    """In-memory cache of referenced key sets, shared by every uploader in the process"""
+
+    def __init__(self, ttl_seconds: float = 300, max_keys: int = 1000000,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Initialize the index
+
+        Args:
+            ttl_seconds: How long a loaded key set is reused before it is reloaded
+            max_keys: Reference tables with more rows are checked with a temp-table join instead
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self.logger = logger or logging.getLogger(__name__)
+        self._key_sets: Dict[str, Tuple[float, Optional[pd.Index]]] = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self, table_name: Optional[str] = None):
+        """Drop cached key sets for a table (e.g., after inserting into it), or all of them"""
+        with self._lock:
+            if table_name is None:
+                self._key_sets.clear()
+                return
+            for fk_ref in [ref for ref in self._key_sets if parse_reference(ref)[0].upper() == table_name.upper()]:
+                del self._key_sets[fk_ref]
+
+    def find_missing(self, connection, values: pd.Series, fk_ref: str) -> pd.Series:
+        """
+        Return the distinct values of a column that do not exist in the referenced table
+
+        Args:
+            connection: Open pyodbc connection used if the key set must be (re)loaded
+            values: Foreign key column (missing values are ignored)
+            fk_ref: Reference in 'TABLE(COLUMN)' form
+        """
+        distinct_values = pd.Series(values.dropna().unique())
+        if distinct_values.empty:
+            return distinct_values
+
+        keys = self.get_keys(connection, fk_ref)
+        if keys is None:
+            return self._find_missing_by_join(connection, distinct_values, fk_ref)
+
+        lookup_values = distinct_values
+        if pd.api.types.is_numeric_dtype(keys.dtype) and not pd.api.types.is_numeric_dtype(distinct_values.dtype):
+            lookup_values = pd.to_numeric(distinct_values, errors='coerce')
+
+        return distinct_values[~lookup_values.isin(keys)]
+
+    def get_keys(self, connection, fk_ref: str) -> Optional[pd.Index]:
+        """Return the cached key set for a reference, loading it if absent or expired (None if too large)"""
+        with self._lock:
+            cached = self._key_sets.get(fk_ref)
+            if cached and time.monotonic() - cached[0] < self.ttl_seconds:
+                return cached[1]
+
+            keys = self._load_keys(connection, fk_ref)
+            self._key_sets[fk_ref] = (time.monotonic(), keys)
+            return keys
+
+    def _load_keys(self, connection, fk_ref: str) -> Optional[pd.Index]:
+        """Load all values of the referenced column, or None if the table is over max_keys rows"""
+        ref_table, ref_col = parse_reference(fk_ref)
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                "SELECT SUM(p.rows) FROM sys.partitions p "
+                "WHERE p.object_id = OBJECT_ID(?) AND p.index_id IN (0, 1)",
+                (ref_table,)
+            )
+            row = cursor.fetchone()
+            row_count = row[0] if row and row[0] is not None else 0
+
+            if row_count > self.max_keys:
+                self.logger.info(f"{ref_table} has {row_count} rows; checking {ref_col} by temp-table join")
+                return None
+
+            start_time = time.perf_counter()
+            cursor.execute(f"SELECT DISTINCT {ref_col} FROM {ref_table}")
+            keys = []
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                keys.extend(row[0] for row in rows)
+
+            self.logger.info(f"Loaded {len(keys)} keys from {fk_ref} in {time.perf_counter() - start_time:.2f}s")
+            return pd.Index(keys)
+
+        finally:
+            cursor.close()
+
+    def _find_missing_by_join(self, connection, distinct_values: pd.Series, fk_ref: str) -> pd.Series:
+        """Check values against a large reference table via a session temp table"""
+        ref_table, ref_col = parse_reference(fk_ref)
+        values = [value.item() if hasattr(value, 'item') else value for value in distinct_values]
+
+        cursor = connection.cursor()
+        try:
+            # UNION ALL keeps the column type but drops any IDENTITY property
+            cursor.execute(
+                f"SELECT TOP 0 {ref_col} AS FK_VALUE INTO #FK_CHECK FROM {ref_table} "
+                f"UNION ALL SELECT TOP 0 {ref_col} FROM {ref_table}"
+            )
+            cursor.fast_executemany = True
+            cursor.executemany("INSERT INTO #FK_CHECK (FK_VALUE) VALUES (?)", [(value,) for value in values])
+            cursor.execute(
+                f"SELECT c.FK_VALUE FROM #FK_CHECK c "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {ref_table} r WHERE r.{ref_col} = c.FK_VALUE)"
+            )
+            missing = {row[0] for row in cursor.fetchall()}
+            return distinct_values[[value in missing for value in values]]
+
+        finally:
+            cursor.execute("DROP TABLE IF EXISTS #FK_CHECK")
+            cursor.close()
+
+
+_shared_index = None
+_shared_lock = threading.Lock()
+
+
+def shared_fk_index(ttl_seconds: float = 300, max_keys: int = 1000000) -> ForeignKeyIndex:
+    """Return the process-wide index so all uploaders reuse the same key sets"""
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            _shared_index = ForeignKeyIndex(ttl_seconds, max_keys)
+        return _shared_index
@@ -0,0 +1,283 @@
+"""
+Upload Job Scheduler for Model Registry
+Runs many (table, file) uploads in one process: independent tables concurrently, foreign key dependencies in order
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from colorama import init, Fore, Style
+
+from config import DB_CONFIG, POOL_CONFIG, TABLE_MAPPINGS, UPLOAD_CONFIG
+from db_access import ConnectionPool, connection_string
+from uploader import UPLOAD_MODES, ExcelUploader
+from parsers import PARSER_BACKENDS
+from workbook_upload import dependency_order, table_dependencies
+
+# Initialize colorama for colored output
+init()
+
+# File types picked up when the jobs are given as a directory
+UPLOAD_FILE_TYPES = ('.xlsx', '.xlsm', '.xls', '.csv', '.parquet')
+
+
+class UploadJob:
+    """One file to upload into one table"""
+
+    def __init__(self, number: int, table_name: str, file_path: str, upload_mode: Optional[str] = None):
+        self.number = number
+        self.table_name = table_name
+        self.file_path = file_path
+        self.upload_mode = upload_mode
+        self.status = 'pending'
+        self.message = ''
+        self.rows = 0
+        self.seconds = 0.0
+
+    def __repr__(self) -> str:
+        return f"#{self.number} {self.table_name} <- {os.path.basename(self.file_path)}"
+
+
+def table_for_file(file_name: str) -> Optional[str]:
+    """
+    Find the table a file is named after (e.g., 'model_validation_results_2024_12.xlsx')
+
+    The file name must start with a TABLE_MAPPINGS key or database table name;
+    the longest match wins, so 'model_registry' does not claim 'model_registry_x' files of other tables.
+    """
+    name = os.path.basename(file_name).lower()
+    matches = []
+    for table_key, table_config in TABLE_MAPPINGS.items():
+        for prefix in (table_key, table_config['table_name'].lower()):
+            if name.startswith(prefix) and not name[len(prefix):len(prefix) + 1].isalnum():
+                matches.append((len(prefix), table_key))
+    return max(matches)[1] if matches else None
+
+
+def load_jobs(source: str, logger: Optional[logging.Logger] = None) -> List[UploadJob]:
+    """
+    Read the jobs from a manifest or a directory
+
+    A manifest is a CSV file with the columns table_name, file and optional mode,
+    or a JSON list of objects with the same keys; relative file paths are taken
+    relative to the manifest. In a directory, every upload file is a job for the
+    table it is named after.
+
+    Raises:
+        ValueError: If a job names an unknown table or upload mode
+    """
+    logger = logger or logging.getLogger(__name__)
+    entries = []
+
+    if os.path.isdir(source):
+        base_dir = source
+        for file_name in sorted(os.listdir(source)):
+            if not file_name.lower().endswith(UPLOAD_FILE_TYPES) or file_name.startswith('~$'):
+                continue
+            table_name = table_for_file(file_name)
+            if table_name is None:
+                logger.warning(f"Skipping {file_name}: its name does not start with a table name")
+                continue
+            entries.append({'table_name': table_name, 'file': file_name})
+    else:
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source, encoding='utf-8') as f:
+            if source.lower().endswith('.json'):
+                entries = json.load(f)
+            else:
+                entries = list(csv.DictReader(f))
+
+    jobs = []
+    for number, entry in enumerate(entries, start=1):
+        table_name = (entry.get('table_name') or '').strip()
+        if table_name not in TABLE_MAPPINGS:
+            raise ValueError(f"Job {number}: unknown table '{table_name}' (available: {', '.join(TABLE_MAPPINGS)})")
+        upload_mode = (entry.get('mode') or '').strip().lower() or None
+        if upload_mode and upload_mode not in UPLOAD_MODES:
+            raise ValueError(f"Job {number}: unknown mode '{upload_mode}' (available: {', '.join(UPLOAD_MODES)})")
+        jobs.append(UploadJob(number, table_name, os.path.join(base_dir, entry['file'].strip()), upload_mode))
+    return jobs
+
+
+class JobScheduler:
+    """Run upload jobs on a bounded thread pool, sharing one connection pool"""
+
+    def __init__(self, jobs: List[UploadJob], concurrency: int = 4, parser_name: Optional[str] = None,
+                 upload_mode: Optional[str] = None, stream: bool = False):
+        """
+        Initialize the scheduler
+
+        Args:
+            jobs: Jobs in manifest order
+            concurrency: Most jobs running at the same time (the connection pool holds at least as many connections)
+            upload_mode: Mode of jobs that do not set their own ('insert' or 'upsert')
+            stream: Read files in fixed-size chunks (see ExcelUploader.process_file)
+
+        Raises:
+            ValueError: If the tables' foreign keys form a cycle
+        """
+        self.jobs = jobs
+        self.concurrency = max(1, concurrency)
+        self.parser_name = parser_name
+        self.upload_mode = upload_mode
+        self.stream = stream
+        self.logger = logging.getLogger(__name__)
+
+        # Fails early on a foreign key cycle
+        dependency_order(TABLE_MAPPINGS)
+        self.blockers = self._find_blockers()
+
+    def _find_blockers(self) -> Dict[int, List[UploadJob]]:
+        """
+        Jobs that must succeed before each job may start
+
+        A job waits for the earlier jobs of its own table and for every job of a
+        table its foreign keys reference.
+        """
+        dependencies = table_dependencies(TABLE_MAPPINGS)
+        blockers = {}
+        for job in self.jobs:
+            blockers[job.number] = [
+                other for other in self.jobs
+                if other is not job and (
+                    (other.table_name == job.table_name and other.number < job.number)
+                    or other.table_name in dependencies[job.table_name]
+                )
+            ]
+        return blockers
+
+    def describe_plan(self) -> List[str]:
+        """One line per job naming the jobs it waits for"""
+        lines = []
+        for job in self.jobs:
+            waits = ', '.join(f"#{other.number}" for other in self.blockers[job.number])
+            lines.append(f"{job!r}" + (f" (after {waits})" if waits else ''))
+        return lines
+
+    def run_job(self, job: UploadJob, pool: ConnectionPool) -> bool:
+        start_time = time.perf_counter()
+        try:
+            if not os.path.exists(job.file_path):
+                job.message = 'file not found'
+                return False
+            uploader = ExcelUploader(job.table_name, parser_name=self.parser_name,
+                                     upload_mode=job.upload_mode or self.upload_mode, pool=pool)
+            success = uploader.process_file(job.file_path, stream=self.stream)
+            job.rows = sum(uploader.upload_counts.values())
+            job.message = uploader.describe_upload_counts() if success else 'upload failed (errors are listed above)'
+            return success
+
+        except Exception as e:
+            job.message = str(e)
+            return False
+
+        finally:
+            job.seconds = time.perf_counter() - start_time
+
+    def run(self) -> bool:
+        """
+        Run all jobs; a job whose prerequisite failed is skipped
+
+        Returns:
+            True if every job succeeded
+        """
+        # Each running job holds a connection; the rest are for its parallel workers and validation
+        options = dict(POOL_CONFIG, max_size=max(POOL_CONFIG['max_size'], self.concurrency))
+        pool = ConnectionPool(connection_string(DB_CONFIG), logger=self.logger, **options)
+        pending = list(self.jobs)
+        running = {}
+
+        try:
+            pool.warm()
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='upload-job') as executor:
+                while pending or running:
+                    for job in list(pending):
+                        blockers = self.blockers[job.number]
+                        failed = [other for other in blockers if other.status in ('failed', 'skipped')]
+                        if failed:
+                            job.status = 'skipped'
+                            job.message = f"prerequisite job #{failed[0].number} ({failed[0].table_name}) did not succeed"
+                            pending.remove(job)
+                        elif len(running) < self.concurrency and all(other.status == 'succeeded' for other in blockers):
+                            job.status = 'running'
+                            print(f"{Fore.CYAN}Starting job {job!r}{Style.RESET_ALL}")
+                            running[executor.submit(self.run_job, job, pool)] = job
+                            pending.remove(job)
+
+                    if not running:
+                        break
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = running.pop(future)
+                        job.status = 'succeeded' if future.result() else 'failed'
+        finally:
+            pool.close()
+
+        self.logger.info(f"Connection pool: {pool.describe()}")
+        return all(job.status == 'succeeded' for job in self.jobs)
+
+    def print_summary(self, elapsed: float):
+        colors = {'succeeded': Fore.GREEN, 'failed': Fore.RED, 'skipped': Fore.YELLOW}
+        print(f"\n{Fore.CYAN}Job summary:{Style.RESET_ALL}")
+        print(f"{'#':>3}  {'Table':<26} {'File':<40} {'Status':<10} {'Seconds':>8} {'Rows':>9}  Details")
+        for job in self.jobs:
+            color = colors.get(job.status, '')
+            print(f"{job.number:>3}  {job.table_name:<26} {os.path.basename(job.file_path)[:40]:<40} "
+                  f"{color}{job.status:<10}{Style.RESET_ALL} {job.seconds:>8.1f} {job.rows:>9}  {job.message}")
+
+        job_seconds = sum(job.seconds for job in self.jobs)
+        succeeded = sum(job.status == 'succeeded' for job in self.jobs)
+        print(f"\n{succeeded}/{len(self.jobs)} jobs succeeded in {elapsed:.1f}s "
+              f"({job_seconds:.1f}s of upload time, concurrency {self.concurrency})")
+
+
+def main():
+    """Main function to run the upload job scheduler"""
+    parser = argparse.ArgumentParser(description='Run many Model Registry uploads in one process')
+    parser.add_argument('jobs', help='Manifest (.csv with table_name,file[,mode] or .json) or a directory of files '
+                                     'named after their tables')
+    parser.add_argument('--concurrency', type=int, default=UPLOAD_CONFIG['job_concurrency'],
+                        help='Most uploads running at the same time (default: JOB_CONCURRENCY)')
+    parser.add_argument('--upsert', action='store_true', help='Upsert jobs that do not set their own mode')
+    parser.add_argument('--stream', action='store_true', help='Read each file in fixed-size chunks with bounded memory')
+    parser.add_argument('--parser', choices=['auto'] + list(PARSER_BACKENDS), default=None,
+                        help='Input parser backend (default: auto, chosen by file type and size)')
+    parser.add_argument('--plan', action='store_true', help='Print the jobs and their prerequisites and exit')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.jobs):
+        print(f"Manifest or directory not found: {args.jobs}")
+        sys.exit(1)
+
+    try:
+        jobs = load_jobs(args.jobs)
+        if not jobs:
+            print("No upload jobs found")
+            sys.exit(1)
+
+        scheduler = JobScheduler(jobs, concurrency=args.concurrency, parser_name=args.parser,
+                                 upload_mode='upsert' if args.upsert else None, stream=args.stream)
+        if args.plan:
+            print('\n'.join(scheduler.describe_plan()))
+            sys.exit(0)
+
+        start_time = time.perf_counter()
+        success = scheduler.run()
+        scheduler.print_summary(time.perf_counter() - start_time)
+        sys.exit(0 if success else 1)
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
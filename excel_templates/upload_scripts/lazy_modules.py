@@ -0,0 +1,33 @@
+"""
+Lazy imports for Model Registry upload scripts
+Modules that are only executed when one of their attributes is first used, so command line tools start fast
+"""
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Import a module without executing it until an attribute is used
+
+    Later imports of the same name anywhere in the process get the same lazy
+    module. Use as `pd = lazy_import('pandas')`; a `from pandas import ...`
+    elsewhere loads it at once.
+
+    Raises:
+        ImportError: If the module is not installed
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'", name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
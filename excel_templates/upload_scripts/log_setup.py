@@ -0,0 +1,215 @@
+"""
+Logging for Model Registry upload scripts
+Queue-based logging: callers only enqueue records, one listener thread writes the console and per-uploader log files
+"""
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Parts of a message that differ between otherwise repeated messages (numbers, quoted and bracketed values)
+_VARIABLE_PARTS = re.compile(r"\d+|'[^']*'|\"[^\"]*\"|\([^)]*\)")
+
+# Most distinct message patterns a rate limiter tracks before it starts over
+MAX_PATTERNS = 10000
+
+_logger_numbers = itertools.count(1)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record (time, level, logger, thread, message)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most `limit` similar warnings and errors per window; count the rest
+
+    Messages are similar when they differ only in numbers and quoted or
+    bracketed values (e.g., 'Row 17 rejected: ... (ABC)' and 'Row 18 rejected: ... (XYZ)').
+    The first message after a window with suppressed messages reports how many
+    were dropped, and summarize() reports the rest.
+    """
+
+    def __init__(self, limit: int, window: float = 60.0, min_level: int = logging.WARNING):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.min_level = min_level
+        # pattern -> (window start, messages in window, suppressed in window)
+        self._patterns: Dict[Tuple[int, str], Tuple[float, int, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno < self.min_level:
+            return True
+
+        key = (record.levelno, _VARIABLE_PARTS.sub('#', str(record.msg)))
+        now = time.monotonic()
+        with self._lock:
+            if len(self._patterns) >= MAX_PATTERNS and key not in self._patterns:
+                self._patterns.clear()
+            start, count, suppressed = self._patterns.get(key, (now, 0, 0))
+            if now - start >= self.window:
+                if suppressed:
+                    record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed)"
+                    record.args = None
+                start, count, suppressed = now, 0, 0
+
+            count += 1
+            if count > self.limit:
+                suppressed += 1
+            self._patterns[key] = (start, count, suppressed)
+            return count <= self.limit
+
+    def summarize(self, logger: logging.Logger):
+        """Log how many messages of each pattern are still suppressed"""
+        with self._lock:
+            pending = [(key, suppressed) for key, (_, _, suppressed) in self._patterns.items() if suppressed]
+            self._patterns.clear()
+        for (level, pattern), suppressed in pending:
+            logger.log(level, f"{suppressed} more messages like '{pattern}' were suppressed")
+
+
+class RoutingQueueListener(QueueListener):
+    """
+    Queue listener that writes every record to the console and to the log file of its logger
+
+    Log files are registered per logger name, so uploaders sharing the process
+    never write into each other's files.
+    """
+
+    def __init__(self, log_queue: queue.Queue, console: logging.Handler):
+        super().__init__(log_queue, console, respect_handler_level=True)
+        self._files: Dict[str, logging.Handler] = {}
+        self._files_lock = threading.Lock()
+
+    def add_file(self, logger_name: str, handler: logging.Handler):
+        with self._files_lock:
+            self._files[logger_name] = handler
+
+    def handle(self, record: logging.LogRecord):
+        close_name = getattr(record, 'close_log_file', None)
+        if close_name:
+            # Queued after the logger's last record, so the file is complete
+            with self._files_lock:
+                handler = self._files.pop(close_name, None)
+            if handler:
+                handler.close()
+            return
+
+        super().handle(record)
+        with self._files_lock:
+            handler = self._files.get(record.name)
+        if handler and record.levelno >= handler.level:
+            handler.handle(record)
+
+
+_listener: Optional[RoutingQueueListener] = None
+_queue: Optional[queue.Queue] = None
+_setup_lock = threading.Lock()
+
+
+def _start_listener(level: str) -> RoutingQueueListener:
+    """Start the process-wide listener, routing the root logger through it as well"""
+    global _listener, _queue
+    with _setup_lock:
+        if _listener is None:
+            if _queue is None:
+                _queue = queue.Queue()
+            console = logging.StreamHandler(sys.stdout)
+            console.setFormatter(logging.Formatter(TEXT_FORMAT))
+            _listener = RoutingQueueListener(_queue, console)
+            _listener.start()
+            atexit.register(stop_logging)
+
+            # Module loggers (e.g., of the connection pool or job scheduler) reach the console too
+            root = logging.getLogger()
+            if not root.handlers:
+                root.addHandler(QueueHandler(_queue))
+                root.setLevel(getattr(logging, level))
+        return _listener
+
+
+def get_upload_logger(name: str, log_file: Optional[str] = None, level: str = 'INFO', json_lines: bool = False,
+                      rate_limit: int = 0) -> logging.Logger:
+    """
+    Logger for one uploader instance
+
+    Logging only enqueues the record; formatting and writing happen on the
+    listener thread, so the insert loop never waits for the disk or terminal.
+
+    Args:
+        name: Base logger name (e.g., 'excel_upload.model_type'); a number is appended so every instance is distinct
+        log_file: File that receives only this logger's records (None for the console only); a number
+            is added to the name if the file already exists
+        level: Log level name (e.g., 'INFO', 'DEBUG')
+        json_lines: Write the log file as JSON lines instead of text
+        rate_limit: Similar warnings and errors let through per minute (0 for no limit)
+    """
+    listener = _start_listener(level)
+    number = next(_logger_numbers)
+    logger = logging.getLogger(f"{name}.{number}")
+    logger.setLevel(getattr(logging, level))
+    logger.propagate = False
+    logger.addHandler(QueueHandler(_queue))
+
+    if rate_limit > 0:
+        logger.addFilter(RateLimitFilter(rate_limit))
+
+    if log_file:
+        with _setup_lock:
+            # Another instance started in the same second; keep the files apart
+            if os.path.exists(log_file):
+                base, extension = os.path.splitext(log_file)
+                log_file = f"{base}_{number}{extension}"
+            handler = logging.FileHandler(log_file, encoding='utf-8')
+        handler.setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter(TEXT_FORMAT))
+        listener.add_file(logger.name, handler)
+    return logger
+
+
+def close_upload_logger(logger: logging.Logger):
+    """Report suppressed messages and close the logger's file once its queued records are written"""
+    for log_filter in list(logger.filters):
+        if isinstance(log_filter, RateLimitFilter):
+            logger.removeFilter(log_filter)
+            log_filter.summarize(logger)
+
+    if _queue is not None:
+        _queue.put_nowait(logging.makeLogRecord({'close_log_file': logger.name}))
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+
+def stop_logging():
+    """Write all queued records and stop the listener thread"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener._files.values():
+                handler.close()
+            _listener = None
@@ -0,0 +1,95 @@
+"""
+Precompiled registry metadata for Model Registry upload scripts
+TEMPLATE_CONFIGS read from create_templates.py without importing it (and its pandas/openpyxl), cached as JSON
+"""
+import ast
+import json
+import os
+import sys
+from typing import Dict, Optional
+
+# Bump when the bundle layout changes, so older bundles are rebuilt
+BUNDLE_VERSION = 1
+
+TEMPLATES_SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'create_templates.py')
+
+BUNDLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'registry_metadata.json')
+
+
+def _source_key(path: str) -> Optional[Dict]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {'version': BUNDLE_VERSION, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def _parse_template_configs(path: str) -> Optional[Dict]:
+    """The literal TEMPLATE_CONFIGS assignment of the source, or None if it is missing or not a plain literal"""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name) and node.targets[0].id == 'TEMPLATE_CONFIGS'):
+            try:
+                return ast.literal_eval(node.value)
+            except ValueError:
+                return None
+    return None
+
+
+def _import_template_configs(path: str) -> Dict:
+    """Fallback for a TEMPLATE_CONFIGS that is not a plain literal: import the module"""
+    templates_dir = os.path.dirname(path)
+    if templates_dir not in sys.path:
+        sys.path.append(templates_dir)
+    try:
+        from create_templates import TEMPLATE_CONFIGS
+    except ImportError:
+        return {}
+    return TEMPLATE_CONFIGS
+
+
+def _write_bundle(path: str, bundle: Dict):
+    """Write the bundle atomically; a read-only install just goes without the cache"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(bundle, f)
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def load_template_configs(source: str = TEMPLATES_SOURCE, bundle_path: str = BUNDLE_PATH) -> Dict:
+    """
+    TEMPLATE_CONFIGS of create_templates.py, from the bundle while the source is unchanged
+
+    The bundle is keyed by the source's modification time and size, and is
+    rebuilt on the first call after create_templates.py changes.
+
+    Returns:
+        Template configs by table name ({} if create_templates.py is not available)
+    """
+    key = _source_key(source)
+    if key is None:
+        return {}
+
+    try:
+        with open(bundle_path, encoding='utf-8') as f:
+            bundle = json.load(f)
+        if bundle.get('source') == key:
+            return bundle['template_configs']
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+
+    template_configs = _parse_template_configs(source)
+    if template_configs is None:
+        return _import_template_configs(source)
+
+    _write_bundle(bundle_path, {'source': key, 'template_configs': template_configs})
+    return template_configs
@@ -0,0 +1,225 @@
+"""
+Upload metrics for Model Registry upload scripts
+Per-stage wall time, CPU time, rows and bytes plus batch latency histograms, written as JSON or CSV for trending
+"""
+import csv
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+from colorama import Fore, Style
+
+# Stages of an upload, in pipeline order
+STAGES = ('read', 'clean', 'validate', 'fk_check', 'backup', 'encode', 'diff', 'insert', 'commit')
+
+# Upper bounds (milliseconds) of the batch latency histogram buckets; slower batches fall in the last one
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# Tells apart the runs of one process that start within the same second
+_run_numbers = itertools.count(1)
+
+# Columns of the CSV metrics file, one row per stage of every run
+CSV_COLUMNS = ['run_id', 'started', 'table', 'file', 'mode', 'success', 'total_seconds', 'stage',
+               'calls', 'wall_seconds', 'cpu_seconds', 'rows', 'bytes', 'rows_per_sec']
+
+
+def frame_size(df: pd.DataFrame) -> int:
+    """In-memory size of a frame; cheap, so string columns count only their object pointers"""
+    return int(df.memory_usage(index=False, deep=False).sum())
+
+
+class StageStats:
+    """Totals of one stage over all its calls"""
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'calls': self.calls,
+            'wall_seconds': round(self.wall_seconds, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'rows_per_sec': round(self.rows_per_sec, 1)
+        }
+
+
+class LatencyHistogram:
+    """Batch latencies in fixed buckets, with exact percentiles of the recorded values"""
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = list(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.latencies_ms: List[float] = []
+        self.rows = 0
+
+    def record(self, seconds: float, rows: int):
+        latency_ms = seconds * 1000
+        bucket = next((i for i, bound in enumerate(self.buckets_ms) if latency_ms <= bound), len(self.buckets_ms))
+        self.counts[bucket] += 1
+        self.latencies_ms.append(latency_ms)
+        self.rows += rows
+
+    def percentile(self, fraction: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+    def to_dict(self) -> Dict:
+        labels = [f"<={bound}ms" for bound in self.buckets_ms] + [f">{self.buckets_ms[-1]}ms"]
+        return {
+            'batches': len(self.latencies_ms),
+            'rows': self.rows,
+            'p50_ms': round(self.percentile(0.50), 3),
+            'p95_ms': round(self.percentile(0.95), 3),
+            'p99_ms': round(self.percentile(0.99), 3),
+            'max_ms': round(max(self.latencies_ms, default=0.0), 3),
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+
+class UploadMetrics:
+    """
+    Timings of one upload, stage by stage
+
+    Stages may run on several threads at once (see StagePipeline), so wall time
+    is the summed busy time of a stage and CPU time is that of the threads
+    running it. Instrumented code wraps each stage in stage() and adds the rows
+    and bytes it handled.
+    """
+
+    def __init__(self, table_name: str, file_path: str = '', upload_mode: str = ''):
+        self.table_name = table_name
+        self.file_path = file_path
+        self.upload_mode = upload_mode
+        self.started = datetime.now()
+        self.run_id = f"{table_name}_{self.started.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{next(_run_numbers)}"
+        self.stages: Dict[str, StageStats] = {name: StageStats() for name in STAGES}
+        self.batches = LatencyHistogram()
+        # Batch sizes chosen during the upload (see AdaptiveBatchSizer.summary)
+        self.batch_sizing: Dict = {}
+        self.success: Optional[bool] = None
+        self.total_seconds = 0.0
+        self._start_time = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0, size: int = 0) -> Iterator[None]:
+        """Time a block as one call of a stage (rows and bytes may also be added later with add())"""
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start_wall, time.thread_time() - start_cpu, rows, size)
+
+    def record(self, name: str, wall_seconds: float, cpu_seconds: float = 0.0, rows: int = 0, size: int = 0):
+        """Add one call of a stage timed elsewhere (e.g., by a worker thread)"""
+        with self._lock:
+            stats = self.stages[name]
+            stats.calls += 1
+            stats.wall_seconds += wall_seconds
+            stats.cpu_seconds += cpu_seconds
+            stats.rows += rows
+            stats.bytes += size
+
+    def add(self, name: str, rows: int = 0, size: int = 0):
+        """Add rows and bytes to a stage without timing anything"""
+        with self._lock:
+            self.stages[name].rows += rows
+            self.stages[name].bytes += size
+
+    def record_batch(self, seconds: float, rows: int):
+        """Record the latency of one written and committed batch"""
+        with self._lock:
+            self.batches.record(seconds, rows)
+
+    def finish(self, success: bool):
+        self.success = success
+        self.total_seconds = time.perf_counter() - self._start_time
+
+    def to_dict(self) -> Dict:
+        return {
+            'run_id': self.run_id,
+            'started': self.started.isoformat(timespec='seconds'),
+            'table': self.table_name,
+            'file': os.path.abspath(self.file_path) if self.file_path else '',
+            'mode': self.upload_mode,
+            'success': self.success,
+            'total_seconds': round(self.total_seconds, 3),
+            'stages': {name: stats.to_dict() for name, stats in self.stages.items()},
+            'batch_latency': self.batches.to_dict(),
+            'batch_size': self.batch_sizing
+        }
+
+    def write(self, metrics_dir: str, fmt: str = 'json') -> List[str]:
+        """
+        Write the metrics to metrics_dir
+
+        'json' writes one file per run; 'csv' appends one row per stage to
+        upload_metrics.csv, so runs can be compared over time; 'both' does both.
+
+        Returns:
+            Paths written
+        """
+        os.makedirs(metrics_dir, exist_ok=True)
+        data = self.to_dict()
+        paths = []
+
+        if fmt in ('json', 'both'):
+            path = os.path.join(metrics_dir, f"upload_{self.run_id}.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            paths.append(path)
+
+        if fmt in ('csv', 'both'):
+            path = os.path.join(metrics_dir, 'upload_metrics.csv')
+            new_file = not os.path.exists(path)
+            with open(path, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+                if new_file:
+                    writer.writeheader()
+                run_fields = {key: data[key] for key in ('run_id', 'started', 'table', 'file', 'mode', 'success',
+                                                         'total_seconds')}
+                for name, stats in data['stages'].items():
+                    writer.writerow(dict(run_fields, stage=name, **stats))
+            paths.append(path)
+
+        return paths
+
+    def print_summary(self):
+        """Print a table of the stages and batch latencies"""
+        print(f"\n{Fore.CYAN}Upload metrics ({self.total_seconds:.1f}s total):{Style.RESET_ALL}")
+        print(f"{'Stage':<10} {'Calls':>7} {'Wall s':>9} {'CPU s':>9} {'Rows':>10} {'MB':>9} {'Rows/sec':>11}")
+        for name, stats in self.stages.items():
+            if not stats.calls:
+                continue
+            print(f"{name:<10} {stats.calls:>7} {stats.wall_seconds:>9.3f} {stats.cpu_seconds:>9.3f} "
+                  f"{stats.rows:>10} {stats.bytes / 1024 / 1024:>9.1f} {stats.rows_per_sec:>11,.0f}")
+
+        latency = self.batches.to_dict()
+        if latency['batches']:
+            print(f"Batch latency: {latency['batches']} batches, p50 {latency['p50_ms']:.1f}ms, "
+                  f"p95 {latency['p95_ms']:.1f}ms, p99 {latency['p99_ms']:.1f}ms, max {latency['max_ms']:.1f}ms")
+            print('  ' + ', '.join(f"{label}: {count}" for label, count in latency['buckets'].items() if count))
+        if self.batch_sizing.get('adaptive'):
+            sizing = self.batch_sizing
+            print(f"Batch size: {sizing['start']} -> {sizing['final']} rows "
+                  f"({'saved' if sizing['warm_start'] else 'cold'} start, {sizing['min']}-{sizing['max']}, "
+                  f"{sizing['changes']} changes)")
@@ -0,0 +1,268 @@
+"""
+Parallel insert engine for Model Registry upload scripts
+Loads one table's rows over several connections into per-worker staging tables, then applies them in one transaction
+"""
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from bulk_insert import BulkInserter, frame_to_rows
+from upsert import MergeUpserter
+
+# Frames buffered per worker before the reader waits
+WORKER_QUEUE_SIZE = 2
+
+
+def hash_partitions(df: pd.DataFrame, key_columns: Sequence[str], workers: int) -> List[pd.DataFrame]:
+    """
+    Split rows into one partition per worker by a hash of their unique key
+
+    The same key always lands in the same partition, so chunks of one file can
+    be partitioned one at a time.
+    """
+    if workers == 1:
+        return [df]
+    key_columns = [col for col in key_columns if col in df.columns]
+    hashes = pd.util.hash_pandas_object(df[key_columns] if key_columns else df, index=False).to_numpy()
+    worker_of_row = hashes % workers
+    return [df[worker_of_row == worker] for worker in range(workers)]
+
+
+def drop_stale_staging(connection, table_name: str, max_age_hours: float,
+                       logger: Optional[logging.Logger] = None) -> List[str]:
+    """
+    Drop a table's staging tables left behind by runs that were killed
+
+    A run drops its own staging tables when it ends, so any older than
+    max_age_hours outlived their run; newer ones may belong to an upload still running.
+
+    Returns:
+        Names of the dropped staging tables
+    """
+    logger = logger or logging.getLogger(__name__)
+    cutoff = datetime.now() - timedelta(hours=max_age_hours)
+
+    # '_' is a LIKE wildcard; the full name check keeps other tables starting with <T>_STAGE_
+    name_pattern = table_name.replace('_', '\\_') + '\\_STAGE\\_%'
+    staging_name = re.compile(rf"{re.escape(table_name)}_STAGE_\d{{8}}_\d{{6}}_\d+_\d+", re.IGNORECASE)
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT name, create_date FROM sys.tables WHERE name LIKE ? ESCAPE '\\'", (name_pattern,))
+        stale = [name for name, create_date in cursor.fetchall()
+                 if staging_name.fullmatch(name) and create_date < cutoff]
+        for name in stale:
+            cursor.execute(f"DROP TABLE IF EXISTS {name}")
+    finally:
+        cursor.close()
+    connection.commit()
+
+    if stale:
+        logger.info(f"Dropped {len(stale)} staging tables of {table_name} left by earlier runs")
+    return stale
+
+
+class WorkerStats:
+    """Rows, time and outcome of one worker"""
+
+    def __init__(self, worker: int, staging_table: str):
+        self.worker = worker
+        self.staging_table = staging_table
+        self.rows = 0
+        self.seconds = 0.0
+        self.error: Optional[Exception] = None
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float(self.rows)
+
+    def describe(self) -> str:
+        status = f"failed: {str(self.error)}" if self.error else f"{self.rows_per_sec:,.0f} rows/sec"
+        return f"Worker {self.worker}: {self.rows} rows in {self.seconds:.1f}s ({status})"
+
+
+class ParallelInserter:
+    """
+    Insert one table's rows over several connections without partial loads
+
+    Each worker streams its partition into its own staging table on its own
+    connection, committing per batch (the staging tables have no constraints and
+    nobody reads them). Only when every worker has finished are the staging
+    tables applied to the target with INSERT ... SELECT (or MERGE in upsert mode)
+    in a single transaction on the coordinating connection. If a worker fails,
+    the staging tables are dropped and the target is never touched.
+    """
+
+    def __init__(self, connect: Callable, table_name: str, columns: Sequence[str], key_columns: Sequence[str],
+                 workers: int, batch_size: int, logger: Optional[logging.Logger] = None, use_bulk: bool = True):
+        """
+        Initialize the parallel inserter for a specific table
+
+        Args:
+            connect: Returns a connection for a worker (e.g., ConnectionPool.acquire); closed when the worker ends
+            table_name: Database table to load (e.g., 'MODEL_REGISTRY')
+            columns: Column names of the uploaded frames, in insert order
+            key_columns: Unique key columns, used to partition the rows
+            workers: Number of worker connections
+            batch_size: Rows per insert batch of a worker
+            use_bulk: Send each batch as one parameter array
+        """
+        if workers < 1:
+            raise ValueError(f"Number of workers must be at least 1: {workers}")
+
+        self.connect = connect
+        self.table_name = table_name
+        self.columns = list(columns)
+        self.key_columns = list(key_columns)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.use_bulk = use_bulk
+
+        # Unique per run, so concurrent uploads of one table never share staging tables
+        run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        self.stats = [WorkerStats(worker, f"{table_name}_STAGE_{run_id}_{worker}") for worker in range(1, workers + 1)]
+        self._failed = threading.Event()
+
+    def create_staging(self, connection):
+        """Create the empty staging tables with the target's column types"""
+        column_list = ', '.join(self.columns)
+        cursor = connection.cursor()
+        try:
+            for stats in self.stats:
+                cursor.execute(f"DROP TABLE IF EXISTS {stats.staging_table}")
+                # UNION ALL keeps the column types but drops any IDENTITY property
+                cursor.execute(
+                    f"SELECT TOP 0 {column_list} INTO {stats.staging_table} FROM {self.table_name} "
+                    f"UNION ALL SELECT TOP 0 {column_list} FROM {self.table_name}"
+                )
+        finally:
+            cursor.close()
+        connection.commit()
+
+    def drop_staging(self, connection):
+        cursor = connection.cursor()
+        try:
+            for stats in self.stats:
+                cursor.execute(f"DROP TABLE IF EXISTS {stats.staging_table}")
+        finally:
+            cursor.close()
+        connection.commit()
+
+    def _run_worker(self, stats: WorkerStats, inbox: queue.Queue):
+        connection = None
+        try:
+            connection = self.connect()
+            inserter = BulkInserter(connection, stats.staging_table, self.columns, self.logger, use_bulk=self.use_bulk)
+            batch_number = 0
+            while True:
+                frame = inbox.get()
+                if frame is None:
+                    break
+                # After a failure anywhere, keep draining so the reader is never blocked
+                if self._failed.is_set():
+                    continue
+
+                start_time = time.perf_counter()
+                for i in range(0, len(frame), self.batch_size):
+                    batch_number += 1
+                    rows = frame_to_rows(frame.iloc[i:i + self.batch_size], self.columns)
+                    inserter.insert_with_fallback(rows, batch_number)
+                    connection.commit()
+                    stats.rows += len(rows)
+                stats.seconds += time.perf_counter() - start_time
+
+        except Exception as e:
+            stats.error = e
+            self._failed.set()
+            # Unblock the reader
+            while inbox.get() is not None:
+                pass
+
+        finally:
+            if connection:
+                connection.close()
+
+    def load(self, frames: Iterable[pd.DataFrame]) -> bool:
+        """
+        Partition the frames and load every partition into its worker's staging table
+
+        Returns:
+            True if all workers succeeded (see self.stats for errors and throughput)
+        """
+        inboxes = [queue.Queue(maxsize=WORKER_QUEUE_SIZE) for _ in self.stats]
+        threads = [threading.Thread(target=self._run_worker, args=(stats, inbox),
+                                    name=f"insert-worker-{stats.worker}", daemon=True)
+                   for stats, inbox in zip(self.stats, inboxes)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for frame in frames:
+                if self._failed.is_set():
+                    break
+                for inbox, partition in zip(inboxes, hash_partitions(frame, self.key_columns, self.workers)):
+                    if not partition.empty:
+                        inbox.put(partition)
+        finally:
+            for inbox in inboxes:
+                inbox.put(None)
+            for thread in threads:
+                thread.join()
+
+        for stats in self.stats:
+            self.logger.info(f"{stats.describe()} into {stats.staging_table}")
+        return not self._failed.is_set()
+
+    def apply(self, connection, upsert: bool = False, nullable_keys: Sequence[str] = (),
+              output_ids: Optional[Tuple[str, str]] = None) -> Dict[str, int]:
+        """
+        Move the staged rows into the target table without committing
+
+        Args:
+            output_ids: (identity column, table) to record the identities of the inserted rows in
+                (see UploadBackup.output_ids)
+
+        Returns:
+            Counts of inserted, updated and unchanged rows
+        """
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        column_list = ', '.join(self.columns)
+        output = f"OUTPUT INSERTED.{output_ids[0]} INTO {output_ids[1]} ({output_ids[0]}) " if output_ids else ''
+
+        for stats in self.stats:
+            if not stats.rows:
+                continue
+            start_time = time.perf_counter()
+            if upsert:
+                upserter = MergeUpserter(connection, self.table_name, self.columns, self.key_columns, self.logger,
+                                         nullable_keys=nullable_keys, staging_table=stats.staging_table,
+                                         output_ids=output_ids)
+                staged_counts = upserter.merge_staged(stats.rows)
+            else:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(f"INSERT INTO {self.table_name} ({column_list}) {output}"
+                                   f"SELECT {column_list} FROM {stats.staging_table}")
+                finally:
+                    cursor.close()
+                staged_counts = {'inserted': stats.rows}
+
+            for outcome, count in staged_counts.items():
+                counts[outcome] += count
+            self.logger.info(f"Applied {stats.staging_table} to {self.table_name} "
+                             f"in {time.perf_counter() - start_time:.3f}s ({stats.rows} rows)")
+        return counts
+
+    def total_rows(self) -> int:
+        return sum(stats.rows for stats in self.stats)
+
+    def errors(self) -> List[str]:
+        return [f"Worker {stats.worker} failed: {str(stats.error)}" for stats in self.stats if stats.error]
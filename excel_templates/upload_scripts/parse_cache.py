@@ -0,0 +1,175 @@
+"""
+Parse cache for Model Registry upload scripts
+Stores cleaned, typed DataFrames as Arrow IPC files keyed by file content, sheet and table mapping
+"""
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+from typing import Dict, Optional, Union
+
+import pandas as pd
+
+# Bump when the cleaning rules change so old entries are not reused
+CACHE_FORMAT_VERSION = 1
+
+STATS_FILE = 'stats.json'
+ENTRY_EXTENSION = '.arrow'
+
+
+def file_sha256(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """Hash a file's content in fixed-size blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """Content-addressed cache of parsed workbooks with size-based LRU eviction"""
+
+    def __init__(self, cache_dir: str, max_bytes: int, logger: Optional[logging.Logger] = None):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir: Directory holding the cache entries
+            max_bytes: Total size the entries may use before the least recently used are evicted
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.logger = logger or logging.getLogger(__name__)
+        self.hits = 0
+        self.misses = 0
+        self.enabled = importlib.util.find_spec('pyarrow') is not None
+
+        if not self.enabled:
+            self.logger.warning("pyarrow not installed; parse cache disabled (install pyarrow or set PARSE_CACHE=false)")
+
+    def make_key(self, file_path: str, sheet: Union[int, str], table_config: Dict, parser_name: str) -> str:
+        """Build the cache key from the file content hash, sheet, table mapping and parser"""
+        key_parts = json.dumps({
+            'version': CACHE_FORMAT_VERSION,
+            'content': file_sha256(file_path),
+            'sheet': sheet,
+            'table': table_config,
+            'parser': parser_name
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(key_parts.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ENTRY_EXTENSION)
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Return the cached DataFrame for a key, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            self._record(hit=False)
+            return None
+
+        try:
+            import pyarrow.feather as feather
+
+            df = feather.read_table(path, memory_map=True).to_pandas()
+            os.utime(path)  # Mark as recently used
+            self._record(hit=True)
+            return df
+
+        except Exception as e:
+            self.logger.warning(f"Discarding unreadable cache entry {key}: {str(e)}")
+            self._remove(path)
+            self._record(hit=False)
+            return None
+
+    def put(self, key: str, df: pd.DataFrame) -> bool:
+        """Store a DataFrame (including its index) and evict old entries if over the size limit"""
+        if not self.enabled:
+            return False
+
+        try:
+            import pyarrow as pa
+            import pyarrow.feather as feather
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._entry_path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+
+            # Uncompressed so entries can be memory-mapped on read
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            feather.write_feather(table, tmp_path, compression='uncompressed')
+            os.replace(tmp_path, path)
+
+        except Exception as e:
+            self.logger.warning(f"Could not cache parsed data: {str(e)}")
+            return False
+
+        self.evict()
+        return True
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(ENTRY_EXTENSION):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove(path)
+            total_bytes -= size
+            self.logger.debug(f"Evicted cache entry: {os.path.basename(path)}")
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _record(self, hit: bool):
+        """Count a lookup for this run and in the cumulative stats file"""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        stats = self.read_stats()
+        stats['hits' if hit else 'misses'] += 1
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(os.path.join(self.cache_dir, STATS_FILE), 'w', encoding='utf-8') as f:
+                json.dump(stats, f)
+        except OSError as e:
+            self.logger.debug(f"Could not update cache stats: {str(e)}")
+
+    def read_stats(self) -> Dict:
+        """Read cumulative hit/miss counters"""
+        try:
+            with open(os.path.join(self.cache_dir, STATS_FILE), encoding='utf-8') as f:
+                stats = json.load(f)
+        except (OSError, ValueError):
+            stats = {}
+        return {'hits': stats.get('hits', 0), 'misses': stats.get('misses', 0)}
+
+    def summary(self) -> Dict:
+        """Cumulative stats plus current entry count and size"""
+        stats = self.read_stats()
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                       if name.endswith(ENTRY_EXTENSION)]
+
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['entries'] = len(entries)
+        stats['size_mb'] = sum(os.path.getsize(path) for path in entries) / (1024 * 1024)
+        stats['max_mb'] = self.max_bytes / (1024 * 1024)
+        return stats
@@ -0,0 +1,275 @@
+"""
+Parser backends for Model Registry upload scripts
+Reads .xlsx/.xls/.csv/.parquet input with the fastest reader installed
+"""
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import os
+import time
+import tracemalloc
+from typing import Dict, Iterator, List, Optional, Union
+
+from lazy_modules import lazy_import
+
+# Loaded on first use, so command line tools can list the parsers without importing pandas
+pd = lazy_import('pandas')
+excel_stream = lazy_import('excel_stream')
+
+# Workbooks smaller than this are read with openpyxl; larger ones use a faster backend if installed
+AUTO_FAST_PARSER_MIN_BYTES = 256 * 1024
+
+# Faster Excel readers, in order of preference
+FAST_EXCEL_PARSERS = ['calamine', 'fastexcel']
+
+
+class ParserBackend:
+    """Base class for input file readers"""
+    name = ''
+    extensions = ()
+    required_modules = ()
+    supports_chunks = False
+    supports_sheets = False
+
+    def is_available(self) -> bool:
+        """Check that the optional modules needed by this backend are installed"""
+        return all(importlib.util.find_spec(module) is not None for module in self.required_modules)
+
+    def supports(self, file_path: str) -> bool:
+        """Check whether this backend can read the given file type"""
+        return os.path.splitext(file_path)[1].lower() in self.extensions
+
+    def load_modules(self):
+        """Import the backend's modules so their import time is not counted as parse time"""
+        for module in self.required_modules:
+            importlib.import_module(module)
+
+    def read(self, file_path: str, sheet: Union[int, str] = 0) -> pd.DataFrame:
+        """Read one sheet as an uncleaned DataFrame with a default RangeIndex"""
+        raise NotImplementedError
+
+    def iter_chunks(self, file_path: str, chunk_size: int,
+                    sheet: Union[int, str] = 0) -> Iterator[pd.DataFrame]:
+        """Yield cleaned chunks indexed by source row number"""
+        raise NotImplementedError(f"Parser '{self.name}' does not support streaming")
+
+    def read_sheets(self, file_path: str) -> Dict[str, pd.DataFrame]:
+        """Read every sheet of a workbook in one pass, as uncleaned DataFrames keyed by sheet name"""
+        raise NotImplementedError(f"Parser '{self.name}' does not read multiple sheets")
+
+
+def _rows_to_frame(rows: List[list]) -> pd.DataFrame:
+    """Build a typed DataFrame from a header row plus data rows, treating '' as missing"""
+    if not rows:
+        return pd.DataFrame()
+
+    columns = [str(name).strip() if name not in (None, '') else f"Unnamed: {idx}"
+               for idx, name in enumerate(rows[0])]
+    df = pd.DataFrame(rows[1:], columns=columns)
+    for col in df.select_dtypes(include=['object']).columns:
+        df[col] = df[col].mask(df[col] == '')
+    df = df.infer_objects()
+
+    # Date cells come back as datetime objects; give them a datetime dtype like openpyxl does
+    for col in df.select_dtypes(include=['object']).columns:
+        if pd.api.types.infer_dtype(df[col], skipna=True) in ('datetime', 'date'):
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+class OpenpyxlBackend(ParserBackend):
+    """Default reader, always installed with the upload scripts"""
+    name = 'openpyxl'
+    extensions = ('.xlsx', '.xlsm')
+    required_modules = ('openpyxl',)
+    supports_chunks = True
+    supports_sheets = True
+
+    def read(self, file_path, sheet=0):
+        return pd.read_excel(file_path, sheet_name=sheet, engine='openpyxl')
+
+    def read_sheets(self, file_path):
+        return pd.read_excel(file_path, sheet_name=None, engine='openpyxl')
+
+    def iter_chunks(self, file_path, chunk_size, sheet=0):
+        return excel_stream.iter_excel_chunks(file_path, chunk_size, sheet)
+
+
+class CalamineBackend(ParserBackend):
+    """Rust-based reader (python-calamine)"""
+    name = 'calamine'
+    extensions = ('.xlsx', '.xlsm', '.xls', '.xlsb', '.ods')
+    required_modules = ('python_calamine',)
+    supports_sheets = True
+
+    def read(self, file_path, sheet=0):
+        from python_calamine import CalamineWorkbook
+
+        workbook = CalamineWorkbook.from_path(file_path)
+        if isinstance(sheet, int):
+            worksheet = workbook.get_sheet_by_index(sheet)
+        else:
+            worksheet = workbook.get_sheet_by_name(sheet)
+        return _rows_to_frame(worksheet.to_python(skip_empty_area=False))
+
+    def read_sheets(self, file_path):
+        from python_calamine import CalamineWorkbook
+
+        workbook = CalamineWorkbook.from_path(file_path)
+        return {name: _rows_to_frame(workbook.get_sheet_by_name(name).to_python(skip_empty_area=False))
+                for name in workbook.sheet_names}
+
+
+class FastexcelBackend(ParserBackend):
+    """Rust-based reader returning Arrow data (fastexcel)"""
+    name = 'fastexcel'
+    extensions = ('.xlsx', '.xlsm', '.xls', '.ods')
+    required_modules = ('fastexcel', 'pyarrow')
+    supports_sheets = True
+
+    def read(self, file_path, sheet=0):
+        import fastexcel
+
+        return fastexcel.read_excel(file_path).load_sheet(sheet).to_pandas()
+
+    def read_sheets(self, file_path):
+        import fastexcel
+
+        reader = fastexcel.read_excel(file_path)
+        return {name: reader.load_sheet(name).to_pandas() for name in reader.sheet_names}
+
+
+class CsvBackend(ParserBackend):
+    """CSV reader (pyarrow engine when installed, otherwise the pandas C engine)"""
+    name = 'csv'
+    extensions = ('.csv',)
+    supports_chunks = True
+
+    def read(self, file_path, sheet=0):
+        engine = 'pyarrow' if importlib.util.find_spec('pyarrow') is not None else 'c'
+        return pd.read_csv(file_path, engine=engine)
+
+    def iter_chunks(self, file_path, chunk_size, sheet=0):
+        for chunk in pd.read_csv(file_path, chunksize=chunk_size):
+            chunk.index = chunk.index + excel_stream.FIRST_DATA_ROW
+            chunk = excel_stream.clean_frame(chunk)
+            if not chunk.empty:
+                yield chunk
+
+
+class ParquetBackend(ParserBackend):
+    """Parquet reader (pyarrow)"""
+    name = 'parquet'
+    extensions = ('.parquet', '.pq')
+    required_modules = ('pyarrow',)
+
+    def read(self, file_path, sheet=0):
+        return pd.read_parquet(file_path)
+
+
+PARSER_BACKENDS: Dict[str, ParserBackend] = {
+    backend.name: backend
+    for backend in (OpenpyxlBackend(), CalamineBackend(), FastexcelBackend(), CsvBackend(), ParquetBackend())
+}
+
+
+def select_parser(file_path: str, name: Optional[str] = 'auto', streaming: bool = False,
+                  all_sheets: bool = False) -> ParserBackend:
+    """
+    Pick the parser backend for a file
+
+    Args:
+        file_path: Input file; its extension and size drive the automatic choice
+        name: Backend name, or 'auto'/None to choose automatically
+        streaming: Only consider backends that can read in chunks
+        all_sheets: Only consider backends that can read every sheet of a workbook
+
+    Raises:
+        ValueError: If the named backend is unknown, not installed or cannot read the file
+    """
+    if name and name != 'auto':
+        backend = PARSER_BACKENDS.get(name)
+        if backend is None:
+            raise ValueError(f"Unknown parser: {name} (available: {', '.join(PARSER_BACKENDS)})")
+        if not backend.is_available():
+            raise ValueError(f"Parser '{name}' is not installed")
+        if not backend.supports(file_path):
+            raise ValueError(f"Parser '{name}' cannot read {os.path.basename(file_path)}")
+        if streaming and not backend.supports_chunks:
+            raise ValueError(f"Parser '{name}' does not support streaming")
+        if all_sheets and not backend.supports_sheets:
+            raise ValueError(f"Parser '{name}' does not read multiple sheets")
+        return backend
+
+    candidates = list(PARSER_BACKENDS.values())
+    if all_sheets:
+        candidates = [backend for backend in candidates if backend.supports_sheets]
+    if streaming:
+        candidates = [backend for backend in candidates if backend.supports_chunks]
+    elif os.path.getsize(file_path) >= AUTO_FAST_PARSER_MIN_BYTES:
+        fast = [PARSER_BACKENDS[parser] for parser in FAST_EXCEL_PARSERS]
+        candidates = fast + [backend for backend in candidates if backend not in fast]
+
+    for backend in candidates:
+        if backend.supports(file_path) and backend.is_available():
+            return backend
+
+    raise ValueError(f"No installed parser can read {os.path.basename(file_path)}")
+
+
+def benchmark_parsers(file_path: str, sheet: Union[int, str] = 0) -> List[Dict]:
+    """
+    Parse a file with every backend that supports it
+
+    Each backend is run twice: once untraced for the parse time, and once under
+    tracemalloc for peak memory (Python objects and NumPy buffers; memory held
+    inside native readers is not seen).
+    """
+    results = []
+
+    for backend in PARSER_BACKENDS.values():
+        if not backend.supports(file_path):
+            continue
+
+        result = {'parser': backend.name, 'rows': None, 'seconds': None, 'peak_mb': None}
+        if not backend.is_available():
+            result['status'] = 'not installed'
+            results.append(result)
+            continue
+
+        try:
+            backend.load_modules()
+
+            start_time = time.perf_counter()
+            df = backend.read(file_path, sheet)
+            result['seconds'] = time.perf_counter() - start_time
+            result['rows'] = len(df.dropna(how='all'))
+            del df
+
+            tracemalloc.start()
+            try:
+                backend.read(file_path, sheet)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            result['peak_mb'] = peak / (1024 * 1024)
+            result['status'] = 'ok'
+
+        except Exception as e:
+            result['status'] = f"error: {str(e)}"
+
+        results.append(result)
+
+    return results
+
+
+def print_benchmark(file_path: str, results: List[Dict]):
+    """Print benchmark results as a table"""
+    print(f"Parser benchmark: {file_path} ({os.path.getsize(file_path) / (1024 * 1024):.1f} MB)")
+    print(f"{'Parser':<12} {'Rows':>10} {'Time (s)':>10} {'Peak MB':>10}  Status")
+    for result in results:
+        rows = f"{result['rows']:,}" if result['rows'] is not None else '-'
+        seconds = f"{result['seconds']:.3f}" if result['seconds'] is not None else '-'
+        peak_mb = f"{result['peak_mb']:.1f}" if result['peak_mb'] is not None else '-'
+        print(f"{result['parser']:<12} {rows:>10} {seconds:>10} {peak_mb:>10}  {result['status']}")
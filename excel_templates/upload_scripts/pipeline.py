@@ -0,0 +1,149 @@
+"""
+Upload pipeline for Model Registry upload scripts
+Reads, validates and encodes chunks on worker threads joined by bounded queues, while the caller inserts
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# How often a blocked stage checks whether the pipeline was stopped
+POLL_SECONDS = 0.1
+
+# Marks the end of the item stream in a queue
+_END = object()
+
+
+class PipelineError(Exception):
+    """A pipeline stage failed; the stage's exception is the __cause__"""
+
+    def __init__(self, stage: str, error: Exception):
+        super().__init__(f"Stage '{stage}' failed: {str(error)}")
+        self.stage = stage
+
+
+class StagePipeline:
+    """
+    Run a source iterator and a chain of stage functions, each on its own thread
+
+    Every stage takes one item and returns the item for the next stage. Stages
+    are joined by queues of queue_size items, so a fast stage blocks instead of
+    running ahead of a slow one, and items leave the pipeline in source order.
+    Iterating the pipeline yields the items of the last stage to the caller,
+    which is the final (e.g., inserting) stage.
+    """
+
+    def __init__(self, source: Iterable, stages: Sequence[Tuple[str, Callable]], queue_size: int = 2,
+                 logger: Optional[logging.Logger] = None, source_name: str = 'read'):
+        """
+        Initialize the pipeline
+
+        Args:
+            source: Items to process (e.g., the chunks of a file); iterated on a worker thread
+            stages: (name, function) pairs applied in order to every item
+            queue_size: Items buffered between two stages
+            source_name: Name of the source stage in errors and timings
+        """
+        self.source = source
+        self.stages = list(stages)
+        self.queue_size = max(1, queue_size)
+        self.logger = logger or logging.getLogger(__name__)
+        self.source_name = source_name
+
+        self.busy_seconds: Dict[str, float] = {}
+        self.items = 0
+        self._stop = threading.Event()
+        self._error: Optional[Tuple[str, Exception]] = None
+        self._threads: List[threading.Thread] = []
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        """Put an item, giving up if the pipeline was stopped meanwhile"""
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue):
+        """Get an item, or _END if the pipeline was stopped meanwhile"""
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, stage: str, error: Exception):
+        if self._error is None:
+            self._error = (stage, error)
+        self._stop.set()
+
+    def _timed(self, stage: str, start_time: float):
+        self.busy_seconds[stage] = self.busy_seconds.get(stage, 0.0) + time.perf_counter() - start_time
+
+    def _run_source(self, output: queue.Queue):
+        try:
+            iterator = iter(self.source)
+            while True:
+                start_time = time.perf_counter()
+                item = next(iterator, _END)
+                self._timed(self.source_name, start_time)
+                if item is _END or not self._put(output, item):
+                    break
+        except Exception as e:
+            self._fail(self.source_name, e)
+        self._put(output, _END)
+
+    def _run_stage(self, name: str, function: Callable, source: queue.Queue, output: queue.Queue):
+        try:
+            while True:
+                item = self._get(source)
+                if item is _END:
+                    break
+                start_time = time.perf_counter()
+                result = function(item)
+                self._timed(name, start_time)
+                if not self._put(output, result):
+                    break
+        except Exception as e:
+            self._fail(name, e)
+        self._put(output, _END)
+
+    def __iter__(self) -> Iterator:
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        self._threads = [threading.Thread(target=self._run_source, args=(queues[0],),
+                                          name=f"pipeline-{self.source_name}", daemon=True)]
+        for i, (name, function) in enumerate(self.stages):
+            self._threads.append(threading.Thread(target=self._run_stage, args=(name, function, queues[i], queues[i + 1]),
+                                                  name=f"pipeline-{name}", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _END:
+                    break
+                self.items += 1
+                yield item
+        finally:
+            # Also reached when the caller stops iterating early
+            self.stop()
+
+        if self._error:
+            stage, error = self._error
+            raise PipelineError(stage, error) from error
+
+    def stop(self):
+        """Stop all stages and wait for their threads"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def describe_timings(self) -> str:
+        """Busy time of each stage (e.g., 'read 12.1s, validate 3.4s, encode 1.2s')"""
+        names = [self.source_name] + [name for name, _ in self.stages]
+        return ', '.join(f"{name} {self.busy_seconds.get(name, 0.0):.1f}s" for name in names)
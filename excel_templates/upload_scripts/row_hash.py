@@ -0,0 +1,246 @@
+"""
+Row hash manifests for Model Registry upload scripts
+Stable per-row hashes keyed by unique columns, kept between runs so a sync sends only new and changed rows
+"""
+import datetime
+import decimal
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from bulk_insert import frame_to_rows
+
+# Bump when the hash input changes, so older manifests are rebuilt
+MANIFEST_VERSION = 1
+
+# Separates the values of a key or hash input; never part of a cell value
+FIELD_SEPARATOR = '\x1f'
+
+# Stands for NULL, so NULL and an empty string hash differently
+NULL_MARKER = '\x00'
+
+# Rows fetched per round trip when rebuilding a manifest from the table
+FETCH_SIZE = 50000
+
+
+def canonical_value(value) -> str:
+    """
+    Text of a value that is the same whether it was read from a workbook or from the database
+
+    Integral floats and decimals lose their trailing zeros (1.0 and Decimal('1.000') are '1'),
+    booleans become 1/0 and midnight timestamps become dates. A value written differently
+    on each side only makes the row look changed, so it is sent and MERGE finds it unchanged.
+    """
+    if value is None or value is pd.NaT:
+        return NULL_MARKER
+    if isinstance(value, (bool, np.bool_)):
+        return '1' if value else '0'
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    if isinstance(value, decimal.Decimal):
+        if not value.is_finite():
+            return str(value)
+        value = value.normalize()
+        return str(int(value)) if value == value.to_integral_value() else format(value, 'f')
+    if isinstance(value, (float, np.floating)):
+        if value != value:
+            return NULL_MARKER
+        return str(int(value)) if float(value).is_integer() else format(float(value), '.15g')
+    if isinstance(value, datetime.datetime):
+        if value.time() == datetime.time(0):
+            return value.date().isoformat()
+        return value.isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return str(value)
+
+
+def row_key(values: Sequence) -> str:
+    return FIELD_SEPARATOR.join(canonical_value(value) for value in values)
+
+
+def row_digest(values: Sequence) -> str:
+    """64-bit hash of the canonical values; only ever compared with the hash of the same key"""
+    return hashlib.blake2b(row_key(values).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def manifest_file_name(database: str, table_name: str) -> str:
+    return re.sub(r'[^\w.-]', '_', f"{database}.{table_name}") + '.json.gz'
+
+
+class RowHashManifest:
+    """
+    Hashes of the rows of one table as of the last sync, keyed by its unique columns
+
+    The hashes cover the uploaded value columns. A manifest only answers for the
+    same server, database and columns; otherwise it is rebuilt from the table.
+    Hashes change only for rows whose batch was committed, so a failed or
+    rejected row is sent again by the next sync.
+    """
+
+    def __init__(self, manifest_dir: str, server: str, database: str, table_name: str,
+                 key_columns: Sequence[str], logger: Optional[logging.Logger] = None):
+        self.path = os.path.join(manifest_dir, manifest_file_name(database, table_name))
+        self.server = server
+        self.database = database
+        self.table_name = table_name
+        self.key_columns = list(key_columns)
+        self.logger = logger or logging.getLogger(__name__)
+        self.value_columns: List[str] = []
+        self.hashes: Dict[str, str] = {}
+        self.pending: Dict[object, Tuple[str, str]] = {}
+        self.seen_keys = set()
+        self.loaded = False
+        self.changed = False
+
+    def _identity(self, value_columns: Sequence[str]) -> Dict:
+        return {
+            'version': MANIFEST_VERSION,
+            'server': self.server,
+            'database': self.database,
+            'table': self.table_name,
+            'key_columns': self.key_columns,
+            'value_columns': list(value_columns)
+        }
+
+    def load(self, value_columns: Sequence[str]) -> bool:
+        """Read the saved hashes (False if there is no manifest for this table and these columns)"""
+        self.value_columns = list(value_columns)
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get('identity') != self._identity(value_columns):
+            self.logger.info(f"Row hash manifest {self.path} was made for other columns; rebuilding it")
+            return False
+        self.hashes = data['hashes']
+        self.loaded = True
+        return True
+
+    def rebuild(self, connection, value_columns: Sequence[str]):
+        """Hash every row of the table, reading it in bulk"""
+        self.value_columns = list(value_columns)
+        columns = self.key_columns + self.value_columns
+        key_count = len(self.key_columns)
+        self.hashes = {}
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"SELECT {', '.join(columns)} FROM {self.table_name}")
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    values = tuple(row)
+                    self.hashes[row_key(values[:key_count])] = row_digest(values[key_count:])
+        finally:
+            cursor.close()
+        self.loaded = True
+        self.changed = True
+        self.logger.info(f"Hashed {len(self.hashes)} existing rows of {self.table_name}")
+
+    def split(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Split prepared rows into those to send (new or changed) and those unchanged since the last sync
+
+        The rows to send are remembered until record_committed() is called for them.
+        """
+        rows = frame_to_rows(df, self.key_columns + self.value_columns)
+        key_count = len(self.key_columns)
+        send = []
+        for index, values in zip(df.index, rows):
+            key = row_key(values[:key_count])
+            digest = row_digest(values[key_count:])
+            self.seen_keys.add(key)
+            if self.hashes.get(key) != digest:
+                send.append(True)
+                self.pending[index] = (key, digest)
+            else:
+                send.append(False)
+        mask = np.array(send, dtype=bool)
+        return df[mask], df[~mask]
+
+    def record_committed(self, index: Iterable):
+        """Take over the hashes of rows whose batch was committed"""
+        for row in index:
+            entry = self.pending.pop(row, None)
+            if entry:
+                self.hashes[entry[0]] = entry[1]
+                self.changed = True
+
+    def missing_keys(self) -> List[Tuple]:
+        """Keys in the table (as of the manifest) that no row of this sync had"""
+        missing = []
+        for key in self.hashes:
+            if key not in self.seen_keys:
+                values = key.split(FIELD_SEPARATOR)
+                missing.append(tuple(None if value == NULL_MARKER else value for value in values))
+        return missing
+
+    def record_deleted(self, keys: Iterable[Tuple]):
+        for values in keys:
+            if self.hashes.pop(row_key(values), None) is not None:
+                self.changed = True
+
+    def save(self):
+        """Write the manifest atomically"""
+        if not self.changed:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+            json.dump({'identity': self._identity(self.value_columns),
+                       'saved': datetime.datetime.now().isoformat(timespec='seconds'),
+                       'hashes': self.hashes}, f, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+        self.changed = False
+        self.logger.info(f"Saved {len(self.hashes)} row hashes to {self.path}")
+
+
+def remove_manifest(manifest_dir: str, database: str, table_name: str) -> bool:
+    """Forget a table's hashes (e.g., after an upload or restore outside sync mode changed it)"""
+    try:
+        os.remove(os.path.join(manifest_dir, manifest_file_name(database, table_name)))
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def delete_keys(connection, table_name: str, key_columns: Sequence[str], keys: Sequence[Tuple],
+                nullable_keys: Sequence[str] = ()) -> int:
+    """
+    Delete the rows with the given keys without committing
+
+    Keys come back from the manifest as text; SQL Server converts them to the column types.
+
+    Returns:
+        Number of keys deleted
+    """
+    if not keys:
+        return 0
+    conditions = ' AND '.join(
+        f"({col} = ? OR ({col} IS NULL AND ? IS NULL))" if col in nullable_keys else f"{col} = ?"
+        for col in key_columns
+    )
+    params = []
+    for values in keys:
+        row = []
+        for col, value in zip(key_columns, values):
+            row.extend((value, value) if col in nullable_keys else (value,))
+        params.append(tuple(row))
+
+    cursor = connection.cursor()
+    try:
+        cursor.fast_executemany = True
+        cursor.executemany(f"DELETE FROM {table_name} WHERE {conditions}", params)
+    finally:
+        cursor.close()
+    return len(keys)
@@ -2,13 +2,21 @@
 Simple Excel Upload Script for Model Registry
 Uploads data from Excel files to SQL Server database
 """
-import pandas as pd
-import pyodbc
-import logging
+from __future__ import annotations
+
 import sys
 import os
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from lazy_modules import lazy_import
+from log_setup import get_upload_logger
+
+# Loaded on first use, so the usage message prints without importing pandas or pyodbc
+pd = lazy_import('pandas')
+bulk_insert = lazy_import('bulk_insert')
+db_access = lazy_import('db_access')
+excel_stream = lazy_import('excel_stream')
 
 # Database configuration
 DB_CONFIG = {
@@ -41,6 +49,9 @@ TABLE_CONFIGS = {
     }
 }
 
+# Rows per chunk when streaming large files
+STREAM_CHUNK_SIZE = 50000
+
 class SimpleExcelUploader:
     def __init__(self, table_name: str):
         self.table_name = table_name
@@ -49,33 +60,13 @@ class SimpleExcelUploader:
         if not self.config:
             raise ValueError(f"Unknown table: {table_name}")
         
-        # Setup logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
-        self.logger = logging.getLogger(__name__)
+        # Setup logging (console only, written off the upload thread)
+        self.logger = get_upload_logger(f"simple_upload.{table_name}", rate_limit=20)
         
     def connect_database(self):
-        """Connect to SQL Server database"""
+        """Borrow a connection to SQL Server from the shared pool (close() returns it)"""
         try:
-            if DB_CONFIG['trusted_connection'] == 'yes':
-                conn_str = (
-                    f"DRIVER={{{DB_CONFIG['driver']}}};"
-                    f"SERVER={DB_CONFIG['server']};"
-                    f"DATABASE={DB_CONFIG['database']};"
-                    f"Trusted_Connection=yes;"
-                )
-            else:
-                conn_str = (
-                    f"DRIVER={{{DB_CONFIG['driver']}}};"
-                    f"SERVER={DB_CONFIG['server']};"
-                    f"DATABASE={DB_CONFIG['database']};"
-                    f"UID={DB_CONFIG.get('username')};"
-                    f"PWD={DB_CONFIG.get('password')};"
-                )
-            
-            return pyodbc.connect(conn_str)
+            return db_access.get_pool(db_access.connection_string(DB_CONFIG)).acquire()
             
         except Exception as e:
             self.logger.error(f"Database connection failed: {str(e)}")
@@ -85,11 +76,8 @@ class SimpleExcelUploader:
         """Read Excel file"""
         try:
             df = pd.read_excel(file_path, sheet_name=0)
-            df = df.dropna(how='all')  # Remove empty rows
-            
-            # Clean string columns
-            for col in df.select_dtypes(include=['object']).columns:
-                df[col] = df[col].astype(str).str.strip()
+            df.index = df.index + excel_stream.FIRST_DATA_ROW  # Excel row numbers
+            df = excel_stream.clean_frame(df)  # Remove empty rows, clean string columns
             
             self.logger.info(f"Loaded {len(df)} rows from {file_path}")
             return df
@@ -98,6 +86,26 @@ class SimpleExcelUploader:
             self.logger.error(f"Error reading Excel file: {str(e)}")
             return None
     
+    def validate_stream(self, file_path: str):
+        """Validate Excel file chunk by chunk"""
+        errors = []
+        key_tracker = excel_stream.DuplicateKeyTracker(self.config['unique_columns'])
+        
+        try:
+            for chunk in excel_stream.iter_excel_chunks(file_path, STREAM_CHUNK_SIZE):
+                chunk_errors = self.validate_data(chunk)
+                
+                duplicates = key_tracker.check(chunk)
+                if duplicates:
+                    chunk_errors.append(f"Duplicate values in unique columns: {self.config['unique_columns']} (repeating earlier rows)")
+                
+                errors.extend(f"{excel_stream.describe_rows(chunk)}: {error}" for error in chunk_errors)
+                
+        except Exception as e:
+            errors.append(f"Error reading Excel file: {str(e)}")
+        
+        return errors
+    
     def validate_data(self, df):
         """Basic data validation"""
         errors = []
@@ -128,33 +136,50 @@ class SimpleExcelUploader:
         
         return errors
     
+    def prepare_upload_frame(self, df):
+        """Drop identity column, map booleans and order rows by the unique key"""
+        upload_df = df.copy()
+        if self.config['identity_column'] in upload_df.columns:
+            upload_df = upload_df.drop(columns=[self.config['identity_column']])
+        
+        # Handle boolean columns
+        bool_cols = ['IS_ACTIVE', 'IS_PII', 'IS_SENSITIVE']
+        for col in bool_cols:
+            if col in upload_df.columns:
+                upload_df[col] = upload_df[col].map({True: 1, False: 0, 'True': 1, 'False': 0, 1: 1, 0: 0})
+        
+        return bulk_insert.sort_by_key(upload_df, self.config['unique_columns'])
+    
+    def insert_chunks(self, chunks: Iterable[pd.DataFrame], connection, use_bulk: bool = True) -> int:
+        """Insert chunks without committing; each chunk is sent as one parameter array"""
+        inserter = None
+        uploaded_count = 0
+        
+        for batch_number, chunk in enumerate(chunks, 1):
+            upload_df = self.prepare_upload_frame(chunk)
+            columns = list(upload_df.columns)
+            if inserter is None or inserter.columns != columns:
+                inserter = bulk_insert.BulkInserter(connection, self.config['table_name'], columns, self.logger, use_bulk=use_bulk)
+            
+            rows = bulk_insert.frame_to_rows(upload_df, columns)
+            inserter.insert_batch(rows, batch_number)
+            uploaded_count += len(rows)
+        
+        return uploaded_count
+    
     def upload_data(self, df, connection):
         """Upload data to database"""
+        return self.upload_chunks(lambda: [df], connection)
+    
+    def upload_chunks(self, chunk_source: Callable[[], Iterable[pd.DataFrame]], connection):
+        """Upload all chunks in a single transaction, retrying row by row if the bulk path fails"""
         try:
-            # Remove identity column if present
-            upload_df = df.copy()
-            if self.config['identity_column'] in upload_df.columns:
-                upload_df = upload_df.drop(columns=[self.config['identity_column']])
-            
-            # Handle boolean columns
-            bool_cols = ['IS_ACTIVE', 'IS_PII', 'IS_SENSITIVE']
-            for col in bool_cols:
-                if col in upload_df.columns:
-                    upload_df[col] = upload_df[col].map({True: 1, False: 0, 'True': 1, 'False': 0, 1: 1, 0: 0})
-            
-            # Generate INSERT statement
-            columns = list(upload_df.columns)
-            placeholders = ','.join(['?' for _ in columns])
-            insert_query = f"INSERT INTO {self.config['table_name']} ({','.join(columns)}) VALUES ({placeholders})"
-            
-            # Execute inserts
-            cursor = connection.cursor()
-            uploaded_count = 0
-            
-            for _, row in upload_df.iterrows():
-                values = [row[col] if pd.notna(row[col]) else None for col in columns]
-                cursor.execute(insert_query, values)
-                uploaded_count += 1
+            try:
+                uploaded_count = self.insert_chunks(chunk_source(), connection)
+            except Exception as e:
+                connection.rollback()
+                self.logger.warning(f"Bulk upload failed, retrying row by row: {str(e)}")
+                uploaded_count = self.insert_chunks(chunk_source(), connection, use_bulk=False)
             
             connection.commit()
             self.logger.info(f"Successfully uploaded {uploaded_count} rows")
@@ -165,8 +190,8 @@ class SimpleExcelUploader:
             self.logger.error(f"Upload failed: {str(e)}")
             return False, 0
     
-    def process_file(self, file_path: str):
-        """Main method to process Excel file"""
+    def process_file(self, file_path: str, stream: bool = False):
+        """Main method to process Excel file (stream=True reads it in bounded-memory chunks)"""
         print(f"Processing {self.table_name} upload...")
         
         # Connect to database
@@ -175,14 +200,19 @@ class SimpleExcelUploader:
             return False
         
         try:
-            # Read Excel file
-            df = self.read_excel(file_path)
-            if df is None:
-                return False
-            
-            # Validate data
-            print("Validating data...")
-            validation_errors = self.validate_data(df)
+            if stream:
+                # Validate data chunk by chunk
+                print("Validating data (streaming)...")
+                validation_errors = self.validate_stream(file_path)
+            else:
+                # Read Excel file
+                df = self.read_excel(file_path)
+                if df is None:
+                    return False
+                
+                # Validate data
+                print("Validating data...")
+                validation_errors = self.validate_data(df)
             
             if validation_errors:
                 print("Validation failed:")
@@ -194,7 +224,11 @@ class SimpleExcelUploader:
             
             # Upload data
             print("Uploading data...")
-            success, uploaded_count = self.upload_data(df, connection)
+            if stream:
+                success, uploaded_count = self.upload_chunks(
+                    lambda: excel_stream.iter_excel_chunks(file_path, STREAM_CHUNK_SIZE), connection)
+            else:
+                success, uploaded_count = self.upload_data(df, connection)
             
             if success:
                 print(f"Upload successful: {uploaded_count} rows uploaded")
@@ -208,13 +242,16 @@ class SimpleExcelUploader:
 
 def main():
     """Main function"""
-    if len(sys.argv) < 3:
-        print("Usage: python simple_upload.py <table_name> <excel_file_path>")
+    stream = '--stream' in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != '--stream']
+    
+    if len(args) < 2:
+        print("Usage: python simple_upload.py <table_name> <excel_file_path> [--stream]")
         print("Available tables:", list(TABLE_CONFIGS.keys()))
         sys.exit(1)
     
-    table_name = sys.argv[1]
-    excel_file = sys.argv[2]
+    table_name = args[0]
+    excel_file = args[1]
     
     if not os.path.exists(excel_file):
         print(f"Excel file not found: {excel_file}")
@@ -222,7 +259,7 @@ def main():
     
     try:
         uploader = SimpleExcelUploader(table_name)
-        success = uploader.process_file(excel_file)
+        success = uploader.process_file(excel_file, stream=stream)
         sys.exit(0 if success else 1)
         
     except Exception as e:
@@ -0,0 +1,49 @@
+"""
+Shared transactions for Model Registry upload scripts
+Lets uploads that commit after every batch run inside one transaction that is committed or rolled back as a whole
+"""
+
+# Savepoint marking the last committed batch inside the shared transaction
+SAVEPOINT_NAME = 'UPLOAD_BATCH'
+
+
+class SharedTransaction:
+    """
+    Connection wrapper that runs several uploads in one transaction
+
+    The uploaders commit after every batch and roll back a failed batch. Through
+    this wrapper a commit only sets a savepoint and a rollback returns to the
+    last savepoint, so nothing is committed until commit_all().
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.commit()
+
+    def cursor(self):
+        return self.connection.cursor()
+
+    def commit(self):
+        """Mark the work so far as the point a failed batch rolls back to"""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"IF @@TRANCOUNT = 0 BEGIN TRANSACTION; SAVE TRANSACTION {SAVEPOINT_NAME}")
+        finally:
+            cursor.close()
+
+    def rollback(self):
+        """Undo the work since the last savepoint"""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"ROLLBACK TRANSACTION {SAVEPOINT_NAME}")
+        finally:
+            cursor.close()
+
+    def commit_all(self):
+        self.connection.commit()
+
+    def rollback_all(self):
+        self.connection.rollback()
+
+    def close(self):
+        """The owner of the real connection closes it"""
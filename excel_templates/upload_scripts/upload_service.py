@@ -0,0 +1,729 @@
+"""
+Upload Service for Model Registry
+Resident uploader: keeps imports and connections warm, takes jobs from a drop folder and a local socket
+"""
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import shutil
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from colorama import init, Fore, Style
+
+from config import DB_CONFIG, POOL_CONFIG, TABLE_MAPPINGS, UPLOAD_CONFIG
+from lazy_modules import lazy_import
+from log_setup import get_upload_logger
+
+# Loaded when the service starts, so the client commands stay fast
+db_access = lazy_import('db_access')
+job_scheduler = lazy_import('job_scheduler')
+parse_cache = lazy_import('parse_cache')
+uploader = lazy_import('uploader')
+workbook_upload = lazy_import('workbook_upload')
+
+# Initialize colorama for colored output
+init()
+
+# Finished jobs kept in the queue file (oldest dropped first)
+MAX_HISTORY = 1000
+
+# Longest request line the socket accepts
+MAX_REQUEST_BYTES = 64 * 1024
+
+# Job states; queued and running jobs are picked up again after a restart
+ACTIVE_STATES = ('queued', 'running')
+
+# Sub-folders of the drop folder that files are moved to
+DROP_SUBDIRS = ('processing', 'done', 'failed', 'duplicates')
+
+
+class ServiceJob:
+    """One file submitted to the service for one table"""
+
+    FIELDS = ('id', 'table_name', 'file_path', 'upload_mode', 'sha256', 'source', 'status', 'resume',
+              'submitted', 'started', 'finished', 'seconds', 'rows', 'message')
+
+    def __init__(self, job_id: int, table_name: str, file_path: str, sha256: str, upload_mode: Optional[str] = None,
+                 source: str = 'socket'):
+        self.id = job_id
+        self.table_name = table_name
+        self.file_path = file_path
+        self.upload_mode = upload_mode
+        self.sha256 = sha256
+        self.source = source
+        self.status = 'queued'
+        self.resume = False
+        self.submitted = datetime.now().isoformat(timespec='seconds')
+        self.started = ''
+        self.finished = ''
+        self.seconds = 0.0
+        self.rows = 0
+        self.message = ''
+
+    def __repr__(self) -> str:
+        return f"#{self.id} {self.table_name} <- {os.path.basename(self.file_path)}"
+
+    def to_dict(self) -> Dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ServiceJob':
+        job = cls(data['id'], data['table_name'], data['file_path'], data['sha256'], data.get('upload_mode'),
+                  data.get('source', 'socket'))
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(job, field, data[field])
+        return job
+
+
+class JobQueue:
+    """
+    Jobs of the service in submission order, saved to a JSON file after every change
+
+    A file is uploaded at most once per table: submitting content (by SHA-256)
+    that is queued, running or already uploaded to the same table returns the
+    existing job instead, unless forced.
+    """
+
+    def __init__(self, path: str, max_history: int = MAX_HISTORY):
+        self.path = path
+        self.max_history = max_history
+        self.jobs: List[ServiceJob] = []
+        self.lock = threading.RLock()
+        self._ids = itertools.count(1)
+
+    def load(self) -> int:
+        """
+        Read the saved queue; jobs that were running when the service stopped are queued again
+
+        Returns:
+            Number of interrupted jobs re-queued (they resume from their upload checkpoint)
+        """
+        with self.lock:
+            if not os.path.exists(self.path):
+                return 0
+            with open(self.path, encoding='utf-8') as f:
+                self.jobs = [ServiceJob.from_dict(entry) for entry in json.load(f).get('jobs', [])]
+
+            interrupted = 0
+            for job in self.jobs:
+                if job.status == 'running':
+                    job.status = 'queued'
+                    job.resume = True
+                    job.message = 'interrupted by a service restart'
+                    interrupted += 1
+            self._ids = itertools.count(max((job.id for job in self.jobs), default=0) + 1)
+            self.save()
+            return interrupted
+
+    def save(self):
+        """Write the queue atomically, so a crash never leaves a half-written file"""
+        with self.lock:
+            finished = [job for job in self.jobs if job.status not in ACTIVE_STATES]
+            if len(finished) > self.max_history:
+                dropped = set(id(job) for job in finished[:len(finished) - self.max_history])
+                self.jobs = [job for job in self.jobs if id(job) not in dropped]
+
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'saved': datetime.now().isoformat(timespec='seconds'),
+                           'jobs': [job.to_dict() for job in self.jobs]}, f, indent=1)
+            os.replace(temp_path, self.path)
+
+    def find_duplicate(self, table_name: str, sha256: str) -> Optional[ServiceJob]:
+        with self.lock:
+            for job in self.jobs:
+                if job.table_name == table_name and job.sha256 == sha256 and job.status in ACTIVE_STATES + ('succeeded',):
+                    return job
+            return None
+
+    def add(self, table_name: str, file_path: str, sha256: str, upload_mode: Optional[str] = None,
+            source: str = 'socket', force: bool = False) -> Tuple[ServiceJob, bool]:
+        """
+        Queue a file unless the same content is already queued, running or uploaded to the table
+
+        Returns:
+            The new or existing job, and whether it is new
+        """
+        with self.lock:
+            duplicate = None if force else self.find_duplicate(table_name, sha256)
+            if duplicate:
+                return duplicate, False
+            job = ServiceJob(next(self._ids), table_name, file_path, sha256, upload_mode, source)
+            self.jobs.append(job)
+            self.save()
+            return job, True
+
+    def get(self, job_id: int) -> Optional[ServiceJob]:
+        with self.lock:
+            return next((job for job in self.jobs if job.id == job_id), None)
+
+    def update(self, job: ServiceJob, **fields):
+        with self.lock:
+            for field, value in fields.items():
+                setattr(job, field, value)
+            self.save()
+
+    def runnable(self, dependencies: Dict[str, set], limit: int) -> List[ServiceJob]:
+        """
+        Queued jobs that may start now, oldest first
+
+        A job waits while a job of its own table or of a table its foreign keys
+        reference is running, or an earlier one is queued.
+        """
+        with self.lock:
+            ready = []
+            waiting = [job for job in self.jobs if job.status == 'running']
+            for job in self.jobs:
+                if job.status == 'queued':
+                    blocked = any(other.table_name == job.table_name
+                                  or other.table_name in dependencies.get(job.table_name, ())
+                                  for other in waiting)
+                    if not blocked and len(ready) < limit:
+                        ready.append(job)
+                    waiting.append(job)
+            return ready
+
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            counts = {}
+            for job in self.jobs:
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+
+class DropFolderWatcher(threading.Thread):
+    """
+    Hand every upload file that appears in the drop folder to the service
+
+    Uses inotify (the optional inotify_simple package) where available and
+    otherwise scans the folder every poll interval, taking a file once its size
+    and modification time stop changing between two scans.
+    """
+
+    def __init__(self, service: 'UploadService', drop_dir: str, poll_interval: float, use_inotify: Optional[bool] = None):
+        super().__init__(name='drop-folder-watcher', daemon=True)
+        self.service = service
+        self.drop_dir = drop_dir
+        self.poll_interval = poll_interval
+        if use_inotify is None:
+            use_inotify = sys.platform.startswith('linux') and importlib.util.find_spec('inotify_simple') is not None
+        self.use_inotify = use_inotify
+        self.stopping = threading.Event()
+        self._seen: Dict[str, Tuple[int, float]] = {}
+
+    def candidates(self) -> List[str]:
+        """Upload files directly in the drop folder (not in its sub-folders, not Office lock files)"""
+        names = []
+        with os.scandir(self.drop_dir) as entries:
+            for entry in entries:
+                if (entry.is_file() and entry.name.lower().endswith(job_scheduler.UPLOAD_FILE_TYPES)
+                        and not entry.name.startswith('~$')):
+                    names.append(entry.name)
+        return sorted(names)
+
+    def scan(self, require_stable: bool = True):
+        """Take the files that are complete; with require_stable, only those unchanged since the last scan"""
+        current = {}
+        for name in self.candidates():
+            try:
+                stat = os.stat(os.path.join(self.drop_dir, name))
+            except OSError:
+                continue
+            current[name] = (stat.st_size, stat.st_mtime)
+            if not require_stable or self._seen.get(name) == current[name]:
+                self.service.take_dropped_file(name)
+                current.pop(name)
+        self._seen = current
+
+    def run(self):
+        # Files dropped while the service was down
+        self.scan(require_stable=False)
+        if self.use_inotify:
+            self._watch_inotify()
+        else:
+            while not self.stopping.wait(self.poll_interval):
+                self._scan_safely()
+
+    def _watch_inotify(self):
+        from inotify_simple import INotify, flags
+
+        with INotify() as inotify:
+            inotify.add_watch(self.drop_dir, flags.CLOSE_WRITE | flags.MOVED_TO)
+            while not self.stopping.is_set():
+                for event in inotify.read(timeout=1000):
+                    if (event.name.lower().endswith(job_scheduler.UPLOAD_FILE_TYPES)
+                            and not event.name.startswith('~$')):
+                        self._take_safely(event.name)
+
+    def _scan_safely(self):
+        try:
+            self.scan()
+        except Exception as e:
+            self.service.logger.error(f"Drop folder scan failed: {str(e)}")
+
+    def _take_safely(self, name: str):
+        try:
+            self.service.take_dropped_file(name)
+        except Exception as e:
+            self.service.logger.error(f"Could not take {name} from the drop folder: {str(e)}")
+
+    def stop(self):
+        self.stopping.set()
+
+
+def service_address(service_dir: str, port: int):
+    """UNIX socket path in the service directory, or a localhost TCP address where UNIX sockets are unavailable"""
+    if hasattr(socket, 'AF_UNIX'):
+        return os.path.abspath(os.path.join(service_dir, 'upload_service.sock'))
+    return ('127.0.0.1', port)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """One JSON request line in, one JSON response line out"""
+
+    def handle(self):
+        line = self.rfile.readline(MAX_REQUEST_BYTES)
+        try:
+            response = self.server.service.handle_request(json.loads(line))
+        except Exception as e:
+            response = {'ok': False, 'error': str(e)}
+        self.wfile.write((json.dumps(response, default=str) + '\n').encode('utf-8'))
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class _TcpServer(socketserver.ThreadingTCPServer):
+    # No address reuse: a second service must fail to bind
+    daemon_threads = True
+
+
+class UploadService:
+    """Long-running uploader: a job queue, a bounded worker pool, a drop folder watcher and a socket server"""
+
+    def __init__(self, service_dir: Optional[str] = None, drop_dir: Optional[str] = None, workers: Optional[int] = None,
+                 poll_interval: Optional[float] = None, stream: bool = False, port: Optional[int] = None,
+                 use_inotify: Optional[bool] = None):
+        """
+        Initialize the service
+
+        Args:
+            service_dir: Holds the job queue file and the socket; defaults to UPLOAD_CONFIG['service_dir']
+            drop_dir: Folder watched for new files (None or '' for socket submissions only)
+            workers: Most uploads running at the same time; defaults to UPLOAD_CONFIG['service_workers']
+            poll_interval: Seconds between drop folder scans when inotify is not used
+            stream: Read files in fixed-size chunks (see ExcelUploader.process_file)
+            port: Localhost TCP port used instead of a UNIX socket where those are unavailable
+            use_inotify: Watch with inotify (False: always poll, e.g. for network shares; None: when available)
+        """
+        self.service_dir = service_dir or UPLOAD_CONFIG['service_dir']
+        self.drop_dir = drop_dir if drop_dir is not None else UPLOAD_CONFIG['service_drop_dir']
+        self.workers = max(1, workers or UPLOAD_CONFIG['service_workers'])
+        self.poll_interval = poll_interval or UPLOAD_CONFIG['service_poll_interval']
+        self.stream = stream
+        self.use_inotify = use_inotify
+        self.address = service_address(self.service_dir, port or UPLOAD_CONFIG['service_port'])
+        self.queue = JobQueue(os.path.join(self.service_dir, 'queue.json'))
+
+        os.makedirs('logs', exist_ok=True)
+        self.logger = get_upload_logger('upload_service',
+                                        f"logs/upload_service_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log",
+                                        UPLOAD_CONFIG['log_level'])
+        self.pool = None
+        self.server = None
+        self.watcher = None
+        self.executor = None
+        self.dependencies: Dict[str, set] = {}
+        self.started = time.monotonic()
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._dispatcher = None
+
+    def start(self):
+        """
+        Load the saved queue, warm the upload stack and start serving
+
+        Raises:
+            RuntimeError: If another service already listens on the socket
+        """
+        os.makedirs(self.service_dir, exist_ok=True)
+        self.server = self._bind()
+
+        interrupted = self.queue.load()
+        if interrupted:
+            self.logger.info(f"Re-queued {interrupted} jobs interrupted by the last shutdown")
+
+        # Pay for pandas, the upload modules and the first connections once, not per file
+        start_time = time.perf_counter()
+        self.dependencies = workbook_upload.table_dependencies(TABLE_MAPPINGS)
+        uploader.ExcelUploader  # noqa: B018 - loads the upload stack
+        options = dict(POOL_CONFIG, max_size=max(POOL_CONFIG['max_size'], self.workers + 1))
+        self.pool = db_access.get_pool(db_access.connection_string(DB_CONFIG), **options)
+        try:
+            self.pool.warm()
+        except Exception as e:
+            # Jobs connect on demand, so the service still starts while the database is down
+            self.logger.warning(f"Could not open the initial database connections: {str(e)}")
+        self.logger.info(f"Upload stack ready in {time.perf_counter() - start_time:.1f}s")
+
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='upload-service')
+        self._dispatcher = threading.Thread(target=self._dispatch, name='upload-dispatcher', daemon=True)
+        self._dispatcher.start()
+
+        if self.drop_dir:
+            for subdir in DROP_SUBDIRS:
+                os.makedirs(os.path.join(self.drop_dir, subdir), exist_ok=True)
+            self.watcher = DropFolderWatcher(self, self.drop_dir, self.poll_interval, self.use_inotify)
+            self.watcher.start()
+            self.logger.info(f"Watching {os.path.abspath(self.drop_dir)} "
+                             f"({'inotify' if self.watcher.use_inotify else f'polling every {self.poll_interval:g}s'})")
+
+        self.logger.info(f"Listening on {self.address} with {self.workers} workers")
+
+    def _bind(self) -> socketserver.BaseServer:
+        if isinstance(self.address, tuple):
+            server = _TcpServer(self.address, _RequestHandler, bind_and_activate=False)
+            try:
+                server.server_bind()
+                server.server_activate()
+            except OSError:
+                server.server_close()
+                raise RuntimeError(f"Another upload service is listening on {self.address}")
+        else:
+            if os.path.exists(self.address):
+                # A live service answers; a stale socket from a crash is removed
+                try:
+                    send_request({'command': 'ping'}, self.address, timeout=2)
+                    raise RuntimeError(f"Another upload service is listening on {self.address}")
+                except (ConnectionError, socket.timeout, FileNotFoundError):
+                    os.remove(self.address)
+            server = _UnixServer(self.address, _RequestHandler)
+            os.chmod(self.address, 0o660)
+        server.service = self
+        return server
+
+    def serve_forever(self):
+        """Answer socket requests until stop() is called"""
+        self.server.serve_forever(poll_interval=0.5)
+
+    def stop(self):
+        """Stop taking jobs, let the running uploads finish, then release everything"""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        self.logger.info("Stopping: waiting for running uploads to finish")
+        if self.watcher:
+            self.watcher.stop()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        if self._dispatcher:
+            self._dispatcher.join()
+        if self.executor:
+            self.executor.shutdown(wait=True)
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            if not isinstance(self.address, tuple) and os.path.exists(self.address):
+                os.remove(self.address)
+        if self.pool:
+            self.logger.info(f"Connection pool: {self.pool.describe()}")
+            self.pool.close()
+        self.queue.save()
+
+    def wake(self):
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _dispatch(self):
+        """Start queued jobs as workers and their table dependencies allow"""
+        while not self._stopping.is_set():
+            running = self.queue.counts().get('running', 0)
+            for job in self.queue.runnable(self.dependencies, self.workers - running):
+                try:
+                    self.queue.update(job, status='running', started=datetime.now().isoformat(timespec='seconds'))
+                    self.executor.submit(self._run_job, job)
+                except Exception as e:
+                    # An unwritable queue file must not end the dispatcher thread
+                    self.logger.error(f"Could not start job {job!r}: {str(e)}")
+                    self._fail_job(job, f"could not start: {str(e)}")
+            with self._wakeup:
+                self._wakeup.wait(1.0)
+
+    def _run_job(self, job: ServiceJob):
+        print(f"{Fore.CYAN}Starting job {job!r}{Style.RESET_ALL}")
+        start_time = time.perf_counter()
+        rows = 0
+        try:
+            if not os.path.exists(job.file_path):
+                success, message = False, 'file not found'
+            else:
+                excel_uploader = uploader.ExcelUploader(job.table_name, upload_mode=job.upload_mode, pool=self.pool)
+                success = excel_uploader.process_file(job.file_path, stream=self.stream, resume=job.resume)
+                rows = sum(excel_uploader.upload_counts.values())
+                message = (excel_uploader.describe_upload_counts() if success
+                           else 'upload failed (see the uploader log)')
+        except Exception as e:
+            success, message = False, str(e)
+
+        # Errors past this point would otherwise vanish into the unread Future, with the job left running
+        try:
+            file_path = job.file_path
+            if job.source == 'watch':
+                file_path = self._file_away(job.file_path, 'done' if success else 'failed')
+            self.queue.update(job, status='succeeded' if success else 'failed', file_path=file_path, rows=rows,
+                              message=message, finished=datetime.now().isoformat(timespec='seconds'),
+                              seconds=round(time.perf_counter() - start_time, 3))
+            log = self.logger.info if success else self.logger.error
+            log(f"Job {job!r} {job.status} in {job.seconds:.1f}s: {message}")
+        except Exception as e:
+            self.logger.error(f"Could not record the result of job {job!r}: {str(e)}")
+            # update() sets the fields before saving, so a failed save still ends the job
+            if job.status == 'running':
+                self._fail_job(job, f"{message}; could not record the result: {str(e)}")
+        finally:
+            self.wake()
+
+    def _fail_job(self, job: ServiceJob, message: str):
+        """Mark a job failed; the job ends even when the queue file cannot be written"""
+        try:
+            self.queue.update(job, status='failed', message=message,
+                              finished=datetime.now().isoformat(timespec='seconds'))
+        except Exception as e:
+            self.logger.error(f"Could not save the job queue: {str(e)}")
+
+    def _file_away(self, file_path: str, subdir: str) -> str:
+        """Move a drop folder file into one of its sub-folders, keeping names unique"""
+        target_dir = os.path.join(self.drop_dir, subdir)
+        name, extension = os.path.splitext(os.path.basename(file_path))
+        target = os.path.join(target_dir, name + extension)
+        number = 1
+        while os.path.exists(target):
+            number += 1
+            target = os.path.join(target_dir, f"{name}_{number}{extension}")
+        try:
+            shutil.move(file_path, target)
+            return target
+        except OSError as e:
+            self.logger.warning(f"Could not move {file_path} to {target_dir}: {str(e)}")
+            return file_path
+
+    def take_dropped_file(self, name: str):
+        """Queue a file from the drop folder for the table it is named after"""
+        file_path = os.path.join(self.drop_dir, name)
+        if not os.path.exists(file_path):
+            return
+        table_name = job_scheduler.table_for_file(name)
+        if table_name is None:
+            self.logger.warning(f"Skipping {name}: its name does not start with a table name")
+            self._file_away(file_path, 'failed')
+            return
+
+        sha256 = parse_cache.file_sha256(file_path)
+        duplicate = self.queue.find_duplicate(table_name, sha256)
+        if duplicate:
+            self.logger.info(f"Skipping {name}: same content as job {duplicate!r} ({duplicate.status})")
+            self._file_away(file_path, 'duplicates')
+            return
+
+        # Out of the drop folder before queuing, so it can never be picked up twice
+        file_path = self._file_away(file_path, 'processing')
+        job, _ = self.queue.add(table_name, file_path, sha256, source='watch')
+        self.logger.info(f"Queued job {job!r} from the drop folder")
+        self.wake()
+
+    def handle_request(self, request: Dict) -> Dict:
+        """Answer one client request (see send_request)"""
+        command = request.get('command')
+
+        if command == 'ping':
+            return {'ok': True, 'workers': self.workers, 'jobs': self.queue.counts(),
+                    'uptime_seconds': round(time.monotonic() - self.started, 1),
+                    'pool': self.pool.describe() if self.pool else ''}
+
+        if command == 'submit':
+            if self._stopping.is_set():
+                return {'ok': False, 'error': 'the service is stopping'}
+            table_name = request.get('table_name')
+            file_path = request.get('file') or ''
+            upload_mode = request.get('mode') or None
+            if table_name not in TABLE_MAPPINGS:
+                return {'ok': False, 'error': f"Unknown table: {table_name} (available: {', '.join(TABLE_MAPPINGS)})"}
+            if upload_mode and upload_mode not in uploader.UPLOAD_MODES:
+                return {'ok': False, 'error': f"Unknown upload mode: {upload_mode}"}
+            if not os.path.isabs(file_path) or not os.path.isfile(file_path):
+                return {'ok': False, 'error': f"File not found (an absolute path is required): {file_path}"}
+
+            job, created = self.queue.add(table_name, file_path, parse_cache.file_sha256(file_path), upload_mode,
+                                          force=bool(request.get('force')))
+            if created:
+                self.logger.info(f"Queued job {job!r} from a client")
+                self.wake()
+            return {'ok': True, 'job': job.to_dict(), 'duplicate': not created}
+
+        if command in ('status', 'cancel'):
+            job = self.queue.get(int(request.get('job_id', 0)))
+            if job is None:
+                return {'ok': False, 'error': f"No job {request.get('job_id')}"}
+            if command == 'cancel':
+                with self.queue.lock:
+                    if job.status != 'queued':
+                        return {'ok': False, 'error': f"Job #{job.id} is {job.status}; only queued jobs can be cancelled"}
+                    self.queue.update(job, status='cancelled', finished=datetime.now().isoformat(timespec='seconds'))
+            return {'ok': True, 'job': job.to_dict()}
+
+        if command == 'list':
+            with self.queue.lock:
+                jobs = [job.to_dict() for job in self.queue.jobs
+                        if request.get('all') or job.status in ACTIVE_STATES]
+            return {'ok': True, 'jobs': jobs}
+
+        if command == 'stop':
+            threading.Thread(target=self.stop, name='upload-service-stop').start()
+            return {'ok': True}
+
+        return {'ok': False, 'error': f"Unknown command: {command}"}
+
+
+def send_request(request: Dict, address=None, timeout: float = 30) -> Dict:
+    """
+    Send one request to a running service and return its response
+
+    Raises:
+        ConnectionError: If no service is listening
+    """
+    if address is None:
+        address = service_address(UPLOAD_CONFIG['service_dir'], UPLOAD_CONFIG['service_port'])
+    family = socket.AF_INET if isinstance(address, tuple) else socket.AF_UNIX
+    with socket.socket(family, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        try:
+            client.connect(address)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise ConnectionError(f"No upload service is listening on {address}") from e
+        client.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        response = client.makefile('rb').readline()
+    if not response:
+        raise ConnectionError("The upload service closed the connection without answering")
+    return json.loads(response)
+
+
+def print_jobs(jobs: List[Dict]):
+    colors = {'succeeded': Fore.GREEN, 'failed': Fore.RED, 'running': Fore.CYAN, 'cancelled': Fore.YELLOW}
+    print(f"{'#':>5}  {'Table':<26} {'File':<40} {'Status':<10} {'Seconds':>8} {'Rows':>9}  Details")
+    for job in jobs:
+        color = colors.get(job['status'], '')
+        print(f"{job['id']:>5}  {job['table_name']:<26} {os.path.basename(job['file_path'])[:40]:<40} "
+              f"{color}{job['status']:<10}{Style.RESET_ALL} {job['seconds']:>8.1f} {job['rows']:>9}  {job['message']}")
+
+
+def run_service(args):
+    service = UploadService(drop_dir=args.drop_dir, workers=args.workers, poll_interval=args.poll_interval,
+                            stream=args.stream, use_inotify=False if args.poll else None)
+    service.start()
+
+    def request_stop(signum, frame):
+        # serve_forever runs on this thread, so shut down from another one
+        threading.Thread(target=service.stop, name='upload-service-stop').start()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        service.stop()
+
+
+def main():
+    """Main function to run the upload service or talk to it"""
+    parser = argparse.ArgumentParser(description='Resident Model Registry upload service and its client')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='Run the service')
+    serve.add_argument('--drop-dir', default=None, help='Folder to watch for new files (default: SERVICE_DROP_DIR)')
+    serve.add_argument('--workers', type=int, default=None, help='Most uploads at the same time (default: SERVICE_WORKERS)')
+    serve.add_argument('--poll-interval', type=float, default=None,
+                       help='Seconds between drop folder scans without inotify (default: SERVICE_POLL_INTERVAL)')
+    serve.add_argument('--poll', action='store_true',
+                       help='Scan the drop folder instead of using inotify (needed for network shares)')
+    serve.add_argument('--stream', action='store_true', help='Read each file in fixed-size chunks with bounded memory')
+
+    submit = commands.add_parser('submit', help='Queue a file for a table')
+    submit.add_argument('table_name', help='Table to upload to (e.g., model_type)')
+    submit.add_argument('excel_file', help='Path to the file')
+    submit.add_argument('--upsert', action='store_true', help='Insert new rows and update changed rows')
+    submit.add_argument('--force', action='store_true', help='Queue even if the same content was already uploaded')
+    submit.add_argument('--wait', action='store_true', help='Wait for the upload and exit with its result')
+
+    status = commands.add_parser('status', help='Show one job')
+    status.add_argument('job_id', type=int)
+    cancel = commands.add_parser('cancel', help='Cancel a queued job')
+    cancel.add_argument('job_id', type=int)
+    jobs = commands.add_parser('list', help='Show queued and running jobs')
+    jobs.add_argument('--all', action='store_true', help='Include finished jobs')
+    commands.add_parser('ping', help='Check that the service is running')
+    commands.add_parser('stop', help='Stop the service after its running uploads finish')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'serve':
+            run_service(args)
+            sys.exit(0)
+
+        if args.command == 'submit':
+            response = send_request({'command': 'submit', 'table_name': args.table_name,
+                                     'file': os.path.abspath(args.excel_file),
+                                     'mode': 'upsert' if args.upsert else None, 'force': args.force})
+        elif args.command in ('status', 'cancel'):
+            response = send_request({'command': args.command, 'job_id': args.job_id})
+        elif args.command == 'list':
+            response = send_request({'command': 'list', 'all': args.all})
+        else:
+            response = send_request({'command': args.command})
+
+        if not response.get('ok'):
+            print(f"{Fore.RED}Error: {response.get('error')}{Style.RESET_ALL}")
+            sys.exit(1)
+
+        if args.command == 'submit':
+            job = response['job']
+            if response['duplicate']:
+                print(f"{Fore.YELLOW}Same content as job #{job['id']} ({job['status']}); not queued again "
+                      f"(use --force to upload it anyway){Style.RESET_ALL}")
+            else:
+                print(f"Queued job #{job['id']}")
+            while args.wait and job['status'] in ACTIVE_STATES:
+                time.sleep(1)
+                job = send_request({'command': 'status', 'job_id': job['id']})['job']
+            if args.wait:
+                print_jobs([job])
+                sys.exit(0 if job['status'] == 'succeeded' else 1)
+        elif args.command in ('status', 'cancel'):
+            print_jobs([response['job']])
+        elif args.command == 'list':
+            print_jobs(response['jobs'])
+        elif args.command == 'ping':
+            print(f"Upload service running for {response['uptime_seconds']:.0f}s with {response['workers']} workers; "
+                  f"jobs: {response['jobs']}; {response['pool']}")
+        sys.exit(0)
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1027 @@
+"""
+Excel Uploader for Model Registry
+Validates Excel data and uploads it to SQL Server; excel_upload.py is its command line
+"""
+import pandas as pd
+import logging
+import os
+import itertools
+import time
+import weakref
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
+from tqdm import tqdm
+from colorama import init, Fore, Style
+
+# Import configuration
+from config import DB_CONFIG, POOL_CONFIG, UPLOAD_CONFIG, TABLE_MAPPINGS
+from bulk_insert import BulkCallError, BulkInserter, frame_to_rows, sort_by_key
+from excel_stream import FIRST_DATA_ROW, DuplicateKeyTracker, clean_frame, describe_rows
+from parsers import select_parser
+from parse_cache import ParseCache
+from fk_index import ForeignKeyIndex, shared_fk_index
+from validation import REPORT_COLUMNS, get_validation_engine, summarize_report
+from upsert import MergeUpserter
+from batch_control import AdaptiveBatchSizer
+from row_hash import RowHashManifest, delete_keys, remove_manifest
+from backup import UploadBackup, prune_backups, restore_upload
+from checkpoint import UploadCheckpoint, open_checkpoint
+from pipeline import StagePipeline
+from parallel_insert import ParallelInserter, drop_stale_staging
+from transaction import SharedTransaction
+from db_access import ConnectionPool, connection_string, get_pool
+from metrics import UploadMetrics, frame_size
+from log_setup import close_upload_logger, get_upload_logger
+
+UPLOAD_MODES = ['insert', 'upsert', 'sync']
+
+# Initialize colorama for colored output
+init()
+
+class ExcelUploader:
+    """Main class for handling Excel file uploads to Model Registry database"""
+    
+    def __init__(self, table_name: str, parser_name: Optional[str] = None, use_cache: Optional[bool] = None,
+                 fk_index: Optional[ForeignKeyIndex] = None, upload_mode: Optional[str] = None,
+                 pool: Optional[ConnectionPool] = None, sync_delete: Optional[bool] = None,
+                 refresh_hashes: bool = False):
+        """
+        Initialize the uploader for a specific table
+        
+        Args:
+            table_name: Name of the table to upload to (e.g., 'model_type', 'feature_registry')
+            parser_name: Input parser backend (e.g., 'openpyxl', 'calamine'); defaults to UPLOAD_CONFIG['parser']
+            use_cache: Reuse parsed data from the parse cache; defaults to UPLOAD_CONFIG['parse_cache']
+            fk_index: Foreign key reference index; defaults to the index shared by all uploaders in the process
+            upload_mode: 'insert', 'upsert' (MERGE on the table's unique columns) or 'sync' (upsert of only the
+                rows whose hash differs from the last sync, see RowHashManifest); defaults to UPLOAD_CONFIG['upload_mode']
+            pool: Connection pool to borrow from; defaults to the process-wide pool for DB_CONFIG
+            sync_delete: In sync mode, delete the table's rows that are not in the file; defaults to UPLOAD_CONFIG['sync_delete']
+            refresh_hashes: In sync mode, rebuild the row hashes from the table instead of trusting the saved manifest
+        """
+        self.table_name = table_name
+        self.parser_name = parser_name or UPLOAD_CONFIG['parser']
+        self.upload_mode = upload_mode or UPLOAD_CONFIG['upload_mode']
+        self.table_config = TABLE_MAPPINGS.get(table_name)
+        
+        if not self.table_config:
+            raise ValueError(f"Unknown table: {table_name}")
+        if self.upload_mode not in UPLOAD_MODES:
+            raise ValueError(f"Unknown upload mode: {self.upload_mode} (available: {', '.join(UPLOAD_MODES)})")
+        
+        self.db_table = self.table_config['table_name']
+        self.required_columns = self.table_config['required_columns']
+        self.unique_columns = self.table_config['unique_columns']
+        self.identity_column = self.table_config['identity_column']
+        self.foreign_keys = self.table_config.get('foreign_keys', {})
+        self.nullable_keys = [col for col in self.unique_columns if col not in self.required_columns]
+        self.sync_delete = UPLOAD_CONFIG['sync_delete'] if sync_delete is None else sync_delete
+        self.refresh_hashes = refresh_hashes
+        
+        # Setup logging
+        self.setup_logging()
+        
+        # Cache of parsed files
+        if use_cache is None:
+            use_cache = UPLOAD_CONFIG['parse_cache']
+        self.parse_cache = create_parse_cache(self.logger) if use_cache else None
+        
+        # Referenced key sets, loaded once and reused across tables
+        self.fk_index = fk_index or shared_fk_index(UPLOAD_CONFIG['fk_cache_ttl'], UPLOAD_CONFIG['fk_index_max_keys'])
+        
+        # Validation rules compiled from TABLE_MAPPINGS and the template column specs
+        self.validator = get_validation_engine(table_name)
+        self.validation_report = pd.DataFrame(columns=REPORT_COLUMNS)
+        
+        # Row counts and backup manifest of the last upload
+        self.upload_counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        self.backup_manifest = None
+        self.rejected_rows = []
+        
+        # Row hashes of the table as of the last sync (sync mode only)
+        self.sync_manifest = None
+        
+        # Stage timings of the current upload (replaced by process_file)
+        self.metrics = UploadMetrics(table_name, upload_mode=self.upload_mode)
+        
+        # Database connection
+        self.pool = pool or get_pool(connection_string(DB_CONFIG), **POOL_CONFIG)
+        self.connection = None
+        
+    def setup_logging(self):
+        """Setup this uploader's logger: its own log file, written off the upload thread"""
+        log_dir = "logs"
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+        
+        json_lines = UPLOAD_CONFIG['log_format'] == 'json'
+        log_file = (f"{log_dir}/excel_upload_{self.table_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                    f"{'.jsonl' if json_lines else '.log'}")
+        
+        self.logger = get_upload_logger(f"excel_upload.{self.table_name}", log_file, UPLOAD_CONFIG['log_level'],
+                                        json_lines=json_lines, rate_limit=UPLOAD_CONFIG['log_rate_limit'])
+        # Close the log file once the uploader is gone
+        weakref.finalize(self, close_upload_logger, self.logger)
+        
+    def open_connection(self):
+        """Borrow a connection to the configured database from the pool (close() returns it)"""
+        return self.pool.acquire()
+    
+    def table_changed(self):
+        """Forget what is cached about the target table after writing to it outside a sync"""
+        # Later FK checks against this table must reload its keys
+        self.fk_index.invalidate(self.db_table)
+        if self.sync_manifest is None:
+            remove_manifest(UPLOAD_CONFIG['sync_manifest_dir'], DB_CONFIG['database'], self.db_table)
+    
+    def connect_database(self) -> bool:
+        """Establish database connection"""
+        try:
+            self.connection = self.open_connection()
+            self.logger.info(f"Connected to database: {DB_CONFIG['database']}")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Database connection failed: {str(e)}")
+            return False
+    
+    def read_excel_file(self, file_path: str) -> Optional[pd.DataFrame]:
+        """Read Excel file and return DataFrame"""
+        try:
+            parser = select_parser(file_path, self.parser_name)
+            
+            # Reuse a previous parse of the same content
+            cache_key = None
+            if self.parse_cache and self.parse_cache.enabled:
+                cache_key = self.parse_cache.make_key(file_path, 0, self.table_config, parser.name)
+                with self.metrics.stage('read'):
+                    df = self.parse_cache.get(cache_key)
+                if df is not None:
+                    self.metrics.add('read', rows=len(df), size=frame_size(df))
+                    self.logger.info(f"Loaded {len(df)} rows from parse cache for {file_path}")
+                    return df
+            
+            self.logger.info(f"Reading Excel file: {file_path} (parser: {parser.name})")
+            with self.metrics.stage('read', size=os.path.getsize(file_path)):
+                df = parser.read(file_path)
+            self.metrics.add('read', rows=len(df))
+            
+            # Index rows by their Excel row number
+            df.index = df.index + FIRST_DATA_ROW
+            
+            # Remove empty rows and strip whitespace from string columns
+            with self.metrics.stage('clean', rows=len(df), size=frame_size(df)):
+                df = clean_frame(df)
+            
+            if cache_key:
+                self.parse_cache.put(cache_key, df)
+            
+            self.logger.info(f"Loaded {len(df)} rows from Excel file")
+            return df
+            
+        except Exception as e:
+            self.logger.error(f"Error reading Excel file: {str(e)}")
+            return None
+    
+    def read_excel_chunks(self, file_path: str) -> Iterator[pd.DataFrame]:
+        """Read Excel file in fixed-size chunks with bounded memory"""
+        chunk_size = UPLOAD_CONFIG['stream_chunk_size']
+        parser = select_parser(file_path, self.parser_name, streaming=True)
+        self.logger.info(f"Streaming Excel file: {file_path} (parser: {parser.name}, chunks of {chunk_size} rows)")
+        self.metrics.add('read', size=os.path.getsize(file_path))
+        
+        # Streaming parsers clean each chunk as they read it, so 'read' includes cleaning here
+        chunks = parser.iter_chunks(file_path, chunk_size)
+        while True:
+            with self.metrics.stage('read'):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            self.metrics.add('read', rows=len(chunk))
+            self.logger.debug(f"Read chunk: {describe_rows(chunk)}")
+            yield chunk
+    
+    def validate_data(self, df: pd.DataFrame, connection=None) -> Tuple[bool, List[str]]:
+        """
+        Validate data before upload
+        
+        Row-level violations are collected in self.validation_report (row, column, rule, value)
+        and summarized as one error message per column and rule.
+        
+        Args:
+            connection: Connection for the foreign key checks (default: self.connection)
+        """
+        errors = []
+        
+        # Check required columns
+        missing_columns = self.validator.missing_columns(df)
+        if missing_columns:
+            errors.append(f"Missing required columns: {set(missing_columns)}")
+        
+        # Validate foreign keys
+        fk_masks = []
+        for fk_col, fk_ref in self.foreign_keys.items():
+            if fk_col in df.columns:
+                with self.metrics.stage('fk_check', rows=len(df)):
+                    fk_mask, fk_errors = self.validate_foreign_key(df, fk_col, fk_ref, connection)
+                errors.extend(fk_errors)
+                if fk_mask is not None:
+                    fk_masks.append((fk_col, 'foreign_key', fk_mask))
+        
+        # Required fields, types, lengths, dropdown options, JSON and unique key in one pass
+        with self.metrics.stage('validate', rows=len(df), size=frame_size(df)):
+            report = self.validator.validate(df, extra_masks=fk_masks)
+        if self.validation_report.empty:
+            self.validation_report = report
+        elif not report.empty:
+            self.validation_report = pd.concat([self.validation_report, report], ignore_index=True)
+        errors.extend(summarize_report(report))
+        
+        return len(errors) == 0, errors
+    
+    def validate_foreign_key(self, df: pd.DataFrame, fk_col: str, fk_ref: str,
+                             connection=None) -> Tuple[Optional[pd.Series], List[str]]:
+        """
+        Validate foreign key constraints
+        
+        Returns:
+            Mask of rows holding a value missing from the referenced table (None if the check failed), and errors
+        """
+        try:
+            # Check the whole column against the cached key set of the referenced table
+            invalid_values = self.fk_index.find_missing(connection or self.connection, df[fk_col], fk_ref)
+            return df[fk_col].isin(invalid_values), []
+                    
+        except Exception as e:
+            return None, [f"Error validating foreign key '{fk_col}': {str(e)}"]
+    
+    def write_validation_report(self) -> Optional[str]:
+        """Write the row-level validation report to a CSV file in the log directory"""
+        if self.validation_report.empty:
+            return None
+        
+        report_file = f"logs/validation_{self.table_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        self.validation_report.to_csv(report_file, index=False, encoding='utf-8')
+        self.logger.info(f"Wrote {len(self.validation_report)} validation errors to {report_file}")
+        return report_file
+    
+    def begin_backup(self) -> Optional[UploadBackup]:
+        """Create the backup for an upload (None if it failed)"""
+        try:
+            with self.metrics.stage('backup'):
+                backup = UploadBackup(self.connection, self.table_config, UPLOAD_CONFIG['backup_mode'],
+                                      UPLOAD_CONFIG['backup_dir'], self.logger)
+                backup.begin()
+            return backup
+            
+        except Exception as e:
+            self.logger.error(f"Backup failed: {str(e)}")
+            return None
+    
+    def finish_backup(self, backup: UploadBackup, uploaded_count: int):
+        """Write the undo manifest and prune old backups (the upload itself is already committed)"""
+        try:
+            with self.metrics.stage('backup'):
+                self.backup_manifest = backup.finish(uploaded_count)
+                prune_backups(self.connection, self.db_table, UPLOAD_CONFIG['backup_keep'],
+                              UPLOAD_CONFIG['backup_retention_days'], UPLOAD_CONFIG['backup_dir'], self.logger)
+            
+        except Exception as e:
+            self.logger.warning(f"Could not finish backup {backup.backup_table}: {str(e)}")
+    
+    def restore_upload(self, manifest_path: str) -> bool:
+        """Undo an earlier upload to this table from its backup manifest"""
+        if not self.connect_database():
+            return False
+        
+        try:
+            counts = restore_upload(self.connection, manifest_path, self.logger)
+            print(f"{Fore.GREEN}Restored {self.db_table}: {counts['deleted']} inserted rows deleted, "
+                  f"{counts['updated']} rows reverted, {counts['restored']} deleted rows put back{Style.RESET_ALL}")
+            self.sync_manifest = None
+            self.table_changed()
+            return True
+            
+        except Exception as e:
+            print(f"{Fore.RED}Restore failed: {str(e)}{Style.RESET_ALL}")
+            return False
+            
+        finally:
+            self.connection.close()
+    
+    def validate_stream(self, file_path: str) -> Tuple[bool, List[str], int]:
+        """Validate an Excel file chunk by chunk without loading it whole"""
+        errors = []
+        row_count = 0
+        key_tracker = DuplicateKeyTracker(self.unique_columns)
+        
+        try:
+            for chunk in self.read_excel_chunks(file_path):
+                row_count += len(chunk)
+                _, chunk_errors = self.validate_data(chunk)
+                
+                # Check unique keys against rows of earlier chunks
+                duplicates = key_tracker.check(chunk)
+                if duplicates:
+                    chunk_errors.append(f"Duplicate values found in unique columns: {self.unique_columns} ({duplicates} rows repeat earlier keys)")
+                
+                errors.extend(f"{describe_rows(chunk)}: {error}" for error in chunk_errors)
+                
+                if len(errors) >= UPLOAD_CONFIG['max_errors']:
+                    errors.append("Too many validation errors, stopped reading file")
+                    break
+                    
+        except Exception as e:
+            errors.append(f"Error reading Excel file: {str(e)}")
+        
+        self.logger.info(f"Validated {row_count} rows in streaming mode")
+        return len(errors) == 0, errors, row_count
+    
+    def prepare_upload_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Prepare data for upload: drop identity column, map booleans, order by unique key"""
+        with self.metrics.stage('encode', rows=len(df), size=frame_size(df)):
+            upload_df = df.copy()
+            
+            # Remove identity column if present
+            if self.identity_column in upload_df.columns:
+                upload_df = upload_df.drop(columns=[self.identity_column])
+            
+            # Handle boolean columns
+            for col in self.validator.boolean_columns:
+                if col in upload_df.columns:
+                    upload_df[col] = upload_df[col].map({True: 1, False: 0, 'True': 1, 'False': 0, 1: 1, 0: 0})
+            
+            # Order rows by the unique key before sending
+            return sort_by_key(upload_df, self.unique_columns)
+    
+    def upload_data(self, df: pd.DataFrame, checkpoint: Optional[UploadCheckpoint] = None) -> Tuple[bool, int, List[str]]:
+        """Upload data to database"""
+        return self.upload_chunks([df], total_rows=len(df), checkpoint=checkpoint)
+    
+    def upload_chunks(self, chunks: Iterable[pd.DataFrame], total_rows: Optional[int] = None,
+                      checkpoint: Optional[UploadCheckpoint] = None,
+                      prepared: bool = False) -> Tuple[bool, int, List[str]]:
+        """
+        Upload a sequence of DataFrame chunks, committing after every batch
+        
+        In upsert mode each batch is merged on the unique columns instead of inserted;
+        sync mode merges only the rows that are new or changed since the last sync
+        and optionally deletes the rows the file no longer has (see sync_rows).
+        Per-row outcomes are counted in self.upload_counts. A batch the database
+        rejects is bisected until only the failing rows are left out; those are
+        collected in self.rejected_rows. Batch sizes adapt to the measured batch
+        latency (see AdaptiveBatchSizer).
+        
+        Args:
+            checkpoint: Skip rows an earlier run already handled and record each commit
+            prepared: The chunks already went through prepare_upload_frame
+        """
+        errors = []
+        uploaded_count = 0
+        self.upload_counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        self.rejected_rows = []
+        upserter = None
+        backup = None
+        self.backup_manifest = None
+        self.sync_manifest = None
+        # Deletes need every row of the file; resumed runs skip some
+        all_rows_seen = True
+        # Inserts and MERGEs of a table settle on different sizes
+        batch_sizer = AdaptiveBatchSizer(
+            f"{DB_CONFIG['database']}.{self.db_table}:{'insert' if self.upload_mode == 'insert' else 'merge'}",
+            UPLOAD_CONFIG, self.logger)
+        
+        try:
+            # Create backup
+            if UPLOAD_CONFIG['backup_before_upload']:
+                backup = self.begin_backup()
+                if backup is None:
+                    return False, 0, ["Backup failed"]
+            
+            batch_number = 0
+            inserter = None
+            
+            with tqdm(total=total_rows, desc=f"Uploading to {self.db_table}") as pbar:
+                for chunk in chunks:
+                    if checkpoint:
+                        skipped = len(chunk)
+                        chunk = checkpoint.pending(chunk)
+                        pbar.update(skipped - len(chunk))
+                        all_rows_seen = all_rows_seen and len(chunk) == skipped
+                        if chunk.empty:
+                            continue
+                    
+                    upload_df = chunk if prepared else self.prepare_upload_frame(chunk)
+                    columns = list(upload_df.columns)
+                    
+                    if self.upload_mode == 'sync':
+                        upload_df = self.sync_rows(upload_df, checkpoint)
+                        pbar.update(len(chunk) - len(upload_df))
+                        if upload_df.empty:
+                            continue
+                    
+                    use_bulk = UPLOAD_CONFIG['insert_mode'] == 'bulk'
+                    if self.upload_mode in ('upsert', 'sync'):
+                        if upserter is None or upserter.columns != columns:
+                            if upserter:
+                                upserter.drop_staging()
+                            upserter = MergeUpserter(
+                                self.connection, self.db_table, columns, self.unique_columns, self.logger,
+                                use_bulk=use_bulk,
+                                nullable_keys=self.nullable_keys,
+                                output_ids=backup.output_ids if backup else None)
+                            # Created (and committed) now, not inside the first batch after its backup copy
+                            upserter.create_staging()
+                    elif inserter is None or inserter.columns != columns:
+                        inserter = BulkInserter(self.connection, self.db_table, columns, self.logger, use_bulk=use_bulk,
+                                                output_ids=backup.output_ids if backup else None)
+                    writer = upserter or inserter
+                    
+                    # Upload in batches, sized from the latency of the ones before
+                    batch_sizer.observe_chunk(upload_df)
+                    position = 0
+                    while position < len(upload_df):
+                        batch_df = upload_df.iloc[position:position + batch_sizer.size]
+                        position += len(batch_df)
+                        batch_number += 1
+                        rejected_before = len(self.rejected_rows)
+                        batch_start = time.perf_counter()
+                        
+                        try:
+                            uploaded_count += self.upload_batch(batch_df, writer, backup, batch_number, checkpoint)
+                            pbar.update(len(batch_df))
+                            batch_sizer.record(len(batch_df), time.perf_counter() - batch_start,
+                                               len(self.rejected_rows) - rejected_before)
+                            
+                        except Exception as e:
+                            errors.append(f"Batch {batch_number} failed: {str(e)}")
+                            
+                            if len(errors) + len(self.rejected_rows) >= UPLOAD_CONFIG['max_errors']:
+                                break
+                    
+                    if len(errors) + len(self.rejected_rows) >= UPLOAD_CONFIG['max_errors']:
+                        break
+            
+            if upserter:
+                upserter.drop_staging()
+            
+            errors.extend(f"Row {row} rejected: {error}" for row, error, _ in self.rejected_rows)
+            if self.sync_manifest and not errors:
+                if all_rows_seen:
+                    errors.extend(self.sync_missing_rows(backup))
+                else:
+                    self.logger.info("Resumed sync: rows missing from the file are not looked for")
+            
+            if backup:
+                self.finish_backup(backup, uploaded_count + self.upload_counts.get('deleted', 0))
+            success = len(errors) == 0
+            self.logger.info(f"Upload completed: {uploaded_count} rows uploaded, {len(errors)} errors "
+                             f"({self.describe_upload_counts()})")
+            
+            if uploaded_count or self.upload_counts.get('deleted'):
+                self.table_changed()
+            
+            return success, uploaded_count, errors
+            
+        except Exception as e:
+            self.logger.error(f"Upload failed: {str(e)}")
+            if backup:
+                self.finish_backup(backup, uploaded_count + self.upload_counts.get('deleted', 0))
+            if uploaded_count or self.upload_counts.get('deleted'):
+                self.table_changed()
+            return False, uploaded_count, [str(e)]
+            
+        finally:
+            if self.sync_manifest:
+                self.save_sync_manifest()
+            self.metrics.batch_sizing = batch_sizer.summary()
+            batch_sizer.save()
+    
+    def sync_rows(self, upload_df: pd.DataFrame, checkpoint: Optional[UploadCheckpoint] = None) -> pd.DataFrame:
+        """
+        Keep only the prepared rows that are new or changed since the last sync
+        
+        The row hashes come from the manifest of the last sync, or from one bulk read
+        of the table when there is none (or refresh_hashes is set). Unchanged rows
+        are counted as such and recorded as handled in the checkpoint.
+        """
+        with self.metrics.stage('diff', rows=len(upload_df)):
+            if self.sync_manifest is None:
+                self.sync_manifest = RowHashManifest(UPLOAD_CONFIG['sync_manifest_dir'], DB_CONFIG['server'],
+                                                     DB_CONFIG['database'], self.db_table, self.unique_columns,
+                                                     self.logger)
+                self.upload_counts['deleted'] = 0
+                value_columns = [col for col in upload_df.columns if col not in self.unique_columns]
+                if self.refresh_hashes or not self.sync_manifest.load(value_columns):
+                    self.sync_manifest.rebuild(self.connection, value_columns)
+            
+            send_df, unchanged_df = self.sync_manifest.split(upload_df)
+        
+        self.upload_counts['unchanged'] += len(unchanged_df)
+        if checkpoint and not unchanged_df.empty:
+            checkpoint.record_committed(unchanged_df.index)
+        return send_df
+    
+    def sync_missing_rows(self, backup: Optional[UploadBackup]) -> List[str]:
+        """
+        List the table's rows that the synced file no longer has, and delete them if sync_delete is set
+        
+        Returns:
+            Errors of failed deletes
+        """
+        missing = self.sync_manifest.missing_keys()
+        if not missing:
+            return []
+        
+        missing_file = f"logs/sync_missing_{self.table_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        pd.DataFrame(missing, columns=self.unique_columns).to_csv(missing_file, index=False, encoding='utf-8')
+        if not self.sync_delete:
+            self.logger.info(f"{len(missing)} rows of {self.db_table} are not in the file (listed in {missing_file}; "
+                             f"not deleted)")
+            return []
+        
+        batch_size = UPLOAD_CONFIG['batch_size']
+        for i in range(0, len(missing), batch_size):
+            keys = missing[i:i + batch_size]
+            try:
+                # Deleted rows go to the backup too, so a restore brings them back
+                if backup:
+                    with self.metrics.stage('backup', rows=len(keys)):
+                        backup.save_batch(pd.DataFrame(keys, columns=self.unique_columns))
+                with self.metrics.stage('insert', rows=len(keys)):
+                    delete_keys(self.connection, self.db_table, self.unique_columns, keys, self.nullable_keys)
+                with self.metrics.stage('commit', rows=len(keys)):
+                    self.connection.commit()
+            except Exception as e:
+                self.connection.rollback()
+                return [f"Deleting rows missing from the file failed: {str(e)} (listed in {missing_file})"]
+            self.sync_manifest.record_deleted(keys)
+            self.upload_counts['deleted'] += len(keys)
+        
+        self.logger.info(f"Deleted {self.upload_counts['deleted']} rows of {self.db_table} missing from the file "
+                         f"(listed in {missing_file})")
+        return []
+    
+    def save_sync_manifest(self):
+        try:
+            self.sync_manifest.save()
+        except Exception as e:
+            # The next sync rebuilds the hashes from the table
+            self.logger.warning(f"Could not save row hashes: {str(e)}")
+            remove_manifest(UPLOAD_CONFIG['sync_manifest_dir'], DB_CONFIG['database'], self.db_table)
+    
+    def write_batch(self, batch_df: pd.DataFrame, writer, backup: Optional[UploadBackup],
+                    batch_number: int) -> Dict[str, int]:
+        """
+        Write one batch in the open transaction, after backing up the rows it overwrites
+        
+        Raises:
+            BulkCallError: The writer's bulk call failed; the caller rolls back, which also
+                undoes the backup copy, and writes the batch again
+        """
+        with self.metrics.stage('encode'):
+            rows = frame_to_rows(batch_df, writer.columns)
+        
+        # Save the rows this batch overwrites, in the same transaction
+        if backup:
+            with self.metrics.stage('backup', rows=len(rows)):
+                backup.save_batch(batch_df)
+        
+        with self.metrics.stage('insert', rows=len(rows), size=frame_size(batch_df)):
+            if isinstance(writer, MergeUpserter):
+                return writer.upsert_batch(rows, batch_number)
+            writer.insert_batch(rows, batch_number)
+        return {'inserted': len(rows)}
+    
+    def write_with_fallback(self, batch_df: pd.DataFrame, writer, backup: Optional[UploadBackup],
+                            batch_number: int) -> Dict[str, int]:
+        """
+        Write one batch, writing it again on the per-row path if the bulk call fails
+        
+        The rollback before the retry also undoes the backup of the batch, so the
+        retry saves the backup again together with the rows. If the per-row retry
+        succeeds the failure came from the driver rather than the data, and bulk
+        mode is switched off for the rest of the run.
+        """
+        try:
+            return self.write_batch(batch_df, writer, backup, batch_number)
+        except BulkCallError as e:
+            self.connection.rollback()
+            self.logger.warning(f"Bulk write of batch {batch_number} failed, retrying row by row: {str(e)}")
+        
+        writer.use_bulk = False
+        try:
+            batch_counts = self.write_batch(batch_df, writer, backup, batch_number)
+        except Exception:
+            writer.use_bulk = True
+            raise
+        
+        self.logger.warning(f"Bulk writes not usable for {self.db_table}; continuing row by row")
+        return batch_counts
+    
+    def upload_batch(self, batch_df: pd.DataFrame, writer, backup: Optional[UploadBackup], batch_number: int,
+                     checkpoint: Optional[UploadCheckpoint] = None, fallback: bool = True) -> int:
+        """
+        Write and commit one batch; if the database rejects it, split it in half and retry each half
+        
+        Splitting continues down to single rows, so only the failing rows are left out
+        (added to self.rejected_rows) and all others are committed.
+        
+        Returns:
+            Number of rows committed
+        
+        Raises:
+            Exception: The batch's error, once max_errors rows have been rejected
+        """
+        start_time = time.perf_counter()
+        try:
+            if fallback and writer.use_bulk:
+                batch_counts = self.write_with_fallback(batch_df, writer, backup, batch_number)
+            else:
+                batch_counts = self.write_batch(batch_df, writer, backup, batch_number)
+            with self.metrics.stage('commit', rows=len(batch_df)):
+                self.connection.commit()
+            self.metrics.record_batch(time.perf_counter() - start_time, len(batch_df))
+            
+        except Exception as e:
+            self.connection.rollback()
+            if len(self.rejected_rows) >= UPLOAD_CONFIG['max_errors']:
+                raise
+            
+            if len(batch_df) == 1:
+                row = batch_df.index[0]
+                self.rejected_rows.append((row, str(e), batch_df))
+                self.logger.warning(f"Row {row} rejected: {str(e)}")
+                if checkpoint:
+                    checkpoint.record_rejected([row])
+                return 0
+            
+            self.logger.info(f"Batch {batch_number} failed ({len(batch_df)} rows); splitting to isolate bad rows")
+            middle = len(batch_df) // 2
+            # Bulk mode was already checked on the full batch, so halves skip the row-by-row fallback
+            return sum(self.upload_batch(half, writer, backup, batch_number, checkpoint, fallback=False)
+                       for half in (batch_df.iloc[:middle], batch_df.iloc[middle:]))
+        
+        for outcome, count in batch_counts.items():
+            self.upload_counts[outcome] += count
+        if checkpoint:
+            checkpoint.record_committed(batch_df.index)
+        if self.sync_manifest:
+            self.sync_manifest.record_committed(batch_df.index)
+        return len(batch_df)
+    
+    def upload_pipelined(self, file_path: str, checkpoint: Optional[UploadCheckpoint] = None,
+                         transactional: bool = True) -> Tuple[bool, int, List[str], int]:
+        """
+        Read, validate and upload a file in one pass, with the stages overlapped
+        
+        Chunks are read, validated and prepared on worker threads while the previous
+        chunk is inserted. Once a chunk fails validation no further chunks are uploaded,
+        but validation goes on so the report covers the whole file.
+        
+        Args:
+            checkpoint: Skip rows an earlier run already handled and record each commit
+            transactional: Run the upload in one transaction, committed only if every
+                row validated and was written (the same all-or-nothing outcome as --stream)
+        
+        Returns:
+            Success flag, uploaded row count, errors, and number of rows read
+        """
+        validation_errors = []
+        row_count = 0
+        key_tracker = DuplicateKeyTracker(self.unique_columns)
+        max_errors = UPLOAD_CONFIG['max_errors']
+        
+        # Foreign key checks run on their own connection, beside the inserts
+        validation_connection = self.open_connection()
+        
+        def validate_chunk(chunk: pd.DataFrame) -> Optional[pd.DataFrame]:
+            nonlocal row_count
+            row_count += len(chunk)
+            _, chunk_errors = self.validate_data(chunk, connection=validation_connection)
+            
+            # Check unique keys against rows of earlier chunks
+            duplicates = key_tracker.check(chunk)
+            if duplicates:
+                chunk_errors.append(f"Duplicate values found in unique columns: {self.unique_columns} ({duplicates} rows repeat earlier keys)")
+            
+            validation_errors.extend(f"{describe_rows(chunk)}: {error}" for error in chunk_errors)
+            return None if validation_errors else chunk
+        
+        def encode_chunk(chunk: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+            return None if chunk is None else self.prepare_upload_frame(chunk)
+        
+        pipeline = StagePipeline(self.read_excel_chunks(file_path),
+                                 [('validate', validate_chunk), ('encode', encode_chunk)],
+                                 UPLOAD_CONFIG['pipeline_queue_size'], self.logger)
+        
+        def valid_chunks() -> Iterator[pd.DataFrame]:
+            for chunk in pipeline:
+                if len(validation_errors) >= max_errors:
+                    validation_errors.append("Too many validation errors, stopped reading file")
+                    break
+                # Later chunks are still validated, but no longer uploaded
+                if chunk is not None and not validation_errors:
+                    yield chunk
+        
+        connection = self.connection
+        transaction = SharedTransaction(connection) if transactional else None
+        if transaction:
+            self.connection = transaction
+        start_time = time.perf_counter()
+        
+        try:
+            success, uploaded_count, upload_errors = self.upload_chunks(
+                valid_chunks(), checkpoint=checkpoint, prepared=True)
+        finally:
+            pipeline.stop()
+            validation_connection.close()
+            self.connection = connection
+        
+        self.logger.info(f"Pipelined upload of {row_count} rows in {time.perf_counter() - start_time:.1f}s "
+                         f"(stage busy time: {pipeline.describe_timings()})")
+        
+        errors = validation_errors + upload_errors
+        success = success and not validation_errors
+        
+        if transaction:
+            try:
+                if success:
+                    with self.metrics.stage('commit'):
+                        transaction.commit_all()
+                else:
+                    transaction.rollback_all()
+            except Exception as e:
+                errors.append(f"Transaction failed: {str(e)}")
+                success = False
+                transaction.rollback_all()
+            
+            if not success and uploaded_count:
+                # Nothing was kept; the key sets and undo manifest describe rows that no longer exist
+                self.table_changed()
+                if self.backup_manifest and os.path.exists(self.backup_manifest):
+                    os.remove(self.backup_manifest)
+                self.backup_manifest = None
+                self.upload_counts = {outcome: 0 for outcome in self.upload_counts}
+                errors.append(f"All {uploaded_count} uploaded rows were rolled back")
+                uploaded_count = 0
+        
+        return success, uploaded_count, errors, row_count
+    
+    def upload_parallel(self, chunks: Iterable[pd.DataFrame], workers: int) -> Tuple[bool, int, List[str]]:
+        """
+        Upload chunks over several connections, all or nothing
+        
+        Rows are split by a hash of the unique key and each worker loads its share into
+        its own staging table. Once every worker succeeded, the staging tables are applied
+        to the target in one transaction (see ParallelInserter); otherwise the target is
+        left untouched.
+        
+        Args:
+            workers: Number of connections loading in parallel
+        """
+        self.upload_counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        self.rejected_rows = []
+        self.backup_manifest = None
+        uploaded_count = 0
+        loader = None
+        backup = None
+        
+        # Workers borrow from the pool while this upload holds its own connection
+        if workers >= self.pool.max_size:
+            self.logger.warning(f"Reducing workers from {workers} to {max(1, self.pool.max_size - 1)}: "
+                                f"the connection pool holds at most {self.pool.max_size} connections")
+            workers = max(1, self.pool.max_size - 1)
+        
+        try:
+            frames = (self.prepare_upload_frame(chunk) for chunk in chunks)
+            first_frame = next(frames, None)
+            if first_frame is None:
+                return True, 0, []
+            
+            loader = ParallelInserter(self.open_connection, self.db_table, list(first_frame.columns),
+                                      self.unique_columns, workers, UPLOAD_CONFIG['batch_size'], self.logger,
+                                      use_bulk=UPLOAD_CONFIG['insert_mode'] == 'bulk')
+            # A killed run never drops its staging tables; the next parallel upload of the table does
+            try:
+                drop_stale_staging(self.connection, self.db_table, UPLOAD_CONFIG['staging_stale_hours'], self.logger)
+            except Exception as e:
+                self.connection.rollback()
+                self.logger.warning(f"Could not drop stale staging tables of {self.db_table}: {str(e)}")
+            loader.create_staging(self.connection)
+            loaded = loader.load(itertools.chain([first_frame], frames))
+            for stats in loader.stats:
+                self.metrics.record('insert', stats.seconds, rows=stats.rows)
+            if not loaded:
+                return False, 0, loader.errors()
+            
+            # Create backup
+            if UPLOAD_CONFIG['backup_before_upload']:
+                backup = self.begin_backup()
+                if backup is None:
+                    return False, 0, ["Backup failed"]
+            
+            # Apply all staging tables in one transaction
+            try:
+                if backup:
+                    with self.metrics.stage('backup', rows=loader.total_rows()):
+                        for stats in loader.stats:
+                            backup.save_staged(stats.staging_table)
+                with self.metrics.stage('insert'):
+                    counts = loader.apply(self.connection, upsert=self.upload_mode == 'upsert',
+                                          nullable_keys=self.nullable_keys,
+                                          output_ids=backup.output_ids if backup else None)
+                with self.metrics.stage('commit'):
+                    self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+            
+            uploaded_count = loader.total_rows()
+            self.upload_counts.update(counts)
+            self.logger.info(f"Upload completed: {uploaded_count} rows uploaded by {workers} workers "
+                             f"({self.describe_upload_counts()})")
+            return True, uploaded_count, []
+            
+        except Exception as e:
+            self.logger.error(f"Upload failed: {str(e)}")
+            return False, 0, [str(e)]
+            
+        finally:
+            if loader:
+                try:
+                    loader.drop_staging(self.connection)
+                except Exception as e:
+                    self.logger.warning(f"Could not drop staging tables of {self.db_table}: {str(e)}")
+            if backup:
+                self.finish_backup(backup, uploaded_count)
+            
+            # New keys were added to this table
+            if uploaded_count:
+                self.table_changed()
+    
+    def write_reject_file(self) -> Optional[str]:
+        """Write the rejected rows with their database errors to a CSV file in the log directory"""
+        if not self.rejected_rows:
+            return None
+        
+        rejects = pd.concat([frame.assign(REJECT_ERROR=error) for _, error, frame in self.rejected_rows])
+        rejects.index.name = 'EXCEL_ROW'
+        reject_file = f"logs/rejects_{self.table_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        rejects.to_csv(reject_file, encoding='utf-8')
+        self.logger.info(f"Wrote {len(rejects)} rejected rows to {reject_file}")
+        return reject_file
+    
+    def describe_upload_counts(self) -> str:
+        """Describe the row outcomes of the last upload (e.g., '10 inserted, 2 updated, 0 unchanged')"""
+        return ', '.join(f"{count} {outcome}" for outcome, count in self.upload_counts.items())
+    
+    def write_metrics(self, print_summary: Optional[bool] = None):
+        """Write the stage timings of the last upload to the metrics directory and optionally print them"""
+        if UPLOAD_CONFIG['metrics_format'] != 'none':
+            try:
+                for path in self.metrics.write(UPLOAD_CONFIG['metrics_dir'], UPLOAD_CONFIG['metrics_format']):
+                    self.logger.info(f"Wrote upload metrics to {path}")
+            except Exception as e:
+                self.logger.warning(f"Could not write upload metrics: {str(e)}")
+        
+        if UPLOAD_CONFIG['metrics_summary'] if print_summary is None else print_summary:
+            self.metrics.print_summary()
+    
+    def process_file(self, file_path: str, stream: bool = False, resume: bool = False,
+                     pipeline: bool = False, workers: int = 1, metrics_summary: Optional[bool] = None) -> bool:
+        """
+        Main method to process Excel file upload
+        
+        Args:
+            file_path: Path to the Excel file
+            stream: Read the file in fixed-size chunks (validated in a first pass,
+                uploaded in a second) instead of loading it whole
+            resume: Skip the rows an interrupted earlier run of the same file already committed or rejected
+            pipeline: Read, validate and upload the file in chunks in one pass, with the stages
+                running concurrently (see upload_pipelined)
+            workers: Insert over this many connections, all or nothing (see upload_parallel)
+            metrics_summary: Print the stage timings at the end; defaults to UPLOAD_CONFIG['metrics_summary']
+        """
+        self.metrics = UploadMetrics(self.table_name, file_path, self.upload_mode)
+        success = False
+        try:
+            success = self.upload_file(file_path, stream, resume, pipeline, workers)
+            return success
+        finally:
+            self.metrics.finish(success)
+            self.write_metrics(metrics_summary)
+    
+    def upload_file(self, file_path: str, stream: bool, resume: bool, pipeline: bool, workers: int) -> bool:
+        """Validate and upload one file (see process_file)"""
+        print(f"{Fore.CYAN}Processing {self.table_name} upload...{Style.RESET_ALL}")
+        
+        if self.upload_mode == 'sync' and (pipeline or workers > 1):
+            print(f"{Fore.RED}Sync mode cannot be combined with pipelined or parallel uploads{Style.RESET_ALL}")
+            return False
+        
+        # Connect to database
+        if not self.connect_database():
+            return False
+        
+        try:
+            if pipeline:
+                # Chunks are validated on a worker thread while earlier chunks are uploaded
+                is_valid, validation_errors = True, []
+            elif stream:
+                # Validate data chunk by chunk
+                print(f"{Fore.YELLOW}Validating data (streaming)...{Style.RESET_ALL}")
+                is_valid, validation_errors, row_count = self.validate_stream(file_path)
+            else:
+                # Read Excel file
+                df = self.read_excel_file(file_path)
+                if df is None:
+                    return False
+                
+                # Validate data
+                print(f"{Fore.YELLOW}Validating data...{Style.RESET_ALL}")
+                is_valid, validation_errors = self.validate_data(df)
+            
+            if not is_valid:
+                print(f"{Fore.RED}Validation failed:{Style.RESET_ALL}")
+                for error in validation_errors:
+                    print(f"  - {error}")
+                report_file = self.write_validation_report()
+                if report_file:
+                    print(f"Row-level error report: {report_file}")
+                return False
+            
+            if not pipeline:
+                print(f"{Fore.GREEN}Data validation passed{Style.RESET_ALL}")
+            
+            # Record progress so an interrupted upload can be resumed (transactional pipelined
+            # and parallel uploads commit nothing before their end, so they never need to)
+            transactional = pipeline and UPLOAD_CONFIG['pipeline_transaction']
+            checkpoint = None
+            if not transactional and workers == 1:
+                checkpoint = open_checkpoint(UPLOAD_CONFIG['checkpoint_dir'], file_path, self.table_name,
+                                             self.upload_mode, resume)
+                if resume and checkpoint.handled_count():
+                    print(f"Resuming: {checkpoint.handled_count()} rows were already handled by an earlier run")
+            
+            # Upload data
+            if pipeline:
+                print(f"{Fore.YELLOW}Validating and uploading data (pipelined)...{Style.RESET_ALL}")
+                success, uploaded_count, upload_errors, row_count = self.upload_pipelined(
+                    file_path, checkpoint=checkpoint, transactional=transactional)
+            elif workers > 1:
+                print(f"{Fore.YELLOW}Uploading data ({workers} workers)...{Style.RESET_ALL}")
+                if not stream:
+                    row_count = len(df)
+                success, uploaded_count, upload_errors = self.upload_parallel(
+                    self.read_excel_chunks(file_path) if stream else [df], workers)
+            elif stream:
+                print(f"{Fore.YELLOW}Uploading data...{Style.RESET_ALL}")
+                success, uploaded_count, upload_errors = self.upload_chunks(
+                    self.read_excel_chunks(file_path), total_rows=row_count, checkpoint=checkpoint)
+            else:
+                print(f"{Fore.YELLOW}Uploading data...{Style.RESET_ALL}")
+                row_count = len(df)
+                success, uploaded_count, upload_errors = self.upload_data(df, checkpoint=checkpoint)
+            
+            # Every row was committed or rejected; nothing is left to resume
+            if checkpoint and checkpoint.handled_count() >= row_count:
+                checkpoint.remove()
+            
+            reject_file = self.write_reject_file()
+            
+            if success:
+                print(f"{Fore.GREEN}Upload successful: {uploaded_count} rows uploaded "
+                      f"({self.describe_upload_counts()}){Style.RESET_ALL}")
+                if self.backup_manifest:
+                    print(f"Undo with: python excel_upload.py {self.table_name} --restore {self.backup_manifest}")
+                return True
+            else:
+                print(f"{Fore.RED}Upload failed:{Style.RESET_ALL}")
+                for error in upload_errors:
+                    print(f"  - {error}")
+                if reject_file:
+                    print(f"Rejected rows ({len(self.rejected_rows)}): {reject_file}")
+                report_file = self.write_validation_report()
+                if report_file:
+                    print(f"Row-level error report: {report_file}")
+                if checkpoint and checkpoint.exists():
+                    print(f"Resume with: python excel_upload.py {self.table_name} {file_path} --resume")
+                return False
+                
+        finally:
+            if self.parse_cache and self.parse_cache.enabled:
+                self.logger.info(f"Parse cache: {self.parse_cache.hits} hits, {self.parse_cache.misses} misses")
+            if self.connection:
+                self.connection.close()
+
+def create_parse_cache(logger: Optional[logging.Logger] = None) -> ParseCache:
+    """Create the parse cache configured in UPLOAD_CONFIG"""
+    return ParseCache(UPLOAD_CONFIG['cache_dir'], UPLOAD_CONFIG['cache_max_mb'] * 1024 * 1024, logger)
+
+def print_cache_stats():
+    """Print cumulative parse cache statistics"""
+    stats = create_parse_cache().summary()
+    print(f"Parse cache: {UPLOAD_CONFIG['cache_dir']}")
+    print(f"  Entries: {stats['entries']} ({stats['size_mb']:.1f} MB of {stats['max_mb']:.0f} MB)")
+    print(f"  Hits: {stats['hits']}, misses: {stats['misses']} (hit rate {stats['hit_rate']:.0%})")
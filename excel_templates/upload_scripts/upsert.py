@@ -0,0 +1,198 @@
+"""
+MERGE upsert engine for Model Registry upload scripts
+Loads each batch into a session temp table and applies it with one set-based MERGE on the unique key
+"""
+import logging
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from bulk_insert import BulkCallError, BulkInserter
+
+STAGING_TABLE = '#UPLOAD_STAGE'
+
+
+class MergeUpserter:
+    """Insert new rows and update changed rows of one table, keyed by its unique columns"""
+
+    def __init__(self, connection, table_name: str, columns: Sequence[str], key_columns: Sequence[str],
+                 logger: Optional[logging.Logger] = None, use_bulk: bool = True,
+                 nullable_keys: Sequence[str] = (), staging_table: str = STAGING_TABLE,
+                 output_ids: Optional[Tuple[str, str]] = None):
+        """
+        Initialize the upserter for a specific table
+
+        Args:
+            connection: Open pyodbc connection; commits are left to the caller
+            table_name: Database table to merge into (e.g., 'MODEL_REGISTRY')
+            columns: Column names, in the order used by the row tuples
+            key_columns: Columns identifying a row (the table's unique_columns)
+            use_bulk: Load the staging table with one parameter-array call per batch
+            nullable_keys: Key columns that may be NULL; only these get a NULL-safe match,
+                so the join on the other key columns can still seek the unique index
+            staging_table: Table the rows are merged from; another table than the session
+                temp table must already exist and be filled (see merge_staged)
+            output_ids: (identity column, table) to record the identities of the inserted rows in,
+                in the same transaction (see UploadBackup.output_ids)
+        """
+        missing_keys = [col for col in key_columns if col not in columns]
+        if missing_keys:
+            raise ValueError(f"Upsert needs the unique key columns in the data: {missing_keys}")
+
+        self.connection = connection
+        self.table_name = table_name
+        self.columns = list(columns)
+        self.key_columns = list(key_columns)
+        self.nullable_keys = [col for col in nullable_keys if col in self.key_columns]
+        self.logger = logger or logging.getLogger(__name__)
+        self.staging_table = staging_table
+        self.output_ids = output_ids
+        self.stager = BulkInserter(connection, staging_table, self.columns, self.logger, use_bulk=use_bulk)
+        self.staging_created = False
+        self.merge_query = self._build_merge_query()
+
+    def _build_merge_query(self) -> str:
+        """Build the MERGE batch; it returns (inserted, updated) and leaves the staging table empty"""
+        # Nullable keys match NULL to NULL, like the table's unique index does
+        match = ' AND '.join(
+            f"(target.{col} = source.{col} OR (target.{col} IS NULL AND source.{col} IS NULL))"
+            if col in self.nullable_keys else f"target.{col} = source.{col}"
+            for col in self.key_columns
+        )
+        value_columns = [col for col in self.columns if col not in self.key_columns]
+
+        update_clause = ''
+        if value_columns:
+            # EXCEPT compares NULLs as equal, so unchanged rows are not rewritten
+            source_values = ', '.join(f"source.{col}" for col in value_columns)
+            target_values = ', '.join(f"target.{col}" for col in value_columns)
+            assignments = ', '.join(f"{col} = source.{col}" for col in value_columns)
+            update_clause = (
+                f"WHEN MATCHED AND EXISTS (SELECT {source_values} EXCEPT SELECT {target_values}) "
+                f"THEN UPDATE SET {assignments} "
+            )
+
+        # A MERGE has one OUTPUT ... INTO, so inserted identities go through the actions table
+        output = "OUTPUT $action INTO @merge_actions (ACTION); "
+        record_ids = ''
+        if self.output_ids:
+            identity_column, ids_table = self.output_ids
+            output = f"OUTPUT $action, INSERTED.{identity_column} INTO @merge_actions (ACTION, ID); "
+            record_ids = (f"INSERT INTO {ids_table} ({identity_column}) "
+                          "SELECT ID FROM @merge_actions WHERE ACTION = 'INSERT'; ")
+
+        column_list = ', '.join(self.columns)
+        source_list = ', '.join(f"source.{col}" for col in self.columns)
+        return (
+            "SET NOCOUNT ON; "
+            "DECLARE @merge_actions TABLE (ACTION NVARCHAR(10), ID BIGINT); "
+            f"MERGE INTO {self.table_name} WITH (HOLDLOCK) AS target "
+            f"USING {self.staging_table} AS source ON {match} "
+            f"{update_clause}"
+            f"WHEN NOT MATCHED BY TARGET THEN INSERT ({column_list}) VALUES ({source_list}) "
+            f"{output}"
+            f"{record_ids}"
+            f"TRUNCATE TABLE {self.staging_table}; "
+            "SELECT ISNULL(SUM(CASE WHEN ACTION = 'INSERT' THEN 1 ELSE 0 END), 0), "
+            "ISNULL(SUM(CASE WHEN ACTION = 'UPDATE' THEN 1 ELSE 0 END), 0) FROM @merge_actions;"
+        )
+
+    @property
+    def use_bulk(self) -> bool:
+        return self.stager.use_bulk
+
+    @use_bulk.setter
+    def use_bulk(self, value: bool):
+        self.stager.use_bulk = value
+
+    def merge_staged(self, staged_rows: int) -> Dict[str, int]:
+        """
+        Merge the filled staging table into the target table without committing
+
+        Args:
+            staged_rows: Number of rows in the staging table
+
+        Returns:
+            Counts of inserted, updated and unchanged rows
+        """
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(self.merge_query)
+            inserted, updated = cursor.fetchone()
+        finally:
+            cursor.close()
+
+        return {'inserted': inserted, 'updated': updated, 'unchanged': staged_rows - inserted - updated}
+
+    def create_staging(self):
+        """
+        Create the empty staging table with the target's column types
+
+        It is committed at once: a temp table created inside a transaction is
+        dropped again if that transaction rolls back. Callers that write more
+        than the batch in its transaction (such as a backup copy) create it
+        before the first batch, as upsert_batch would otherwise commit that work.
+        """
+        if self.staging_created:
+            return
+
+        column_list = ', '.join(self.columns)
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.staging_table}")
+            # UNION ALL keeps the column types but drops any IDENTITY property
+            cursor.execute(
+                f"SELECT TOP 0 {column_list} INTO {self.staging_table} FROM {self.table_name} "
+                f"UNION ALL SELECT TOP 0 {column_list} FROM {self.table_name}"
+            )
+        finally:
+            cursor.close()
+        self.connection.commit()
+        self.staging_created = True
+
+    def drop_staging(self):
+        """Drop the staging table (it is also dropped when the connection closes)"""
+        if not self.staging_created:
+            return
+
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.staging_table}")
+        finally:
+            cursor.close()
+        self.connection.commit()
+        self.staging_created = False
+
+    def upsert_batch(self, rows: List[tuple], batch_number: int = 1) -> Dict[str, int]:
+        """
+        Stage one batch and merge it into the target table without committing
+
+        Returns:
+            Counts of inserted, updated and unchanged rows in the batch
+
+        Raises:
+            BulkCallError: The staging call failed in bulk mode; nothing is rolled back, so the
+                caller rolls back and can redo the batch with use_bulk = False
+        """
+        if not rows:
+            return {'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+        self.create_staging()
+        start_time = time.perf_counter()
+
+        # The staging table is empty at every commit, so a rolled-back batch leaves nothing behind
+        if self.stager.use_bulk:
+            try:
+                self.stager.insert_bulk(rows)
+            except Exception as e:
+                raise BulkCallError(str(e)) from e
+        else:
+            self.stager.insert_row_by_row(rows)
+
+        counts = self.merge_staged(len(rows))
+
+        elapsed = time.perf_counter() - start_time
+        self.logger.info(
+            f"Batch {batch_number}: {len(rows)} rows merged into {self.table_name} in {elapsed:.3f}s "
+            f"({counts['inserted']} inserted, {counts['updated']} updated, {counts['unchanged']} unchanged)"
+        )
+        return counts
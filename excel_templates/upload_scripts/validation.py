@@ -0,0 +1,207 @@
+"""
+Validation engine for Model Registry upload scripts
+Compiles per-table rules from TABLE_MAPPINGS and TEMPLATE_CONFIGS once and checks them with vectorized masks
+"""
+import json
+import warnings
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+import metadata_bundle
+from config import TABLE_MAPPINGS
+
+# Column types used when a table has no template config (or the template omits a column)
+DEFAULT_COLUMN_TYPES = {
+    'EFF_DATE': 'date', 'EXP_DATE': 'date', 'VALIDATION_DATE': 'date',
+    'CREATED_DATE': 'date', 'UPDATED_DATE': 'date',
+    'IS_ACTIVE': 'boolean', 'IS_PII': 'boolean', 'IS_SENSITIVE': 'boolean',
+    'PRIORITY': 'number', 'TYPE_ID': 'number', 'MODEL_ID': 'number', 'FEATURE_ID': 'number'
+}
+
+BOOLEAN_VALUES = [True, False, 1, 0, '1', '0', 'True', 'False']
+
+REPORT_COLUMNS = ['row', 'column', 'rule', 'value']
+
+# Rows listed per rule in validation messages
+MAX_ROWS_IN_MESSAGE = 10
+
+
+def load_template_configs() -> Dict:
+    """Load TEMPLATE_CONFIGS of create_templates.py (one directory above the upload scripts) from the metadata bundle"""
+    return metadata_bundle.load_template_configs()
+
+
+def compile_rules(table_name: str, template_configs: Optional[Dict] = None) -> Dict[str, Dict]:
+    """
+    Build the column rules for one table
+
+    Returns:
+        Mapping of column name to rule spec with keys: type, required, max_length, options, json
+        (json is False for non-JSON columns, otherwise the required kind: 'object', 'array' or None)
+    """
+    table_config = TABLE_MAPPINGS[table_name]
+    if template_configs is None:
+        template_configs = load_template_configs()
+
+    rules = {}
+
+    def rule_for(column: str) -> Dict:
+        if column not in rules:
+            rules[column] = {
+                'type': DEFAULT_COLUMN_TYPES.get(column),
+                'required': False,
+                'max_length': None,
+                'options': None,
+                'json': False
+            }
+        return rules[column]
+
+    for col_config in template_configs.get(table_name, {}).get('columns', []):
+        rule = rule_for(col_config['name'])
+        col_type = col_config.get('type')
+        if col_type == 'dropdown':
+            rule['options'] = list(col_config.get('options', []))
+        elif col_type in ('date', 'number', 'boolean'):
+            rule['type'] = col_type
+        rule['required'] = rule['required'] or col_config.get('required', False)
+        rule['max_length'] = col_config.get('max_length')
+
+    for column in table_config['required_columns']:
+        rule_for(column)['required'] = True
+
+    for column in table_config.get('foreign_keys', {}):
+        rule_for(column)['type'] = 'number'
+
+    for column, kind in table_config.get('json_columns', {}).items():
+        rule_for(column)['json'] = kind
+
+    return rules
+
+
+def _is_json(value, kind: Optional[str]) -> bool:
+    """Check that a cell holds JSON, optionally of a given kind ('object' or 'array')"""
+    if not isinstance(value, str):
+        return False
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return False
+    if kind == 'object':
+        return isinstance(parsed, dict)
+    if kind == 'array':
+        return isinstance(parsed, list)
+    return True
+
+
+class ValidationEngine:
+    """Row-level validation of one table's data against its compiled rules"""
+
+    def __init__(self, table_name: str, template_configs: Optional[Dict] = None):
+        self.table_name = table_name
+        self.table_config = TABLE_MAPPINGS[table_name]
+        self.unique_columns = list(self.table_config['unique_columns'])
+        self.rules = compile_rules(table_name, template_configs)
+
+    @property
+    def boolean_columns(self) -> List[str]:
+        """Columns whose rule type is boolean"""
+        return [column for column, rule in self.rules.items() if rule['type'] == 'boolean']
+
+    def missing_columns(self, df: pd.DataFrame) -> List[str]:
+        """Required columns absent from the sheet"""
+        return [col for col in self.table_config['required_columns'] if col not in df.columns]
+
+    def rule_masks(self, df: pd.DataFrame) -> List[Tuple[str, str, pd.Series]]:
+        """Evaluate every rule as a boolean mask over the rows (True = violation)"""
+        masks = []
+
+        for column, rule in self.rules.items():
+            if column not in df.columns:
+                continue
+            series = df[column]
+            present = series.notna()
+
+            if rule['required']:
+                masks.append((column, 'required', ~present))
+
+            if rule['type'] == 'date' and not pd.api.types.is_datetime64_any_dtype(series):
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    parsed = pd.to_datetime(series, errors='coerce')
+                masks.append((column, 'date', present & parsed.isna()))
+
+            elif rule['type'] == 'number' and not pd.api.types.is_numeric_dtype(series):
+                masks.append((column, 'number', present & pd.to_numeric(series, errors='coerce').isna()))
+
+            elif rule['type'] == 'boolean':
+                masks.append((column, 'boolean', present & ~series.isin(BOOLEAN_VALUES)))
+
+            if rule['options']:
+                masks.append((column, 'options', present & ~series.isin(rule['options'])))
+
+            if rule['max_length']:
+                lengths = series.astype('string').str.len()
+                masks.append((column, 'max_length', present & (lengths > rule['max_length']).fillna(False)))
+
+            if rule['json'] is not False:
+                # Parse each distinct value once; JSON columns repeat heavily across rows
+                distinct_values = series[present].unique()
+                invalid_values = [value for value in distinct_values if not _is_json(value, rule['json'])]
+                masks.append((column, 'json', present & series.isin(invalid_values)))
+
+        if self.unique_columns and all(col in df.columns for col in self.unique_columns):
+            masks.append((', '.join(self.unique_columns), 'unique',
+                          df.duplicated(subset=self.unique_columns, keep=False)))
+
+        return masks
+
+    def validate(self, df: pd.DataFrame,
+                 extra_masks: Sequence[Tuple[str, str, pd.Series]] = ()) -> pd.DataFrame:
+        """
+        Run all rules and return a row-level error report
+
+        Args:
+            df: Data indexed by Excel row number
+            extra_masks: Additional (column, rule, mask) checks, e.g., foreign keys
+
+        Returns:
+            DataFrame with one row per violation: row, column, rule, value
+        """
+        reports = []
+        for column, rule, mask in list(self.rule_masks(df)) + list(extra_masks):
+            if not mask.any():
+                continue
+            value_column = column if column in df.columns else None
+            rows = df.index[mask.to_numpy()]
+            reports.append(pd.DataFrame({
+                'row': rows,
+                'column': column,
+                'rule': rule,
+                'value': df.loc[rows, value_column].to_numpy() if value_column else None
+            }))
+
+        if not reports:
+            return pd.DataFrame(columns=REPORT_COLUMNS)
+        return pd.concat(reports, ignore_index=True).sort_values(['row', 'column'], kind='mergesort')
+
+
+_engines: Dict[str, ValidationEngine] = {}
+
+
+def get_validation_engine(table_name: str) -> ValidationEngine:
+    """Return the compiled engine for a table, compiling its rules on first use"""
+    if table_name not in _engines:
+        _engines[table_name] = ValidationEngine(table_name)
+    return _engines[table_name]
+
+
+def summarize_report(report: pd.DataFrame) -> List[str]:
+    """Turn a row-level error report into one message per column and rule"""
+    messages = []
+    for (column, rule), group in report.groupby(['column', 'rule'], sort=False):
+        rows = group['row'].tolist()
+        shown = ', '.join(str(row) for row in rows[:MAX_ROWS_IN_MESSAGE])
+        more = f" and {len(rows) - MAX_ROWS_IN_MESSAGE} more" if len(rows) > MAX_ROWS_IN_MESSAGE else ""
+        messages.append(f"Column '{column}' failed rule '{rule}' in {len(rows)} rows (rows {shown}{more})")
+    return messages
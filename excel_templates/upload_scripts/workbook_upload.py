@@ -0,0 +1,325 @@
+"""
+Workbook Upload Script for Model Registry
+Loads a workbook with one sheet per table into all registry tables, in foreign key order and in one transaction
+"""
+import argparse
+import logging
+import os
+import sys
+from typing import Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+from colorama import init, Fore, Style
+
+from config import TABLE_MAPPINGS, UPLOAD_CONFIG
+from excel_stream import FIRST_DATA_ROW, clean_frame
+from uploader import ExcelUploader
+from fk_index import parse_reference
+from parsers import PARSER_BACKENDS, select_parser
+from transaction import SharedTransaction
+
+# Initialize colorama for colored output
+init()
+
+# Rows listed per unresolved natural key message
+MAX_ROWS_IN_MESSAGE = 10
+
+
+def table_key_for(db_table: str) -> Optional[str]:
+    """Find the TABLE_MAPPINGS key of a database table (e.g., 'MODEL_REGISTRY' -> 'model_registry')"""
+    for table_key, table_config in TABLE_MAPPINGS.items():
+        if table_config['table_name'].upper() == db_table.upper():
+            return table_key
+    return None
+
+
+def table_dependencies(table_mappings: Dict[str, Dict]) -> Dict[str, Set[str]]:
+    """Map each table to the other tables its foreign keys reference"""
+    dependencies = {}
+    for table_key, table_config in table_mappings.items():
+        referenced = {table_key_for(parse_reference(fk_ref)[0]) for fk_ref in table_config.get('foreign_keys', {}).values()}
+        dependencies[table_key] = {ref for ref in referenced if ref and ref != table_key}
+    return dependencies
+
+
+def dependency_order(table_mappings: Dict[str, Dict]) -> List[str]:
+    """
+    Order tables so each comes after the tables its foreign keys reference
+
+    Same wave-by-wave ordering as SchemaValidator.generate_dependency_order;
+    tables within a wave keep their TABLE_MAPPINGS order.
+
+    Raises:
+        ValueError: If the foreign keys form a cycle
+    """
+    dependencies = table_dependencies(table_mappings)
+
+    ordered_tables = []
+    remaining_tables = list(table_mappings)
+    while remaining_tables:
+        # Find tables with no dependencies on remaining tables
+        independent_tables = [table for table in remaining_tables
+                              if not dependencies[table] & set(remaining_tables)]
+        if not independent_tables:
+            raise ValueError(f"Circular dependency detected among tables: {', '.join(remaining_tables)}")
+
+        ordered_tables.extend(independent_tables)
+        remaining_tables = [table for table in remaining_tables if table not in independent_tables]
+
+    return ordered_tables
+
+
+def match_sheets(sheet_names: List[str]) -> Dict[str, str]:
+    """Map TABLE_MAPPINGS keys to sheets named after the key or the database table (case-insensitive)"""
+    matches = {}
+    for sheet_name in sheet_names:
+        normalized = sheet_name.strip().lower()
+        for table_key, table_config in TABLE_MAPPINGS.items():
+            if normalized in (table_key, table_config['table_name'].lower()):
+                matches[table_key] = sheet_name
+    return matches
+
+
+class NaturalKeyResolver:
+    """Fill foreign key columns from natural keys (e.g., TYPE_CODE -> TYPE_ID) of tables loaded earlier"""
+
+    def __init__(self, connection, logger: Optional[logging.Logger] = None):
+        self.connection = connection
+        self.logger = logger or logging.getLogger(__name__)
+        self.key_maps: Dict[str, pd.Series] = {}
+
+    def load(self, table_key: str):
+        """(Re)load a table's natural key -> identity map, including rows written earlier in the transaction"""
+        table_config = TABLE_MAPPINGS[table_key]
+        natural_key = table_config['natural_key']
+        identity_column = table_config['identity_column']
+
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"SELECT {identity_column}, {', '.join(natural_key)} FROM {table_config['table_name']}")
+            rows = [tuple(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+        frame = pd.DataFrame.from_records(rows, columns=[identity_column] + natural_key)
+        frame[natural_key] = frame[natural_key].astype(str)
+        key_map = frame.set_index(natural_key)[identity_column]
+        self.key_maps[table_key] = key_map[~key_map.index.duplicated()]
+        self.logger.info(f"Loaded {len(key_map)} natural keys of {table_config['table_name']}")
+
+    def resolve(self, df: pd.DataFrame, table_key: str) -> Tuple[pd.DataFrame, List[str]]:
+        """
+        Fill empty foreign key cells from the referenced table's natural key columns in the sheet
+
+        The natural key columns are dropped afterwards, since they are not columns of the table.
+
+        Returns:
+            The resolved DataFrame and errors for keys that match no row
+        """
+        table_config = TABLE_MAPPINGS[table_key]
+        errors = []
+        natural_key_columns = set()
+
+        for fk_col, fk_ref in table_config.get('foreign_keys', {}).items():
+            ref_key = table_key_for(parse_reference(fk_ref)[0])
+            natural_key = TABLE_MAPPINGS.get(ref_key, {}).get('natural_key')
+            if not natural_key or not all(col in df.columns for col in natural_key):
+                continue
+            natural_key_columns.update(natural_key)
+
+            if ref_key not in self.key_maps:
+                self.load(ref_key)
+            key_map = self.key_maps[ref_key]
+
+            needs_lookup = df[natural_key].notna().all(axis=1)
+            if fk_col in df.columns:
+                needs_lookup &= df[fk_col].isna()
+            if not needs_lookup.any():
+                continue
+
+            keys = df.loc[needs_lookup, natural_key].astype(str)
+            if len(natural_key) > 1:
+                positions = key_map.index.get_indexer(pd.MultiIndex.from_frame(keys))
+            else:
+                positions = key_map.index.get_indexer(keys[natural_key[0]])
+
+            resolved = pd.Series(key_map.to_numpy()[positions], index=keys.index).where(positions >= 0).astype('Int64')
+            df = df.copy()
+            if fk_col not in df.columns:
+                df[fk_col] = pd.Series(pd.NA, index=df.index, dtype='Int64')
+            df.loc[needs_lookup, fk_col] = resolved
+
+            unresolved_rows = keys.index[positions < 0].tolist()
+            if unresolved_rows:
+                shown = ', '.join(str(row) for row in unresolved_rows[:MAX_ROWS_IN_MESSAGE])
+                more = f" and {len(unresolved_rows) - MAX_ROWS_IN_MESSAGE} more" \
+                    if len(unresolved_rows) > MAX_ROWS_IN_MESSAGE else ""
+                errors.append(f"Columns {natural_key} match no {parse_reference(fk_ref)[0]} row "
+                              f"in {len(unresolved_rows)} rows (rows {shown}{more})")
+
+        own_columns = set(table_config.get('natural_key', [])) | set(table_config['unique_columns'])
+        drop_columns = [col for col in natural_key_columns if col not in own_columns]
+        return df.drop(columns=drop_columns), errors
+
+
+class WorkbookUploader:
+    """Upload every table sheet of one workbook in a single connection and transaction"""
+
+    def __init__(self, parser_name: Optional[str] = None, upload_mode: Optional[str] = None,
+                 tables: Optional[List[str]] = None):
+        """
+        Initialize the workbook uploader
+
+        Args:
+            parser_name: Input parser backend (must read multiple sheets); defaults to UPLOAD_CONFIG['parser']
+            upload_mode: 'insert' or 'upsert'; defaults to UPLOAD_CONFIG['upload_mode']
+            tables: Only load these TABLE_MAPPINGS keys (default: every sheet that matches a table)
+        """
+        unknown_tables = [table for table in tables or [] if table not in TABLE_MAPPINGS]
+        if unknown_tables:
+            raise ValueError(f"Unknown tables: {unknown_tables}")
+
+        self.parser_name = parser_name or UPLOAD_CONFIG['parser']
+        self.upload_mode = upload_mode
+        self.tables = tables
+        self.logger = logging.getLogger(__name__)
+        self.results: Dict[str, Dict[str, int]] = {}
+
+    def read_workbook(self, file_path: str) -> Dict[str, pd.DataFrame]:
+        """Read every table sheet in one parse, cleaned and indexed by Excel row number"""
+        parser = select_parser(file_path, self.parser_name, all_sheets=True)
+        self.logger.info(f"Reading workbook: {file_path} (parser: {parser.name})")
+        sheets = parser.read_sheets(file_path)
+
+        tables = {}
+        for table_key, sheet_name in match_sheets(list(sheets)).items():
+            if self.tables and table_key not in self.tables:
+                continue
+            df = sheets[sheet_name]
+            df.index = df.index + FIRST_DATA_ROW
+            tables[table_key] = clean_frame(df)
+            self.logger.info(f"Sheet '{sheet_name}': {len(tables[table_key])} rows for {table_key}")
+
+        return tables
+
+    def process_workbook(self, file_path: str) -> bool:
+        """Validate and upload all table sheets; any failure rolls back the whole workbook"""
+        print(f"{Fore.CYAN}Processing workbook {file_path}...{Style.RESET_ALL}")
+
+        uploaders: Dict[str, ExcelUploader] = {}
+        connection = None
+        transaction = None
+
+        try:
+            order = dependency_order(TABLE_MAPPINGS)
+            for table_key in order:
+                uploaders[table_key] = ExcelUploader(table_key, parser_name=self.parser_name, use_cache=False,
+                                                     upload_mode=self.upload_mode)
+
+            sheets = self.read_workbook(file_path)
+            order = [table_key for table_key in order if table_key in sheets]
+            if not order:
+                print(f"{Fore.RED}No sheet matches a table; name sheets after the tables: "
+                      f"{list(TABLE_MAPPINGS)}{Style.RESET_ALL}")
+                return False
+            print(f"Load order: {' -> '.join(order)}")
+
+            first_uploader = uploaders[order[0]]
+            if not first_uploader.connect_database():
+                return False
+            connection = first_uploader.connection
+            transaction = SharedTransaction(connection)
+            resolver = NaturalKeyResolver(transaction, self.logger)
+
+            for table_key in order:
+                uploader = uploaders[table_key]
+                uploader.connection = transaction
+
+                df, errors = resolver.resolve(sheets[table_key], table_key)
+                print(f"{Fore.YELLOW}Validating {table_key}...{Style.RESET_ALL}")
+                _, validation_errors = uploader.validate_data(df)
+                errors.extend(validation_errors)
+                if errors:
+                    print(f"{Fore.RED}Validation of {table_key} failed:{Style.RESET_ALL}")
+                    for error in errors:
+                        print(f"  - {error}")
+                    report_file = uploader.write_validation_report()
+                    if report_file:
+                        print(f"Row-level error report: {report_file}")
+                    self.rollback(transaction, uploaders)
+                    return False
+
+                print(f"{Fore.YELLOW}Uploading {table_key}...{Style.RESET_ALL}")
+                success, _, upload_errors = uploader.upload_data(df)
+                if not success:
+                    print(f"{Fore.RED}Upload of {table_key} failed:{Style.RESET_ALL}")
+                    for error in upload_errors:
+                        print(f"  - {error}")
+                    self.rollback(transaction, uploaders)
+                    return False
+                self.results[table_key] = dict(uploader.upload_counts)
+
+                # Later sheets can now refer to this table's new rows by natural key
+                if TABLE_MAPPINGS[table_key].get('natural_key'):
+                    resolver.load(table_key)
+
+            transaction.commit_all()
+
+            print(f"{Fore.GREEN}Workbook loaded:{Style.RESET_ALL}")
+            for table_key in self.results:
+                print(f"  - {table_key}: {uploaders[table_key].describe_upload_counts()}")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Workbook upload failed: {str(e)}")
+            print(f"{Fore.RED}Workbook upload failed: {str(e)}{Style.RESET_ALL}")
+            if transaction:
+                self.rollback(transaction, uploaders)
+            return False
+
+        finally:
+            if connection:
+                connection.close()
+
+    def rollback(self, transaction: SharedTransaction, uploaders: Dict[str, ExcelUploader]):
+        """Roll back the whole workbook and discard what the uploads recorded about it"""
+        transaction.rollback_all()
+        self.results = {}
+        for uploader in uploaders.values():
+            # Key sets and undo manifests may describe rows that no longer exist
+            uploader.fk_index.invalidate()
+            if uploader.backup_manifest and os.path.exists(uploader.backup_manifest):
+                os.remove(uploader.backup_manifest)
+        print(f"{Fore.RED}All changes from this workbook were rolled back{Style.RESET_ALL}")
+
+
+def main():
+    """Main function to run the workbook upload script"""
+    parser = argparse.ArgumentParser(description='Upload a multi-sheet workbook to all Model Registry tables')
+    parser.add_argument('workbook', help='Workbook with one sheet per table, named after the table (e.g., model_type)')
+    parser.add_argument('--tables', nargs='+', choices=list(TABLE_MAPPINGS), help='Only load these tables')
+    parser.add_argument('--upsert', action='store_true',
+                        help='Insert new rows and update changed rows matched on the unique columns')
+    parser.add_argument('--parser', choices=['auto'] + [name for name, backend in PARSER_BACKENDS.items()
+                                                        if backend.supports_sheets],
+                        default=None, help='Input parser backend (default: auto)')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.workbook):
+        print(f"Workbook not found: {args.workbook}")
+        sys.exit(1)
+
+    try:
+        uploader = WorkbookUploader(parser_name=args.parser, upload_mode='upsert' if args.upsert else None,
+                                    tables=args.tables)
+        success = uploader.process_workbook(args.workbook)
+        sys.exit(0 if success else 1)
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Deployment Script for Model Registry
+Runs the database scripts in waves of independent scripts over pooled connections, in dependency order
+"""
+
+import os
+import sys
+import argparse
+import getpass
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sql_parser import SqlSyntaxError, dependency_waves, find_sql_files, parse_directory, split_script
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'excel_templates' / 'upload_scripts'))
+
+# Directories of data scripts, deployed only with --include-data
+DATA_DIRS = ('sample_data',)
+
+
+class DeployScript:
+    """One script of a deployment, with the scripts it must run after"""
+
+    def __init__(self, file: str, path: Path, objects: List[str], depends_on: List[str]):
+        self.file = file
+        self.path = path
+        self.objects = objects
+        self.depends_on = depends_on
+        self.wave = 0
+        self.status = 'pending'
+        self.error: Optional[str] = None
+        self.batches = 0
+        self.seconds = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'file': self.file,
+            'wave': self.wave,
+            'objects': self.objects,
+            'depends_on': self.depends_on,
+            'status': self.status,
+            'error': self.error,
+            'batches': self.batches,
+            'seconds': round(self.seconds, 3)
+        }
+
+
+class SchemaDeployer:
+    """
+    Deploys the scripts under the schema path in waves
+
+    The scripts are ordered by the object graph of sql_parser: a script runs
+    after the scripts defining the objects it uses. Each wave holds the scripts
+    whose dependencies ran in earlier waves, and its scripts run at the same
+    time on up to jobs pooled connections. Scripts left in a dependency cycle
+    run one after another in a last wave.
+
+    A failed script stops the deployment after the scripts already running
+    (fail fast); with keep_going the scripts that do not depend on it still run.
+    Scripts depending on a failed script are skipped either way.
+    """
+
+    def __init__(self, schema_path: str, include_data: bool = False, jobs: int = 4, keep_going: bool = False):
+        self.schema_path = Path(schema_path)
+        self.include_data = include_data
+        self.jobs = max(1, jobs)
+        self.keep_going = keep_going
+        self.scripts: Dict[str, DeployScript] = {}
+        self.waves: List[List[DeployScript]] = []
+        self.cycle: List[DeployScript] = []
+        self.errors: List[str] = []
+        self.wave_seconds: List[float] = []
+        self.total_seconds = 0.0
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def build_plan(self):
+        """Parse the scripts and group them into waves"""
+        graph = parse_directory(str(self.schema_path))
+        self.errors.extend(graph.errors)
+        base = self.schema_path if self.schema_path.is_dir() else None
+        paths = {str(path.relative_to(base)) if base else path.name: path
+                 for path in find_sql_files(str(self.schema_path))}
+
+        selected = [file for file in graph.files
+                    if self.include_data or Path(file).parts[0] not in DATA_DIRS]
+        for file in selected:
+            objects = [f"{obj.kind} {obj.name}" for obj in graph.script_objects.get(file, [])]
+            # Data scripts left out of the deployment are not waited for
+            depends_on = sorted(set(graph.script_dependencies(file)) & set(selected))
+            self.scripts[file] = DeployScript(file, paths[file], objects, depends_on)
+
+        waves, cycle = dependency_waves({file: set(script.depends_on) for file, script in self.scripts.items()})
+        self.waves = [[self.scripts[file] for file in wave] for wave in waves]
+        self.cycle = [self.scripts[file] for file in cycle]
+        for number, wave in enumerate(self.waves + ([self.cycle] if self.cycle else []), 1):
+            for script in wave:
+                script.wave = number
+
+    def print_plan(self):
+        """Print the waves, the scripts in each and the objects they create"""
+        widest = max((len(wave) for wave in self.waves), default=0)
+        print(f"{len(self.scripts)} scripts in {len(self.waves) + bool(self.cycle)} waves "
+              f"(up to {widest} at once, {self.jobs} connections)")
+        for number, wave in enumerate(self.waves, 1):
+            print(f"\nWave {number} ({len(wave)} scripts)")
+            for script in wave:
+                print(f"  {script.file}" + (f"  [{', '.join(script.objects)}]" if script.objects else ""))
+        if self.cycle:
+            print(f"\nWave {len(self.waves) + 1} ({len(self.cycle)} scripts in a dependency cycle, one at a time)")
+            for script in self.cycle:
+                print(f"  {script.file}  (after {', '.join(script.depends_on)})")
+
+    def run_script(self, script: DeployScript, pool):
+        """Run the batches of one script on a pooled connection"""
+        with self._lock:
+            if self._stopped:
+                script.status = 'skipped'
+                script.error = 'Deployment stopped after a failure'
+                return
+        start = time.perf_counter()
+        try:
+            batches = split_script(script.path.read_text(encoding='utf-8-sig'))
+            connection = pool.acquire()
+            try:
+                cursor = connection.cursor()
+                try:
+                    for line, batch, count in batches:
+                        for _ in range(count):
+                            try:
+                                cursor.execute(batch)
+                                # Errors of later statements in the batch arrive with their result sets
+                                while cursor.nextset():
+                                    pass
+                            except Exception as e:
+                                raise RuntimeError(f"Batch starting on line {line}: {str(e)}")
+                        script.batches += 1
+                finally:
+                    cursor.close()
+            finally:
+                connection.close()
+            script.status = 'ok'
+        except (OSError, UnicodeDecodeError, SqlSyntaxError, RuntimeError, TimeoutError) as e:
+            script.status = 'failed'
+            script.error = str(e)
+        except Exception as e:
+            script.status = 'failed'
+            script.error = f"Connection failed: {str(e)}"
+        script.seconds = time.perf_counter() - start
+
+        if script.status == 'failed':
+            print(f"  FAILED {script.file}: {script.error}")
+            if not self.keep_going:
+                with self._lock:
+                    self._stopped = True
+        else:
+            print(f"  ok     {script.file} ({script.seconds:.2f}s, {script.batches} batches)")
+
+    def _runnable(self, script: DeployScript) -> bool:
+        """Mark a script skipped if a script it depends on did not succeed, or after a failure without keep_going"""
+        failed = [file for file in script.depends_on if self.scripts[file].status == 'failed']
+        blocked = [file for file in script.depends_on if self.scripts[file].status == 'skipped']
+        if failed:
+            script.error = f"Depends on failed {', '.join(failed)}"
+        elif self._stopped:
+            script.error = 'Deployment stopped after a failure'
+        elif blocked:
+            script.error = f"Depends on skipped {', '.join(blocked)}"
+        else:
+            return True
+        script.status = 'skipped'
+        return False
+
+    def deploy(self, connection_str: str):
+        """Run every wave; a wave starts when the one before it has finished"""
+        # Imported here so --plan works without pyodbc
+        from concurrent.futures import ThreadPoolExecutor
+        from db_access import ConnectionPool
+
+        start = time.perf_counter()
+        pool = ConnectionPool(connection_str, max_size=self.jobs, autocommit=True)
+        try:
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                for number, wave in enumerate(self.waves, 1):
+                    wave_start = time.perf_counter()
+                    runnable = [script for script in wave if self._runnable(script)]
+                    if runnable:
+                        print(f"Wave {number}: {len(runnable)} scripts")
+                    list(executor.map(lambda script: self.run_script(script, pool), runnable))
+                    self.wave_seconds.append(round(time.perf_counter() - wave_start, 3))
+
+            if self.cycle:
+                print(f"Wave {len(self.waves) + 1}: {len(self.cycle)} scripts in a dependency cycle, one at a time")
+                wave_start = time.perf_counter()
+                for script in self.cycle:
+                    # Scripts of the cycle wait for each other, so only scripts outside it can block them
+                    script.depends_on = [file for file in script.depends_on if self.scripts[file] not in self.cycle]
+                    if self._runnable(script):
+                        self.run_script(script, pool)
+                self.wave_seconds.append(round(time.perf_counter() - wave_start, 3))
+        finally:
+            pool.close()
+        self.total_seconds = time.perf_counter() - start
+
+    def generate_report(self) -> Dict:
+        """Generate deployment report"""
+        counts = {'ok': 0, 'failed': 0, 'skipped': 0, 'pending': 0}
+        for script in self.scripts.values():
+            counts[script.status] += 1
+        return {
+            'scripts': len(self.scripts),
+            'waves': [[script.file for script in wave] for wave in self.waves],
+            'cycle': [script.file for script in self.cycle],
+            'status_counts': counts,
+            'errors': self.errors + [f"{script.file}: {script.error}" for script in self.scripts.values()
+                                     if script.status == 'failed'],
+            'wave_seconds': self.wave_seconds,
+            'total_seconds': round(self.total_seconds, 3),
+            # Time the scripts took one after another, against total_seconds for the waves
+            'serial_seconds': round(sum(script.seconds for script in self.scripts.values()), 3),
+            'results': [script.to_dict() for script in self.scripts.values()]
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Deploy the Model Registry database scripts in dependency waves')
+    parser.add_argument('--schema-path', default='database',
+                        help='Directory of SQL files (searched recursively) or a single SQL file')
+    parser.add_argument('--server', default=os.getenv('DB_SERVER', 'localhost'), help='Database server')
+    parser.add_argument('--database', default=os.getenv('DB_NAME', 'MODEL_REGISTRY'), help='Database name')
+    parser.add_argument('--driver', default=os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server'),
+                        help='ODBC driver')
+    parser.add_argument('--username', default=os.getenv('DB_USERNAME', ''),
+                        help='SQL Server login (Windows Authentication if empty); the password is read from '
+                             'DB_PASSWORD or prompted for')
+    parser.add_argument('--jobs', type=int, default=4, help='Scripts run at the same time (pooled connections)')
+    parser.add_argument('--include-data', action='store_true', help=f"Also run the scripts in {', '.join(DATA_DIRS)}")
+    parser.add_argument('--keep-going', action='store_true',
+                        help='After a failure, still run the scripts that do not depend on the failed one')
+    parser.add_argument('--plan', action='store_true', help='Print the waves without connecting to the database')
+    parser.add_argument('--json', help='Write the deployment report with per-script timings to this JSON file')
+
+    args = parser.parse_args()
+
+    deployer = SchemaDeployer(args.schema_path, include_data=args.include_data, jobs=args.jobs,
+                              keep_going=args.keep_going)
+    deployer.build_plan()
+    if deployer.errors:
+        for error in deployer.errors:
+            print(f"  - {error}")
+        print(f"Cannot plan the deployment: {len(deployer.errors)} scripts could not be read")
+        sys.exit(1)
+
+    if args.plan:
+        deployer.print_plan()
+        sys.exit(0)
+
+    db_config = {
+        'server': args.server,
+        'database': args.database,
+        'driver': args.driver,
+        'trusted_connection': 'no' if args.username else 'yes',
+        'username': args.username,
+        'password': (os.getenv('DB_PASSWORD') or getpass.getpass('Password: ')) if args.username else ''
+    }
+    from db_access import connection_string  # pyodbc loads here, not for --help or --plan
+
+    print(f"Deploying {len(deployer.scripts)} scripts to {args.database} on {args.server} "
+          f"in {len(deployer.waves) + bool(deployer.cycle)} waves")
+    deployer.deploy(connection_string(db_config))
+
+    report = deployer.generate_report()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    counts = report['status_counts']
+    print(f"\n{counts['ok']} succeeded, {counts['failed']} failed, {counts['skipped']} skipped "
+          f"in {report['total_seconds']:.1f}s ({report['serial_seconds']:.1f}s of script time)")
+    slowest = sorted(deployer.scripts.values(), key=lambda script: script.seconds, reverse=True)[:5]
+    if slowest and slowest[0].seconds:
+        print("Slowest scripts:")
+        for script in slowest:
+            print(f"  {script.seconds:7.2f}s  {script.file}")
+    for script in deployer.scripts.values():
+        if script.status == 'skipped':
+            print(f"  skipped {script.file}: {script.error}")
+
+    sys.exit(1 if counts['failed'] or counts['skipped'] else 0)
+
+if __name__ == '__main__':
+    main()
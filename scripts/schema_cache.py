@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Schema Validation Cache for Model Registry
+Parse results of SQL scripts keyed by content hash, and per-object validation results, kept between runs
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+from sql_parser import PARSER_VERSION
+
+CACHE_FILE = 'schema_cache.json'
+
+
+def content_key(name: str, content: bytes) -> str:
+    """Cache key of a script: its path (recorded on the parsed objects) and its content"""
+    return hashlib.sha256(name.encode('utf-8') + b'\0' + content).hexdigest()
+
+
+class SchemaCache:
+    """
+    On-disk cache of one validation run for the next
+
+    Parse results are reused while a script's content is unchanged. Validation
+    results are kept per object under a fingerprint of the object and of the
+    objects it depends on (see SchemaValidator.fingerprint). Entries not used
+    by a run are dropped when it saves, so deleted scripts do not accumulate.
+    """
+
+    def __init__(self, cache_dir: str, validator_version: int):
+        self.path = os.path.join(cache_dir, CACHE_FILE)
+        self.validator_version = validator_version
+        self.parsed: Dict[str, Dict] = {}
+        self.validated: Dict[str, Dict] = {}
+        self.used_parsed: Dict[str, Dict] = {}
+        self.used_validated: Dict[str, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict):
+            return
+        if data.get('parser_version') == PARSER_VERSION:
+            self.parsed = data.get('parsed', {})
+            # Validation results describe parse results of the same parser
+            if data.get('validator_version') == self.validator_version:
+                self.validated = data.get('validated', {})
+
+    def key(self, name: str, content: bytes) -> str:
+        return content_key(name, content)
+
+    def get_parse(self, key: str) -> Optional[Dict]:
+        """Cached parse result of a script (see ParseResult.to_dict), counting hits and misses"""
+        data = self.parsed.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.used_parsed[key] = data
+        return data
+
+    def put_parse(self, key: str, data: Dict):
+        self.used_parsed[key] = data
+
+    def get_validation(self, object_key: str, fingerprint: str) -> Optional[Dict]:
+        entry = self.validated.get(object_key)
+        if not entry or entry.get('fingerprint') != fingerprint:
+            return None
+        self.used_validated[object_key] = entry
+        return entry['result']
+
+    def put_validation(self, object_key: str, fingerprint: str, result: Dict):
+        self.used_validated[object_key] = {'fingerprint': fingerprint, 'result': result}
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def save(self):
+        """Write the entries this run used, atomically; a read-only checkout just goes without the cache"""
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'parser_version': PARSER_VERSION, 'validator_version': self.validator_version,
+                           'parsed': self.used_parsed, 'validated': self.used_validated}, f)
+            os.replace(temp_path, self.path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
@@ -0,0 +1,740 @@
+#!/usr/bin/env python3
+"""
+Schema Diff Script for Model Registry
+Compares the schema of the database scripts with a snapshot or the live catalog and writes a migration of only the changes
+"""
+
+import os
+import sys
+import re
+import argparse
+import getpass
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sql_parser import SchemaGraph, SqlSyntaxError, dependency_waves, split_script, tokenize
+from validate_schema import SchemaValidator
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'excel_templates' / 'upload_scripts'))
+
+# Bump when the snapshot layout changes (2: indexes record whether they are key constraints)
+SNAPSHOT_VERSION = 2
+
+# Object types of sys.objects, as the kinds of the object graph
+CATALOG_KINDS = {'V': 'view', 'P': 'procedure', 'FN': 'function', 'IF': 'function', 'TF': 'function',
+                 'TR': 'trigger'}
+
+# CREATE [OR ALTER] at the start of a view, procedure, function or trigger definition
+_CREATE_PATTERN = re.compile(r'CREATE\s+(?:OR\s+ALTER\s+)?(?=(?:VIEW|PROC|PROCEDURE|FUNCTION|TRIGGER)\b)',
+                             re.IGNORECASE)
+
+_TYPE_PATTERN = re.compile(r'^(\w+)(?:\((.*)\))?$')
+
+# Tables the upload tools create next to a registry table: <T>_BACKUP_<timestamp> with its _IDS table
+# (backup.py, needed by --restore) and the per-worker <T>_STAGE_<timestamp>_<pid>_<worker> (parallel_insert.py)
+UPLOAD_TABLE_PATTERN = re.compile(r'^\w+?_(?:BACKUP_\d{8}_\d{6}(?:_IDS)?|STAGE_\d{8}_\d{6}_\d+_\d+)$', re.IGNORECASE)
+
+
+def normalize_type(data_type: str) -> str:
+    """Data type as SQL Server reports it, e.g. DECIMAL(5, 2) -> DECIMAL(5,2), DATETIME2 -> DATETIME2(7)"""
+    text = re.sub(r'\s+', '', data_type or '').upper()
+    match = _TYPE_PATTERN.match(text)
+    if not match:
+        return text
+    name, size = match.group(1), match.group(2)
+    name = {'DEC': 'DECIMAL', 'INTEGER': 'INT', 'CHARACTER': 'CHAR', 'NATIONAL': 'NCHAR'}.get(name, name)
+    if name in ('DECIMAL', 'NUMERIC'):
+        precision, _, scale = (size or '18').partition(',')
+        return f"{name}({precision},{scale or 0})"
+    if name in ('DATETIME2', 'TIME', 'DATETIMEOFFSET'):
+        return f"{name}({size or 7})"
+    if name == 'FLOAT':
+        return 'FLOAT' if not size or int(size) > 24 else 'REAL'
+    if name in ('CHAR', 'VARCHAR', 'NCHAR', 'NVARCHAR', 'BINARY', 'VARBINARY'):
+        return f"{name}({size or 1})"
+    return f"{name}({size})" if size else name
+
+
+def catalog_type(type_name: str, max_length: int, precision: int, scale: int) -> str:
+    """Data type of a catalog column, in the form normalize_type() gives"""
+    name = type_name.upper()
+    if name in ('CHAR', 'VARCHAR', 'BINARY', 'VARBINARY'):
+        return f"{name}({'MAX' if max_length == -1 else max_length})"
+    if name in ('NCHAR', 'NVARCHAR'):
+        return f"{name}({'MAX' if max_length == -1 else max_length // 2})"
+    if name in ('DECIMAL', 'NUMERIC'):
+        return f"{name}({precision},{scale})"
+    if name in ('DATETIME2', 'TIME', 'DATETIMEOFFSET'):
+        return f"{name}({scale})"
+    if name == 'FLOAT':
+        return 'FLOAT' if precision > 24 else 'REAL'
+    return name
+
+
+def normalize_expression(text: Optional[str]) -> Optional[str]:
+    """A default expression without spaces and enclosing parentheses (the catalog stores ((0)) for 0)"""
+    if text is None:
+        return None
+    text = re.sub(r'\s+', '', text).upper()
+    while text.startswith('(') and text.endswith(')') and _balanced(text[1:-1]):
+        text = text[1:-1]
+    return text
+
+
+def _balanced(text: str) -> bool:
+    depth = 0
+    for char in text:
+        depth += {'(': 1, ')': -1}.get(char, 0)
+        if depth < 0:
+            return False
+    return depth == 0
+
+
+def definition_hash(text: str) -> str:
+    """
+    Hash of a view, procedure, function or trigger definition
+
+    Comments, whitespace, the case of keywords and CREATE vs CREATE OR ALTER
+    do not change it, so a definition read from the catalog hashes like the script.
+    """
+    tokens = tokenize(text)
+    i = 0
+    while i < len(tokens) and tokens[i].is_word('CREATE', 'OR', 'ALTER'):
+        i += 1
+    digest = hashlib.sha256()
+    for token in tokens[i:]:
+        digest.update(f"{token.kind}:{token.upper or token.value}\x1f".encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def code_definitions(graph: SchemaGraph, schema_path: Path) -> Dict[str, str]:
+    """
+    CREATE OR ALTER statement of each view, procedure, function and trigger, from its script
+
+    A code object is the only statement of its batch, so its definition is the batch.
+    """
+    batches_by_file: Dict[str, List[Tuple[int, str, int]]] = {}
+    definitions = {}
+    for obj in graph.objects.values():
+        if obj.kind == 'table':
+            continue
+        if obj.file not in batches_by_file:
+            path = schema_path / obj.file if schema_path.is_dir() else schema_path
+            try:
+                batches_by_file[obj.file] = split_script(path.read_text(encoding='utf-8-sig'))
+            except (OSError, UnicodeDecodeError, SqlSyntaxError):
+                batches_by_file[obj.file] = []
+        batch = None
+        for start, text, _ in batches_by_file[obj.file]:
+            if start <= obj.line:
+                batch = (start, text)
+        if batch is None:
+            continue
+        start, text = batch
+        # Skip the comments before the statement; they may mention CREATE too
+        first_line = tokenize(text)[0].line
+        offset = sum(len(line) + 1 for line in text.split('\n')[:first_line - 1])
+        match = _CREATE_PATTERN.search(text, offset)
+        if match:
+            definitions[obj.key] = 'CREATE OR ALTER ' + text[match.end():].rstrip()
+    return definitions
+
+
+def model_from_graph(graph: SchemaGraph, definitions: Dict[str, str]) -> Dict:
+    """Schema model (the snapshot layout) of the parsed scripts"""
+    tables = {}
+    code = {}
+    for obj in graph.objects.values():
+        if obj.kind == 'table':
+            data = obj.to_dict()
+            # REFERENCES without columns means the referenced table's primary key
+            for fk, fk_data in zip(obj.foreign_keys, data['foreign_keys']):
+                ref_table = graph.get(fk.references.name)
+                if not fk.ref_columns and ref_table is not None and ref_table.primary_key:
+                    fk_data['references_columns'] = ref_table.primary_key.columns
+            tables[obj.key] = {key: data[key] for key in ('name', 'schema', 'columns', 'indexes', 'foreign_keys')}
+        elif obj.key in definitions:
+            code[obj.key] = {
+                'kind': obj.kind,
+                'name': obj.name,
+                'schema': obj.ref.schema,
+                'parent': obj.parent.name if obj.parent else None,
+                'depends_on': sorted(obj.depends_on()),
+                'definition_hash': definition_hash(definitions[obj.key])
+            }
+    return {'version': SNAPSHOT_VERSION, 'tables': tables, 'code': code}
+
+
+def model_from_catalog(connection) -> Dict:
+    """
+    Schema model of a live database, read from its catalog views
+
+    The backup and staging tables of the upload tools (UPLOAD_TABLE_PATTERN) are
+    left out, so a migration never lists them for dropping.
+    """
+    tables: Dict[str, Dict] = {}
+
+    def table_entry(schema: str, name: str) -> Dict:
+        return tables.setdefault(name.upper(), {'name': name, 'schema': schema, 'columns': [], 'indexes': [],
+                                                'foreign_keys': []})
+
+    for schema, table, column, type_name, max_length, precision, scale, nullable, identity, computed, default in (
+            connection.fetch_all("""
+                SELECT SCHEMA_NAME(t.schema_id), t.name, c.name, TYPE_NAME(c.user_type_id), c.max_length,
+                       c.precision, c.scale, c.is_nullable, c.is_identity, c.is_computed, dc.definition
+                FROM sys.tables t
+                JOIN sys.columns c ON c.object_id = t.object_id
+                LEFT JOIN sys.default_constraints dc ON dc.object_id = c.default_object_id
+                WHERE t.is_ms_shipped = 0
+                ORDER BY t.name, c.column_id""") or []):
+        if UPLOAD_TABLE_PATTERN.match(table):
+            continue
+        table_entry(schema, table)['columns'].append({
+            'name': column,
+            'data_type': '' if computed else catalog_type(type_name, max_length, precision, scale),
+            'nullable': bool(nullable),
+            'identity': bool(identity),
+            'default': default,
+            'computed': bool(computed)
+        })
+
+    indexes: Dict[Tuple[str, str], Dict] = {}
+    for schema, table, index, primary_key, unique, constraint, clustered, column in (connection.fetch_all("""
+            SELECT SCHEMA_NAME(t.schema_id), t.name, i.name, i.is_primary_key, i.is_unique, i.is_unique_constraint,
+                   CASE WHEN i.type = 1 THEN 1 ELSE 0 END, c.name
+            FROM sys.indexes i
+            JOIN sys.tables t ON t.object_id = i.object_id
+            JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+            JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+            WHERE i.type IN (1, 2) AND ic.is_included_column = 0 AND t.is_ms_shipped = 0
+            ORDER BY t.name, i.name, ic.key_ordinal""") or []):
+        if UPLOAD_TABLE_PATTERN.match(table):
+            continue
+        entry = indexes.get((table, index))
+        if entry is None:
+            entry = indexes[(table, index)] = {'name': index, 'columns': [], 'unique': bool(unique),
+                                               'primary_key': bool(primary_key), 'clustered': bool(clustered),
+                                               'constraint': bool(primary_key or constraint)}
+            table_entry(schema, table)['indexes'].append(entry)
+        entry['columns'].append(column)
+
+    foreign_keys: Dict[str, Dict] = {}
+    for name, schema, table, column, ref_table, ref_column in (connection.fetch_all("""
+            SELECT fk.name, SCHEMA_NAME(fk.schema_id), OBJECT_NAME(fk.parent_object_id), pc.name,
+                   OBJECT_NAME(fk.referenced_object_id), rc.name
+            FROM sys.foreign_keys fk
+            JOIN sys.foreign_key_columns fkc ON fkc.constraint_object_id = fk.object_id
+            JOIN sys.columns pc ON pc.object_id = fkc.parent_object_id AND pc.column_id = fkc.parent_column_id
+            JOIN sys.columns rc ON rc.object_id = fkc.referenced_object_id AND rc.column_id = fkc.referenced_column_id
+            ORDER BY fk.name, fkc.constraint_column_id""") or []):
+        if UPLOAD_TABLE_PATTERN.match(table):
+            continue
+        entry = foreign_keys.get(name)
+        if entry is None:
+            entry = foreign_keys[name] = {'name': name, 'columns': [], 'references_table': ref_table,
+                                          'references_columns': []}
+            table_entry(schema, table)['foreign_keys'].append(entry)
+        entry['columns'].append(column)
+        entry['references_columns'].append(ref_column)
+
+    code = {}
+    for schema, name, object_type, definition, parent in (connection.fetch_all("""
+            SELECT SCHEMA_NAME(o.schema_id), o.name, RTRIM(o.type), m.definition, OBJECT_NAME(tr.parent_id)
+            FROM sys.sql_modules m
+            JOIN sys.objects o ON o.object_id = m.object_id
+            LEFT JOIN sys.triggers tr ON tr.object_id = o.object_id
+            WHERE o.is_ms_shipped = 0""") or []):
+        kind = CATALOG_KINDS.get(object_type)
+        if kind is None or definition is None:
+            continue
+        try:
+            digest = definition_hash(definition)
+        except SqlSyntaxError:
+            digest = ''
+        code[name.upper()] = {'kind': kind, 'name': name, 'schema': schema, 'parent': parent, 'depends_on': [],
+                              'definition_hash': digest}
+    return {'version': SNAPSHOT_VERSION, 'tables': tables, 'code': code}
+
+
+def load_snapshot(path: str) -> Dict:
+    with open(path, encoding='utf-8') as f:
+        model = json.load(f)
+    if model.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot {path} has version {model.get('version')}, expected {SNAPSHOT_VERSION}; "
+                         f"save it again with --save-snapshot from the scripts the database was built from, "
+                         f"or diff against --server")
+    return model
+
+
+def save_snapshot(model: Dict, path: str):
+    """Write a snapshot atomically"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(model, saved=datetime.now().isoformat(timespec='seconds')), f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def _qualified(entry: Dict) -> str:
+    return f"{entry.get('schema') or 'dbo'}.{entry['name']}"
+
+
+def _columns(names: List[str]) -> Tuple[str, ...]:
+    return tuple(name.upper() for name in names)
+
+
+def _index_signature(index: Dict) -> Tuple:
+    # An unnamed key or index is clustered if it is the primary key, as SQL Server makes it
+    clustered = index['primary_key'] if index.get('clustered') is None else index['clustered']
+    return (bool(index['primary_key']), bool(index['unique']), _columns(index['columns']), bool(clustered),
+            bool(index.get('constraint', index['primary_key'])))
+
+
+def _key_constraint_lookup(table: Dict, index: Dict) -> str:
+    """Query for the name SQL Server gave an unnamed PRIMARY KEY or UNIQUE constraint"""
+    qualified = _qualified(table)
+    query = (f"SELECT TOP 1 kc.name FROM sys.key_constraints kc\n"
+             f"    WHERE kc.parent_object_id = OBJECT_ID('{qualified}') "
+             f"AND kc.type = '{'PK' if index['primary_key'] else 'UQ'}'")
+    if not index['primary_key']:
+        # A table has one primary key; a UNIQUE constraint is told apart by its key columns, in order
+        for position, column in enumerate(index['columns'], 1):
+            query += f"\n      AND INDEX_COL('{qualified}', kc.unique_index_id, {position}) = '{column}'"
+        query += f"\n      AND INDEX_COL('{qualified}', kc.unique_index_id, {len(index['columns']) + 1}) IS NULL"
+    return query
+
+
+def _foreign_key_lookup(table: Dict, fk: Dict) -> str:
+    """Query for the name SQL Server gave an unnamed foreign key"""
+    query = (f"SELECT TOP 1 fk.name FROM sys.foreign_keys fk\n"
+             f"    WHERE fk.parent_object_id = OBJECT_ID('{_qualified(table)}') "
+             f"AND fk.referenced_object_id = OBJECT_ID('{fk['references_table']}')\n"
+             f"      AND (SELECT COUNT(*) FROM sys.foreign_key_columns fkc "
+             f"WHERE fkc.constraint_object_id = fk.object_id) = {len(fk['columns'])}")
+    for position, column in enumerate(fk['columns'], 1):
+        query += (f"\n      AND EXISTS (SELECT 1 FROM sys.foreign_key_columns fkc "
+                  f"WHERE fkc.constraint_object_id = fk.object_id AND fkc.constraint_column_id = {position} "
+                  f"AND COL_NAME(fkc.parent_object_id, fkc.parent_column_id) = '{column}')")
+    return query
+
+
+def _foreign_key_signature(fk: Dict) -> Tuple:
+    return _columns(fk['columns']), fk['references_table'].upper(), _columns(fk['references_columns'])
+
+
+def _column_signature(column: Dict) -> Tuple:
+    return normalize_type(column['data_type']), bool(column['nullable']), bool(column['identity'])
+
+
+class SchemaDiff:
+    """
+    Statements that bring a database from the current schema to the desired one
+
+    Tables are never dropped and recreated: new tables are created, columns are
+    added or altered in place, and keys and indexes are created or dropped. Views,
+    procedures, functions and triggers whose definition changed are recreated
+    with CREATE OR ALTER. Statements that lose data (dropping tables or columns)
+    are written as comments unless allow_drop is set; changes ALTER COLUMN cannot
+    make (identity, computed columns) are listed for a manual migration.
+
+    An altered column first loses what SQL Server does not let ALTER COLUMN
+    change under it: its default, the keys and indexes on it and the foreign
+    keys of any table that reference it. They are created again after the
+    column is altered. Keys declared without a name are dropped by the name
+    SQL Server gave them, looked up when the migration runs.
+    """
+
+    # Phases, in the order the migration runs them
+    PHASES = ('drop_foreign_keys', 'drop_indexes', 'create_tables', 'alter_columns', 'create_indexes',
+              'add_foreign_keys', 'code', 'drop_objects')
+
+    def __init__(self, desired: Dict, current: Dict, definitions: Dict[str, str], allow_drop: bool = False):
+        """
+        Args:
+            desired: Schema model of the scripts (model_from_graph)
+            current: Schema model of the database (a snapshot or model_from_catalog)
+            definitions: CREATE OR ALTER statements of the desired code objects, by key
+            allow_drop: Write the statements that drop tables, columns and code objects
+        """
+        self.desired = desired
+        self.current = current
+        self.definitions = definitions
+        self.allow_drop = allow_drop
+        self.statements: Dict[str, List[str]] = {phase: [] for phase in self.PHASES}
+        self.changes: List[str] = []
+        self.manual: List[str] = []
+        # Columns ALTER COLUMN changes, by table key
+        self.altered: Dict[str, set] = {}
+
+    def compare(self):
+        """Fill the statements of every phase"""
+        desired_tables = self.desired['tables']
+        current_tables = self.current['tables']
+        # Known for every table first: foreign keys of other tables depend on them
+        self.altered = {key: self.altered_columns(table, current_tables[key])
+                        for key, table in desired_tables.items() if key in current_tables}
+        for key in self._table_order(desired_tables):
+            table = desired_tables[key]
+            if key in current_tables:
+                self.compare_table(table, current_tables[key])
+            else:
+                self.create_table(table)
+        for key, table in current_tables.items():
+            if key not in desired_tables and key not in self.desired['code']:
+                for fk in table['foreign_keys']:
+                    if self.references_altered(fk):
+                        self.drop_foreign_key(table, fk)
+                self._drop(f"DROP TABLE {_qualified(table)};", f"Table {table['name']} is not in the scripts")
+        self.compare_code()
+
+    def _table_order(self, tables: Dict[str, Dict]) -> List[str]:
+        """Tables after the tables their foreign keys reference"""
+        waves, cycle = dependency_waves({
+            key: {fk['references_table'].upper() for fk in table['foreign_keys']} for key, table in tables.items()})
+        return [key for wave in waves for key in wave] + cycle
+
+    def _drop(self, statement: str, reason: str):
+        self.changes.append(reason)
+        if self.allow_drop:
+            self.statements['drop_objects'].append(statement)
+        else:
+            self.statements['drop_objects'].append(f"-- {reason}; run with --allow-drop to drop it:\n-- {statement}")
+
+    def column_definition(self, table: Dict, column: Dict) -> str:
+        parts = [column['name'], normalize_type(column['data_type'])]
+        if column['identity']:
+            parts.append('IDENTITY(1,1)')
+        parts.append('NULL' if column['nullable'] else 'NOT NULL')
+        if column.get('default') is not None:
+            parts.append(f"CONSTRAINT DF_{table['name']}_{column['name']} DEFAULT {column['default']}")
+        return ' '.join(parts)
+
+    def create_table(self, table: Dict):
+        self.changes.append(f"Create table {table['name']}")
+        lines = []
+        for column in table['columns']:
+            if column.get('computed'):
+                self.manual.append(f"Add computed column {table['name']}.{column['name']} (its expression is in "
+                                   f"the table script)")
+                continue
+            lines.append(f"    {self.column_definition(table, column)}")
+        for index in table['indexes']:
+            if index['primary_key']:
+                clustered = '' if index.get('clustered') is None else (
+                    ' CLUSTERED' if index['clustered'] else ' NONCLUSTERED')
+                name = index.get('name') or f"PK_{table['name']}"
+                lines.append(f"    CONSTRAINT {name} PRIMARY KEY{clustered} ({', '.join(index['columns'])})")
+        self.statements['create_tables'].append(
+            f"CREATE TABLE {_qualified(table)} (\n" + ',\n'.join(lines) + "\n);")
+        for index in table['indexes']:
+            if not index['primary_key']:
+                self.create_index(table, index)
+        for fk in table['foreign_keys']:
+            self.add_foreign_key(table, fk)
+
+    def create_index(self, table: Dict, index: Dict):
+        clustered = '' if index.get('clustered') is None else (
+            ' CLUSTERED' if index['clustered'] else ' NONCLUSTERED')
+        if index['primary_key']:
+            name = index.get('name') or f"PK_{table['name']}"
+            self.statements['create_indexes'].append(
+                f"ALTER TABLE {_qualified(table)} ADD CONSTRAINT {name} PRIMARY KEY{clustered} "
+                f"({', '.join(index['columns'])});")
+            return
+        if index.get('constraint'):
+            name = index.get('name') or f"UQ_{table['name']}_{'_'.join(index['columns'])}"
+            self.statements['create_indexes'].append(
+                f"ALTER TABLE {_qualified(table)} ADD CONSTRAINT {name} UNIQUE{clustered} "
+                f"({', '.join(index['columns'])});")
+            return
+        name = index.get('name') or f"{'UX' if index['unique'] else 'IX'}_{table['name']}_{'_'.join(index['columns'])}"
+        kind = ('UNIQUE ' if index['unique'] else '') + ('CLUSTERED ' if index.get('clustered') else 'NONCLUSTERED ')
+        self.statements['create_indexes'].append(
+            f"CREATE {kind}INDEX {name} ON {_qualified(table)} ({', '.join(index['columns'])});")
+
+    def drop_looked_up(self, phase: str, table: Dict, lookup: str):
+        """Drop the constraint whose name the lookup query returns when the migration runs, if there is one"""
+        self.statements[phase].append(
+            f"DECLARE @constraint_name sysname = ({lookup});\n"
+            f"IF @constraint_name IS NOT NULL\n"
+            f"    EXEC('ALTER TABLE {_qualified(table)} DROP CONSTRAINT ' + QUOTENAME(@constraint_name));")
+
+    def drop_index(self, table: Dict, index: Dict):
+        name = index.get('name')
+        if index.get('constraint', index['primary_key']):
+            if name:
+                self.statements['drop_indexes'].append(f"ALTER TABLE {_qualified(table)} DROP CONSTRAINT {name};")
+            else:
+                self.drop_looked_up('drop_indexes', table, _key_constraint_lookup(table, index))
+        elif name:
+            self.statements['drop_indexes'].append(f"DROP INDEX {name} ON {_qualified(table)};")
+
+    def add_foreign_key(self, table: Dict, fk: Dict):
+        name = fk.get('name') or f"FK_{table['name']}_{fk['references_table']}_{'_'.join(fk['columns'])}"
+        references = f" ({', '.join(fk['references_columns'])})" if fk['references_columns'] else ''
+        self.statements['add_foreign_keys'].append(
+            f"ALTER TABLE {_qualified(table)} WITH CHECK ADD CONSTRAINT {name} FOREIGN KEY "
+            f"({', '.join(fk['columns'])}) REFERENCES {fk['references_table']}{references};")
+
+    def drop_foreign_key(self, table: Dict, fk: Dict):
+        if fk.get('name'):
+            self.statements['drop_foreign_keys'].append(
+                f"ALTER TABLE {_qualified(table)} DROP CONSTRAINT {fk['name']};")
+        else:
+            self.drop_looked_up('drop_foreign_keys', table, _foreign_key_lookup(table, fk))
+
+    def references_altered(self, fk: Dict) -> bool:
+        """Whether a foreign key references a column that ALTER COLUMN changes"""
+        return bool(self.altered.get(fk['references_table'].upper(), set()) & set(_columns(fk['references_columns'])))
+
+    def drop_default(self, table: Dict, column: Dict):
+        """Drop a column's default constraint, whatever SQL Server named it"""
+        self.drop_looked_up('alter_columns', table,
+                            f"SELECT name FROM sys.default_constraints\n"
+                            f"    WHERE parent_object_id = OBJECT_ID('{_qualified(table)}')\n"
+                            f"      AND parent_column_id = COLUMNPROPERTY(OBJECT_ID('{_qualified(table)}'), "
+                            f"'{column['name']}', 'ColumnId')")
+
+    def add_default(self, table: Dict, column: Dict):
+        self.statements['alter_columns'].append(
+            f"ALTER TABLE {_qualified(table)} ADD CONSTRAINT DF_{table['name']}_{column['name']} "
+            f"DEFAULT {column['default']} FOR {column['name']};")
+
+    def fill_nulls(self, table: Dict, column: Dict):
+        """Before a column becomes NOT NULL: set its NULLs to the default, or list it if it has none"""
+        if column.get('default') is None:
+            self.manual.append(f"Column {table['name']}.{column['name']} becomes NOT NULL without a default; "
+                               f"altering it fails while any row holds NULL")
+            return
+        self.statements['alter_columns'].append(
+            f"UPDATE {_qualified(table)} SET {column['name']} = {column['default']} WHERE {column['name']} IS NULL;")
+
+    @staticmethod
+    def altered_columns(table: Dict, current: Dict) -> set:
+        """Keys of the stored columns whose type or nullability changes (identity changes are not altered)"""
+        current_columns = {column['name'].upper(): column for column in current['columns']}
+        altered = set()
+        for column in table['columns']:
+            existing = current_columns.get(column['name'].upper())
+            if (existing is not None and not column.get('computed') and not existing.get('computed')
+                    and column['identity'] == existing['identity']
+                    and _column_signature(column) != _column_signature(existing)):
+                altered.add(column['name'].upper())
+        return altered
+
+    def compare_table(self, table: Dict, current: Dict):
+        current_columns = {column['name'].upper(): column for column in current['columns']}
+        desired_columns = {column['name'].upper(): column for column in table['columns']}
+        altered = self.altered.get(table['name'].upper(), set())
+
+        for key, column in desired_columns.items():
+            existing = current_columns.get(key)
+            if existing is None:
+                if column.get('computed'):
+                    self.manual.append(f"Add computed column {table['name']}.{column['name']}")
+                    continue
+                self.changes.append(f"Add column {table['name']}.{column['name']}")
+                if not column['nullable'] and column.get('default') is None and not column['identity']:
+                    self.manual.append(f"Column {table['name']}.{column['name']} is NOT NULL without a default; "
+                                       f"adding it fails if the table has rows")
+                self.statements['alter_columns'].append(
+                    f"ALTER TABLE {_qualified(table)} ADD {self.column_definition(table, column)};")
+                continue
+            if column.get('computed') or existing.get('computed'):
+                if bool(column.get('computed')) != bool(existing.get('computed')):
+                    self.manual.append(f"Column {table['name']}.{column['name']} changes between computed and "
+                                       f"stored")
+                continue
+            if column['identity'] != existing['identity']:
+                self.manual.append(f"Column {table['name']}.{column['name']} changes IDENTITY; "
+                                   f"ALTER COLUMN cannot do that")
+            default_changed = normalize_expression(column.get('default')) != normalize_expression(
+                existing.get('default'))
+            if default_changed:
+                self.changes.append(f"Change the default of {table['name']}.{column['name']}")
+            if key in altered:
+                self.changes.append(f"Alter column {table['name']}.{column['name']}: "
+                                    f"{normalize_type(existing['data_type'])} "
+                                    f"{'NULL' if existing['nullable'] else 'NOT NULL'} -> "
+                                    f"{normalize_type(column['data_type'])} "
+                                    f"{'NULL' if column['nullable'] else 'NOT NULL'}")
+                # ALTER COLUMN fails while the column has a default, so it is dropped and added back around it
+                if existing.get('default') is not None:
+                    self.drop_default(table, column)
+                if existing['nullable'] and not column['nullable']:
+                    self.fill_nulls(table, column)
+                self.statements['alter_columns'].append(
+                    f"ALTER TABLE {_qualified(table)} ALTER COLUMN {column['name']} "
+                    f"{normalize_type(column['data_type'])} {'NULL' if column['nullable'] else 'NOT NULL'};")
+                if column.get('default') is not None:
+                    self.add_default(table, column)
+            elif default_changed:
+                if existing.get('default') is not None:
+                    self.drop_default(table, column)
+                if column.get('default') is not None:
+                    self.add_default(table, column)
+
+        for key, column in current_columns.items():
+            if key not in desired_columns:
+                self._drop(f"ALTER TABLE {_qualified(current)} DROP COLUMN {column['name']};",
+                           f"Column {table['name']}.{column['name']} is not in the scripts")
+
+        # Keys and indexes on altered columns, and foreign keys referencing altered columns of any table,
+        # are dropped first and created again after
+        def rebuilt(columns: List[str]) -> bool:
+            return bool(altered & set(_columns(columns)))
+
+        desired_indexes = {_index_signature(index): index for index in table['indexes']}
+        current_indexes = {_index_signature(index): index for index in current['indexes']}
+        for signature, index in current_indexes.items():
+            if signature not in desired_indexes or rebuilt(index['columns']):
+                self.drop_index(current, index)
+        for signature, index in desired_indexes.items():
+            if signature not in current_indexes or rebuilt(index['columns']):
+                if signature not in current_indexes:
+                    self.changes.append(f"Create {'primary key' if index['primary_key'] else 'index'} on "
+                                        f"{table['name']} ({', '.join(index['columns'])})")
+                self.create_index(table, index)
+
+        desired_fks = {_foreign_key_signature(fk): fk for fk in table['foreign_keys']}
+        current_fks = {_foreign_key_signature(fk): fk for fk in current['foreign_keys']}
+        for signature, fk in current_fks.items():
+            if signature not in desired_fks or rebuilt(fk['columns']) or self.references_altered(fk):
+                self.drop_foreign_key(current, fk)
+        for signature, fk in desired_fks.items():
+            if signature not in current_fks or rebuilt(fk['columns']) or self.references_altered(fk):
+                if signature not in current_fks:
+                    self.changes.append(f"Add foreign key {table['name']} ({', '.join(fk['columns'])}) -> "
+                                        f"{fk['references_table']}")
+                self.add_foreign_key(table, fk)
+
+    def compare_code(self):
+        desired_code = self.desired['code']
+        current_code = self.current['code']
+        changed = {}
+        for key, obj in desired_code.items():
+            existing = current_code.get(key)
+            if existing is not None and existing['kind'] == obj['kind'] and (
+                    existing['definition_hash'] == obj['definition_hash']):
+                continue
+            if existing is not None and existing['kind'] != obj['kind']:
+                self.manual.append(f"{existing['kind'].capitalize()} {existing['name']} becomes a {obj['kind']}; "
+                                   f"drop it before running the migration")
+            self.changes.append(f"{'Alter' if existing else 'Create'} {obj['kind']} {obj['name']}")
+            changed[key] = obj
+
+        # Create each after the changed objects it uses
+        waves, cycle = dependency_waves({key: set(obj.get('depends_on', [])) for key, obj in changed.items()})
+        for key in [key for wave in waves for key in wave] + cycle:
+            self.statements['code'].append(self.definitions[key])
+
+        for key, obj in current_code.items():
+            if key not in desired_code and key not in self.desired['tables']:
+                statement_kind = 'PROCEDURE' if obj['kind'] == 'procedure' else obj['kind'].upper()
+                self._drop(f"DROP {statement_kind} {_qualified(obj)};",
+                           f"{obj['kind'].capitalize()} {obj['name']} is not in the scripts")
+
+    def script(self, source: str) -> str:
+        """The migration script, one batch per statement"""
+        lines = [
+            '/*',
+            'Migration generated by scripts/schema_diff.py',
+            f"Generated: {datetime.now().isoformat(timespec='seconds')}",
+            f"From: {source}",
+            f"Changes: {len(self.changes)}",
+        ]
+        lines.extend(f"  - {change}" for change in self.changes)
+        if self.manual:
+            lines.append('Needs a manual migration:')
+            lines.extend(f"  - {item}" for item in self.manual)
+        lines.extend(['*/', ''])
+        for phase in self.PHASES:
+            if self.statements[phase]:
+                lines.append(f"-- {phase.replace('_', ' ').capitalize()}")
+                for statement in self.statements[phase]:
+                    lines.extend([statement, 'GO', ''])
+        return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a migration from the database to the schema scripts')
+    parser.add_argument('--schema-path', default='database',
+                        help='Directory of SQL files (searched recursively) or a single SQL file')
+    current = parser.add_mutually_exclusive_group(required=True)
+    current.add_argument('--snapshot', help='Schema snapshot of the database (see --save-snapshot)')
+    current.add_argument('--server', help='Read the current schema from this database server')
+    parser.add_argument('--database', default=os.getenv('DB_NAME', 'MODEL_REGISTRY'), help='Database name')
+    parser.add_argument('--driver', default=os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server'),
+                        help='ODBC driver')
+    parser.add_argument('--username', default=os.getenv('DB_USERNAME', ''),
+                        help='SQL Server login (Windows Authentication if empty); the password is read from '
+                             'DB_PASSWORD or prompted for')
+    parser.add_argument('--output', help='Write the migration to this file instead of standard output')
+    parser.add_argument('--save-snapshot', help='Save the schema of the scripts as a snapshot, for the next diff '
+                                                'after the migration is applied')
+    parser.add_argument('--allow-drop', action='store_true',
+                        help='Drop tables, columns and code objects that are not in the scripts (loses data)')
+
+    args = parser.parse_args()
+
+    validator = SchemaValidator(args.schema_path)
+    validator.parse_sql_files()
+    if validator.errors:
+        print(f"Could not read the schema scripts: {'; '.join(validator.errors)}", file=sys.stderr)
+        sys.exit(1)
+    definitions = code_definitions(validator.graph, validator.schema_path)
+    desired = model_from_graph(validator.graph, definitions)
+
+    if args.snapshot:
+        try:
+            current = load_snapshot(args.snapshot)
+        except (OSError, ValueError) as e:
+            print(f"Could not read the snapshot: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        source = f"snapshot {args.snapshot}"
+    else:
+        from db_access import ConnectionPool, connection_string  # pyodbc loads here, not for --help
+        db_config = {
+            'server': args.server,
+            'database': args.database,
+            'driver': args.driver,
+            'trusted_connection': 'no' if args.username else 'yes',
+            'username': args.username,
+            'password': (os.getenv('DB_PASSWORD') or getpass.getpass('Password: ')) if args.username else ''
+        }
+        pool = ConnectionPool(connection_string(db_config), max_size=1, autocommit=True)
+        try:
+            connection = pool.acquire()
+            try:
+                current = model_from_catalog(connection)
+            finally:
+                connection.close()
+        except Exception as e:
+            print(f"Could not read the database catalog: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            pool.close()
+        source = f"database {args.database} on {args.server}"
+
+    diff = SchemaDiff(desired, current, definitions, allow_drop=args.allow_drop)
+    diff.compare()
+    script = diff.script(source)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(script)
+        print(f"{len(diff.changes)} changes written to {args.output}"
+              + (f"; {len(diff.manual)} need a manual migration" if diff.manual else ''))
+    else:
+        print(script)
+
+    if args.save_snapshot:
+        save_snapshot(desired, args.save_snapshot)
+
+    sys.exit(0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+T-SQL Performance Lint for Model Registry
+Flags row-by-row patterns in views, procedures, functions and triggers: cursors, scalar UDFs in queries, non-sargable WHERE
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from sql_parser import RESERVED_WORDS, SchemaGraph, SqlObject, SqlSyntaxError, Token, find_sql_files, split_batches, \
+    tokenize
+
+# Rule id: (severity, what it flags)
+RULES = {
+    'cursor-in-trigger': ('error', 'Cursor inside a trigger; it runs row by row on every write to the table'),
+    'nested-cursor': ('error', 'Cursor declared while another cursor is open'),
+    'cursor': ('warning', 'Cursor; a set-based statement is usually faster'),
+    'scalar-udf-in-query': ('warning', 'Scalar function called in a set query; it runs once per row and '
+                                       'prevents parallel plans'),
+    'non-sargable-predicate': ('warning', 'Function wrapped around an indexed column in WHERE; the index '
+                                          'cannot be used for a seek'),
+    'rbar-while-loop': ('warning', 'WHILE loop running a query per iteration (row by agonizing row)'),
+    'select-star': ('info', 'SELECT * in a procedure; callers break and more data is read when columns change')
+}
+
+SEVERITIES = ('error', 'warning', 'info')
+
+# Words that end a WHERE clause at its own nesting level
+_CLAUSE_END_WORDS = {'GROUP', 'ORDER', 'HAVING', 'UNION', 'EXCEPT', 'INTERSECT', 'OPTION', 'SELECT', 'INSERT',
+                     'UPDATE', 'DELETE', 'MERGE', 'SET', 'DECLARE', 'IF', 'ELSE', 'WHILE', 'BEGIN', 'END', 'RETURN',
+                     'EXEC', 'EXECUTE', 'PRINT', 'FETCH', 'OPEN', 'CLOSE', 'DEALLOCATE', 'FOR'}
+
+# Words that start a statement, ending the one before
+_STATEMENT_WORDS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'MERGE', 'SET', 'DECLARE', 'IF', 'ELSE', 'WHILE',
+                    'BEGIN', 'END', 'RETURN', 'EXEC', 'EXECUTE', 'PRINT', 'FETCH', 'OPEN', 'CLOSE', 'DEALLOCATE'}
+
+_COMPARISON_SYMBOLS = {'=', '<', '>', '<=', '>=', '<>', '!='}
+
+# Words that separate one predicate from the next
+_PREDICATE_BOUNDARY_WORDS = {'WHERE', 'ON', 'AND', 'OR', 'NOT', 'EXISTS', 'CASE', 'WHEN', 'THEN', 'ELSE'}
+
+
+class LintFinding:
+    """One rule violation"""
+
+    def __init__(self, rule: str, obj: SqlObject, line: int, detail: str = ''):
+        self.rule = rule
+        self.severity = RULES[rule][0]
+        self.obj = obj
+        self.file = obj.file
+        self.line = line
+        self.message = RULES[rule][1] + (f" ({detail})" if detail else '')
+
+    def __str__(self):
+        return f"{self.file}:{self.line} [{self.severity}] {self.obj.kind} {self.obj.name}: {self.message}"
+
+    def to_dict(self) -> Dict:
+        return {
+            'rule': self.rule,
+            'severity': self.severity,
+            'file': self.file,
+            'line': self.line,
+            'object': self.obj.name,
+            'kind': self.obj.kind,
+            'message': self.message
+        }
+
+
+def _is_symbol(tokens: List[Token], i: int, value: str) -> bool:
+    return 0 <= i < len(tokens) and tokens[i].kind == 'symbol' and tokens[i].value == value
+
+
+def _closing_paren(tokens: List[Token], start: int) -> int:
+    depth = 0
+    for i in range(start, len(tokens)):
+        if tokens[i].kind == 'symbol':
+            if tokens[i].value == '(':
+                depth += 1
+            elif tokens[i].value == ')':
+                depth -= 1
+                if not depth:
+                    return i
+    return len(tokens)
+
+
+def _is_call(tokens: List[Token], i: int) -> bool:
+    """A function name followed by its argument list (not a keyword such as EXISTS or IN)"""
+    token = tokens[i]
+    return token.is_name and token.upper not in RESERVED_WORDS and _is_symbol(tokens, i + 1, '(')
+
+
+def _is_identifier(token: Token) -> bool:
+    return token.is_name and token.upper not in RESERVED_WORDS
+
+
+def _on_value_side(tokens: List[Token], i: int) -> bool:
+    """
+    Whether the call at i is the value side of its predicate: the pattern of a LIKE, the list of an IN,
+    a BETWEEN bound, or the right operand of a comparison whose left operand is not a constant or variable
+    """
+    depth = 0
+    for j in range(i - 1, -1, -1):
+        token = tokens[j]
+        if token.kind == 'symbol':
+            if token.value == ')':
+                depth += 1
+            elif token.value == '(':
+                if not depth:
+                    # An IN (...) list holds values; any other parenthesis starts a new predicate
+                    return j > 0 and tokens[j - 1].is_word('IN')
+                depth -= 1
+            elif not depth and token.value in _COMPARISON_SYMBOLS:
+                return j > 0 and tokens[j - 1].kind not in ('number', 'string', 'variable')
+            continue
+        if depth:
+            continue
+        if token.is_word('LIKE', 'IN', 'BETWEEN'):
+            return True
+        if token.upper in _PREDICATE_BOUNDARY_WORDS:
+            return False
+    return False
+
+
+class SqlLinter:
+    """
+    Lints the code objects of a graph, reading each script once more for its tokens
+
+    A column counts as indexed when it leads the key of one of its table's indexes or primary key
+    (a seek needs the leading column); scalar functions are the graph's functions that do not RETURN a TABLE.
+    """
+
+    def __init__(self, graph: SchemaGraph, schema_path: str):
+        self.graph = graph
+        self.schema_path = Path(schema_path)
+        self.findings: List[LintFinding] = []
+        self.errors: List[str] = []
+        self.linted: List[SqlObject] = []
+        self.leading_columns: Dict[str, Set[str]] = {
+            table.key: {index.columns[0].upper() for index in table.indexes if index.columns}
+            for table in graph.tables}
+        self.scalar_functions: Set[str] = set()
+
+    def _code_batches(self) -> List[tuple]:
+        """(object, tokens of its batch) for each view, procedure, function and trigger"""
+        base = self.schema_path if self.schema_path.is_dir() else None
+        code = []
+        for path in find_sql_files(str(self.schema_path)):
+            name = str(path.relative_to(base)) if base else path.name
+            objects = [obj for obj in self.graph.script_objects.get(name, []) if obj.kind != 'table']
+            if not objects:
+                continue
+            try:
+                batches = split_batches(tokenize(path.read_text(encoding='utf-8-sig')))
+            except (OSError, UnicodeDecodeError, SqlSyntaxError) as e:
+                self.errors.append(f"Error reading {name}: {str(e)}")
+                continue
+            for obj in objects:
+                batch = next((tokens for tokens in batches if tokens[0].line <= obj.line <= tokens[-1].line), None)
+                if batch is not None:
+                    code.append((obj, batch))
+        return code
+
+    def lint(self) -> List[LintFinding]:
+        """Run every rule on every code object"""
+        code = self._code_batches()
+        for obj, tokens in code:
+            if obj.kind == 'function' and self._returns_scalar(tokens):
+                self.scalar_functions.add(obj.key)
+        for obj, tokens in code:
+            self.linted.append(obj)
+            self.check_cursors(obj, tokens)
+            self.check_scalar_udfs(obj, tokens)
+            self.check_where_clauses(obj, tokens)
+            self.check_while_loops(obj, tokens)
+            if obj.kind == 'procedure':
+                self.check_select_star(obj, tokens)
+        self.findings.sort(key=lambda finding: (finding.file, finding.line))
+        return self.findings
+
+    def _add(self, rule: str, obj: SqlObject, line: int, detail: str = ''):
+        self.findings.append(LintFinding(rule, obj, line, detail))
+
+    @staticmethod
+    def _returns_scalar(tokens: List[Token]) -> bool:
+        for i, token in enumerate(tokens):
+            if token.is_word('RETURNS'):
+                following = tokens[i + 1:i + 3]
+                return not any(other.is_word('TABLE') for other in following)
+        return False
+
+    def check_cursors(self, obj: SqlObject, tokens: List[Token]):
+        open_cursors: Set[str] = set()
+        for i, token in enumerate(tokens):
+            if token.is_word('OPEN') and i + 1 < len(tokens):
+                open_cursors.add(tokens[i + 1].value.upper())
+            elif token.is_word('CLOSE', 'DEALLOCATE') and i + 1 < len(tokens):
+                open_cursors.discard(tokens[i + 1].value.upper())
+            elif token.is_word('DECLARE') and i + 2 < len(tokens) and tokens[i + 2].is_word(
+                    'CURSOR', 'INSENSITIVE', 'SCROLL'):
+                name = tokens[i + 1].value
+                if open_cursors:
+                    self._add('nested-cursor', obj, token.line,
+                              f"{name} inside the loop over {', '.join(sorted(open_cursors))}")
+                self._add('cursor-in-trigger' if obj.kind == 'trigger' else 'cursor', obj, token.line, name)
+
+    def _in_set_query(self, tokens: List[Token], i: int) -> bool:
+        """Whether the token at i belongs to a SELECT with a FROM clause, an UPDATE or a DELETE"""
+        depth = 0
+        start = None
+        for j in range(i - 1, -1, -1):
+            token = tokens[j]
+            if token.kind == 'symbol':
+                depth += {')': 1, '(': -1}.get(token.value, 0)
+                if token.value == ';' and depth <= 0:
+                    return False
+                continue
+            if depth <= 0 and token.is_word('UPDATE', 'DELETE'):
+                return True
+            if depth <= 0 and token.is_word('SELECT'):
+                start = j
+                break
+            if depth <= 0 and token.is_word('SET'):
+                # UPDATE table SET ... is a set query, SET @variable = ... is not
+                k = j - 1
+                while k > 0 and (tokens[k].is_name and tokens[k].upper not in RESERVED_WORDS
+                                 or _is_symbol(tokens, k, '.')):
+                    k -= 1
+                return k < j - 1 and tokens[k].is_word('UPDATE')
+            if depth <= 0 and token.upper in _STATEMENT_WORDS:
+                return False
+        if start is None:
+            return False
+        depth = 0
+        for j in range(start + 1, len(tokens)):
+            token = tokens[j]
+            if token.kind == 'symbol':
+                depth += {'(': 1, ')': -1}.get(token.value, 0)
+                if depth < 0 or (token.value == ';' and depth == 0):
+                    return False
+                continue
+            if depth == 0:
+                if token.is_word('FROM'):
+                    return True
+                if token.upper in _STATEMENT_WORDS - {'SELECT'} or (
+                        token.is_word('SELECT') and not tokens[j - 1].is_word('UNION', 'ALL', 'EXCEPT',
+                                                                               'INTERSECT')):
+                    return False
+        return False
+
+    def check_scalar_udfs(self, obj: SqlObject, tokens: List[Token]):
+        for i, token in enumerate(tokens):
+            # Scalar functions are called schema-qualified: dbo.FN_NAME(...)
+            if (_is_symbol(tokens, i - 1, '.') and _is_symbol(tokens, i + 1, '(') and token.is_name
+                    and token.value.upper() in self.scalar_functions and token.value.upper() != obj.key
+                    and self._in_set_query(tokens, i)):
+                self._add('scalar-udf-in-query', obj, token.line, token.value)
+
+    def _table_aliases(self, tokens: List[Token]) -> Dict[str, Set[str]]:
+        """Table keys by the aliases and names they are read under in the batch (FROM, JOIN, UPDATE, INTO)"""
+        aliases: Dict[str, Set[str]] = {}
+        for i, token in enumerate(tokens):
+            if not token.is_word('FROM', 'JOIN', 'UPDATE', 'INTO'):
+                continue
+            j = i + 1
+            while True:
+                # schema.table, then an optional [AS] alias; FROM a x, b y lists more tables
+                if j >= len(tokens) or not _is_identifier(tokens[j]):
+                    break
+                while _is_symbol(tokens, j + 1, '.') and j + 2 < len(tokens) and tokens[j + 2].is_name:
+                    j += 2
+                table = self.graph.get(tokens[j].value)
+                j += 1
+                if table is None or table.kind != 'table':
+                    break
+                aliases.setdefault(table.key, set()).add(table.key)
+                if j < len(tokens) and tokens[j].is_word('AS'):
+                    j += 1
+                if j < len(tokens) and _is_identifier(tokens[j]):
+                    aliases.setdefault(tokens[j].value.upper(), set()).add(table.key)
+                    j += 1
+                if not _is_symbol(tokens, j, ','):
+                    break
+                j += 1
+        return aliases
+
+    def _wrapped_column(self, tokens: List[Token], start: int, end: int,
+                        aliases: Dict[str, Set[str]]) -> Optional[str]:
+        """
+        The first indexed column among the arguments from start to end
+
+        A qualified column (alias.COLUMN) is looked up in the tables of its alias, an unqualified one in
+        every table the batch reads.
+        """
+        every_table = set().union(*aliases.values())
+        for j in range(start, end):
+            token = tokens[j]
+            if not _is_identifier(token) or _is_symbol(tokens, j + 1, '(') or _is_symbol(tokens, j + 1, '.'):
+                continue
+            qualified = _is_symbol(tokens, j - 1, '.') and j >= 2 and tokens[j - 2].is_name
+            tables = aliases.get(tokens[j - 2].value.upper(), set()) if qualified else every_table
+            column = token.value.upper()
+            if any(column in self.leading_columns.get(table, ()) for table in tables):
+                return f"{tokens[j - 2].value}.{token.value}" if qualified else token.value
+        return None
+
+    def check_where_clauses(self, obj: SqlObject, tokens: List[Token]):
+        # (paren depth, inside a WHERE) of the open clauses; a subquery's SELECT list is not part of the WHERE
+        clauses: List[tuple] = []
+        aliases = self._table_aliases(tokens)
+        depth = 0
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token.kind == 'symbol':
+                if token.value == '(':
+                    depth += 1
+                elif token.value == ')':
+                    depth -= 1
+                    while clauses and clauses[-1][0] > depth:
+                        clauses.pop()
+                elif token.value == ';':
+                    while clauses and clauses[-1][0] == depth:
+                        clauses.pop()
+                i += 1
+                continue
+            while clauses and clauses[-1][0] == depth and token.upper in _CLAUSE_END_WORDS:
+                clauses.pop()
+            if token.is_word('WHERE'):
+                clauses.append((depth, True))
+            elif token.is_word('SELECT') and clauses and depth > clauses[-1][0]:
+                clauses.append((depth, False))
+            elif clauses and clauses[-1][1] and _is_call(tokens, i):
+                end = _closing_paren(tokens, i + 1)
+                # Only the column side of a comparison needs a seek; a function building the value is fine
+                column = None if _on_value_side(tokens, i) else self._wrapped_column(tokens, i + 2, end, aliases)
+                if column:
+                    self._add('non-sargable-predicate', obj, token.line, f"{token.value}({column} ...)")
+                    # One finding per wrapped expression; nested calls are part of it
+                    i = end
+                    continue
+            i += 1
+
+    def check_while_loops(self, obj: SqlObject, tokens: List[Token]):
+        for i, token in enumerate(tokens):
+            if not token.is_word('WHILE'):
+                continue
+            # The condition runs to the BEGIN of the body (subqueries in it are skipped)
+            j = i + 1
+            while j < len(tokens) and not tokens[j].is_word('BEGIN'):
+                if _is_symbol(tokens, j, '('):
+                    j = _closing_paren(tokens, j)
+                j += 1
+            end = self._block_end(tokens, j)
+            body = tokens[j + 1:end]
+            statements = sorted({other.upper for other in body
+                                 if other.is_word('INSERT', 'UPDATE', 'DELETE', 'MERGE', 'FROM', 'FETCH')})
+            if statements:
+                self._add('rbar-while-loop', obj, token.line, f"body runs {', '.join(statements)}")
+
+    @staticmethod
+    def _block_end(tokens: List[Token], begin: int) -> int:
+        """Index of the END closing the BEGIN at begin (CASE ... END counted; BEGIN TRAN has no END)"""
+        depth = 0
+        for j in range(begin, len(tokens)):
+            token = tokens[j]
+            if token.is_word('BEGIN') and not (j + 1 < len(tokens) and tokens[j + 1].is_word(
+                    'TRAN', 'TRANSACTION', 'DISTRIBUTED')):
+                depth += 1
+            elif token.is_word('CASE'):
+                depth += 1
+            elif token.is_word('END'):
+                depth -= 1
+                if not depth:
+                    return j
+        return len(tokens)
+
+    def check_select_star(self, obj: SqlObject, tokens: List[Token]):
+        for i, token in enumerate(tokens):
+            if not token.is_word('SELECT'):
+                continue
+            # EXISTS (SELECT * ...) reads no columns
+            if _is_symbol(tokens, i - 1, '(') and i >= 2 and tokens[i - 2].is_word('EXISTS'):
+                continue
+            j = i + 1
+            if j < len(tokens) and tokens[j].is_word('DISTINCT', 'ALL'):
+                j += 1
+            if j < len(tokens) and tokens[j].is_word('TOP'):
+                j = _closing_paren(tokens, j + 1) + 1 if _is_symbol(tokens, j + 1, '(') else j + 2
+                if j < len(tokens) and tokens[j].is_word('PERCENT'):
+                    j += 1
+            if _is_symbol(tokens, j, '*'):
+                self._add('select-star', obj, token.line)
@@ -0,0 +1,1159 @@
+#!/usr/bin/env python3
+"""
+T-SQL Parser for Model Registry
+Tokenizes SQL scripts (batches, GO, comments, brackets) and builds the graph of tables, indexes, keys and code objects
+"""
+
+import re
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Bump when parsing changes, so cached parse results are discarded
+PARSER_VERSION = 4
+
+# Fewer uncached scripts than this are parsed without starting a process pool
+MIN_PARALLEL_FILES = 8
+
+# Kinds of objects the graph holds, as written after CREATE
+OBJECT_KINDS = {
+    'TABLE': 'table',
+    'VIEW': 'view',
+    'PROC': 'procedure',
+    'PROCEDURE': 'procedure',
+    'FUNCTION': 'function',
+    'TRIGGER': 'trigger'
+}
+
+# Keywords after which a statement names the object it reads or writes
+REFERENCE_KEYWORDS = {'FROM', 'JOIN', 'INTO', 'INSERT', 'UPDATE', 'DELETE', 'MERGE', 'USING', 'APPLY', 'EXEC',
+                      'EXECUTE', 'REFERENCES'}
+
+# Words that end a table source, so they are never taken for its alias
+RESERVED_WORDS = {
+    'ADD', 'ALL', 'AND', 'ANY', 'APPLY', 'AS', 'ASC', 'BEGIN', 'BETWEEN', 'BREAK', 'BY', 'CASE', 'CLOSE',
+    'COMMIT', 'CONTINUE', 'CROSS', 'CURSOR', 'DEALLOCATE', 'DECLARE', 'DELETE', 'DESC', 'DISTINCT', 'DROP',
+    'ELSE', 'END', 'EXCEPT', 'EXEC', 'EXECUTE', 'EXISTS', 'FETCH', 'FOR', 'FROM', 'FULL', 'GOTO', 'GROUP',
+    'HAVING', 'IF', 'IN', 'INNER', 'INSERT', 'INTERSECT', 'INTO', 'IS', 'JOIN', 'LEFT', 'LIKE', 'MERGE',
+    'NOT', 'NULL', 'ON', 'OPEN', 'OPTION', 'OR', 'ORDER', 'OUTER', 'OUTPUT', 'PIVOT', 'PRINT', 'RAISERROR',
+    'RETURN', 'RETURNS', 'RIGHT', 'ROLLBACK', 'SAVE', 'SELECT', 'SET', 'THEN', 'THROW', 'TRAN',
+    'TRANSACTION', 'TRUNCATE', 'TRY', 'CATCH', 'UNION', 'UNPIVOT', 'UPDATE', 'USING', 'VALUES', 'WAITFOR',
+    'WHEN', 'WHERE', 'WHILE', 'WITH'
+}
+
+# Words that end the column and constraint list of an ALTER TABLE ... ADD
+_ALTER_END_WORDS = RESERVED_WORDS - {'NOT', 'NULL', 'ON', 'WITH', 'FOR'}
+
+# Schemas of built-in objects, never looked up in the graph
+SYSTEM_SCHEMAS = {'SYS', 'INFORMATION_SCHEMA'}
+
+# Pseudo-tables of triggers and OUTPUT clauses
+PSEUDO_TABLES = {'INSERTED', 'DELETED'}
+
+_TOKEN_PATTERN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<line_comment>--[^\n]*)
+  | (?P<block_comment>/\*)
+  | (?P<string>N?'(?:[^']|'')*')
+  | (?P<bracket>\[(?:[^\]]|\]\])*\])
+  | (?P<dquote>"(?:[^"]|"")*")
+  | (?P<variable>@@?[\w@#$]*)
+  | (?P<number>0[xX][0-9A-Fa-f]*|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<word>(?:[^\W\d]|\#)[\w@#$]*)
+  | (?P<symbol><>|!=|>=|<=|::|\+=|-=|\*=|/=|.)
+""", re.VERBOSE | re.DOTALL)
+
+_BLOCK_COMMENT_PATTERN = re.compile(r'/\*|\*/')
+
+
+class SqlSyntaxError(Exception):
+    """A script the tokenizer cannot read (e.g., an unterminated comment or string)"""
+
+
+class Token:
+    """
+    One token of a script
+
+    kind is 'word' (identifier or keyword), 'name' (quoted identifier, value without
+    the quotes), 'string', 'number', 'variable', 'symbol' or 'go' (batch separator).
+    """
+    __slots__ = ('kind', 'value', 'line', 'upper')
+
+    def __init__(self, kind: str, value: str, line: int):
+        self.kind = kind
+        self.value = value
+        self.line = line
+        self.upper = value.upper() if kind == 'word' else None
+
+    @property
+    def is_name(self) -> bool:
+        return self.kind in ('word', 'name')
+
+    def is_word(self, *words: str) -> bool:
+        return self.upper in words
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.value!r}, line {self.line})"
+
+
+def tokenize(text: str) -> List[Token]:
+    """
+    Split a script into tokens in one pass, dropping whitespace and comments
+
+    Block comments nest as in T-SQL. GO on a line of its own (optionally with a
+    repeat count) becomes a 'go' token; a GO anywhere else is an ordinary word.
+
+    Raises:
+        SqlSyntaxError: An unterminated block comment, string or quoted identifier
+    """
+    tokens: List[Token] = []
+    match = _TOKEN_PATTERN.match
+    position = 0
+    line = 1
+    length = len(text)
+    previous_line = 0
+
+    while position < length:
+        m = match(text, position)
+        kind = m.lastgroup
+        value = m.group()
+        end = m.end()
+
+        if kind == 'block_comment':
+            depth = 1
+            scan = end
+            while depth:
+                marker = _BLOCK_COMMENT_PATTERN.search(text, scan)
+                if not marker:
+                    raise SqlSyntaxError(f"Unterminated comment starting on line {line}")
+                depth += 1 if marker.group() == '/*' else -1
+                scan = marker.end()
+            line += text.count('\n', position, scan)
+            position = scan
+            continue
+
+        if kind in ('space', 'line_comment'):
+            line += value.count('\n')
+            position = end
+            continue
+
+        if kind == 'symbol' and value in ("'", '[', '"'):
+            raise SqlSyntaxError(f"Unterminated {'string' if value == chr(39) else 'quoted identifier'} "
+                                 f"on line {line}")
+
+        if kind == 'word' and value.upper() == 'GO' and line > previous_line:
+            # GO is a batch separator only when it stands alone on its line (a repeat count may follow)
+            line_end = text.find('\n', end)
+            if line_end < 0:
+                line_end = length
+            rest = text[end:line_end].split('--', 1)[0].strip()
+            if not rest or rest.isdigit():
+                tokens.append(Token('go', value, line))
+                previous_line = line
+                position = line_end
+                continue
+
+        if kind == 'string':
+            token = Token('string', value, line)
+            line += value.count('\n')
+        elif kind in ('bracket', 'dquote'):
+            quote = value[-1]
+            token = Token('name', value[1:-1].replace(quote * 2, quote), line)
+            line += value.count('\n')
+        elif kind == 'word':
+            token = Token('word', value, line)
+        else:
+            token = Token(kind, value, line)
+        tokens.append(token)
+        previous_line = line
+        position = end
+
+    return tokens
+
+
+def split_batches(tokens: List[Token]) -> List[List[Token]]:
+    """Group tokens into the batches GO separates (empty batches are dropped)"""
+    batches = []
+    current: List[Token] = []
+    for token in tokens:
+        if token.kind == 'go':
+            if current:
+                batches.append(current)
+            current = []
+        else:
+            current.append(token)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def split_script(text: str) -> List[Tuple[int, str, int]]:
+    """
+    Split a script into the batches sqlcmd would send, at the GO lines tokenize() finds
+
+    Returns:
+        (line the batch starts on, batch text, times to run it (GO n)) for each batch with any statements
+
+    Raises:
+        SqlSyntaxError: A script tokenize() cannot read
+    """
+    lines = text.split('\n')
+    batches = []
+    start = 1
+    has_statements = False
+    for token in tokenize(text) + [None]:
+        if token is not None and token.kind != 'go':
+            has_statements = True
+            continue
+        end = token.line if token is not None else len(lines) + 1
+        if has_statements:
+            count = 1
+            if token is not None:
+                rest = lines[token.line - 1].strip()[2:].split('--', 1)[0].strip()
+                count = int(rest) if rest.isdigit() else 1
+            batches.append((start, '\n'.join(lines[start - 1:end - 1]), count))
+        start = end + 1
+        has_statements = False
+    return batches
+
+
+class ObjectRef:
+    """A possibly qualified object name ([database.][schema.]name)"""
+    __slots__ = ('database', 'schema', 'name')
+
+    def __init__(self, name: str, schema: Optional[str] = None, database: Optional[str] = None):
+        self.name = name
+        self.schema = schema or None
+        self.database = database or None
+
+    @property
+    def key(self) -> str:
+        """Case-insensitive lookup key of the object (its name; the registry uses one schema)"""
+        return self.name.upper()
+
+    def is_system(self) -> bool:
+        return ((self.schema or '').upper() in SYSTEM_SCHEMAS or self.name.upper() in PSEUDO_TABLES
+                or self.name.startswith('#') or self.name.lower().startswith(('sp_', 'xp_')))
+
+    def __str__(self):
+        return '.'.join(part for part in (self.database, self.schema, self.name) if part)
+
+    def __repr__(self):
+        return f"ObjectRef({str(self)!r})"
+
+
+class Column:
+    """A table column"""
+
+    def __init__(self, name: str, data_type: str, nullable: bool = True, identity: bool = False,
+                 default: Optional[str] = None, computed: bool = False, line: int = 0):
+        self.name = name
+        self.data_type = data_type
+        self.nullable = nullable
+        self.identity = identity
+        self.default = default
+        self.computed = computed
+        self.line = line
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'data_type': self.data_type,
+            'nullable': self.nullable,
+            'identity': self.identity,
+            'default': self.default,
+            'computed': self.computed
+        }
+
+
+class ForeignKey:
+    """A foreign key of a table"""
+
+    def __init__(self, columns: List[str], references: ObjectRef, ref_columns: List[str],
+                 name: Optional[str] = None, line: int = 0):
+        self.columns = columns
+        self.references = references
+        self.ref_columns = ref_columns
+        self.name = name
+        self.line = line
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'columns': self.columns,
+            'references_table': self.references.name,
+            'references_columns': self.ref_columns
+        }
+
+
+class Index:
+    """An index or key constraint of a table (constraint: declared PRIMARY KEY or UNIQUE rather than as an index)"""
+
+    def __init__(self, name: Optional[str], columns: List[str], unique: bool = False,
+                 primary_key: bool = False, clustered: Optional[bool] = None, line: int = 0,
+                 constraint: bool = False):
+        self.name = name
+        self.columns = columns
+        self.unique = unique or primary_key
+        self.primary_key = primary_key
+        self.clustered = clustered
+        self.line = line
+        self.constraint = constraint or primary_key
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'columns': self.columns,
+            'unique': self.unique,
+            'primary_key': self.primary_key,
+            'clustered': self.clustered,
+            'constraint': self.constraint
+        }
+
+
+class SqlObject:
+    """
+    A table, view, procedure, function or trigger defined in a script
+
+    Tables carry their columns, keys and indexes; code objects carry the objects
+    their body reads, writes or executes (references) and, for triggers, the
+    table they are on (parent).
+    """
+
+    def __init__(self, kind: str, ref: ObjectRef, file: str, line: int):
+        self.kind = kind
+        self.ref = ref
+        self.file = file
+        self.line = line
+        self.columns: Dict[str, Column] = {}
+        self.foreign_keys: List[ForeignKey] = []
+        self.indexes: List[Index] = []
+        self.references: Dict[str, ObjectRef] = {}
+        self.parent: Optional[ObjectRef] = None
+
+    @property
+    def name(self) -> str:
+        return self.ref.name
+
+    @property
+    def key(self) -> str:
+        return self.ref.key
+
+    @property
+    def primary_key(self) -> Optional[Index]:
+        return next((index for index in self.indexes if index.primary_key), None)
+
+    def column(self, name: str) -> Optional[Column]:
+        return self.columns.get(name.upper())
+
+    def add_column(self, column: Column):
+        self.columns[column.name.upper()] = column
+
+    def add_reference(self, ref: ObjectRef):
+        if not ref.is_system() and ref.key != self.key:
+            self.references.setdefault(ref.key, ref)
+
+    def depends_on(self) -> Set[str]:
+        """Keys of the objects this one needs to exist first"""
+        keys = {fk.references.key for fk in self.foreign_keys} | set(self.references)
+        if self.parent:
+            keys.add(self.parent.key)
+        keys.discard(self.key)
+        return keys
+
+    def to_dict(self) -> Dict:
+        data = {'kind': self.kind, 'name': self.name, 'schema': self.ref.schema, 'file': self.file, 'line': self.line}
+        if self.kind == 'table':
+            data['columns'] = [column.to_dict() for column in self.columns.values()]
+            data['foreign_keys'] = [fk.to_dict() for fk in self.foreign_keys]
+            data['indexes'] = [index.to_dict() for index in self.indexes]
+        else:
+            data['references'] = sorted(str(ref) for ref in self.references.values())
+            if self.parent:
+                data['parent'] = str(self.parent)
+        return data
+
+
+class TableAlteration:
+    """Columns and constraints an ALTER TABLE adds, applied once every script is parsed"""
+
+    def __init__(self, table: ObjectRef, file: str, line: int):
+        self.table = table
+        self.file = file
+        self.line = line
+        self.columns: List[Column] = []
+        self.foreign_keys: List[ForeignKey] = []
+        self.indexes: List[Index] = []
+
+
+def _ref_to_list(ref: Optional[ObjectRef]) -> Optional[List]:
+    return [ref.name, ref.schema, ref.database] if ref else None
+
+
+def _ref_from_list(data: Optional[List]) -> Optional[ObjectRef]:
+    return ObjectRef(*data) if data else None
+
+
+def _keys_to_list(foreign_keys: List[ForeignKey], indexes: List[Index]) -> Dict:
+    return {
+        'foreign_keys': [[fk.columns, _ref_to_list(fk.references), fk.ref_columns, fk.name, fk.line]
+                         for fk in foreign_keys],
+        'indexes': [[index.name, index.columns, index.unique, index.primary_key, index.clustered, index.line,
+                     index.constraint] for index in indexes]
+    }
+
+
+def _keys_from_list(data: Dict) -> Tuple[List[ForeignKey], List[Index]]:
+    foreign_keys = [ForeignKey(columns, _ref_from_list(ref), ref_columns, name, line)
+                    for columns, ref, ref_columns, name, line in data['foreign_keys']]
+    indexes = [Index(name, columns, unique, primary_key, clustered, line, constraint)
+               for name, columns, unique, primary_key, clustered, line, constraint in data['indexes']]
+    return foreign_keys, indexes
+
+
+def _column_to_list(column: Column) -> List:
+    return [column.name, column.data_type, column.nullable, column.identity, column.default, column.computed,
+            column.line]
+
+
+class ParseResult:
+    """Everything parsed from one script"""
+
+    def __init__(self, file: str):
+        self.file = file
+        self.objects: List[SqlObject] = []
+        self.alterations: List[TableAlteration] = []
+        # Objects used by statements outside the object definitions (e.g., data scripts)
+        self.references: Dict[str, ObjectRef] = {}
+        self.batches = 0
+        self.errors: List[str] = []
+
+    def to_dict(self) -> Dict:
+        """Plain data holding the whole result (see from_dict), e.g., for a parse cache"""
+        objects = []
+        for obj in self.objects:
+            data = {'kind': obj.kind, 'ref': _ref_to_list(obj.ref), 'line': obj.line,
+                    'columns': [_column_to_list(column) for column in obj.columns.values()],
+                    'references': [_ref_to_list(ref) for ref in obj.references.values()],
+                    'parent': _ref_to_list(obj.parent)}
+            data.update(_keys_to_list(obj.foreign_keys, obj.indexes))
+            objects.append(data)
+        alterations = []
+        for alteration in self.alterations:
+            data = {'table': _ref_to_list(alteration.table), 'line': alteration.line,
+                    'columns': [_column_to_list(column) for column in alteration.columns]}
+            data.update(_keys_to_list(alteration.foreign_keys, alteration.indexes))
+            alterations.append(data)
+        return {'file': self.file, 'objects': objects, 'alterations': alterations,
+                'references': [_ref_to_list(ref) for ref in self.references.values()],
+                'batches': self.batches, 'errors': self.errors}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ParseResult':
+        result = cls(data['file'])
+        result.batches = data['batches']
+        result.errors = list(data['errors'])
+        for item in data['objects']:
+            obj = SqlObject(item['kind'], _ref_from_list(item['ref']), result.file, item['line'])
+            for column in item['columns']:
+                obj.add_column(Column(*column))
+            for ref in item['references']:
+                ref = _ref_from_list(ref)
+                obj.references[ref.key] = ref
+            obj.parent = _ref_from_list(item['parent'])
+            obj.foreign_keys, obj.indexes = _keys_from_list(item)
+            result.objects.append(obj)
+        for item in data['alterations']:
+            alteration = TableAlteration(_ref_from_list(item['table']), result.file, item['line'])
+            alteration.columns = [Column(*column) for column in item['columns']]
+            alteration.foreign_keys, alteration.indexes = _keys_from_list(item)
+            result.alterations.append(alteration)
+        for ref in data['references']:
+            ref = _ref_from_list(ref)
+            result.references[ref.key] = ref
+        return result
+
+
+def _matching_paren(tokens: List[Token], start: int) -> int:
+    """Index of the ')' closing the '(' at start (len(tokens) if it is never closed)"""
+    depth = 0
+    for i in range(start, len(tokens)):
+        value = tokens[i].value if tokens[i].kind == 'symbol' else None
+        if value == '(':
+            depth += 1
+        elif value == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(tokens)
+
+
+def _split_top_level(tokens: List[Token]) -> List[List[Token]]:
+    """Split tokens on the commas outside parentheses"""
+    parts = [[]]
+    depth = 0
+    for token in tokens:
+        if token.kind == 'symbol':
+            if token.value == '(':
+                depth += 1
+            elif token.value == ')':
+                depth -= 1
+            elif token.value == ',' and depth == 0:
+                parts.append([])
+                continue
+        parts[-1].append(token)
+    return [part for part in parts if part]
+
+
+def _is_symbol(tokens: List[Token], i: int, value: str) -> bool:
+    return i < len(tokens) and tokens[i].kind == 'symbol' and tokens[i].value == value
+
+
+def _read_name(tokens: List[Token], i: int) -> Tuple[Optional[ObjectRef], int]:
+    """Read a multi-part name starting at i; returns the name and the index after it"""
+    if i >= len(tokens) or not tokens[i].is_name:
+        return None, i
+    parts = [tokens[i].value]
+    i += 1
+    while _is_symbol(tokens, i, '.'):
+        if i + 1 < len(tokens) and tokens[i + 1].is_name:
+            parts.append(tokens[i + 1].value)
+            i += 2
+        elif _is_symbol(tokens, i + 1, '.'):
+            # database..name leaves the schema out
+            parts.append('')
+            i += 1
+        else:
+            break
+    parts = parts[-3:]
+    return ObjectRef(parts[-1], *(reversed(parts[:-1]))), i
+
+
+def _column_list(tokens: List[Token], i: int) -> Tuple[List[str], int]:
+    """Read '(col [ASC|DESC], ...)' at i; returns the column names and the index after ')'"""
+    if not _is_symbol(tokens, i, '('):
+        return [], i
+    end = _matching_paren(tokens, i)
+    columns = [part[0].value for part in _split_top_level(tokens[i + 1:end]) if part[0].is_name]
+    return columns, end + 1
+
+
+def _text(tokens: List[Token]) -> str:
+    """Tokens joined back into compact SQL text"""
+    text = ''
+    for token in tokens:
+        value = f"[{token.value}]" if token.kind == 'name' else token.value
+        if text and not (token.kind == 'symbol' and token.value in ',.)') and not text.endswith(('(', '.')):
+            text += ' '
+        text += value
+    return text
+
+
+class _BatchParser:
+    """Parser of the statements of one batch"""
+
+    def __init__(self, tokens: List[Token], result: ParseResult):
+        self.tokens = tokens
+        self.result = result
+
+    def parse(self):
+        tokens = self.tokens
+        i = 0
+        # Start of the statements since the last definition, whose references belong to the script
+        loose = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token.is_word('CREATE'):
+                self.add_script_references(loose, i)
+                i = loose = self.parse_create(i + 1)
+            elif token.is_word('ALTER') and i + 1 < len(tokens) and tokens[i + 1].is_word('TABLE'):
+                self.add_script_references(loose, i)
+                i = loose = self.parse_alter_table(i + 2)
+            else:
+                i += 1
+        self.add_script_references(loose, len(tokens))
+
+    def add_script_references(self, start: int, end: int):
+        if start >= end:
+            return
+        for ref in self.collect_references(start, end):
+            if not ref.is_system():
+                self.result.references.setdefault(ref.key, ref)
+
+    def parse_create(self, i: int) -> int:
+        tokens = self.tokens
+        if i + 1 < len(tokens) and tokens[i].is_word('OR') and tokens[i + 1].is_word('ALTER'):
+            i += 2
+        unique = False
+        clustered = None
+        while i < len(tokens) and tokens[i].is_word('UNIQUE', 'CLUSTERED', 'NONCLUSTERED'):
+            unique = unique or tokens[i].upper == 'UNIQUE'
+            if tokens[i].upper != 'UNIQUE':
+                clustered = tokens[i].upper == 'CLUSTERED'
+            i += 1
+        if i >= len(tokens):
+            return i
+
+        keyword = tokens[i].upper
+        if keyword == 'INDEX':
+            return self.parse_index(i + 1, unique, clustered)
+        kind = OBJECT_KINDS.get(keyword)
+        if kind is None:
+            return i
+        ref, next_i = _read_name(tokens, i + 1)
+        if ref is None:
+            return next_i
+        if kind == 'table':
+            if ref.name.startswith('#'):
+                return next_i
+            return self.parse_table(ref, tokens[i].line, next_i)
+
+        # A view, procedure, function or trigger runs to the end of its batch
+        code = SqlObject(kind, ref, self.result.file, tokens[i].line)
+        self.parse_body(code, next_i)
+        self.result.objects.append(code)
+        return len(tokens)
+
+    def parse_table(self, ref: ObjectRef, line: int, i: int) -> int:
+        tokens = self.tokens
+        if not _is_symbol(tokens, i, '('):
+            return i
+        end = _matching_paren(tokens, i)
+        table = SqlObject('table', ref, self.result.file, line)
+        for element in _split_top_level(tokens[i + 1:end]):
+            self.parse_table_element(element, table.add_column, table.foreign_keys, table.indexes)
+        self.result.objects.append(table)
+        return end + 1
+
+    def parse_alter_table(self, i: int) -> int:
+        tokens = self.tokens
+        ref, i = _read_name(tokens, i)
+        if ref is None or ref.name.startswith('#'):
+            return i
+        while i < len(tokens) and tokens[i].is_word('WITH', 'CHECK', 'NOCHECK'):
+            i += 1
+        if i >= len(tokens) or not tokens[i].is_word('ADD'):
+            return i
+
+        # The added items run to the next statement
+        end = i + 1
+        depth = 0
+        while end < len(tokens):
+            token = tokens[end]
+            if token.kind == 'symbol':
+                depth += {'(': 1, ')': -1}.get(token.value, 0)
+                if depth < 0 or token.value == ';':
+                    break
+            elif depth == 0 and token.upper in _ALTER_END_WORDS:
+                break
+            end += 1
+
+        alteration = TableAlteration(ref, self.result.file, tokens[i].line)
+        for element in _split_top_level(tokens[i + 1:end]):
+            self.parse_table_element(element, alteration.columns.append, alteration.foreign_keys,
+                                     alteration.indexes)
+        self.result.alterations.append(alteration)
+        return end
+
+    def parse_table_element(self, element: List[Token], add_column, foreign_keys: List[ForeignKey],
+                            indexes: List[Index]):
+        """Parse one column definition or table constraint"""
+        constraint_name = None
+        i = 0
+        if element[0].is_word('CONSTRAINT') and len(element) > 1:
+            constraint_name = element[1].value
+            i = 2
+        if i >= len(element):
+            return
+        first = element[i]
+
+        if first.is_word('PRIMARY', 'UNIQUE'):
+            primary_key = first.upper == 'PRIMARY'
+            i += 2 if primary_key else 1
+            clustered = None
+            if i < len(element) and element[i].is_word('CLUSTERED', 'NONCLUSTERED'):
+                clustered = element[i].upper == 'CLUSTERED'
+                i += 1
+            columns, _ = _column_list(element, i)
+            indexes.append(Index(constraint_name, columns, unique=True, primary_key=primary_key,
+                                 clustered=clustered, line=first.line, constraint=True))
+        elif first.is_word('FOREIGN'):
+            columns, i = _column_list(element, i + 2)
+            self.parse_references(element, i, columns, constraint_name, foreign_keys)
+        elif first.is_word('INDEX'):
+            name = element[i + 1].value if i + 1 < len(element) else None
+            i += 2
+            unique = False
+            clustered = None
+            while i < len(element) and element[i].is_word('UNIQUE', 'CLUSTERED', 'NONCLUSTERED'):
+                unique = unique or element[i].upper == 'UNIQUE'
+                if element[i].upper != 'UNIQUE':
+                    clustered = element[i].upper == 'CLUSTERED'
+                i += 1
+            columns, _ = _column_list(element, i)
+            indexes.append(Index(name, columns, unique=unique, clustered=clustered, line=first.line))
+        elif first.is_word('CHECK', 'DEFAULT', 'PERIOD'):
+            return
+        elif first.is_name:
+            self.parse_column(element, i, add_column, foreign_keys, indexes)
+
+    def parse_column(self, element: List[Token], i: int, add_column, foreign_keys: List[ForeignKey],
+                     indexes: List[Index]):
+        name_token = element[i]
+        i += 1
+        if i < len(element) and element[i].is_word('AS'):
+            add_column(Column(name_token.value, '', computed=True, line=name_token.line))
+            return
+
+        # Data type: a (possibly qualified) name with optional (length) or (precision, scale)
+        type_ref, i = _read_name(element, i)
+        data_type = type_ref.name.upper() if type_ref else ''
+        if _is_symbol(element, i, '('):
+            end = _matching_paren(element, i)
+            data_type += _text(element[i:end + 1]).upper()
+            i = end + 1
+
+        column = Column(name_token.value, data_type, line=name_token.line)
+        constraint_name = None
+        while i < len(element):
+            token = element[i]
+            if token.is_word('NOT') and i + 1 < len(element) and element[i + 1].is_word('NULL'):
+                column.nullable = False
+                i += 2
+            elif token.is_word('NULL'):
+                column.nullable = True
+                i += 1
+            elif token.is_word('IDENTITY'):
+                column.identity = True
+                column.nullable = False
+                i += 1
+                if _is_symbol(element, i, '('):
+                    i = _matching_paren(element, i) + 1
+            elif token.is_word('CONSTRAINT') and i + 1 < len(element):
+                constraint_name = element[i + 1].value
+                i += 2
+            elif token.is_word('DEFAULT'):
+                start = i + 1
+                i = start
+                depth = 0
+                while i < len(element):
+                    if element[i].kind == 'symbol':
+                        depth += {'(': 1, ')': -1}.get(element[i].value, 0)
+                    elif depth == 0 and element[i].is_word('NOT', 'NULL', 'CONSTRAINT', 'PRIMARY', 'UNIQUE',
+                                                           'REFERENCES', 'FOREIGN', 'CHECK', 'IDENTITY', 'WITH'):
+                        break
+                    i += 1
+                column.default = _text(element[start:i])
+            elif token.is_word('PRIMARY', 'UNIQUE'):
+                primary_key = token.upper == 'PRIMARY'
+                i += 2 if primary_key else 1
+                clustered = None
+                if i < len(element) and element[i].is_word('CLUSTERED', 'NONCLUSTERED'):
+                    clustered = element[i].upper == 'CLUSTERED'
+                    i += 1
+                if primary_key:
+                    column.nullable = False
+                indexes.append(Index(constraint_name, [column.name], unique=True, primary_key=primary_key,
+                                     clustered=clustered, line=token.line, constraint=True))
+                constraint_name = None
+            elif token.is_word('FOREIGN', 'REFERENCES'):
+                if token.upper == 'FOREIGN':
+                    i += 2
+                i = self.parse_references(element, i, [column.name], constraint_name, foreign_keys)
+                constraint_name = None
+            elif token.is_word('CHECK') and _is_symbol(element, i + 1, '('):
+                i = _matching_paren(element, i + 1) + 1
+            else:
+                i += 1
+        add_column(column)
+
+    def parse_references(self, tokens: List[Token], i: int, columns: List[str], name: Optional[str],
+                         foreign_keys: List[ForeignKey]) -> int:
+        if i >= len(tokens) or not tokens[i].is_word('REFERENCES'):
+            return i
+        line = tokens[i].line
+        ref, i = _read_name(tokens, i + 1)
+        if ref is None:
+            return i
+        ref_columns, i = _column_list(tokens, i)
+        foreign_keys.append(ForeignKey(columns, ref, ref_columns, name, line))
+        return i
+
+    def parse_index(self, i: int, unique: bool, clustered: Optional[bool]) -> int:
+        tokens = self.tokens
+        if i >= len(tokens) or not tokens[i].is_name:
+            return i
+        name = tokens[i].value
+        line = tokens[i].line
+        if i + 1 >= len(tokens) or not tokens[i + 1].is_word('ON'):
+            return i + 1
+        ref, i = _read_name(tokens, i + 2)
+        if ref is None or ref.name.startswith('#'):
+            return i
+        columns, i = _column_list(tokens, i)
+        alteration = TableAlteration(ref, self.result.file, line)
+        alteration.indexes.append(Index(name, columns, unique=unique, clustered=clustered, line=line))
+        self.result.alterations.append(alteration)
+        return i
+
+    def parse_body(self, code: SqlObject, i: int):
+        """Collect the objects a code object's body refers to"""
+        tokens = self.tokens
+        if code.kind == 'trigger' and i < len(tokens) and tokens[i].is_word('ON'):
+            code.parent, i = _read_name(tokens, i + 1)
+        for ref in self.collect_references(i, len(tokens)):
+            code.add_reference(ref)
+
+    def collect_references(self, i: int, count: int) -> List[ObjectRef]:
+        """Objects the tokens from i to count refer to, skipping CTEs, aliases, cursors and variables"""
+        tokens = self.tokens
+        local_names: Set[str] = set()
+        candidates: List[ObjectRef] = []
+        while i < count:
+            token = tokens[i]
+            upper = token.upper
+            if upper is None:
+                i += 1
+                continue
+
+            # CTE names: WITH name [(columns)] AS (, and , name AS ( after it
+            if token.is_name and i > 0 and (tokens[i - 1].is_word('WITH') or _is_symbol(tokens, i - 1, ',')):
+                after = i + 1
+                if _is_symbol(tokens, after, '('):
+                    after = _matching_paren(tokens, after) + 1
+                if after + 1 < count and tokens[after].is_word('AS') and _is_symbol(tokens, after + 1, '('):
+                    local_names.add(token.value.upper())
+
+            if upper == 'DECLARE' and i + 2 < count and tokens[i + 1].is_name and tokens[i + 2].is_word(
+                    'CURSOR', 'INSENSITIVE', 'SCROLL'):
+                local_names.add(tokens[i + 1].value.upper())
+
+            if upper in REFERENCE_KEYWORDS:
+                i = self.read_reference(i + 1, upper, candidates, local_names)
+                continue
+
+            # Qualified names: schema-qualified calls are user functions (scalar UDFs must be qualified)
+            if _is_symbol(tokens, i + 1, '.'):
+                ref, i = _read_name(tokens, i)
+                if ref.schema and _is_symbol(tokens, i, '(') and ref.schema.upper() not in SYSTEM_SCHEMAS:
+                    candidates.append(ref)
+                continue
+            i += 1
+
+        # CTEs, aliases and cursors are never schema-qualified, so dbo.U stays a table after FROM dbo.U AS u
+        return [ref for ref in candidates if ref.schema or ref.key not in local_names]
+
+    def read_reference(self, i: int, keyword: str, candidates: List[ObjectRef], local_names: Set[str]) -> int:
+        """Read the object named after a FROM/JOIN/INTO/... keyword and remember its alias"""
+        tokens = self.tokens
+        if keyword in ('EXEC', 'EXECUTE'):
+            # EXEC @status = dbo.proc
+            if i + 1 < len(tokens) and tokens[i].kind == 'variable' and _is_symbol(tokens, i + 1, '='):
+                i += 2
+        elif keyword == 'MERGE' and i < len(tokens) and tokens[i].is_word('INTO'):
+            i += 1
+        elif keyword == 'UPDATE' and i < len(tokens) and tokens[i].is_word('STATISTICS'):
+            return i + 1
+        if i < len(tokens) and tokens[i].is_word('TOP'):
+            return i + 1
+
+        if i < len(tokens) and tokens[i].kind == 'variable':
+            # A table variable
+            i += 1
+        else:
+            if i >= len(tokens) or not tokens[i].is_name or tokens[i].is_word(*RESERVED_WORDS):
+                return i
+            ref, i = _read_name(tokens, i)
+            # Unqualified calls after FROM/APPLY are built-in rowset functions such as OPENJSON(...)
+            builtin = not ref.schema and (keyword == 'APPLY' or (
+                _is_symbol(tokens, i, '(') and keyword not in ('INTO', 'REFERENCES')))
+            if not builtin:
+                candidates.append(ref)
+
+        # Remember the alias so a later UPDATE alias / DELETE alias is not taken for a table
+        if _is_symbol(tokens, i, '('):
+            i = _matching_paren(tokens, i) + 1
+        if i < len(tokens) and tokens[i].is_word('AS'):
+            i += 1
+        if i < len(tokens) and tokens[i].is_name and not tokens[i].is_word(*RESERVED_WORDS):
+            local_names.add(tokens[i].value.upper())
+            i += 1
+        return i
+
+
+def parse_sql(text: str, file: str = '') -> ParseResult:
+    """
+    Parse one script into the objects it creates and the tables it alters
+
+    Args:
+        text: Script text
+        file: Name recorded on the objects (e.g., the path relative to the scanned directory)
+
+    Returns:
+        ParseResult; a script that cannot be tokenized has its error in result.errors
+    """
+    result = ParseResult(file)
+    try:
+        tokens = tokenize(text)
+    except SqlSyntaxError as e:
+        result.errors.append(f"{file}: {str(e)}")
+        return result
+    batches = split_batches(tokens)
+    result.batches = len(batches)
+    for batch in batches:
+        _BatchParser(batch, result).parse()
+    return result
+
+
+def dependency_waves(dependencies: Dict[str, Set[str]]) -> Tuple[List[List[str]], List[str]]:
+    """
+    Group nodes into waves, each depending only on nodes of earlier waves (Kahn's algorithm)
+
+    Args:
+        dependencies: Nodes the key depends on, by node; nodes that are not keys are ignored.
+            Waves keep the nodes in the order of this dict.
+
+    Returns:
+        (waves, nodes left in or behind a dependency cycle)
+    """
+    order = {node: position for position, node in enumerate(dependencies)}
+    waiting = {node: 0 for node in dependencies}
+    dependents: Dict[str, List[str]] = {node: [] for node in dependencies}
+    for node, needs in dependencies.items():
+        for other in needs:
+            if other in dependents and other != node:
+                waiting[node] += 1
+                dependents[other].append(node)
+
+    waves = []
+    ready = [node for node, count in waiting.items() if not count]
+    while ready:
+        waves.append(ready)
+        next_ready = []
+        for node in ready:
+            for dependent in dependents[node]:
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    next_ready.append(dependent)
+        ready = sorted(next_ready, key=order.get)
+    done = {node for wave in waves for node in wave}
+    return waves, [node for node in dependencies if node not in done]
+
+
+def find_sql_files(root: str) -> List[Path]:
+    """The .sql files under root (or root itself if it is a file), in name order"""
+    path = Path(root)
+    if path.is_file():
+        return [path]
+    return sorted(path.rglob('*.sql'))
+
+
+class SchemaGraph:
+    """
+    All objects of a set of scripts, keyed by name, with the dependencies between them
+
+    Objects are looked up by name without case or schema, as the registry keeps
+    everything in dbo. ALTER TABLE and CREATE INDEX statements are applied to
+    their table after all scripts are added (see finish()).
+    """
+
+    def __init__(self):
+        self.objects: Dict[str, SqlObject] = {}
+        self.duplicates: List[Tuple[SqlObject, SqlObject]] = []
+        self.alterations: List[TableAlteration] = []
+        self.unresolved_alterations: List[TableAlteration] = []
+        self.errors: List[str] = []
+        self.files: List[str] = []
+        # Objects each script defines (duplicates included) and objects its other statements use
+        self.script_objects: Dict[str, List[SqlObject]] = {}
+        self.script_references: Dict[str, Dict[str, ObjectRef]] = {}
+        self.batches = 0
+        self.stats: Dict = {}
+
+    def add_result(self, result: ParseResult):
+        self.files.append(result.file)
+        self.batches += result.batches
+        self.errors.extend(result.errors)
+        self.script_objects[result.file] = list(result.objects)
+        references = dict(result.references)
+        for alteration in result.alterations:
+            references.setdefault(alteration.table.key, alteration.table)
+            for fk in alteration.foreign_keys:
+                references.setdefault(fk.references.key, fk.references)
+        self.script_references[result.file] = references
+        for obj in result.objects:
+            existing = self.objects.get(obj.key)
+            if existing:
+                # The first definition is kept; validation reports the others
+                self.duplicates.append((existing, obj))
+                continue
+            self.objects[obj.key] = obj
+        self.alterations.extend(result.alterations)
+
+    def add_file(self, path: Path, base: Optional[Path] = None):
+        """Parse one script and add its objects"""
+        name = str(path.relative_to(base)) if base else path.name
+        try:
+            with open(path, 'r', encoding='utf-8-sig') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            self.errors.append(f"Error reading {name}: {str(e)}")
+            return
+        self.add_result(parse_sql(text, name))
+
+    def finish(self):
+        """Apply the ALTER TABLE / CREATE INDEX statements to their tables"""
+        for alteration in self.alterations:
+            table = self.objects.get(alteration.table.key)
+            if table is None or table.kind != 'table':
+                self.unresolved_alterations.append(alteration)
+                continue
+            for column in alteration.columns:
+                table.add_column(column)
+            table.foreign_keys.extend(alteration.foreign_keys)
+            table.indexes.extend(alteration.indexes)
+        self.alterations = []
+
+    def get(self, name: str) -> Optional[SqlObject]:
+        return self.objects.get(name.upper())
+
+    def of_kind(self, kind: str) -> List[SqlObject]:
+        return [obj for obj in self.objects.values() if obj.kind == kind]
+
+    @property
+    def tables(self) -> List[SqlObject]:
+        return self.of_kind('table')
+
+    def dependencies(self, obj: SqlObject) -> Set[str]:
+        """Keys of the objects in the graph that obj depends on"""
+        return {key for key in obj.depends_on() if key in self.objects}
+
+    def dependents(self, obj: SqlObject) -> List[SqlObject]:
+        """Objects in the graph that depend on obj"""
+        return [other for other in self.objects.values() if obj.key in other.depends_on()]
+
+    def creation_order(self, objects: Optional[Iterable[SqlObject]] = None) -> Tuple[List[SqlObject], List[str]]:
+        """
+        Objects ordered so each comes after those it depends on
+
+        Returns:
+            (ordered objects, keys left in a dependency cycle)
+        """
+        waves, cycle = self.creation_waves(objects)
+        return [obj for wave in waves for obj in wave], cycle
+
+    def creation_waves(self, objects: Optional[Iterable[SqlObject]] = None
+                       ) -> Tuple[List[List[SqlObject]], List[str]]:
+        """
+        Objects grouped into waves that can each be created at once, after the waves before them
+
+        Returns:
+            (waves of objects in file order, keys left in or behind a dependency cycle)
+        """
+        selected = sorted(self.objects.values() if objects is None else objects, key=lambda obj: (obj.file, obj.line))
+        waves, cycle = dependency_waves({obj.key: self.dependencies(obj) for obj in selected})
+        return [[self.objects[key] for key in wave] for wave in waves], sorted(cycle)
+
+    def script_dependencies(self, file: str) -> Set[str]:
+        """
+        Scripts that must run before a script: those defining the objects it uses
+
+        A script that defines no objects (e.g., sample data) also waits for the
+        scripts creating triggers on the tables it uses, so data goes in with the
+        triggers in place, and for the earlier such scripts (in file order) using
+        any of the same objects, as it may read the rows they insert.
+        """
+        keys = set(self.script_references.get(file, {}))
+        for obj in self.script_objects.get(file, []):
+            keys |= obj.depends_on()
+        files = {self.objects[key].file for key in keys if key in self.objects}
+        if not self.script_objects.get(file):
+            # Triggers may share a name with another object (e.g., their audit table), so go by script
+            files |= {obj.file for objects in self.script_objects.values() for obj in objects
+                      if obj.kind == 'trigger' and obj.parent and obj.parent.key in keys}
+            for other in self.files:
+                if other == file:
+                    break
+                if not self.script_objects.get(other) and keys & set(self.script_references.get(other, {})):
+                    files.add(other)
+        return files - {file}
+
+
+def _parse_script(script: Tuple[str, str]) -> Dict:
+    """Parse one (text, name) script in a worker process"""
+    text, name = script
+    return parse_sql(text, name).to_dict()
+
+
+def parse_directory(root: str, cache=None, jobs: int = 1) -> SchemaGraph:
+    """
+    Parse every .sql file under root into one graph
+
+    Scripts found in the cache are not parsed again. The others are parsed by
+    a pool of jobs processes, unless there are too few of them to make up for
+    starting the pool. graph.stats holds the timings and counts.
+
+    Args:
+        root: Directory searched recursively, or a single script
+        cache: Parse cache (see schema_cache.SchemaCache), or None
+        jobs: Processes parsing the uncached scripts (1 parses them in this process)
+    """
+    start = time.perf_counter()
+    graph = SchemaGraph()
+    base = Path(root) if Path(root).is_dir() else None
+    results: Dict[str, ParseResult] = {}
+    pending: List[Tuple[Optional[str], str, str]] = []
+    names = []
+    for path in find_sql_files(root):
+        name = str(path.relative_to(base)) if base else path.name
+        try:
+            content = path.read_bytes()
+            text = content.decode('utf-8-sig')
+        except (OSError, UnicodeDecodeError) as e:
+            graph.errors.append(f"Error reading {name}: {str(e)}")
+            continue
+        names.append(name)
+        key = cache.key(name, content) if cache else None
+        data = cache.get_parse(key) if cache else None
+        if data is not None:
+            results[name] = ParseResult.from_dict(data)
+        else:
+            pending.append((key, text, name))
+    read_seconds = time.perf_counter() - start
+
+    parse_start = time.perf_counter()
+    workers = min(jobs, len(pending)) if len(pending) >= MIN_PARALLEL_FILES else 1
+    parsed = None
+    if workers > 1:
+        # Imported here so the command line tools start without it
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parsed = list(executor.map(_parse_script, [(text, name) for _, text, name in pending],
+                                           chunksize=max(1, len(pending) // (workers * 4))))
+        except (OSError, BrokenProcessPool):
+            # No process pool here (e.g., a sandbox without semaphores); parse in this process
+            workers = 1
+    for i, (key, text, name) in enumerate(pending):
+        if parsed is not None:
+            results[name] = ParseResult.from_dict(parsed[i])
+        else:
+            results[name] = parse_sql(text, name)
+        if cache:
+            cache.put_parse(key, parsed[i] if parsed is not None else results[name].to_dict())
+    parse_seconds = time.perf_counter() - parse_start
+
+    for name in names:
+        graph.add_result(results[name])
+    graph.finish()
+    graph.stats = {
+        'files': len(names),
+        'parsed': len(pending),
+        'cached': len(names) - len(pending),
+        'workers': workers,
+        'read_seconds': round(read_seconds, 4),
+        'parse_seconds': round(parse_seconds, 4),
+        'graph_seconds': round(time.perf_counter() - start - read_seconds - parse_seconds, 4)
+    }
+    return graph
@@ -8,209 +8,442 @@ import os
 import sys
 import re
 import argparse
+import hashlib
 import json
+import time
+from collections import defaultdict
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
-import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional
+
+from schema_cache import SchemaCache
+from sql_lint import SEVERITIES, LintFinding, SqlLinter
+from sql_parser import SchemaGraph, SqlObject, parse_directory
+
+# Bump when validate_object() changes, so cached results are not reused
+VALIDATOR_VERSION = 1
 
 class SchemaValidator:
-    def __init__(self, schema_path: str):
+    def __init__(self, schema_path: str, cache: Optional[SchemaCache] = None, jobs: int = 1):
+        """
+        Args:
+            schema_path: Directory of SQL files (searched recursively) or a single SQL file
+            cache: Cache of parse and validation results from earlier runs, or None
+            jobs: Processes parsing the scripts not in the cache
+        """
         self.schema_path = Path(schema_path)
-        self.tables = {}
-        self.foreign_keys = []
-        self.dependencies = {}
+        self.cache = cache
+        self.jobs = max(1, jobs)
+        self.graph = SchemaGraph()
         self.errors = []
         self.warnings = []
-        
+        # Errors by object key, for the per-object JUnit test cases
+        self.object_errors = defaultdict(list)
+        self.dependency_errors = []
+        self.objects_validated = 0
+        self.objects_reused = 0
+        self.timings: Dict[str, float] = {}
+        self._definition_hashes: Dict[str, str] = {}
+        # Performance lint, filled by lint()
+        self.linter: Optional[SqlLinter] = None
+        self.lint_findings: List[LintFinding] = []
+        self.lint_seconds = 0.0
+
     def parse_sql_files(self):
-        """Parse all SQL schema files to extract table and dependency information"""
-        for sql_file in self.schema_path.glob("*.sql"):
-            self._parse_sql_file(sql_file)
-    
-    def _parse_sql_file(self, file_path: Path):
-        """Parse individual SQL file for table definitions and foreign keys"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Extract table name
-            table_match = re.search(r'CREATE TABLE\s+(\w+\.)?(\w+)\s*\(', content, re.IGNORECASE)
-            if table_match:
-                table_name = table_match.group(2)
-                self.tables[table_name] = {
-                    'file': file_path.name,
-                    'columns': self._extract_columns(content),
-                    'foreign_keys': self._extract_foreign_keys(content)
-                }
-                
-        except Exception as e:
-            self.errors.append(f"Error parsing {file_path.name}: {str(e)}")
-    
-    def _extract_columns(self, content: str) -> List[str]:
-        """Extract column definitions from CREATE TABLE statement"""
-        columns = []
-        # Simple regex to extract column names (can be improved)
-        column_matches = re.findall(r'^\s*(\w+)\s+\w+', content, re.MULTILINE)
-        return [col for col in column_matches if col.upper() not in ['CREATE', 'TABLE', 'CONSTRAINT', 'PRIMARY', 'FOREIGN', 'KEY', 'INDEX']]
-    
-    def _extract_foreign_keys(self, content: str) -> List[Dict]:
-        """Extract foreign key constraints"""
-        fks = []
-        # Extract FOREIGN KEY constraints
-        fk_pattern = r'FOREIGN KEY\s*\(([^)]+)\)\s*REFERENCES\s+(\w+\.)?(\w+)\s*\(([^)]+)\)'
-        matches = re.findall(fk_pattern, content, re.IGNORECASE)
-        
-        for match in matches:
-            fks.append({
-                'column': match[0].strip(),
-                'references_table': match[2],
-                'references_column': match[3].strip()
-            })
-        
-        return fks
-    
-    def validate_dependencies(self):
-        """Validate that all foreign key dependencies exist"""
-        for table_name, table_info in self.tables.items():
-            for fk in table_info['foreign_keys']:
-                ref_table = fk['references_table']
-                if ref_table not in self.tables:
-                    self.errors.append(f"Table {table_name} references non-existent table {ref_table}")
-                else:
-                    ref_columns = self.tables[ref_table]['columns']
-                    if fk['references_column'] not in ref_columns:
-                        self.errors.append(f"Table {table_name} references non-existent column {ref_table}.{fk['references_column']}")
-    
-    def validate_naming_conventions(self):
-        """Validate naming conventions"""
-        for table_name in self.tables.keys():
-            # Check table naming convention (should be uppercase with underscores)
-            if not re.match(r'^[A-Z][A-Z0-9_]*$', table_name):
-                self.warnings.append(f"Table {table_name} doesn't follow naming convention (uppercase with underscores)")
-    
+        """Parse all SQL files under the schema path into one object graph"""
+        start = time.perf_counter()
+        self.graph = parse_directory(str(self.schema_path), cache=self.cache, jobs=self.jobs)
+        self.errors.extend(self.graph.errors)
+        self._definition_hashes = {}
+        self.timings['parse_seconds'] = round(time.perf_counter() - start, 4)
+
+    @property
+    def tables(self) -> Dict[str, Dict]:
+        """Tables with their columns and foreign keys, by name"""
+        return {
+            table.name: {
+                'file': table.file,
+                'columns': [column.name for column in table.columns.values()],
+                'foreign_keys': [{
+                    'column': ', '.join(fk.columns),
+                    'references_table': fk.references.name,
+                    'references_column': ', '.join(fk.ref_columns)
+                } for fk in table.foreign_keys]
+            }
+            for table in self.graph.tables
+        }
+
+    def _check_foreign_keys(self, table: SqlObject, result: Dict[str, List[str]]):
+        for fk in table.foreign_keys:
+            for column in fk.columns:
+                if not table.column(column):
+                    result['dependency_errors'].append(
+                        f"Table {table.name} has a foreign key on non-existent column {column}")
+            ref_table = self.graph.get(fk.references.name)
+            if ref_table is None or ref_table.kind != 'table':
+                result['dependency_errors'].append(
+                    f"Table {table.name} references non-existent table {fk.references.name}")
+                continue
+            # REFERENCES without columns means the referenced table's primary key
+            ref_columns = fk.ref_columns or (ref_table.primary_key.columns if ref_table.primary_key else [])
+            for column in ref_columns:
+                if not ref_table.column(column):
+                    result['dependency_errors'].append(
+                        f"Table {table.name} references non-existent column {ref_table.name}.{column}")
+
+    def _check_indexes(self, table: SqlObject, result: Dict[str, List[str]]):
+        for index in table.indexes:
+            for column in index.columns:
+                if not table.column(column):
+                    result['errors'].append(f"Index {index.name or '(unnamed)'} of table {table.name} uses "
+                                            f"non-existent column {column}")
+
+    def _check_references(self, obj: SqlObject, result: Dict[str, List[str]]):
+        parent = self.graph.get(obj.parent.name) if obj.parent else None
+        if obj.parent and (parent is None or parent.kind not in ('table', 'view')):
+            result['dependency_errors'].append(f"Trigger {obj.name} is on non-existent table {obj.parent.name}")
+        for ref in obj.references.values():
+            if ref.key not in self.graph.objects:
+                # Deferred name resolution lets these compile; they fail when run
+                result['warnings'].append(f"{obj.kind.capitalize()} {obj.name} ({obj.file}:{obj.line}) references "
+                                          f"unknown object {ref}")
+
+    def _check_naming(self, obj: SqlObject, result: Dict[str, List[str]]):
+        # Object names should be uppercase with underscores
+        if not re.match(r'^[A-Z][A-Z0-9_]*$', obj.name):
+            result['warnings'].append(f"{obj.kind.capitalize()} {obj.name} doesn't follow naming convention "
+                                      f"(uppercase with underscores)")
+
+    def validate_object(self, obj: SqlObject) -> Dict[str, List[str]]:
+        """
+        Check one object against the graph
+
+        Tables are checked for their foreign keys and indexes; views, procedures,
+        functions and triggers for the objects they use. Every object is checked
+        for the naming convention.
+
+        Returns:
+            Messages by type: errors, dependency_errors (also errors) and warnings
+        """
+        result = {'errors': [], 'dependency_errors': [], 'warnings': []}
+        if obj.kind == 'table':
+            self._check_foreign_keys(obj, result)
+            self._check_indexes(obj, result)
+        else:
+            self._check_references(obj, result)
+        self._check_naming(obj, result)
+        return result
+
+    def _definition_hash(self, key: str) -> str:
+        if key not in self._definition_hashes:
+            obj = self.graph.objects.get(key)
+            self._definition_hashes[key] = hashlib.sha256(
+                json.dumps(obj.to_dict(), sort_keys=True).encode('utf-8')).hexdigest() if obj else 'missing'
+        return self._definition_hashes[key]
+
+    def fingerprint(self, obj: SqlObject) -> str:
+        """
+        Hash of everything validate_object() reads for an object
+
+        That is the object's own definition and those of the objects it depends
+        on, so the object is validated again when either changes, or when a
+        dependency is created or dropped.
+        """
+        parts = [self._definition_hash(obj.key)]
+        parts.extend(f"{key}={self._definition_hash(key)}" for key in sorted(obj.depends_on()))
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def _record(self, obj: SqlObject, result: Dict[str, List[str]]):
+        messages = result['dependency_errors'] + result['errors']
+        self.errors.extend(messages)
+        self.dependency_errors.extend(result['dependency_errors'])
+        self.warnings.extend(result['warnings'])
+        if messages:
+            self.object_errors[obj.key].extend(messages)
+
+    def validate_duplicates(self):
+        """Validate that no object is created twice"""
+        for first, other in self.graph.duplicates:
+            where = f"{first.file}:{first.line} and {other.file}:{other.line}"
+            if first.kind != other.kind:
+                message = f"{other.name} is created both as a {first.kind} and as a {other.kind} ({where})"
+                self.errors.append(message)
+                self.object_errors[first.key].append(message)
+            else:
+                self.warnings.append(f"{first.kind.capitalize()} {first.name} is created more than once ({where})")
+
+        for alteration in self.graph.unresolved_alterations:
+            self.errors.append(f"{alteration.file}:{alteration.line} alters non-existent table {alteration.table.name}")
+
+    def validate(self):
+        """
+        Validate the whole graph
+
+        Duplicates and alterations span scripts and are always checked. Objects
+        whose fingerprint is in the cache reuse the cached messages; the others
+        are validated and cached.
+        """
+        start = time.perf_counter()
+        self.validate_duplicates()
+        for obj in self.graph.objects.values():
+            fingerprint = self.fingerprint(obj) if self.cache else None
+            result = self.cache.get_validation(obj.key, fingerprint) if self.cache else None
+            if result is None:
+                result = self.validate_object(obj)
+                self.objects_validated += 1
+                if self.cache:
+                    self.cache.put_validation(obj.key, fingerprint, result)
+            else:
+                self.objects_reused += 1
+            self._record(obj, result)
+        self.timings['validate_seconds'] = round(time.perf_counter() - start, 4)
+
+    def lint(self):
+        """Run the performance lint rules (see sql_lint.RULES) on the views, procedures, functions and triggers"""
+        start = time.perf_counter()
+        self.linter = SqlLinter(self.graph, str(self.schema_path))
+        self.lint_findings = self.linter.lint()
+        self.errors.extend(self.linter.errors)
+        self.lint_seconds = round(time.perf_counter() - start, 4)
+
+    def lint_counts(self) -> Dict[str, int]:
+        counts = {severity: 0 for severity in SEVERITIES}
+        for finding in self.lint_findings:
+            counts[finding.severity] += 1
+        return counts
+
     def generate_dependency_order(self) -> List[str]:
         """Generate correct order for table creation based on dependencies"""
-        ordered_tables = []
-        remaining_tables = set(self.tables.keys())
-        
-        while remaining_tables:
-            # Find tables with no dependencies on remaining tables
-            independent_tables = []
-            for table in remaining_tables:
-                dependencies = [fk['references_table'] for fk in self.tables[table]['foreign_keys']]
-                if not any(dep in remaining_tables for dep in dependencies):
-                    independent_tables.append(table)
-            
-            if not independent_tables:
-                # Circular dependency detected
-                self.errors.append(f"Circular dependency detected among tables: {', '.join(remaining_tables)}")
-                break
-            
-            ordered_tables.extend(independent_tables)
-            remaining_tables -= set(independent_tables)
-        
-        return ordered_tables
-    
+        ordered, cycle = self.graph.creation_order(self.graph.tables)
+        if cycle:
+            # Circular dependency detected
+            message = f"Circular dependency detected among tables: {', '.join(cycle)}"
+            if message not in self.errors:
+                self.errors.append(message)
+                self.dependency_errors.append(message)
+        return [table.name for table in ordered]
+
+    def generate_object_order(self) -> List[str]:
+        """Order in which all objects can be created, each after the objects it uses"""
+        ordered, cycle = self.graph.creation_order()
+        return [f"{obj.kind} {obj.name}" for obj in ordered] + [f"(cycle) {key}" for key in cycle]
+
     def generate_report(self) -> Dict:
         """Generate validation report"""
+        dependency_order = self.generate_dependency_order()
+        counts = defaultdict(int)
+        for obj in self.graph.objects.values():
+            counts[obj.kind] += 1
         return {
-            'total_tables': len(self.tables),
+            'total_tables': len(self.graph.tables),
+            'total_objects': len(self.graph.objects),
+            'object_counts': dict(counts),
+            'files': len(self.graph.files),
+            'batches': self.graph.batches,
             'errors': self.errors,
             'warnings': self.warnings,
             'tables': self.tables,
-            'dependency_order': self.generate_dependency_order()
+            'objects': {obj.name: obj.to_dict() for obj in self.graph.objects.values()},
+            'dependency_order': dependency_order,
+            'object_order': self.generate_object_order(),
+            'timings': dict(self.timings, parse=self.graph.stats),
+            'cache': self.cache_stats(),
+            'lint': {
+                'enabled': self.linter is not None,
+                'seconds': self.lint_seconds,
+                'counts': self.lint_counts(),
+                'findings': [finding.to_dict() for finding in self.lint_findings]
+            }
         }
-    
+
+    def cache_stats(self) -> Dict:
+        """Scripts and objects taken from the cache in this run"""
+        return {
+            'enabled': self.cache is not None,
+            'scripts_cached': self.cache.hits if self.cache else 0,
+            'scripts_parsed': self.cache.misses if self.cache else len(self.graph.files),
+            'hit_rate': round(self.cache.hit_rate, 3) if self.cache else 0.0,
+            'objects_validated': self.objects_validated,
+            'objects_reused': self.objects_reused
+        }
+
     def generate_junit_xml(self, output_path: str):
         """Generate JUnit XML report for CI/CD integration"""
+        import xml.etree.ElementTree as ET  # imported here so --help starts without it
         root = ET.Element('testsuite')
         root.set('name', 'Schema Validation')
-        root.set('tests', str(len(self.tables) + 2))  # +2 for dependency and naming tests
+        root.set('tests', str(len(self.graph.objects) + 2))  # +2 for dependency and naming tests
         root.set('failures', str(len(self.errors)))
         root.set('errors', '0')
-        
-        # Test case for each table
-        for table_name, table_info in self.tables.items():
+        root.set('time', str(sum(self.timings.values())))
+
+        # Test case for each object
+        for obj in self.graph.objects.values():
             testcase = ET.SubElement(root, 'testcase')
-            testcase.set('name', f'validate_table_{table_name}')
+            testcase.set('name', f'validate_{obj.kind}_{obj.name}')
             testcase.set('classname', 'SchemaValidation')
-            
-            # Check if this table has any errors
-            table_errors = [err for err in self.errors if table_name in err]
-            if table_errors:
+
+            # Check if this object has any errors
+            object_errors = self.object_errors.get(obj.key)
+            if object_errors:
                 failure = ET.SubElement(testcase, 'failure')
-                failure.set('message', f'Table {table_name} validation failed')
-                failure.text = '\n'.join(table_errors)
-        
+                failure.set('message', f'{obj.kind.capitalize()} {obj.name} validation failed')
+                failure.text = '\n'.join(object_errors)
+
         # Test case for dependency validation
         dep_testcase = ET.SubElement(root, 'testcase')
         dep_testcase.set('name', 'validate_dependencies')
         dep_testcase.set('classname', 'SchemaValidation')
-        
-        dep_errors = [err for err in self.errors if 'references' in err or 'Circular' in err]
-        if dep_errors:
+
+        if self.dependency_errors:
             failure = ET.SubElement(dep_testcase, 'failure')
             failure.set('message', 'Dependency validation failed')
-            failure.text = '\n'.join(dep_errors)
-        
+            failure.text = '\n'.join(self.dependency_errors)
+
         # Test case for naming conventions
         naming_testcase = ET.SubElement(root, 'testcase')
         naming_testcase.set('name', 'validate_naming_conventions')
         naming_testcase.set('classname', 'SchemaValidation')
-        
+
         if self.warnings:
             system_out = ET.SubElement(naming_testcase, 'system-out')
             system_out.text = '\n'.join(self.warnings)
-        
+
         # Write XML file
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         tree = ET.ElementTree(root)
         tree.write(output_path, encoding='utf-8', xml_declaration=True)
 
+    def generate_lint_junit_xml(self, output_path: str):
+        """Generate JUnit XML report of the performance lint, one test case per code object"""
+        import xml.etree.ElementTree as ET  # imported here so --help starts without it
+        findings = defaultdict(list)
+        for finding in self.lint_findings:
+            findings[id(finding.obj)].append(finding)
+        objects = self.linter.linted if self.linter else []
+
+        root = ET.Element('testsuite')
+        root.set('name', 'Performance Lint')
+        root.set('tests', str(len(objects)))
+        # Errors and warnings fail their object's test case; info findings are listed in its output
+        root.set('failures', str(sum(1 for obj in objects
+                                     if any(f.severity != 'info' for f in findings.get(id(obj), [])))))
+        root.set('errors', '0')
+        root.set('time', str(self.lint_seconds))
+
+        for obj in objects:
+            testcase = ET.SubElement(root, 'testcase')
+            testcase.set('name', f'lint_{obj.kind}_{obj.name}')
+            testcase.set('classname', 'PerformanceLint')
+            testcase.set('file', obj.file)
+
+            failing = [str(f) for f in findings.get(id(obj), []) if f.severity != 'info']
+            if failing:
+                failure = ET.SubElement(testcase, 'failure')
+                failure.set('message', f'{obj.kind.capitalize()} {obj.name}: {len(failing)} performance findings')
+                failure.set('type', 'error' if any(f.severity == 'error' for f in findings[id(obj)]) else 'warning')
+                failure.text = '\n'.join(failing)
+            info = [str(f) for f in findings.get(id(obj), []) if f.severity == 'info']
+            if info:
+                system_out = ET.SubElement(testcase, 'system-out')
+                system_out.text = '\n'.join(info)
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        tree = ET.ElementTree(root)
+        tree.write(output_path, encoding='utf-8', xml_declaration=True)
+
 def main():
     parser = argparse.ArgumentParser(description='Validate Model Registry database schema')
-    parser.add_argument('--schema-path', default='database/schema', help='Path to schema files')
+    parser.add_argument('--schema-path', default='database',
+                        help='Directory of SQL files (searched recursively) or a single SQL file')
     parser.add_argument('--output', default='test-reports/schema-validation.xml', help='Output path for JUnit XML')
+    parser.add_argument('--json', help='Also write the full report, with the object graph, to this JSON file')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Processes parsing the scripts not in the cache (default: CPU count)')
+    parser.add_argument('--cache-dir', default='.schema_cache',
+                        help='Directory of the parse and validation cache kept between runs')
+    parser.add_argument('--no-cache', action='store_true', help='Parse and validate everything, without the cache')
+    parser.add_argument('--lint', action='store_true',
+                        help='Also lint the views, procedures, functions and triggers for performance problems '
+                             '(cursors, scalar functions in queries, non-sargable WHERE, SELECT *, WHILE loops)')
+    parser.add_argument('--lint-output', default='test-reports/performance-lint.xml',
+                        help='Output path for the JUnit XML of the lint')
+    parser.add_argument('--lint-fail-on', choices=['error', 'warning', 'never'], default='never',
+                        help='Fail when the lint finds problems of this severity or worse (default: never)')
     parser.add_argument('--verbose', action='store_true', help='Verbose output')
-    
+
     args = parser.parse_args()
-    
-    validator = SchemaValidator(args.schema_path)
+
+    cache = None if args.no_cache else SchemaCache(args.cache_dir, VALIDATOR_VERSION)
+    validator = SchemaValidator(args.schema_path, cache=cache, jobs=args.jobs)
     validator.parse_sql_files()
-    validator.validate_dependencies()
-    validator.validate_naming_conventions()
-    
+    validator.validate()
+    if args.lint:
+        validator.lint()
+    if cache:
+        cache.save()
+
     report = validator.generate_report()
-    
+
     if args.verbose:
+        print(f"Files parsed: {report['files']} ({report['batches']} batches)")
         print(f"Total tables found: {report['total_tables']}")
+        print(f"Total objects found: {report['total_objects']} "
+              f"({', '.join(f'{count} {kind}s' for kind, count in sorted(report['object_counts'].items()))})")
         print(f"Errors: {len(report['errors'])}")
         print(f"Warnings: {len(report['warnings'])}")
-        
+        parse_stats = report['timings']['parse']
+        print(f"Parse: {report['timings']['parse_seconds']:.3f}s ({parse_stats['parsed']} parsed with "
+              f"{parse_stats['workers']} workers, {parse_stats['cached']} from cache); "
+              f"validate: {report['timings']['validate_seconds']:.3f}s "
+              f"({report['cache']['objects_validated']} validated, {report['cache']['objects_reused']} from cache)")
+
         if report['errors']:
             print("\nErrors:")
             for error in report['errors']:
                 print(f"  - {error}")
-        
+
         if report['warnings']:
             print("\nWarnings:")
             for warning in report['warnings']:
                 print(f"  - {warning}")
-        
+
+        if args.lint:
+            counts = report['lint']['counts']
+            print(f"\nPerformance lint: {counts['error']} errors, {counts['warning']} warnings, "
+                  f"{counts['info']} info in {report['lint']['seconds']:.3f}s")
+            for finding in validator.lint_findings:
+                print(f"  - {finding}")
+
         print(f"\nRecommended table creation order:")
         for i, table in enumerate(report['dependency_order'], 1):
             print(f"  {i}. {table}")
-    
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
     # Generate JUnit XML report
     validator.generate_junit_xml(args.output)
-    
+    if args.lint:
+        validator.generate_lint_junit_xml(args.lint_output)
+
     # Exit with error code if there are errors
+    lint_failing = 0
+    if args.lint:
+        counts = report['lint']['counts']
+        lint_failing = {'error': counts['error'], 'warning': counts['error'] + counts['warning'],
+                        'never': 0}[args.lint_fail_on]
+        print(f"Performance lint: {counts['error']} errors, {counts['warning']} warnings, {counts['info']} info")
+
     if report['errors']:
         print(f"Schema validation failed with {len(report['errors'])} errors")
         sys.exit(1)
+    elif lint_failing:
+        print(f"Performance lint failed with {lint_failing} findings at --lint-fail-on {args.lint_fail_on}")
+        sys.exit(1)
     else:
         print("Schema validation passed")
         sys.exit(0)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Startup Time Check for Model Registry
+Verifies the command line tools start without loading pandas, pyodbc or openpyxl and within a time budget
+"""
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+import time
+from pathlib import Path
+import xml.etree.ElementTree as ET
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+UPLOAD_SCRIPTS = REPO_ROOT / 'excel_templates' / 'upload_scripts'
+
+# Modules that must not be imported just to print help or usage
+HEAVY_MODULES = ('pandas', 'numpy', 'pyodbc', 'openpyxl', 'dotenv', 'tqdm')
+
+# (test name, working directory, arguments after the interpreter); usage-only runs exit 1, which is fine
+COMMANDS = [
+    ('excel_upload_help', UPLOAD_SCRIPTS, ['excel_upload.py', '--help']),
+    ('excel_upload_usage', UPLOAD_SCRIPTS, ['excel_upload.py']),
+    ('simple_upload_usage', UPLOAD_SCRIPTS, ['simple_upload.py']),
+    ('upload_service_client', UPLOAD_SCRIPTS, ['upload_service.py', 'ping']),
+    ('template_configs', UPLOAD_SCRIPTS, ['-c', 'import metadata_bundle; metadata_bundle.load_template_configs()']),
+    ('create_templates_import', REPO_ROOT / 'excel_templates', ['-c', 'import create_templates']),
+    ('validate_schema_help', REPO_ROOT, ['scripts/validate_schema.py', '--help']),
+    ('deploy_help', REPO_ROOT, ['scripts/deploy.py', '--help']),
+    ('schema_diff_help', REPO_ROOT, ['scripts/schema_diff.py', '--help']),
+    ('health_check_help', REPO_ROOT, ['tests/health_check.py', '--help'])
+]
+
+class StartupTimeChecker:
+    def __init__(self, budget_ms: float, runs: int):
+        self.budget_ms = budget_ms
+        self.runs = runs
+        self.test_results = []
+
+    def imported_modules(self, cwd: Path, args: list) -> set:
+        """Top-level packages the command imports, from python -X importtime"""
+        result = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=cwd,
+                                capture_output=True, text=True)
+        modules = set()
+        for line in result.stderr.splitlines():
+            # import time:       self [us] |   cumulative | imported package
+            if line.startswith('import time:') and '|' in line:
+                name = line.rsplit('|', 1)[1].strip()
+                modules.add(name.split('.')[0])
+        return modules
+
+    def median_startup_ms(self, cwd: Path, args: list) -> float:
+        """Median wall time of the command over the configured runs"""
+        timings = []
+        for _ in range(self.runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + args, cwd=cwd, capture_output=True)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def check_command(self, name: str, cwd: Path, args: list):
+        """Check one command for heavy imports and its startup time"""
+        try:
+            heavy = sorted(set(HEAVY_MODULES) & self.imported_modules(cwd, args))
+            median_ms = self.median_startup_ms(cwd, args)
+
+            problems = []
+            if heavy:
+                problems.append(f"imports {', '.join(heavy)}")
+            if median_ms > self.budget_ms:
+                problems.append(f"median startup {median_ms:.0f}ms exceeds the {self.budget_ms:.0f}ms budget")
+
+            self.test_results.append({
+                'name': name,
+                'status': 'FAIL' if problems else 'PASS',
+                'message': f"median startup {median_ms:.0f}ms over {self.runs} runs",
+                'error': '; '.join(problems) or None
+            })
+        except Exception as e:
+            self.test_results.append({
+                'name': name,
+                'status': 'ERROR',
+                'message': 'Startup check error',
+                'error': str(e)
+            })
+
+    def run_all_checks(self):
+        for name, cwd, args in COMMANDS:
+            self.check_command(name, cwd, args)
+
+    def generate_junit_xml(self, output_path: str):
+        """Generate JUnit XML report"""
+        root = ET.Element('testsuite')
+        root.set('name', 'Model Registry Startup Time')
+        root.set('tests', str(len(self.test_results)))
+        root.set('failures', str(len([t for t in self.test_results if t['status'] == 'FAIL'])))
+        root.set('errors', str(len([t for t in self.test_results if t['status'] == 'ERROR'])))
+
+        for test in self.test_results:
+            testcase = ET.SubElement(root, 'testcase')
+            testcase.set('name', test['name'])
+            testcase.set('classname', 'ModelRegistryStartupTime')
+
+            if test['status'] == 'FAIL':
+                failure = ET.SubElement(testcase, 'failure')
+                failure.set('message', test['error'] or 'Check failed')
+                failure.text = test['message']
+            elif test['status'] == 'ERROR':
+                error = ET.SubElement(testcase, 'error')
+                error.set('message', test['error'] or 'Check error')
+                error.text = test['message']
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        tree = ET.ElementTree(root)
+        tree.write(output_path, encoding='utf-8', xml_declaration=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the startup time of the Model Registry command line tools')
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('STARTUP_BUDGET_MS', '300')),
+                        help='Largest allowed median startup time in milliseconds')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per command (the median is checked)')
+    parser.add_argument('--output', default='test-reports/startup-time.xml', help='Output XML file')
+    parser.add_argument('--verbose', action='store_true', help='Verbose output')
+
+    args = parser.parse_args()
+
+    checker = StartupTimeChecker(args.budget_ms, args.runs)
+    print("Checking command line startup time...")
+    checker.run_all_checks()
+    checker.generate_junit_xml(args.output)
+
+    failed = [t for t in checker.test_results if t['status'] != 'PASS']
+    print("\nStartup Check Results:")
+    print(f"Total: {len(checker.test_results)}")
+    print(f"Passed: {len(checker.test_results) - len(failed)}")
+    print(f"Failed: {len(failed)}")
+
+    for test in checker.test_results:
+        if args.verbose or test['status'] != 'PASS':
+            status_symbol = "✓" if test['status'] == 'PASS' else "✗"
+            print(f"{status_symbol} {test['name']}: {test['message']}")
+            if test['error']:
+                print(f"  Error: {test['error']}")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -7,9 +7,11 @@ Post-deployment validation and system health monitoring
 import os
 import sys
 import argparse
-import pyodbc
 import time
 from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'excel_templates' / 'upload_scripts'))
 
 class ModelRegistryHealthChecker:
     def __init__(self, connection_string: str):
@@ -22,8 +24,9 @@ class ModelRegistryHealthChecker:
     def setup_connection(self):
         """Establish database connection"""
         try:
-            self.connection = pyodbc.connect(self.connection_string)
-            self.connection.autocommit = True
+            from db_access import get_pool  # pyodbc loads here, not for --help
+            
+            self.connection = get_pool(self.connection_string, autocommit=True).acquire()
         except Exception as e:
             self.health_status = "CRITICAL"
             self.issues.append(f"Database connection failed: {e}")
@@ -33,21 +36,11 @@ class ModelRegistryHealthChecker:
         if not self.connection:
             return None
             
-        cursor = self.connection.cursor()
         try:
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            
-            try:
-                return cursor.fetchall()
-            except:
-                return None
+            # Cached statement on the pooled connection; [] for an empty result, None if it returned no result set
+            return self.connection.fetch_all(query, params)
         except Exception as e:
             raise Exception(f"Query execution failed: {e}")
-        finally:
-            cursor.close()
     
     def check_database_connectivity(self):
         """Test basic database connectivity"""
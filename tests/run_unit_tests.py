@@ -7,12 +7,14 @@ Tests stored procedures, functions, and database logic
 import os
 import sys
 import argparse
-import pyodbc
 import json
 from datetime import datetime
 from pathlib import Path
 import xml.etree.ElementTree as ET
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'excel_templates' / 'upload_scripts'))
+from db_access import get_pool  # noqa: E402
+
 class ModelRegistryUnitTester:
     def __init__(self, connection_string: str):
         self.connection_string = connection_string
@@ -23,30 +25,18 @@ class ModelRegistryUnitTester:
     def setup_connection(self):
         """Establish database connection"""
         try:
-            self.connection = pyodbc.connect(self.connection_string)
-            self.connection.autocommit = True
+            self.connection = get_pool(self.connection_string, autocommit=True).acquire()
         except Exception as e:
             print(f"Failed to connect to database: {e}")
             sys.exit(1)
     
     def execute_query(self, query: str, params: tuple = None):
         """Execute SQL query and return results"""
-        cursor = self.connection.cursor()
         try:
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            
-            # Try to fetch results
-            try:
-                return cursor.fetchall()
-            except:
-                return None
+            # Cached statement on the pooled connection; [] for an empty result, None if it returned no result set
+            return self.connection.fetch_all(query, params)
         except Exception as e:
             raise Exception(f"Query execution failed: {e}")
-        finally:
-            cursor.close()
     
     def test_stored_procedure(self, proc_name: str, test_cases: list):
         """Test a stored procedure with multiple test cases"""
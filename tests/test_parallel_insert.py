@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Parallel Insert Tests for Model Registry
+Checks that staging tables left by killed parallel uploads are dropped, and only those
+"""
+
+import sys
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'excel_templates' / 'upload_scripts'))
+from parallel_insert import drop_stale_staging  # noqa: E402
+
+class CatalogCursor:
+    """Answers the sys.tables query with its connection's tables and records the drops"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        self.connection.executed.append((sql, params))
+
+    def fetchall(self):
+        return self.connection.tables
+
+    def close(self):
+        pass
+
+class CatalogConnection:
+    def __init__(self, tables):
+        self.tables = tables
+        self.executed = []
+        self.commits = 0
+
+    def cursor(self):
+        return CatalogCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+class DropStaleStagingTests(unittest.TestCase):
+    def test_only_old_staging_tables_are_dropped(self):
+        old = datetime.now() - timedelta(hours=30)
+        recent = datetime.now() - timedelta(hours=1)
+        connection = CatalogConnection([
+            ('MODEL_TYPE_STAGE_20240101_120000_4242_1', old),
+            ('MODEL_TYPE_STAGE_20240101_120000_4242_2', old),
+            # A concurrent upload still loading
+            ('MODEL_TYPE_STAGE_20240102_090000_5151_1', recent),
+            # Matches the LIKE pattern but is not a staging table
+            ('MODEL_TYPE_STAGE_HISTORY', old),
+        ])
+        dropped = drop_stale_staging(connection, 'MODEL_TYPE', 24)
+
+        self.assertEqual(dropped, ['MODEL_TYPE_STAGE_20240101_120000_4242_1', 'MODEL_TYPE_STAGE_20240101_120000_4242_2'])
+        query, params = connection.executed[0]
+        self.assertIn("ESCAPE '\\'", query)
+        self.assertEqual(params, ('MODEL\\_TYPE\\_STAGE\\_%',))
+        self.assertEqual([sql for sql, _ in connection.executed[1:]],
+                         [f"DROP TABLE IF EXISTS {name}" for name in dropped])
+        self.assertEqual(connection.commits, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Schema Diff Tests for Model Registry
+Checks the migration statements generated for key, default and nullability changes on small schema models
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+from schema_diff import SNAPSHOT_VERSION, SchemaDiff, model_from_catalog  # noqa: E402
+
+def column(name: str, data_type: str = 'INT', nullable: bool = True, identity: bool = False,
+           default: str = None) -> dict:
+    return {'name': name, 'data_type': data_type, 'nullable': nullable, 'identity': identity, 'default': default,
+            'computed': False}
+
+def key(columns: list, primary_key: bool = False, unique: bool = True, constraint: bool = True,
+        name: str = None) -> dict:
+    """A key or index as a snapshot records it (scripts leave inline keys unnamed)"""
+    return {'name': name, 'columns': columns, 'unique': unique, 'primary_key': primary_key, 'clustered': None,
+            'constraint': constraint}
+
+def foreign_key(columns: list, table: str, ref_columns: list, name: str = None) -> dict:
+    return {'name': name, 'columns': columns, 'references_table': table, 'references_columns': ref_columns}
+
+def table(name: str, columns: list, indexes: list = (), foreign_keys: list = ()) -> dict:
+    return {'name': name, 'schema': 'dbo', 'columns': list(columns), 'indexes': list(indexes),
+            'foreign_keys': list(foreign_keys)}
+
+def model(*tables: dict) -> dict:
+    return {'version': SNAPSHOT_VERSION, 'tables': {entry['name'].upper(): entry for entry in tables}, 'code': {}}
+
+def diff(desired: dict, current: dict, allow_drop: bool = False) -> SchemaDiff:
+    schema_diff = SchemaDiff(desired, current, {}, allow_drop=allow_drop)
+    schema_diff.compare()
+    return schema_diff
+
+class AlteredKeyTests(unittest.TestCase):
+    def model_type(self, type_id: str) -> dict:
+        return table('MODEL_TYPE', [column('TYPE_ID', type_id, nullable=False, identity=True),
+                                    column('TYPE_CODE', 'NVARCHAR(20)', nullable=False)],
+                     [key(['TYPE_ID'], primary_key=True)])
+
+    def model_registry(self, type_id: str) -> dict:
+        return table('MODEL_REGISTRY', [column('MODEL_ID', nullable=False, identity=True), column('TYPE_ID', type_id)],
+                     [key(['MODEL_ID'], primary_key=True, name='PK_MODEL_REGISTRY')],
+                     [foreign_key(['TYPE_ID'], 'MODEL_TYPE', ['TYPE_ID'], name='FK_MODEL_REGISTRY_TYPE')])
+
+    def test_altered_primary_key_column_with_referencing_foreign_keys(self):
+        result = diff(model(self.model_type('BIGINT'), self.model_registry('BIGINT')),
+                      model(self.model_type('INT'), self.model_registry('INT')))
+        statements = result.statements
+
+        # The referencing foreign key goes first, then the unnamed primary key by its looked-up name
+        self.assertEqual(statements['drop_foreign_keys'],
+                         ['ALTER TABLE dbo.MODEL_REGISTRY DROP CONSTRAINT FK_MODEL_REGISTRY_TYPE;'])
+        self.assertEqual(len(statements['drop_indexes']), 1)
+        drop_key = statements['drop_indexes'][0]
+        self.assertIn("FROM sys.key_constraints kc", drop_key)
+        self.assertIn("kc.parent_object_id = OBJECT_ID('dbo.MODEL_TYPE') AND kc.type = 'PK'", drop_key)
+        self.assertIn("EXEC('ALTER TABLE dbo.MODEL_TYPE DROP CONSTRAINT ' + QUOTENAME(@constraint_name));", drop_key)
+
+        self.assertEqual(statements['alter_columns'], [
+            'ALTER TABLE dbo.MODEL_TYPE ALTER COLUMN TYPE_ID BIGINT NOT NULL;',
+            'ALTER TABLE dbo.MODEL_REGISTRY ALTER COLUMN TYPE_ID BIGINT NULL;'])
+        self.assertEqual(statements['create_indexes'],
+                         ['ALTER TABLE dbo.MODEL_TYPE ADD CONSTRAINT PK_MODEL_TYPE PRIMARY KEY (TYPE_ID);'])
+        self.assertEqual(statements['add_foreign_keys'], [
+            'ALTER TABLE dbo.MODEL_REGISTRY WITH CHECK ADD CONSTRAINT FK_MODEL_REGISTRY_TYPE FOREIGN KEY (TYPE_ID) '
+            'REFERENCES MODEL_TYPE (TYPE_ID);'])
+        # The other table's primary key is on an unchanged column and stays
+        self.assertNotIn('PK_MODEL_REGISTRY', result.script('test'))
+
+    def test_referencing_foreign_key_rebuilt_when_only_the_referenced_column_changes(self):
+        result = diff(model(self.model_type('BIGINT'), self.model_registry('INT')),
+                      model(self.model_type('INT'), self.model_registry('INT')))
+        self.assertEqual(len(result.statements['drop_foreign_keys']), 1)
+        self.assertEqual(len(result.statements['add_foreign_keys']), 1)
+
+    def test_phases_run_in_order(self):
+        script = diff(model(self.model_type('BIGINT'), self.model_registry('BIGINT')),
+                      model(self.model_type('INT'), self.model_registry('INT'))).script('test')
+        positions = [script.index(text) for text in ('DROP CONSTRAINT FK_MODEL_REGISTRY_TYPE', "kc.type = 'PK'",
+                                                     'ALTER COLUMN TYPE_ID', 'ADD CONSTRAINT PK_MODEL_TYPE',
+                                                     'ADD CONSTRAINT FK_MODEL_REGISTRY_TYPE')]
+        self.assertEqual(positions, sorted(positions))
+
+class UniqueConstraintTests(unittest.TestCase):
+    def feature(self, code_type: str) -> dict:
+        return table('FEATURE', [column('ID', nullable=False), column('CODE', code_type, nullable=False)],
+                     [key(['CODE'])])
+
+    def test_unnamed_unique_constraint_on_altered_column(self):
+        statements = diff(model(self.feature('NVARCHAR(100)')), model(self.feature('NVARCHAR(50)'))).statements
+        drop_key = statements['drop_indexes'][0]
+        self.assertIn("kc.type = 'UQ'", drop_key)
+        self.assertIn("AND INDEX_COL('dbo.FEATURE', kc.unique_index_id, 1) = 'CODE'", drop_key)
+        self.assertIn("AND INDEX_COL('dbo.FEATURE', kc.unique_index_id, 2) IS NULL", drop_key)
+        self.assertEqual(statements['alter_columns'],
+                         ['ALTER TABLE dbo.FEATURE ALTER COLUMN CODE NVARCHAR(100) NOT NULL;'])
+        # Recreated as a constraint, not as a unique index
+        self.assertEqual(statements['create_indexes'],
+                         ['ALTER TABLE dbo.FEATURE ADD CONSTRAINT UQ_FEATURE_CODE UNIQUE (CODE);'])
+
+    def test_unique_index_stays_an_index(self):
+        index = key(['CODE'], constraint=False, name='UX_CODE')
+        desired = table('FEATURE', [column('CODE', 'NVARCHAR(100)')], [index])
+        current = table('FEATURE', [column('CODE', 'NVARCHAR(50)')], [index])
+        statements = diff(model(desired), model(current)).statements
+        self.assertEqual(statements['drop_indexes'], ['DROP INDEX UX_CODE ON dbo.FEATURE;'])
+        self.assertEqual(statements['create_indexes'],
+                         ['CREATE UNIQUE NONCLUSTERED INDEX UX_CODE ON dbo.FEATURE (CODE);'])
+
+class DefaultTests(unittest.TestCase):
+    def test_changed_default(self):
+        result = diff(model(table('T', [column('IS_ACTIVE', 'BIT', nullable=False, default='1')])),
+                      model(table('T', [column('IS_ACTIVE', 'BIT', nullable=False, default='((0))')])))
+        drop_default, add_default = result.statements['alter_columns']
+        self.assertIn("SELECT name FROM sys.default_constraints", drop_default)
+        self.assertIn("COLUMNPROPERTY(OBJECT_ID('dbo.T'), 'IS_ACTIVE', 'ColumnId')", drop_default)
+        self.assertEqual(add_default, 'ALTER TABLE dbo.T ADD CONSTRAINT DF_T_IS_ACTIVE DEFAULT 1 FOR IS_ACTIVE;')
+        self.assertEqual(result.changes, ['Change the default of T.IS_ACTIVE'])
+
+    def test_same_default_written_differently_is_unchanged(self):
+        result = diff(model(table('T', [column('AMOUNT', 'DECIMAL(5, 2)', default='0')])),
+                      model(table('T', [column('AMOUNT', 'DECIMAL(5,2)', default='((0))')])))
+        self.assertEqual(result.changes, [])
+        self.assertEqual(result.script('test').count('GO'), 0)
+
+    def test_default_dropped_around_a_type_change(self):
+        statements = diff(model(table('T', [column('AMOUNT', 'DECIMAL(10,2)', nullable=False, default='0')])),
+                          model(table('T', [column('AMOUNT', 'DECIMAL(5,2)', nullable=False, default='0')]))).statements
+        drop_default, alter, add_default = statements['alter_columns']
+        self.assertIn('sys.default_constraints', drop_default)
+        self.assertEqual(alter, 'ALTER TABLE dbo.T ALTER COLUMN AMOUNT DECIMAL(10,2) NOT NULL;')
+        self.assertEqual(add_default, 'ALTER TABLE dbo.T ADD CONSTRAINT DF_T_AMOUNT DEFAULT 0 FOR AMOUNT;')
+
+class NotNullTests(unittest.TestCase):
+    def test_new_not_null_column_without_default_is_listed(self):
+        result = diff(model(table('T', [column('ID'), column('CODE', 'NVARCHAR(10)', nullable=False)])),
+                      model(table('T', [column('ID')])))
+        self.assertEqual(result.statements['alter_columns'], ['ALTER TABLE dbo.T ADD CODE NVARCHAR(10) NOT NULL;'])
+        self.assertEqual(len(result.manual), 1)
+        self.assertIn('T.CODE is NOT NULL without a default', result.manual[0])
+
+    def test_new_not_null_column_with_default(self):
+        result = diff(model(table('T', [column('ID'), column('IS_ACTIVE', 'BIT', nullable=False, default='1')])),
+                      model(table('T', [column('ID')])))
+        self.assertEqual(result.statements['alter_columns'],
+                         ['ALTER TABLE dbo.T ADD IS_ACTIVE BIT NOT NULL CONSTRAINT DF_T_IS_ACTIVE DEFAULT 1;'])
+        self.assertEqual(result.manual, [])
+
+    def test_column_becoming_not_null_without_default_is_listed(self):
+        result = diff(model(table('T', [column('CODE', 'NVARCHAR(10)', nullable=False)])),
+                      model(table('T', [column('CODE', 'NVARCHAR(10)')])))
+        self.assertEqual(result.statements['alter_columns'],
+                         ['ALTER TABLE dbo.T ALTER COLUMN CODE NVARCHAR(10) NOT NULL;'])
+        self.assertEqual(len(result.manual), 1)
+        self.assertIn('T.CODE becomes NOT NULL without a default', result.manual[0])
+
+    def test_column_becoming_not_null_with_default_fills_nulls_first(self):
+        result = diff(model(table('T', [column('IS_ACTIVE', 'BIT', nullable=False, default='1')])),
+                      model(table('T', [column('IS_ACTIVE', 'BIT', default='1')])))
+        drop_default, fill, alter, add_default = result.statements['alter_columns']
+        self.assertIn('sys.default_constraints', drop_default)
+        self.assertEqual(fill, 'UPDATE dbo.T SET IS_ACTIVE = 1 WHERE IS_ACTIVE IS NULL;')
+        self.assertEqual(alter, 'ALTER TABLE dbo.T ALTER COLUMN IS_ACTIVE BIT NOT NULL;')
+        self.assertEqual(add_default, 'ALTER TABLE dbo.T ADD CONSTRAINT DF_T_IS_ACTIVE DEFAULT 1 FOR IS_ACTIVE;')
+        self.assertEqual(result.manual, [])
+
+class CatalogTests(unittest.TestCase):
+    class Catalog:
+        """Connection returning catalog rows for a table, its upload backups and its staging tables"""
+
+        TABLES = ['MODEL_TYPE', 'MODEL_TYPE_BACKUP_20240101_120000', 'MODEL_TYPE_BACKUP_20240101_120000_IDS',
+                  'MODEL_TYPE_STAGE_20240101_120000_4242_1']
+
+        def fetch_all(self, sql, params=None):
+            if 'FROM sys.tables t' in sql and 'sys.columns c' in sql:
+                return [('dbo', name, 'TYPE_ID', 'int', 4, 10, 0, 0, 0, 0, None) for name in self.TABLES]
+            if 'FROM sys.indexes' in sql:
+                return [('dbo', name, f"PK_{name}", 1, 1, 0, 1, 'TYPE_ID') for name in self.TABLES]
+            return []
+
+    def test_upload_backup_and_staging_tables_are_left_out(self):
+        current = model_from_catalog(self.Catalog())
+        self.assertEqual(list(current['tables']), ['MODEL_TYPE'])
+
+        desired = model(table('MODEL_TYPE', [column('TYPE_ID', nullable=False)], [key(['TYPE_ID'], primary_key=True)]))
+        result = diff(desired, current, allow_drop=True)
+        self.assertEqual(result.statements['drop_objects'], [])
+        self.assertEqual(result.changes, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+SQL Parser Tests for Model Registry
+Checks the T-SQL tokenizer, batch splitting, object parsing and dependency ordering on small inline scripts
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+from sql_parser import SchemaGraph, SqlSyntaxError, dependency_waves, parse_sql, split_batches, \
+    split_script, tokenize  # noqa: E402
+
+def graph_of(*scripts: str) -> SchemaGraph:
+    """Graph of inline scripts, named 01.sql, 02.sql, ... in the order given"""
+    graph = SchemaGraph()
+    for number, text in enumerate(scripts, 1):
+        graph.add_result(parse_sql(text, f"{number:02d}.sql"))
+    graph.finish()
+    return graph
+
+class TokenizerTests(unittest.TestCase):
+    def go_lines(self, text: str) -> list:
+        return [token.line for token in tokenize(text) if token.kind == 'go']
+
+    def test_go_alone_on_its_line_separates_batches(self):
+        text = "SELECT 1\nGO\nSELECT 2\n  go  -- trailing comment\nSELECT 3"
+        self.assertEqual(self.go_lines(text), [2, 4])
+        self.assertEqual(len(split_batches(tokenize(text))), 3)
+
+    def test_go_inside_a_line_word_or_string_is_not_a_separator(self):
+        text = "SELECT 1; GO\nSELECT GOAL FROM dbo.T\nPRINT 'a\nGO\nb'\nSELECT [GO]\nGO_ON:"
+        self.assertEqual(self.go_lines(text), [])
+        words = [token.value for token in tokenize(text) if token.kind == 'word']
+        self.assertIn('GO', words)
+        self.assertIn('GOAL', words)
+
+    def test_go_with_repeat_count(self):
+        self.assertEqual(self.go_lines("INSERT INTO dbo.T DEFAULT VALUES\nGO 5\n"), [2])
+
+    def test_nested_block_comments(self):
+        text = "/* outer /* inner\n*/ still comment\n*/ SELECT 1\nGO"
+        tokens = tokenize(text)
+        self.assertEqual([(token.value, token.line) for token in tokens], [('SELECT', 3), ('1', 3), ('GO', 4)])
+        with self.assertRaises(SqlSyntaxError):
+            tokenize("/* /* */ SELECT 1")
+
+    def test_unterminated_string(self):
+        with self.assertRaises(SqlSyntaxError):
+            tokenize("SELECT 'open")
+
+    def test_bracketed_and_quoted_names(self):
+        tokens = tokenize('SELECT [My ]]Col], "Other ""Col""" FROM [dbo].[T]')
+        names = [token.value for token in tokens if token.kind == 'name']
+        self.assertEqual(names, ['My ]Col', 'Other "Col"', 'dbo', 'T'])
+        self.assertTrue(all(token.upper is None for token in tokens if token.kind == 'name'))
+
+class SplitScriptTests(unittest.TestCase):
+    def test_line_numbers_and_repeat_counts(self):
+        text = ("-- header\n"
+                "CREATE TABLE dbo.T (ID INT)\n"
+                "GO\n"
+                "\n"
+                "INSERT INTO dbo.T VALUES (1)\n"
+                "GO 3\n"
+                "/* only a comment */\n"
+                "GO\n"
+                "SELECT * FROM dbo.T")
+        batches = split_script(text)
+        self.assertEqual([(start, count) for start, _, count in batches], [(1, 1), (4, 3), (9, 1)])
+        self.assertEqual(batches[0][1], "-- header\nCREATE TABLE dbo.T (ID INT)")
+        self.assertEqual(batches[1][1].strip(), "INSERT INTO dbo.T VALUES (1)")
+        self.assertEqual(batches[2][1], "SELECT * FROM dbo.T")
+
+class ParseTests(unittest.TestCase):
+    def test_table_with_bracketed_and_quoted_names(self):
+        result = parse_sql('CREATE TABLE [dbo].[My Table] ("Col ""x""" INT NOT NULL, [Name] NVARCHAR(50))')
+        table = result.objects[0]
+        self.assertEqual((table.kind, table.name, table.ref.schema), ('table', 'My Table', 'dbo'))
+        self.assertEqual(list(table.columns), ['COL "X"', 'NAME'])
+        self.assertFalse(table.column('Col "x"').nullable)
+        self.assertEqual(table.column('name').data_type, 'NVARCHAR(50)')
+
+    def test_create_or_alter(self):
+        result = parse_sql("CREATE OR ALTER VIEW dbo.VW_T AS SELECT ID FROM dbo.T")
+        view = result.objects[0]
+        self.assertEqual((view.kind, view.name), ('view', 'VW_T'))
+        self.assertEqual(view.depends_on(), {'T'})
+
+    def test_alter_table_add_constraint_foreign_key(self):
+        graph = graph_of(
+            "CREATE TABLE dbo.A (ID INT NOT NULL CONSTRAINT PK_A PRIMARY KEY)",
+            "CREATE TABLE dbo.B (ID INT, A_ID INT)\nGO\n"
+            "ALTER TABLE dbo.B WITH CHECK ADD CONSTRAINT FK_B_A FOREIGN KEY (A_ID) REFERENCES dbo.A (ID);")
+        table = graph.get('b')
+        self.assertEqual(len(table.foreign_keys), 1)
+        fk = table.foreign_keys[0]
+        self.assertEqual((fk.name, fk.columns, fk.references.key, fk.ref_columns), ('FK_B_A', ['A_ID'], 'A', ['ID']))
+        self.assertEqual(graph.dependencies(table), {'A'})
+        self.assertEqual(graph.unresolved_alterations, [])
+
+    def test_primary_key_and_unique_constraints(self):
+        table = parse_sql("CREATE TABLE dbo.T (ID INT PRIMARY KEY, CODE NVARCHAR(10) UNIQUE, "
+                          "NAME NVARCHAR(50), CONSTRAINT UQ_T_NAME UNIQUE NONCLUSTERED (NAME, CODE))").objects[0]
+        primary_key, code, name = table.indexes
+        self.assertTrue(primary_key.primary_key and primary_key.constraint)
+        self.assertIsNone(primary_key.name)
+        self.assertFalse(table.column('ID').nullable)
+        self.assertEqual((code.columns, code.unique, code.constraint, code.primary_key), (['CODE'], True, True, False))
+        self.assertEqual((name.name, name.columns, name.clustered), ('UQ_T_NAME', ['NAME', 'CODE'], False))
+
+    def test_create_unique_clustered_index(self):
+        graph = graph_of("CREATE TABLE dbo.T (ID INT, CODE NVARCHAR(10))\nGO\n"
+                         "CREATE UNIQUE CLUSTERED INDEX IX_T_CODE ON dbo.T (CODE, ID DESC)")
+        index = graph.get('T').indexes[0]
+        self.assertEqual((index.name, index.columns), ('IX_T_CODE', ['CODE', 'ID']))
+        self.assertTrue(index.unique)
+        self.assertTrue(index.clustered)
+        self.assertFalse(index.constraint)
+
+    def test_cte_alias_and_cursor_names_are_not_references(self):
+        procedure = parse_sql(
+            "CREATE PROCEDURE dbo.P AS\n"
+            "BEGIN\n"
+            "    WITH recent (ID) AS (SELECT ID FROM dbo.T), older AS (SELECT ID FROM dbo.T)\n"
+            "    SELECT r.ID FROM recent r JOIN older o ON o.ID = r.ID;\n"
+            "    DECLARE row_cursor CURSOR FOR SELECT ID FROM dbo.U;\n"
+            "    OPEN row_cursor;\n"
+            "    UPDATE u SET NAME = 'x' FROM dbo.U AS u;\n"
+            "    DELETE w FROM dbo.W w;\n"
+            "    EXEC dbo.Q;\n"
+            "END").objects[0]
+        self.assertEqual(procedure.depends_on(), {'T', 'U', 'W', 'Q'})
+
+    def test_trigger_depends_on_its_table(self):
+        trigger = parse_sql("CREATE TRIGGER dbo.TRG ON dbo.T AFTER INSERT AS "
+                            "INSERT INTO dbo.LOG (ID) SELECT ID FROM inserted").objects[0]
+        self.assertEqual(trigger.parent.key, 'T')
+        self.assertEqual(trigger.depends_on(), {'T', 'LOG'})
+
+class OrderingTests(unittest.TestCase):
+    def test_dependency_waves(self):
+        waves, cycle = dependency_waves({'a': set(), 'b': {'a'}, 'c': {'a', 'b'}, 'd': {'outside'}})
+        self.assertEqual(waves, [['a', 'd'], ['b'], ['c']])
+        self.assertEqual(cycle, [])
+
+    def test_dependency_waves_with_cycle(self):
+        waves, cycle = dependency_waves({'a': {'b'}, 'b': {'a'}, 'c': {'a'}, 'e': {'e'}})
+        self.assertEqual(waves, [['e']])
+        self.assertEqual(cycle, ['a', 'b', 'c'])
+
+    def test_creation_order_follows_dependencies_then_file_order(self):
+        graph = graph_of(
+            "CREATE VIEW dbo.V AS SELECT ID FROM dbo.CHILD",
+            "CREATE TABLE dbo.CHILD (ID INT, PARENT_ID INT REFERENCES dbo.PARENT (ID))",
+            "CREATE TABLE dbo.PARENT (ID INT PRIMARY KEY)\nGO\nCREATE TABLE dbo.OTHER (ID INT)")
+        ordered, cycle = graph.creation_order()
+        self.assertEqual([obj.name for obj in ordered], ['PARENT', 'OTHER', 'CHILD', 'V'])
+        self.assertEqual(cycle, [])
+        waves, _ = graph.creation_waves()
+        self.assertEqual([[obj.name for obj in wave] for wave in waves], [['PARENT', 'OTHER'], ['CHILD'], ['V']])
+
+    def test_creation_order_reports_cycles(self):
+        graph = graph_of("CREATE VIEW dbo.A AS SELECT * FROM dbo.B", "CREATE VIEW dbo.B AS SELECT * FROM dbo.A",
+                         "CREATE TABLE dbo.T (ID INT)")
+        ordered, cycle = graph.creation_order()
+        self.assertEqual([obj.name for obj in ordered], ['T'])
+        self.assertEqual(cycle, ['A', 'B'])
+
+if __name__ == '__main__':
+    unittest.main()
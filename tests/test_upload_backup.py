@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Upload Backup Tests for Model Registry
+Checks that a batch whose bulk write fails is retried together with its backup, so the backup keeps the pre-image,
+and that a failed restore leaves no session settings behind on the pooled connection
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'excel_templates' / 'upload_scripts'))
+import pandas as pd  # noqa: E402
+from backup import UploadBackup, restore_upload  # noqa: E402
+from bulk_insert import BulkInserter  # noqa: E402
+from config import TABLE_MAPPINGS  # noqa: E402
+from upsert import MergeUpserter  # noqa: E402
+from uploader import ExcelUploader  # noqa: E402
+
+class FakeCursor:
+    """Records statements on its connection; bulk calls into the failing table raise"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.fast_executemany = False
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        self.connection.pending.append(sql)
+        self.connection.log.append(sql)
+        self.rowcount = 1
+
+    def executemany(self, sql, rows):
+        if self.fast_executemany and sql.startswith(f"INSERT INTO {self.connection.failing_table} "):
+            raise RuntimeError('bulk call rejected by the driver')
+        self.connection.pending.extend(sql for _ in rows)
+        self.rowcount = len(rows)
+
+    def fetchone(self):
+        # MERGE counts: (inserted, updated)
+        return (0, 1)
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    """Keeps the statements of the open transaction apart from the committed ones"""
+
+    def __init__(self, failing_table: str):
+        self.failing_table = failing_table
+        self.pending = []
+        self.committed = []
+        # Every statement executed, rolled back or not
+        self.log = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.committed.extend(self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+class BulkFallbackBackupTests(unittest.TestCase):
+    def setUp(self):
+        # The uploader writes its log file under the working directory
+        self.cwd = os.getcwd()
+        self.workdir = tempfile.TemporaryDirectory()
+        os.chdir(self.workdir.name)
+        self.uploader = ExcelUploader('model_type', use_cache=False, upload_mode='upsert', pool=object())
+        self.batch = pd.DataFrame({'TYPE_CODE': ['PD', 'LGD'], 'TYPE_NAME': ['Default', 'Loss']})
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.workdir.cleanup()
+
+    def upload(self, connection, writer) -> UploadBackup:
+        self.uploader.connection = connection
+        backup = UploadBackup(connection, TABLE_MAPPINGS['model_type'])
+        backup.begin()
+        committed = self.uploader.upload_batch(self.batch, writer, backup, 1)
+        self.assertEqual(committed, len(self.batch))
+        return backup
+
+    def assert_backed_up_before_write(self, connection, backup: UploadBackup, write_prefix: str):
+        copies = [i for i, sql in enumerate(connection.committed)
+                  if sql.startswith(f"INSERT INTO {backup.backup_table} SELECT t.*")]
+        writes = [i for i, sql in enumerate(connection.committed) if sql.startswith(write_prefix)]
+        self.assertEqual(len(copies), 1, 'the committed batch must copy the pre-image into the backup once')
+        self.assertTrue(writes, 'the batch must be committed on the per-row path')
+        self.assertLess(copies[0], writes[0], 'the pre-image must be copied before the rows are overwritten')
+        self.assertEqual(connection.pending, [])
+
+    def test_insert_fallback_keeps_backup(self):
+        connection = FakeConnection('MODEL_TYPE')
+        inserter = BulkInserter(connection, 'MODEL_TYPE', ['TYPE_CODE', 'TYPE_NAME'])
+        backup = self.upload(connection, inserter)
+        self.assertFalse(inserter.use_bulk)
+        self.assert_backed_up_before_write(connection, backup, 'INSERT INTO MODEL_TYPE (')
+
+    def test_upsert_fallback_keeps_backup(self):
+        connection = FakeConnection('#UPLOAD_STAGE')
+        upserter = MergeUpserter(connection, 'MODEL_TYPE', ['TYPE_CODE', 'TYPE_NAME'], ['TYPE_CODE'])
+        # As in ExcelUploader.upload_data: the staging table's commit must not take a batch's backup with it
+        upserter.create_staging()
+        backup = self.upload(connection, upserter)
+        self.assertFalse(upserter.use_bulk)
+        self.assertEqual(self.uploader.upload_counts['updated'], 1)
+        self.assert_backed_up_before_write(connection, backup, 'SET NOCOUNT ON; DECLARE @merge_actions')
+
+class RestoreCursor(FakeCursor):
+    """Cursor for restore_upload: lists the table's columns, and putting deleted rows back fails"""
+
+    def execute(self, sql, params=None):
+        if sql.startswith('INSERT INTO MODEL_TYPE '):
+            raise RuntimeError('duplicate key')
+        super().execute(sql, params)
+
+    def fetchall(self):
+        return [('TYPE_ID',), ('TYPE_CODE',), ('TYPE_NAME',)]
+
+class RestoreConnection(FakeConnection):
+    def cursor(self):
+        return RestoreCursor(self)
+
+class RestoreTests(unittest.TestCase):
+    def test_failed_restore_turns_identity_insert_off(self):
+        connection = RestoreConnection('MODEL_TYPE')
+        with tempfile.TemporaryDirectory() as manifest_dir:
+            manifest_path = os.path.join(manifest_dir, 'MODEL_TYPE_BACKUP_20240101_120000.json')
+            with open(manifest_path, 'w', encoding='utf-8') as f:
+                json.dump({'table': 'MODEL_TYPE', 'backup_table': 'MODEL_TYPE_BACKUP_20240101_120000',
+                           'identity_column': 'TYPE_ID', 'inserted_ids_table': None}, f)
+            with self.assertRaises(RuntimeError):
+                restore_upload(connection, manifest_path)
+
+        # Rolled back, but the session setting was switched off again
+        self.assertEqual(connection.committed, [])
+        self.assertEqual(connection.pending, [])
+        settings = [sql for sql in connection.log if sql.startswith('SET IDENTITY_INSERT')]
+        self.assertEqual(settings, ['SET IDENTITY_INSERT MODEL_TYPE ON', 'SET IDENTITY_INSERT MODEL_TYPE OFF'])
+
+if __name__ == '__main__':
+    unittest.main()